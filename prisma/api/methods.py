@@ -48,11 +48,11 @@ class ApiMethods:
     @staticmethod
     def peer_list():
         """
-        Returns a list with all the peers in our database.
+        Returns a list with all the peers we know.
 
         :return: a list of peers
         """
-        return {'peer_list': Prisma().db.get_peers_many()}
+        return {'peer_list': Prisma().network.peers.get_many()}
 
     @staticmethod
     def peer_count():
@@ -61,7 +61,7 @@ class ApiMethods:
 
         :return: a list of peers
         """
-        return {'peer_count': Prisma().db.count_peers()}
+        return {'peer_count': Prisma().network.peers.count()}
 
     @staticmethod
     def last_event_time():
@@ -72,6 +72,78 @@ class ApiMethods:
         """
         return {'latest_event_time': Prisma().db.get_latest_event_time()}
 
+    @staticmethod
+    def is_ancestor(ancestor, descendant):
+        """
+        Debug method, checks if an event is an ancestor of another one.
+
+        :param ancestor: hash of possible ancestor event
+        :param descendant: hash of possible descendant event
+        :return: is ancestor
+        """
+        return {'is_ancestor': Prisma().graph.is_ancestor(ancestor, descendant)}
+
+    @staticmethod
+    def first_descendant(event, creator):
+        """
+        Debug method, returns the first event of a creator that has the given event as an ancestor.
+
+        :param event: event hash
+        :param creator: identifying key (public key) of creator
+        :return: hash of the first descendant or None
+        """
+        return {'first_descendant': Prisma().graph.first_descendant(event, creator)}
+
+    @staticmethod
+    def memory_stats():
+        """
+        Returns the memory budget and the usage of in-memory consensus structures.
+
+        :return: memory stats
+        """
+        return {'memory_stats': Prisma().memory.stats()}
+
+    @staticmethod
+    def cache_stats():
+        """
+        Returns hits, misses and size of the database read cache per kind of lookup.
+
+        :return: cache stats
+        """
+        return {'cache_stats': Prisma().db.cache.stats()}
+
+    @staticmethod
+    def get_archived_round(r):
+        """
+        Returns events pruned from the database in the archive record holding the given round.
+
+        :param r: round
+        :return: archived events and their rounds
+        """
+        if Prisma().archive is None:
+            raise Exception('archive is not enabled')
+        return {'archived_round': Prisma().archive.get(int(r))}
+
+    @staticmethod
+    def archive_stats():
+        """
+        Returns the count of archive records, the last archived round and the size of segments.
+
+        :return: archive stats
+        """
+        if Prisma().archive is None:
+            raise Exception('archive is not enabled')
+        return {'archive_stats': Prisma().archive.stats()}
+
+    @staticmethod
+    def query_stats():
+        """
+        Returns latency histograms of database commands per collection and operation and the slowest commands.
+
+        :return: query stats
+        """
+        return {'query_stats': Prisma().db.get_query_stats()}
+
     @staticmethod
     def get_my_balance():
         """
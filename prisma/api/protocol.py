@@ -7,8 +7,10 @@ Licensed under the GNU Lesser General Public License, version 3 or later. See LI
 
 import logging
 import json
+from twisted.internet import defer
 from autobahn.twisted.websocket import WebSocketServerFactory, WebSocketServerProtocol
 
+from prisma.manager import Prisma
 from prisma.api.methods import ApiMethods
 
 
@@ -50,26 +52,45 @@ class ApiProtocol(WebSocketServerProtocol):
         :return:
         """
         if not isBinary:
-            response = {'ok': True}
-            try:
-                message = json.loads(payload.decode('utf-8'))
-                request = message.get('req')
-                if request is None:
-                    raise Exception('please, specify a request')
-                elif request == 'connected_clients':
-                    response.update(self.get_connected_clients_list())
-                else:
-                    # calls the function in the request, with all the msg as parameters
-                    del message['req']
-                    result = getattr(ApiMethods, request)(**message)
-                    # merges the response with the final result
-                    response.update(result)
-            except Exception as e:
-                response['ok'] = False
-                response['error'] = str(e)
-
-            # send the response
-            self.send_json(response)
+            d = defer.maybeDeferred(self.call_request, payload)
+            d.addCallbacks(self.request_done, self.request_error)
+
+    def call_request(self, payload):
+        """
+        Calls the function in the request. Methods use the cryptograph and the database,
+        so they run in the cryptograph thread.
+
+        :param payload:
+        :return: deferred result of the function
+        """
+        message = json.loads(payload.decode('utf-8'))
+        request = message.get('req')
+        if request is None:
+            raise Exception('please, specify a request')
+        elif request == 'connected_clients':
+            return self.get_connected_clients_list()
+        # calls the function in the request, with all the msg as parameters
+        del message['req']
+        method = getattr(ApiMethods, request)
+        return Prisma().deferred_db.defer_serial(method, **message)
+
+    def request_done(self, result):
+        """
+        Merges the response with the final result and sends it.
+
+        :param result: result of the function in the request
+        """
+        response = {'ok': True}
+        response.update(result)
+        self.send_json(response)
+
+    def request_error(self, reason):
+        """
+        Sends the error of a request.
+
+        :param reason: failure
+        """
+        self.send_json({'ok': False, 'error': reason.getErrorMessage()})
 
     def send_json(self, payload):
         """
@@ -1,6 +1,8 @@
+import logging
 from twisted.internet import reactor
 from twisted.internet.task import LoopingCall
 
+from prisma.manager import Prisma
 from prisma.config import CONFIG
 from prisma.api.methods import ApiMethods
 from prisma.api.protocol import ApiFactory
@@ -14,6 +16,7 @@ class ApiService:
     Api Service
     """
     def __init__(self):
+        self.logger = logging.getLogger('Api')
         self.port = CONFIG.getint('api', 'listen_port')
         self.factory = ApiFactory()
         self.listener = None
@@ -57,9 +60,27 @@ class ApiService:
     def push_info(self):
         """
         Push notification to the client with some general information about the node.
+        The looping call waits for the queries before scheduling the next push.
+
+        :return: deferred fired when pushed
+        """
+        def push_error(reason):
+            self.logger.error('Could not push info: {0}'.format(reason.getErrorMessage()))
+
+        d = Prisma().deferred_db.defer(self.get_info)
+        d.addCallback(self.broadcast)
+        d.addErrback(push_error)
+        return d
+
+    @staticmethod
+    def get_info():
+        """
+        Gets general information about the node. Runs in a database thread.
+
+        :return: push payload
         """
         push = {'push': 'info'}
         push.update(ApiMethods.peer_count())
         push.update(ApiMethods.last_event_time())
         push.update(ApiMethods.get_my_balance())
-        self.broadcast(push)
+        return push
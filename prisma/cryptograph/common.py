@@ -216,7 +216,7 @@ class CryptographCommon(object):
             self.logger.critical('Could not read genesis event. Reason: {0}'.format(e))
         return False
 
-    def strongly_see(self, h, r):
+    def strongly_see(self, h, r, can_see=None):
         """
         Get nodes that given event can strongly see
 
@@ -224,13 +224,17 @@ class CryptographCommon(object):
         :type h: str
         :param r: round
         :type r: int
+        :param can_see: can_see of event if it is not stored in db yet
+        :type can_see: dict or None
         :return: nodes that can strongly see that event
         :rtype: set
         """
         self.logger.debug("strongly_see start h = %s, r = %s", str(h), str(r))
         self.logger.debug("Witneeses on round r %s", str(Prisma().db.get_witness(r)))
         hits = defaultdict(int)
-        for c, k in Prisma().db.get_can_see(h).items():
+        if can_see is None:
+            can_see = Prisma().db.get_can_see(h)
+        for c, k in can_see.items():
             self.logger.debug("strongly_see k = %s ", str(k))
             self.logger.debug("strongly_see k (round) = %s", str(Prisma().db.get_round(k)))
             if Prisma().db.get_round(k) == r:
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 Prisma crypto currency and its Authors.
+This file is part of prisma crypto currency.
+Licensed under the GNU Lesser General Public License, version 3 or later. See LICENSING for details.
+"""
+
+import logging
+import sys
+
+from prisma.manager import Prisma
+
+
+class Decided(object):
+    """
+    In-memory mirror of the consensus and famous collections.
+
+    Decided rounds above the last pruned round are kept in a set, rounds up to it
+    are signed and so decided. The fame of every decided witness is kept in a dict
+    keyed by the binary digest of the witness. Fame uses it instead of
+    querying the database once per round and witness.
+    Bytes taken by the entries are counted as they are added and removed.
+    """
+    def __init__(self, graph):
+        """
+        Create class instance
+
+        :param graph: instance of cryptograph class
+        :type graph: object
+        :returns instance of Decided class
+        :rtype: object
+        """
+        self.graph = graph
+        self.logger = logging.getLogger('Decided')
+        self.rounds = set()
+        self.last_pruned = -1
+        self.famous = {}
+        self.size = 0
+
+    def restore(self):
+        """
+        Rebuilds the structure from the consensus and famous collections.
+        Should be invoked at startup and whenever those collections were replaced.
+
+        :return: None
+        """
+        self.rounds = set()
+        self.famous = {}
+        self.size = 0
+        last_pruned = Prisma().db.get_consensus_last_pruned()
+        self.last_pruned = -1 if last_pruned is False else last_pruned
+        self.add_rounds(Prisma().db.get_consensus_many(sign=False))
+        self.add_rounds(Prisma().db.get_consensus_many(sign=True))
+
+        famous = Prisma().db.get_famous_many()
+        if famous:
+            for h, is_famous in famous.items():
+                self.set_famous(h, is_famous)
+        self.logger.debug("Restored %s decided rounds and %s decided witnesses",
+                          str(len(self.rounds)), str(len(self.famous)))
+
+    def add_rounds(self, rounds):
+        """
+        Marks rounds as decided (all famous witnesses are known)
+
+        :param rounds: decided rounds
+        :type rounds: list
+        :return: None
+        """
+        for r in rounds:
+            if r > self.last_pruned and r not in self.rounds:
+                self.rounds.add(r)
+                self.size += sys.getsizeof(r)
+
+    def is_round_decided(self, r):
+        """
+        Checks if round is present in consensus
+
+        :param r: round to check
+        :type r: int
+        :return: is present or not
+        :rtype: bool
+        """
+        return r >= 0 and (r <= self.last_pruned or r in self.rounds)
+
+    def delete_rounds(self, last_pruned):
+        """
+        Forgets rounds pruned from db, they are signed and stay decided
+
+        :param last_pruned: last pruned round
+        :type last_pruned: int
+        :return: None
+        """
+        if last_pruned > self.last_pruned:
+            self.last_pruned = last_pruned
+            pruned = {r for r in self.rounds if r <= last_pruned}
+            self.rounds -= pruned
+            self.size -= sum(sys.getsizeof(r) for r in pruned)
+
+    def set_famous(self, h, is_famous):
+        """
+        Stores the decided fame of a witness
+
+        :param h: witness hash, binary digest or hex
+        :type h: bytes or str
+        :param is_famous: is witness famous
+        :type is_famous: bool
+        :return: None
+        """
+        bin_h = Prisma().common.hash_to_bin(h)
+        if bin_h not in self.famous:
+            self.size += sys.getsizeof(bin_h)
+        self.famous[bin_h] = is_famous
+
+    def is_fame_decided(self, h):
+        """
+        Checks if fame of the witness is already decided
+
+        :param h: witness hash, binary digest or hex
+        :type h: bytes or str
+        :return: is decided or not
+        :rtype: bool
+        """
+        return Prisma().common.hash_to_bin(h) in self.famous
+
+    def delete_famous(self, hash_list):
+        """
+        Forgets witnesses deleted from db when cleaning signed rounds
+
+        :param hash_list: hashes of deleted events
+        :type hash_list: list
+        :return: None
+        """
+        for h in hash_list:
+            bin_h = Prisma().common.hash_to_bin(h)
+            if bin_h in self.famous:
+                del self.famous[bin_h]
+                self.size -= sys.getsizeof(bin_h)
+
+    def usage(self):
+        """
+        Gets estimated memory taken by the structure
+
+        :return: size in bytes
+        :rtype: int
+        """
+        return sys.getsizeof(self.rounds) + sys.getsizeof(self.famous) + self.size
@@ -108,8 +108,8 @@ class Event(object):
         if ev.p != ():
             rnd1 = Prisma().db.get_round(ev.p[0])
             rnd2 = Prisma().db.get_round(ev.p[1])
-            first_parent = Prisma().db.get_event(ev.p[0], as_tuple=False)
-            second_parent = Prisma().db.get_event(ev.p[1], as_tuple=False)
+            first_parent = Prisma().db.get_event(ev.p[0], as_tuple=False, payload=False)
+            second_parent = Prisma().db.get_event(ev.p[1], as_tuple=False, payload=False)
         if (self.crypto.blake_hash(bytes(dumps(ev).encode('utf-8'))) == blake2hash and (
                         ev.p == ()
                 or (len(ev.p) == 2
@@ -139,9 +139,10 @@ class Event(object):
         :rtype: bool
         """
         try:
-            Prisma().graph.tbd.add(blake2hash)
+            Prisma().graph.tbd.add(Prisma().common.hash_to_bin(blake2hash))
             if ev.p == ():
-                if not Prisma().db.insert_height({blake2hash: 0}):
+                height = 0
+                if not Prisma().db.insert_height({blake2hash: height}):
                     self.logger.error("Could not add root event with blake2b hash %s.",
                                       str(blake2hash))
                     return False
@@ -149,12 +150,14 @@ class Event(object):
                 height_list = []
                 for p in ev.p:
                     height_list.append(Prisma().db.get_height(p))
+                height = max(height_list) + 1
                 if not Prisma().db.insert_height(
-                        {blake2hash: max(height_list) + 1}):
+                        {blake2hash: height}):
                     self.logger.debug("Could not add new event with blake2b hash %s",
                                       str(blake2hash))
                     return False
             Prisma().db.insert_event({blake2hash: ev})
+            self.graph._reachability.add_event(blake2hash, ev, height)
         except Exception as e:
             self.logger.error("Could not add new event. Reason:", e)
             return False
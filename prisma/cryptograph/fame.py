@@ -12,6 +12,7 @@ import logging
 from collections import defaultdict
 
 from prisma.manager import Prisma
+from prisma.cryptograph.journal import STEP_FAME
 
 
 class Fame(object):
@@ -70,6 +71,42 @@ class Fame(object):
         self.logger.debug("max_r %s", str(max_r))
         self.logger.debug("max_c %s", str(max_c))
 
+        # Hashes are binary digests like in Decided, hex is only passed to db and journal
+        to_hex = Prisma().common.bin_to_hash
+        to_bin = Prisma().common.hash_to_bin
+        witnesses = {}
+        stored_votes = {}
+
+        def get_witness(r):
+            """
+            Gets witnesses of a round, read once per decision
+
+            :param r: round
+            :type r: int
+            :return: witnesses in format {creator: binary hash}
+            :rtype: dict
+            """
+            if r not in witnesses:
+                witnesses[r] = {c: to_bin(w) for c, w in Prisma().db.get_witness(r).items()}
+            return witnesses[r]
+
+        def get_vote(w):
+            """
+            Gets votes of a witness of the previous round, they are written before they are read
+
+            :param w: witness hash
+            :type w: bytes
+            :return: votes in format {binary hash: vote}
+            :rtype: dict
+            """
+            if w not in stored_votes:
+                stored_votes[w] = {to_bin(x): v for x, v in (Prisma().db.get_vote(to_hex(w)) or {}).items()}
+            return stored_votes[w]
+
+        def insert_vote(votes):
+            Prisma().db.insert_vote({to_hex(y): {to_hex(x): v for x, v in vote.items()}
+                                     for y, vote in votes.items()})
+
         # helpers to keep code clean
         def iter_undetermined(r_):
             """
@@ -84,13 +121,10 @@ class Fame(object):
             """
             for r in range(max_c, r_):
                 self.logger.debug("Start cycle with r = %s", str(r))
-                if not Prisma().db.check_consensus(r):
+                if not self.graph._decided.is_round_decided(r):
                     self.logger.debug("r is not in consensus")
-                    witness = Prisma().db.get_witness(r)
-                    self.logger.debug("self.node.witnesses[r] %s", str(witness))
-                    for w in witness.values():
-                        self.logger.debug("Start cycle with w = %s", str(w))
-                        if not Prisma().db.check_famous(w):
+                    for w in get_witness(r).values():
+                        if not self.graph._decided.is_fame_decided(w):
                             self.logger.debug("w is not in famous")
                             yield r, w
 
@@ -107,19 +141,27 @@ class Fame(object):
             self.logger.debug("MAX_C value = %s", str(max_c))
             for _r in range(max_c + 1, max_r + 1):
                 self.logger.debug("X value = %s", str(_r))
-                witness = Prisma().db.get_witness(_r)
-                for w in witness.values():
+                for w in get_witness(_r).values():
                     yield _r, w
 
         done = set()
+        # Votes of witnesses of votes_round, voters only read votes of the previous round,
+        # so they are written in one batch when the round is done
+        votes = {}
+        votes_round = None
+        famous = {}
 
         # Note: r_ -- witness round
         #       y -- witness hash
         for r_, y in iter_voters():
-            self.logger.debug("iter_y %s", str(y))
+            if r_ != votes_round:
+                if votes:
+                    insert_vote(votes)
+                votes = {}
+                votes_round = r_
+            self.logger.debug("iter_y %s", to_hex(y))
             self.logger.debug("Fame strongly see start")
-            s = {Prisma().db.get_witness(r_ - 1)[c] for c in self.graph._cgc.strongly_see(y, r_ - 1)}
-            self.logger.debug("fame_s %s", str(list(s)))
+            s = {get_witness(r_ - 1)[c] for c in self.graph._cgc.strongly_see(to_hex(y), r_ - 1)}
 
             # Note:    r -- witness round
             #          x -- witness hash
@@ -128,40 +170,60 @@ class Fame(object):
                 self.logger.debug("fame_r %s", str(r))
 
                 if r_ - r == 1: # ﬁrst round of the election
-                    self.logger.debug("y %s", str(y))
-                    self.logger.debug("x %s", str(x))
-
-                    new_votes = {y: {x: x in s}}
-                    self.logger.debug("new_votes %s", new_votes)
-                    Prisma().db.insert_vote(new_votes)
+                    votes.setdefault(y, {})[x] = x in s
                 else:
-                    v, t = self.majority((len(s), Prisma().db.get_vote(w)[x]) for w in s)
+                    v, t = self.majority((len(s), get_vote(w)[x]) for w in s)
                     self.logger.debug("fame_v %s", str(v))
                     self.logger.debug("round = %s fame_t %s", str(r), str(t))
 
                     if (r_ - r) % self.C != 0: # this is a normal round
                         if t >= self.graph.min_s:  # if supermajority, then decide
-                            Prisma().db.insert_famous({x: v})
+                            famous[x] = v
+                            self.graph._decided.set_famous(x, v)
                             self.logger.debug("Add to done famous, round = %s", str(r))
                             done.add(r)
                         else: # else, just vote
-                            Prisma().db.insert_vote({y: {x: v}})
-                            self.logger.debug("[just vote] y %s vote for x %s %s", str(y), str(x), str(v))
+                            votes.setdefault(y, {})[x] = v
+                            self.logger.debug("[just vote] y %s vote for x %s %s", to_hex(y), to_hex(x), str(v))
                     else:  # this is a coin round
                         if t >= self.graph.min_s:  # if supermajority, then vote
-                            Prisma().db.insert_vote({y: {x: v}})
-                            self.logger.debug("[coin round] y %s vote for x %s %s", str(y), str(x), str(v))
+                            votes.setdefault(y, {})[x] = v
+                            self.logger.debug("[coin round] y %s vote for x %s %s", to_hex(y), to_hex(x), str(v))
                         else: # else ﬂip a coin
                             # the 1st bit is same as any other bit right?
-                            hg = Prisma().db.get_event(y)
-                            Prisma().db.insert_vote({y: {x: bool(ord(hg.s[0]) & 1)}})
-                            self.logger.debug("[ﬂip a coin] y %s vote for x %s %s", str(y), str(x), str(bool(ord(hg.s[0]) & 1)))
+                            hg = Prisma().db.get_event(to_hex(y), payload=False)
+                            votes.setdefault(y, {})[x] = bool(ord(hg.s[0]) & 1)
+                            self.logger.debug("[ﬂip a coin] y %s vote for x %s %s", to_hex(y), to_hex(x),
+                                              str(bool(ord(hg.s[0]) & 1)))
+
+        if votes:
+            insert_vote(votes)
 
         self.logger.debug("Famous_done %s", str(done))
         new_c = {r for r in done
-                 if all(Prisma().db.check_famous(w) for w in Prisma().db.get_witness(r).values())}
+                 if all(self.graph._decided.is_fame_decided(w) for w in get_witness(r).values())}
         new_c = sorted(list(new_c))
 
         self.logger.debug("new_c %s", str(new_c))
-        Prisma().db.insert_consensus(new_c)
+        famous = {to_hex(x): v for x, v in famous.items()}
+        if famous or new_c:
+            # votes can be computed again, fame and consensus are journaled to be written again
+            self.graph._journal.step(STEP_FAME, famous=famous, consensus=new_c)
+        self.insert_fame(famous, new_c)
         return new_c
+
+    def insert_fame(self, famous, new_c):
+        """
+        Writes decided fame and the rounds where famousness is fully decided
+
+        :param famous: data in format {hash: is famous(T/F)}
+        :type famous: dict
+        :param new_c: new consensus
+        :type new_c: list
+        :return: None
+        """
+        if famous:
+            Prisma().db.insert_famous(famous)
+
+        Prisma().db.insert_consensus(new_c)
+        self.graph._decided.add_rounds(new_c)
@@ -10,11 +10,15 @@ import logging
 import json
 
 from prisma.manager import Prisma
+from prisma.config import CONFIG
 from prisma.crypto.crypto import Crypto
 from prisma.cryptograph.common import CryptographCommon
+from prisma.cryptograph.decided import Decided
 from prisma.cryptograph.event import Event
 from prisma.cryptograph.fame import Fame
+from prisma.cryptograph.journal import Journal
 from prisma.cryptograph.order import Order
+from prisma.cryptograph.reachability import Reachability
 from prisma.cryptograph.rounds import Rounds
 from prisma.utils.common import Common
 from prisma.crypto.wallet import Wallet
@@ -48,45 +52,85 @@ class Graph:
         self.crypto = Crypto()
         self.head = None
         self.round = {}
+        # binary digests of events whose order is not yet found
         self.tbd = set()
         self._event = Event(graph=self)
+        self._decided = Decided(graph=self)
         self._fame = Fame(graph=self)
+        self._journal = Journal(graph=self)
         self._order = Order(graph=self)
         self._round = Rounds(graph=self)
+        self._reachability = Reachability(graph=self)
 
     def init_graph(self):
         self.last_signed_state = Prisma().db.get_consensus_last_signed()
         self.logger.debug("INIT last_signed_state: %s", str(self.last_signed_state))
+        self._decided.restore()
+        self.register_memory()
 
         is_cg_empty = self.init_events()
         self.restore_invariants(is_cg_empty)
 
         if is_cg_empty:
             self.sync_genesis()
+        else:
+            # a sync interrupted by a crash is rolled back or finished from its journal
+            if not self._journal.recover():
+                self.logger.critical("Could not recover the interrupted sync, database is not consistent.")
+                sys.exit(1)
 
         self.unsent_count = len(Prisma().db.get_consensus_greater_than(
             Prisma().db.get_consensus_last_created_sign()))
 
+    def register_memory(self):
+        """
+        Registers in-memory structures in the memory manager.
+        Fame of signed witnesses is never needed again, so it is evicted with signed events.
+
+        :return: None
+        """
+        Prisma().memory.register('reachability', self._reachability.usage,
+                                 evict_signed=self._reachability.evict_signed,
+                                 evict_cold=self._reachability.evict_cold)
+        Prisma().memory.register('decided', self._decided.usage,
+                                 evict_signed=self._decided.delete_famous)
+        Prisma().memory.register('tbd', self.tbd_usage)
+
+    def tbd_usage(self):
+        """
+        Gets estimated memory taken by tbd, its binary digests are all of the same size
+
+        :return: size in bytes
+        :rtype: int
+        """
+        return sys.getsizeof(self.tbd) + len(self.tbd) * sys.getsizeof(bytes(64))
+
     def init_events(self):
         """
-        Verifying events stored in database
+        Verifies events stored in database and restores in-memory structures.
+        Only events whose order is not found yet are read, the reachability index
+        is built from db when it is used. Verification streams the events in batches
+        and may be disabled by verify_events in the config.
 
         :return: is cg empty
         :rtype: bool
         """
-        cg = Prisma().db.get_events_many()
+        if not Prisma().db.get_latest_event_time():
+            return True
 
-        if cg:
+        if CONFIG.getboolean('database', 'verify_events', fallback=True):
             self.logger.info("Verifying events stored in database.")
-            for event in cg:
-                if not self._event.is_valid_event(event, cg[event]):
-                    self.logger.error("Could not verify event with blake2b hash %s",
-                                      str(event))
-                    """ Todo: what will we do here if we can not validate an event in database? """
-                    exit()
-            return False
-        else:
-            return True
+            for batch in Prisma().db.iter_events():
+                cg = Prisma().common.dict_to_tuple(batch)
+                for event in cg:
+                    if not self._event.is_valid_event(event, cg[event]):
+                        self.logger.critical("Could not verify event with blake2b hash %s", str(event))
+                        sys.exit(1)
+        self._reachability.drop()
+
+        # events whose order is not found yet
+        self.tbd = {Prisma().common.hash_to_bin(h) for h in Prisma().db.get_rounds_unhandled() or []}
+        return False
 
     def restore_invariants(self, is_cg_empty):
         """
@@ -110,7 +154,7 @@ class Graph:
         """
         Insert genesis state if it is not exist
         """
-        if not Prisma().db.get_state(-1):
+        if not Prisma().db.get_state(-1, balance=False):
             gen_state = Common().read_genesis_state()
             self.logger.debug("genesis_state: %s", str(gen_state))
             Prisma().db.insert_state(gen_state['state'], gen_state['hash'], gen_state['signed'])
@@ -154,7 +198,7 @@ class Graph:
                 return False
 
             if (event_round and event_round <= self.last_signed_state) \
-                    or Prisma().db.get_event(event_hash, as_tuple=False):
+                    or Prisma().db.get_event(event_hash, as_tuple=False, payload=False):
                 self.logger.debug("CLEANING DELETE hash = %s", str(event_hash))
                 del remote_cg[event_hash]
 
@@ -213,11 +257,38 @@ class Graph:
             self.logger.debug("new_event_event_part %s", str(ev))
             assert self._event.is_valid_event(h, ev)
 
+            self._journal.add_events([h])
             if self._event.add_event(h, ev):
                 Prisma().db.insert_head(h)
                 return new + (h,)
         return False
 
+    def is_ancestor(self, x, y):
+        """
+        Checks if event x is an ancestor of event y
+
+        :param x: hash of possible ancestor
+        :type x: str
+        :param y: hash of possible descendant
+        :type y: str
+        :returns: is x an ancestor of y
+        :rtype: bool
+        """
+        return self._reachability.is_ancestor(x, y)
+
+    def first_descendant(self, x, creator):
+        """
+        Finds the first event created by creator that has event x as an ancestor
+
+        :param x: event hash
+        :type x: str
+        :param creator: identifying key of creator
+        :type creator: str
+        :returns: hash of first descendant or None
+        :rtype: str or None
+        """
+        return self._reachability.first_descendant(x, creator)
+
     def local_cryptograph_response(self, signed_event_response):
         """
         Based on the get_event_response and the data generated in signed_event_response()
@@ -239,12 +310,13 @@ class Graph:
         if head:
             cs = json.loads((self.crypto.verify_concatenated(signed_event_response)).decode('utf-8'))
             # cs are a dict
+            # only the events we send need their payload, the traversal reads metadata
             subset = {h: Prisma().db.get_event(h)
                       for h in self._cgc.bfs((head,),
                                                    lambda u: (p for p in
-                                                              Prisma().db.get_event(u, clear_parent=True).p
-                                                              if Prisma().db.get_event(p).c not in cs or
-                                                              Prisma().db.get_height(p) > cs[Prisma().db.get_event(p).c]))}
+                                                              Prisma().db.get_event(u, clear_parent=True, payload=False).p
+                                                              if Prisma().db.get_event(p, payload=False).c not in cs or
+                                                              Prisma().db.get_height(p) > cs[Prisma().db.get_event(p, payload=False).c]))}
             response = json.dumps((head, subset))
             local_cryptograph_response_res = self.crypto.sign_data(response, self.keystore['privateKeySeed'])
             self.logger.debug("local_cryptograph_response_res %s", str(local_cryptograph_response_res))
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 Prisma crypto currency and its Authors.
+This file is part of prisma crypto currency.
+Licensed under the GNU Lesser General Public License, version 3 or later. See LICENSING for details.
+"""
+
+import logging
+
+from prisma.manager import Prisma
+
+# consensus steps of a sync in the order they run
+STEP_EVENTS = 'events'
+STEP_ROUNDS = 'rounds'
+STEP_FAME = 'fame'
+STEP_ORDER = 'order'
+
+
+class Journal(object):
+    """
+    Write-ahead journal of the consensus steps of a sync: events added, rounds divided,
+    fame decided and order found.
+
+    Adding events is journaled before the events are written. Every later step is journaled
+    with the results of the previous ones into the unit of work, which writes the journal
+    after events and before the data of the steps, so a sync is written with one flush.
+    After a crash added events are rolled back, as peers send them again, or the sync is
+    finished from the journal: rounds are divided again, fame and order are taken from the
+    journal when they were found. The journal is deleted when the sync is committed.
+    """
+    def __init__(self, graph):
+        """
+        Create class instance
+
+        :param graph: instance of cryptograph class
+        :type graph: object
+        :returns instance of Journal class
+        :rtype: object
+        """
+        self.graph = graph
+        self.logger = logging.getLogger('Journal')
+        # mirrors the journal stored in db while a step is in progress
+        self.journal = None
+
+    def write(self, journal, buffered=True):
+        """
+        Stores the journal, the sync can not go on without it
+
+        :param journal: journal in format {'step': name, ...data of the step}
+        :type journal: dict
+        :param buffered: can the write be buffered by the unit of work
+        :type buffered: bool
+        :return: None
+        """
+        if not Prisma().db.insert_journal(journal, buffered):
+            raise RuntimeError("Could not write journal of step {0}.".format(journal['step']))
+        self.journal = journal
+
+    def begin(self, events):
+        """
+        Journals adding of remote events. A step left by a failed sync is recovered first.
+
+        :param events: hashes of remote events that are going to be added
+        :type events: list
+        :return: None
+        """
+        if self.journal is not None and not self.recover():
+            raise RuntimeError("Could not recover step {0} of a failed sync.".format(self.journal['step']))
+        self.write({'step': STEP_EVENTS, 'head': Prisma().db.get_head(), 'events': list(events)}, False)
+
+    def add_events(self, events):
+        """
+        Journals events created by this node before they are added during a sync.
+        The write is not buffered, an event of this node must not be written without it.
+
+        :param events: event hashes
+        :type events: list
+        :return: None
+        """
+        if self.journal is None:
+            return
+        self.write(dict(self.journal, events=self.journal['events'] + list(events)), False)
+
+    def step(self, name, **data):
+        """
+        Journals the next step into the unit of work
+
+        :param name: step name
+        :type name: str
+        :param data: data needed to finish the step
+        :type data: dict
+        :return: None
+        """
+        journal = dict(self.journal, **data)
+        journal['step'] = name
+        self.write(journal)
+
+    def commit(self):
+        """
+        Deletes the journal once the writes of the sync are committed
+
+        :return: None
+        """
+        if self.journal is not None and Prisma().db.delete_journal():
+            self.journal = None
+
+    def recover(self):
+        """
+        Rolls back or finishes the step in progress when the node stopped or a sync failed.
+        Invoked at start, after the in-memory structures are rebuilt from db, and before
+        the sync that follows a failed one.
+
+        :return: is db consistent
+        :rtype: bool
+        """
+        journal = Prisma().db.get_journal()
+        if journal is False:
+            return False
+        failed = self.journal
+        if failed is not None:
+            # fame decided in memory by the failed sync is not written yet
+            self.graph._decided.restore()
+            if journal is None or journal['step'] == STEP_EVENTS:
+                # events journaled with a dropped unit of work are only in memory
+                events = set(failed['events']) | set(journal['events'] if journal else [])
+                journal = dict(failed, step=STEP_EVENTS, events=list(events))
+        self.journal = journal
+        if journal is None:
+            return True
+
+        self.logger.warning("Recovering step %s of an interrupted sync.", journal['step'])
+        Prisma().db.begin_unit_of_work()
+        try:
+            if journal['step'] == STEP_EVENTS:
+                self.roll_back_events(journal)
+            else:
+                # data of the steps may be written partially, dividing rounds is repeatable
+                # events without a round were not loaded in tbd at start
+                self.graph.tbd.update(Prisma().common.hash_to_bin(h) for h in journal['events'])
+                self.graph._round.divide_rounds(journal['events'])
+                Prisma().db.set_transaction_hash(journal['transactions'])
+                if 'famous' in journal:
+                    new_c = self.redo_fame(journal)
+                else:
+                    new_c = self.graph._fame.decide_fame()
+                if 'order' in journal:
+                    self.redo_order(journal)
+                else:
+                    self.graph._order.find_order(new_c)
+        except Exception as e:
+            self.logger.error("Could not recover step %s. Reason: %s", journal['step'], str(e))
+            Prisma().db.discard_unit_of_work()
+            return False
+
+        if Prisma().db.commit_unit_of_work():
+            self.commit()
+        return self.journal is None
+
+    def roll_back_events(self, journal):
+        """
+        Deletes events added by the interrupted sync and restores the head
+
+        :param journal: journal of the events step
+        :type journal: dict
+        :return: None
+        """
+        events = journal['events']
+        Prisma().db.delete_events_many(events)
+        for h in events:
+            Prisma().db.delete_height(h)
+            self.graph.tbd.discard(Prisma().common.hash_to_bin(h))
+        self.graph._reachability.delete_events(events)
+        if journal['head']:
+            Prisma().db.insert_head(journal['head'])
+        self.logger.info("Rolled back %s events.", len(events))
+
+    def redo_fame(self, journal):
+        """
+        Writes fame and decided rounds of the interrupted sync
+
+        :param journal: journal of the fame step
+        :type journal: dict
+        :return: decided rounds
+        :rtype: list
+        """
+        for h, is_famous in journal['famous'].items():
+            self.graph._decided.set_famous(h, is_famous)
+        self.graph._fame.insert_fame(journal['famous'],
+                                     [r for r in journal['consensus'] if not Prisma().db.check_consensus(r)])
+        return journal['consensus']
+
+    def redo_order(self, journal):
+        """
+        Writes the order found by the interrupted sync again. Transactions written
+        before the crash are deleted first, so none of them is inserted twice.
+
+        :param journal: journal of the order step
+        :type journal: dict
+        :return: None
+        """
+        order = journal['order']
+        if not Prisma().db.delete_processed_transactions([r for r, _ in order]):
+            raise RuntimeError("Could not delete processed transactions.")
+        for _, final in order:
+            for h in final:
+                self.graph.tbd.discard(Prisma().common.hash_to_bin(h))
+        self.graph._order.insert_order(order)
@@ -11,6 +11,7 @@ import logging
 from functools import reduce
 
 from prisma.manager import Prisma
+from prisma.cryptograph.journal import STEP_ORDER
 from prisma.cryptograph.transaction import Transaction
 
 
@@ -33,57 +34,60 @@ class Order(object):
 
     def find_order(self, new_c):
         """
-        Assign earlier events a round received and consensus timestamp
+        Assign earlier events a round received and consensus timestamp.
+        Order of all rounds is found first and journaled before it is written.
 
         :param new_c: new consensus
         :type new_c: list
         :return: None
         """
+        # Hashes are binary digests like in tbd, hex is only passed to db and journal
         # @var to_int function to get int value from event signature by its hash
-        # @var f_w function to get int value from event signature by its hash
+        # @var f_w famous witnesses of the round
 
-        to_int = lambda x: int.from_bytes(Prisma().db.get_event(x).s.encode('utf-8'), byteorder='big')
+        to_hex = Prisma().common.bin_to_hash
+        to_bin = Prisma().common.hash_to_bin
+        tbd = Prisma().graph.tbd
+        to_int = lambda x: int.from_bytes(Prisma().db.get_event(to_hex(x), payload=False).s.encode('utf-8'),
+                                          byteorder='big')
+        parents = lambda u: (to_bin(p) for p in Prisma().db.get_event(to_hex(u), clear_parent=True, payload=False).p)
 
+        order = []
         for r in new_c:
-            f_w = {w for w in Prisma().db.get_witness(r).values() if
+            f_w = {to_bin(w) for w in Prisma().db.get_witness(r).values() if
                    Prisma().db.get_famous(w)}
+            can_see = {w: Prisma().db.get_can_see(to_hex(w)) for w in f_w}
 
             white = reduce(lambda a, b: a ^ to_int(b), f_w, 0)
             self.logger.debug("white %s", str(white))
 
             ts = {}  # timestamps dict
             seen = set()
-            for x in Prisma().graph._cgc.bfs(filter(Prisma().graph.tbd.__contains__, f_w),
-                                         lambda u: (p for p in
-                                                    Prisma().db.get_event(u, clear_parent=True).p
-                                                    if p in Prisma().graph.tbd)):
+            for x in Prisma().graph._cgc.bfs((w for w in f_w if w in tbd),
+                                             lambda u: (p for p in parents(u) if p in tbd)):
+                h = to_hex(x)
+                self.logger.debug("order_x: %s", h)
 
-                self.logger.debug("order_x: %s", str(x))
+                c = Prisma().db.get_event(h, payload=False).c  # key of first parent
 
-                c = Prisma().db.get_event(x).c  # key of first parent
+                s = {w for w in f_w if c in can_see[w] and Prisma().graph._cgc.higher(can_see[w][c], h)}
+                self.logger.debug("Order s count %s", str(len(s)))
 
-                s = set()
-                for w in f_w:
-                    can_see_w = Prisma().db.get_can_see(w)
-                    if c in can_see_w and Prisma().graph._cgc.higher(can_see_w[c], x):
-                       s.add(w)
-                self.logger.debug("Order s %s", str(s))
-
-                if sum(1 for w in s) > self.graph.tot_stake / 2:
-                    Prisma().graph.tbd.remove(x)
+                if len(s) > self.graph.tot_stake / 2:
+                    tbd.remove(x)
                     seen.add(x)
 
                     """ Calculate median of the timestamps of all the events in s"""
                     times = []
                     for w in s:
-                        a = w
+                        a = to_hex(w)
                         can_see_a = Prisma().db.get_can_see(a)
                         while (c in can_see_a
-                               and Prisma().graph._cgc.higher(can_see_a[c], x)
-                               and Prisma().db.get_event(a, clear_parent=True).p):
-                            a = Prisma().db.get_event(a, clear_parent=True).p[0]
+                               and Prisma().graph._cgc.higher(can_see_a[c], h)
+                               and Prisma().db.get_event(a, clear_parent=True, payload=False).p):
+                            a = Prisma().db.get_event(a, clear_parent=True, payload=False).p[0]
                             can_see_a = Prisma().db.get_can_see(a)
-                        times.append(Prisma().db.get_event(a).t)
+                        times.append(Prisma().db.get_event(a, payload=False).t)
                     times.sort()
 
                     times_len = len(times)
@@ -92,10 +96,23 @@ class Order(object):
                     else:
                         ts[x] = .5 * (times[times_len // 2])
 
-            final = sorted(seen, key=lambda x: (ts[x], white ^ to_int(x)))
-            self.logger.debug("Seen: %s", str(seen))
-            self.logger.debug("Transaction dictL %s", str(ts))
+            final = [to_hex(x) for x in sorted(seen, key=lambda x: (ts[x], white ^ to_int(x)))]
             self.logger.debug("Final: %s", str(final))
 
-            self.logger.debug("Before inserting new_c %s", str(new_c))
+            order.append([r, final])
+
+        if order:
+            self.graph._journal.step(STEP_ORDER, order=order)
+        self.logger.debug("Before inserting new_c %s", str(new_c))
+        self.insert_order(order)
+
+    def insert_order(self, order):
+        """
+        Writes round received of events and inserts their transactions
+
+        :param order: events of rounds in consensus order, in format [[round, [hash]]]
+        :type order: list
+        :return: None
+        """
+        for r, final in order:
             self.transaction.insert_processed_transaction(final, r, self.graph.keystore['publicKey'])
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 Prisma crypto currency and its Authors.
+This file is part of prisma crypto currency.
+Licensed under the GNU Lesser General Public License, version 3 or later. See LICENSING for details.
+"""
+
+import logging
+import sys
+from collections import OrderedDict
+
+from prisma.manager import Prisma
+
+
+class Reachability(object):
+    """
+    Reachability index over the cryptograph, based on vector clocks.
+
+    Height strictly grows along the self-parent chain of a creator, so the
+    events of creator c that are ancestors of y are exactly the ones with
+    height <= clock(y)[c], where clock(y)[c] is the highest of them.
+    With that, x is an ancestor of y if clock(y)[creator(x)] >= height(x).
+
+    Note: this assumes there are no forks (two events of one creator with the
+    same self-parent), fork detection is not implemented yet in Event.
+
+    Entries may be evicted to fit the memory budget, they are rebuilt from
+    db on the next access. The last event of every creator is never evicted.
+    Consensus does not query the index, so at start it is left empty and
+    built from db on its first use.
+    """
+    # tuple, chain slots, key and OrderedDict link of one entry (approximate)
+    ENTRY_OVERHEAD = 250
+
+    def __init__(self, graph):
+        """
+        Create class instance
+
+        :param graph: instance of cryptograph class
+        :type graph: object
+        :returns instance of Reachability class
+        :rtype: object
+        """
+        self.graph = graph
+        self.logger = logging.getLogger('Reachability')
+        # binary hash: (creator, height, clock), least recently used first
+        self.events = OrderedDict()
+        # creator: ([heights], [binary hashes]) ordered by height
+        self.chains = {}
+        # creators with evicted events in the middle of their chains
+        self.trimmed = set()
+        self.size = 0
+        # False while the index is not built from events stored in db
+        self.complete = True
+
+    def add_event(self, h, ev, height):
+        """
+        Indexes a new event. Parents must be indexed (or be in db) before their children.
+
+        :param h: event hash
+        :type h: str
+        :param ev: event
+        :type ev: named tuple
+        :param height: height of event
+        :type height: int
+        :return: None
+        """
+        bin_h = Prisma().common.hash_to_bin(h)
+        if not self.complete or bin_h in self.events:
+            return
+
+        clock = {}
+        for p in ev.p:
+            entry = self.get_entry(p)
+            if not entry:
+                # parent was pruned with a signed state
+                continue
+            for c, c_height in entry[2].items():
+                if clock.get(c, -1) < c_height:
+                    clock[c] = c_height
+        clock[ev.c] = height
+
+        self.events[bin_h] = (ev.c, height, clock)
+        self.size += self.entry_size(clock)
+        heights, hashes = self.chains.setdefault(ev.c, ([], []))
+        # events of one creator come in order of height, unless rebuilt from db lazily
+        i = len(heights)
+        while i > 0 and heights[i - 1] > height:
+            i -= 1
+        heights.insert(i, height)
+        hashes.insert(i, bin_h)
+
+    def get_entry(self, h):
+        """
+        Gets index entry of event, rebuilding it from db if it is not in memory
+
+        :param h: event hash
+        :type h: str
+        :return: (creator, height, clock) or None if event is unknown
+        :rtype: tuple or None
+        """
+        self.load()
+        bin_h = Prisma().common.hash_to_bin(h)
+        if bin_h in self.events:
+            self.events.move_to_end(bin_h)
+            return self.events[bin_h]
+
+        # Iterative rebuild, ancestors first
+        stack = [h]
+        unknown = set()
+        while stack:
+            u = stack[-1]
+            if Prisma().common.hash_to_bin(u) in self.events:
+                stack.pop()
+                continue
+            ev = Prisma().db.get_event(u, payload=False)
+            height = Prisma().db.get_height(u)
+            if not ev or height is False:
+                stack.pop()
+                unknown.add(u)
+                continue
+            missing = [p for p in ev.p if Prisma().common.hash_to_bin(p) not in self.events
+                       and p not in unknown and p not in stack]
+            if missing:
+                stack.extend(missing)
+            else:
+                stack.pop()
+                self.add_event(u, ev, height)
+        return self.events.get(bin_h)
+
+    def rebuild(self, cg, heights):
+        """
+        Builds the index from events stored in db
+
+        :param cg: events in format {hash: event}
+        :type cg: dict
+        :param heights: heights in format {hash: height}
+        :type heights: dict
+        :return: None
+        """
+        self.events = OrderedDict()
+        self.chains = {}
+        self.trimmed = set()
+        self.size = 0
+        self.complete = True
+        for h in self.graph._cgc.toposort(cg.keys(), lambda u: cg[u].p):
+            if h in heights:
+                self.add_event(h, cg[h], heights[h])
+        self.logger.debug("Reachability index rebuilt, events = %s", str(len(self.events)))
+
+    def drop(self):
+        """
+        Drops the index, it is built from db when it is used next time
+
+        :return: None
+        """
+        self.events = OrderedDict()
+        self.chains = {}
+        self.trimmed = set()
+        self.size = 0
+        self.complete = False
+
+    def load(self):
+        """
+        Builds the index from db if it was dropped
+
+        :return: None
+        """
+        if not self.complete:
+            self.rebuild(Prisma().db.get_events_many(), Prisma().db.get_heights_many() or {})
+
+    def delete_events(self, hash_list):
+        """
+        Removes pruned events from index
+
+        :param hash_list: hashes of deleted events
+        :type hash_list: list
+        :return: None
+        """
+        removed = set()
+        for h in hash_list:
+            bin_h = Prisma().common.hash_to_bin(h)
+            entry = self.events.pop(bin_h, None)
+            if entry:
+                self.size -= self.entry_size(entry[2])
+                removed.add(bin_h)
+        self.remove_from_chains(removed)
+
+    def evict_signed(self, hash_list):
+        """
+        Evicts entries of signed events, keeping the last event of every creator.
+        The events stay in db until the signed rounds are cleaned.
+
+        :param hash_list: hashes of signed events
+        :type hash_list: list
+        :return: freed bytes
+        :rtype: int
+        """
+        return self.evict((Prisma().common.hash_to_bin(h) for h in hash_list), None)
+
+    def evict_cold(self, nbytes):
+        """
+        Evicts least recently used entries, keeping the last event of every creator
+
+        :param nbytes: bytes to free
+        :type nbytes: int
+        :return: freed bytes
+        :rtype: int
+        """
+        return self.evict(list(self.events), nbytes)
+
+    def evict(self, candidates, nbytes):
+        """
+        Evicts entries from index
+
+        :param candidates: binary hashes to evict, in order
+        :type candidates: iterable
+        :param nbytes: bytes to free or None to evict all candidates
+        :type nbytes: int or None
+        :return: freed bytes
+        :rtype: int
+        """
+        freed = 0
+        removed = set()
+        for bin_h in candidates:
+            if nbytes is not None and freed >= nbytes:
+                break
+            if bin_h not in self.events:
+                continue
+            c = self.events[bin_h][0]
+            if self.chains[c][1][-1] == bin_h:
+                continue
+            freed += self.entry_size(self.events.pop(bin_h)[2])
+            removed.add(bin_h)
+            self.trimmed.add(c)
+        self.size -= freed
+        self.remove_from_chains(removed)
+        self.logger.debug("Evicted %s entries, freed %s bytes", str(len(removed)), str(freed))
+        return freed
+
+    def remove_from_chains(self, removed):
+        """
+        Removes hashes from the chains of creators
+
+        :param removed: binary hashes
+        :type removed: set
+        :return: None
+        """
+        if removed:
+            for c, (heights, hashes) in list(self.chains.items()):
+                keep = [i for i, bin_h in enumerate(hashes) if bin_h not in removed]
+                self.chains[c] = ([heights[i] for i in keep], [hashes[i] for i in keep])
+
+    def entry_size(self, clock):
+        """
+        Estimates memory taken by one entry
+
+        :param clock: clock of the entry
+        :type clock: dict
+        :return: size in bytes
+        :rtype: int
+        """
+        return self.ENTRY_OVERHEAD + sys.getsizeof(clock)
+
+    def usage(self):
+        """
+        Gets estimated memory taken by the index
+
+        :return: size in bytes
+        :rtype: int
+        """
+        return self.size
+
+    def is_ancestor(self, x, y):
+        """
+        Checks if x is an ancestor of y (an event is an ancestor of itself)
+
+        :param x: hash of possible ancestor
+        :type x: str
+        :param y: hash of possible descendant
+        :type y: str
+        :return: is x an ancestor of y
+        :rtype: bool
+        """
+        entry_x = self.get_entry(x)
+        entry_y = self.get_entry(y)
+        if not entry_x or not entry_y:
+            return False
+        return entry_y[2].get(entry_x[0], -1) >= entry_x[1]
+
+    def first_descendant(self, x, creator):
+        """
+        Finds the first event of creator that has x as an ancestor
+
+        :param x: event hash
+        :type x: str
+        :param creator: identifying key of creator
+        :type creator: str
+        :return: hash of the first descendant or None if there is no such event
+        :rtype: str or None
+        """
+        self.load()
+        entry_x = self.get_entry(x)
+        if not entry_x or creator not in self.chains:
+            return None
+
+        c, height, _ = entry_x
+        heights, hashes = self.chains[creator]
+        # clocks only grow along the chain, so binary search for the first one that sees x
+        lo, hi = 0, len(hashes)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.events[hashes[mid]][2].get(c, -1) >= height:
+                hi = mid
+            else:
+                lo = mid + 1
+
+        if lo == len(hashes):
+            return None
+
+        first = hashes[lo]
+        if creator in self.trimmed:
+            # evicted events could precede the one found, walk back the self-parents
+            while True:
+                ev = Prisma().db.get_event(Prisma().common.bin_to_hash(first), payload=False)
+                if not ev or not ev.p:
+                    break
+                parent = self.get_entry(ev.p[0])
+                if not parent or parent[0] != creator or parent[2].get(c, -1) < height:
+                    break
+                first = Prisma().common.hash_to_bin(ev.p[0])
+        return Prisma().common.bin_to_hash(first)
@@ -38,12 +38,12 @@ class Rounds(object):
         """
         self.logger.debug("DIVIDE ROUNDS: %s", str(events))
         for h in events:
-            ev = Prisma().db.get_event(h)
+            ev = Prisma().db.get_event(h, payload=False)
 
             if ev.p == ():  # this is a root event
-                Prisma().db.insert_round({h: 0})
+                x_round = 0
+                value = {ev.c: h}
                 Prisma().db.insert_witness({0: {ev.c: h}})
-                Prisma().db.insert_can_see({h: {ev.c: h}})
             else:
                 # r -- last round stored in db
                 r =  max(Prisma().db.get_round(p) for p in ev.p)
@@ -56,22 +56,24 @@ class Rounds(object):
                 self.logger.debug("p0 %s", str(p0))
                 self.logger.debug("p1 %s", str(p1))
                 self.logger.debug("vaule %s", str(value))
-                Prisma().db.insert_can_see({h: value})
 
                 self.logger.debug("self.graph.min_s %s", str(self.graph.min_s))
 
                 self.logger.debug("Round strongly see start")
-                if len(self.graph._cgc.strongly_see(h, r)) >= self.graph.min_s:
-                    Prisma().db.insert_round({h: r + 1})
+                if len(self.graph._cgc.strongly_see(h, r, value)) >= self.graph.min_s:
+                    x_round = r + 1
                     self.logger.debug("Hash %s has round + 1 ", h)
                     self.logger.debug("Decide round for event with hash = %s, round = %s", str(h), str(r+1))
                 else:
-                    Prisma().db.insert_round({h: r})
+                    x_round = r
                     self.logger.debug("Decide round for event with hash = %s, round = %s", str(h), str(r))
 
-                    Prisma().db.insert_can_see({h: {ev.c: h}})
+                    value[ev.c] = h
 
-                # Get round for x by hash and get round for x parent if first is bigger we can insert witness for x
-                x_round = Prisma().db.get_round(h)
+                # If round of x is bigger than round of x parent we can insert witness for x
                 if x_round > Prisma().db.get_round(ev.p[0]):
                     Prisma().db.insert_witness({x_round: {ev.c: h}})
+
+            # Next events read these, so they are written before moving on
+            Prisma().db.insert_round({h: x_round})
+            Prisma().db.insert_can_see({h: value})
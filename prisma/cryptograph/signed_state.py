@@ -8,6 +8,7 @@ Licensed under the GNU Lesser General Public License, version 3 or later. See LI
 import logging
 import collections
 from json import dumps, loads
+from twisted.internet import threads
 
 from prisma.manager import Prisma
 from prisma.crypto.crypto import Crypto
@@ -31,6 +32,14 @@ class SignedStateManager(object):
         self.crypto = Crypto()
         self.transaction = Transaction()
         self.logger = logging.getLogger('SignedStateManager')
+        self.precomputing = False
+        self.precompute_pending = False
+        self.cleaning = False
+        self.clean_pending = None
+        # last pruned round, rounds up to it are not read again after restart.
+        # None prunes every round up to the last signed one
+        last_pruned = Prisma().db.get_consensus_last_pruned()
+        self.pruned_round = last_pruned if last_pruned is not False and last_pruned >= 0 else None
 
     def get_ordered_state(self, last_round, prev_hash, balance):
         """ Gets ordered dict of state
@@ -61,7 +70,7 @@ class SignedStateManager(object):
         :rtype: str
         """
         # Gets Prev_hash
-        prev_hash = Prisma().db.get_last_state()['hash']
+        prev_hash = Prisma().db.get_last_state(balance=False)['hash']
 
         # Gets and sort Balance
         balance_dict = Prisma().db.get_account_balance_many(
@@ -76,14 +85,85 @@ class SignedStateManager(object):
         Prisma().db.insert_state(state, state_hash)
         return state_hash
 
+    def create_pending_states(self):
+        """
+        Creates states for every finished block of to_sign_count rounds
+        where famousness is fully decided and that has no state yet
+
+        :return: count of created states
+        :rtype: int
+        """
+        created = 0
+        while True:
+            consensus = Prisma().db.get_consensus_greater_than(
+                Prisma().db.get_last_state(balance=False)['_id'],
+                lim=self.graph.to_sign_count)
+
+            if len(consensus) != self.graph.to_sign_count:
+                return created
+
+            self.logger.debug("Precompute state for consensus %s", str(consensus))
+            self.create_state(consensus[0], consensus[-1])
+            created += 1
+
+    def precompute_states(self):
+        """
+        Builds and hashes the states of finished blocks off the event sync,
+        so the sync only has to sign hashes that are already computed.
+        The job runs in the cryptograph thread after the sync in progress, rounds are
+        decided before their transactions are ordered, so a block is only read once
+        the sync that decided it is committed. Only one job is queued at a time,
+        a request made while it runs starts another job when it is done.
+
+        :returns: None
+        """
+        if self.precomputing:
+            self.precompute_pending = True
+            return
+
+        self.precomputing = True
+        self.precompute_pending = False
+        d = Prisma().deferred_db.defer_serial(self.create_pending_states)
+        d.addCallbacks(self.precompute_states_done, self.precompute_states_error)
+
+    def precompute_states_done(self, created):
+        """
+        Called in the reactor thread when the precomputation job is done.
+        States are only signed here, the event sync does not wait for them.
+
+        :param created: count of created states
+        :type created: int
+        :returns: None
+        """
+        self.precomputing = False
+        self.logger.debug("Precomputed states count %s", str(created))
+        if created or self.graph.unsent_count >= self.graph.to_sign_count:
+            # signing works on the cryptograph, it runs after the sync in progress
+            d = Prisma().deferred_db.defer_serial(self.try_create_state_signatures)
+            d.addErrback(lambda failure: self.logger.error("Could not sign states. Reason: %s",
+                                                           failure.getErrorMessage()))
+        if self.precompute_pending:
+            self.precompute_states()
+
+    def precompute_states_error(self, failure):
+        """
+        Called in the reactor thread when the precomputation job failed.
+
+        :param failure: failure of the job
+        :type failure: twisted.python.failure.Failure
+        :returns: None
+        """
+        self.precomputing = False
+        self.logger.error("Could not precompute state. Reason: %s", failure.getErrorMessage())
+
     def create_state_sign(self):
         """
-        Gets unsent state from db or create if it is not exit, 
-        then gets its hash, and finally signs hash and 
+        Gets unsent state from db (it is created in advance by precompute_states),
+        then gets its hash, and finally signs hash and
         last round of this state by nodes secret key
 
-        :returns: transaction with state signature
-        :rtype: str
+        :returns: transaction with state signature or False if the state is not precomputed yet
+        :rtype: str or bool
         """
         # Get rounds where famousness is fully decided
         consensus = Prisma().db.get_consensus_greater_than(
@@ -94,12 +174,12 @@ class SignedStateManager(object):
         if len(consensus) != self.graph.to_sign_count:
             raise ValueError("Not enough rounds where famousness is fully decided!")
 
-        state_db = Prisma().db.get_state(consensus[-1])
+        state_db = Prisma().db.get_state(consensus[-1], balance=False)
         if not state_db:
-            state_hash = self.create_state(consensus[0], consensus[-1])
-        else:
-            # State was generated before
-            state_hash = state_db['hash']
+            # it is signed when precompute_states is done
+            self.logger.debug("State of round %s is not precomputed yet.", str(consensus[-1]))
+            return False
+        state_hash = state_db['hash']
 
         data = {'last_round': consensus[-1], 'hash': state_hash}
         self.logger.debug("State signature data %s", str(data))
@@ -134,11 +214,12 @@ class SignedStateManager(object):
             except ValueError as e:
                 self.logger.error("Error with get state signature %s", str(e))
                 break
+            if not new_signature:
+                break
 
-            if new_signature:
-                state_signatures.append(new_signature)
-                self.graph.unsent_count -= self.graph.to_sign_count
-                self.logger.debug("State signature was generated %s", str(new_signature))
+            state_signatures.append(new_signature)
+            self.graph.unsent_count -= self.graph.to_sign_count
+            self.logger.debug("State signature was generated %s", str(new_signature))
 
         self.logger.debug("Consensus sign response = %s", str(state_signatures))
         self.transaction.insert_transactions_into_pool(state_signatures)
@@ -199,7 +280,7 @@ class SignedStateManager(object):
             return False
 
         # Hash of local state
-        local_hash = Prisma().db.get_state(local_signatures['_id'])['hash']
+        local_hash = Prisma().db.get_state(local_signatures['_id'], balance=False)['hash']
 
         # Count of successfully checked signatures
         unchecked_len = 0
@@ -242,8 +323,8 @@ class SignedStateManager(object):
             self.graph.last_signed_state = local_consensus[-1]
             self.logger.debug("self.graph.last_signed_state %s", str(self.graph.last_signed_state))
 
-            # Start cleaning database
-            self.clean_database(self.graph.last_signed_state)
+            # Start cleaning database, the job is started from the reactor thread
+            Prisma().deferred_db.call_in_reactor(self.clean_database, self.graph.last_signed_state)
             Prisma().db.set_state_signed(local_signatures['_id'])
             return True
         else:
@@ -251,27 +332,117 @@ class SignedStateManager(object):
 
     def clean_database(self, last_signed):
         """
-        Deletes signed data from db, so there will never be a huge number of data stored
+        Deletes signed data from db, so there will never be a huge number of data stored.
+        Pruning runs in a worker thread, only one job runs at a time.
 
         :param last_signed: last round for which signed state was reached
         :type last_signed: int
         :return: None
         """
+        if self.cleaning:
+            self.clean_pending = last_signed
+            return
+
+        self.cleaning = True
+        self.clean_pending = None
+        d = threads.deferToThread(self.prune_signed_rounds, self.pruned_round, last_signed)
+        d.addCallbacks(self.clean_database_done, self.clean_database_error,
+                       callbackArgs=(last_signed,))
+
+    @staticmethod
+    def prune_signed_rounds(start, last_signed):
+        """
+        Deletes events handled in rounds (start; last_signed] with batched queries
+
+        :param start: last pruned round or None to prune all rounds up to last_signed
+        :type start: int or None
+        :param last_signed: last round for which signed state was reached
+        :type last_signed: int
+        :return: hashes of deleted events
+        :rtype: list
+        """
         Prisma().db.delete_transaction_less_than(last_signed)
         Prisma().db.delete_witnesses_less_than(last_signed)
 
         # Gets list of signed events
-        hash_list = Prisma().db.get_rounds_hash_list(last_signed)
-        for _hash in hash_list:
-            Prisma().db.delete_event(_hash)
-            Prisma().db.delete_can_see(_hash)
-            Prisma().db.delete_votes(_hash)
-            Prisma().db.delete_famous(_hash)
-
-        ''' We should clear references after removing documents by hash.
-            In this case we will get much better performance '''
-        # Delete each link to signed events
-        Prisma().db.delete_references_can_see(hash_list)
+        hash_list = Prisma().db.get_rounds_hash_list(last_signed, start) or []
+        if Prisma().archive is not None:
+            SignedStateManager.archive_events(hash_list, last_signed)
+        # can_see of remaining events may still name deleted events, their heights and rounds are kept
+        if Prisma().db.delete_events_many(hash_list):
+            Prisma().db.set_consensus_last_pruned(last_signed)
+        return hash_list
+
+    @staticmethod
+    def archive_events(hash_list, last_signed):
+        """
+        Appends events handled up to last_signed to the archive before they are deleted,
+        one record per round in which the order of events was found.
+        Events that are not in db anymore were archived before.
+
+        :param hash_list: hashes of events to delete
+        :type hash_list: list
+        :param last_signed: last round for which signed state was reached
+        :type last_signed: int
+        :return: None
+        """
+        events = Prisma().db.get_events_by_hash(hash_list) or {}
+        rounds = Prisma().db.get_rounds_by_hash(list(events)) or {}
+        records = {}
+        for h, event in events.items():
+            r = rounds.get(h, {})
+            if r.get('round_handled', last_signed + 1) <= last_signed:
+                record = records.setdefault(r['round_handled'], {'events': {}, 'rounds': {}})
+                record['events'][h] = event
+                record['rounds'][h] = r['round']
+        for r in sorted(records):
+            Prisma().archive.append(r - 1, r, records[r])
+
+    def clean_database_done(self, hash_list, last_signed):
+        """
+        Called in the reactor thread when pruning is done. Deleted events are forgotten
+        in memory in the cryptograph thread, which uses the same structures.
+
+        :param hash_list: hashes of deleted events
+        :type hash_list: list
+        :param last_signed: last pruned round
+        :type last_signed: int
+        :return: None
+        """
+        self.cleaning = False
+        self.pruned_round = last_signed
+        d = Prisma().deferred_db.defer_serial(self.forget_events, hash_list, last_signed)
+        d.addErrback(lambda failure: self.logger.error("Could not forget pruned events. Reason: %s",
+                                                       failure.getErrorMessage()))
+        self.logger.debug("Pruned %s events up to round %s", str(len(hash_list)), str(last_signed))
+        if self.clean_pending is not None:
+            self.clean_database(self.clean_pending)
+
+    def forget_events(self, hash_list, last_signed):
+        """
+        Removes pruned events and rounds from in-memory structures. Runs in the cryptograph thread.
+
+        :param hash_list: hashes of deleted events
+        :type hash_list: list
+        :param last_signed: last pruned round
+        :type last_signed: int
+        :return: None
+        """
+        self.graph._decided.delete_rounds(last_signed)
+        self.graph._decided.delete_famous(hash_list)
+        self.graph._reachability.delete_events(hash_list)
+
+    def clean_database_error(self, failure):
+        """
+        Called in the reactor thread when pruning failed.
+        Rounds are pruned again with the next signed state.
+
+        :param failure: failure of the job
+        :type failure: twisted.python.failure.Failure
+        :return: None
+        """
+        self.cleaning = False
+        self.logger.error("Could not clean database. Reason: %s", failure.getErrorMessage())
 
     def handle_received_state(self, state, signatures):
         """ Validates state received via connection
@@ -282,7 +453,7 @@ class SignedStateManager(object):
         :type signatures: list
         :return: is handling operation successful 
         """
-        last_state_hash = Prisma().db.get_last_state()['hash']
+        last_state_hash = Prisma().db.get_last_state(balance=False)['hash']
 
         if last_state_hash != state['prev_hash']:
             self.logger.error("Recived state have bad hash of prev state")
@@ -175,10 +175,10 @@ class Transaction(object):
                           str(ev_hash_list), str(round), str(self_pub_key))
 
         tx_list = []
+        Prisma().db.set_round_handled({event_hash: round for event_hash in ev_hash_list})
         for event_hash in ev_hash_list:
             self.logger.debug("insert_processed_transaction for ev with hash %s", str(event_hash))
             event = Prisma().db.get_event(event_hash)
-            Prisma().db.set_round_handled({event_hash: round})
             self.logger.debug("insert_transaction_by_ev_hash event %s", str(event))
             if not event:
                 self.logger.error("Could not insert tx, event there is no event !")
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 Prisma crypto currency and its Authors.
+This file is part of prisma crypto currency.
+Licensed under the GNU Lesser General Public License, version 3 or later. See LICENSING for details.
+"""
+
+import bisect
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+# index entry: first round (exclusive), last round, offset and length of the record in the segment
+INDEX_ENTRY = struct.Struct('<qqQI')
+
+
+class SegmentArchive(object):
+    """
+    Archive of pruned history, for explorer and audit nodes.
+
+    Events pruned with a signed state are appended as one zlib compressed json record
+    to a segment file, segments are append-only and a new one is started when the
+    current one reaches segment_size. Every segment has an index of fixed size entries
+    mapping the round range of a record to its position, the index of all segments is
+    kept in memory and records are read through memory maps of the segments.
+    """
+    def __init__(self, path, segment_size=64 * 1024 * 1024):
+        """
+        :param path: directory of the segments
+        :type path: str
+        :param segment_size: segment size in bytes that starts a new segment
+        :type segment_size: int
+        """
+        self.logger = logging.getLogger('Archive')
+        self.path = path
+        self.segment_size = segment_size
+        self.lock = threading.Lock()
+        # sorted last rounds of records and (first round, segment, offset, length) of each
+        self.last_rounds = []
+        self.records = []
+        self.maps = {}
+        self.last_round = -1
+
+        os.makedirs(self.path, exist_ok=True)
+        for name in sorted(os.listdir(self.path)):
+            if name.endswith('.seg'):
+                self.load_segment(int(name[:-4]))
+        self.logger.info("Archive %s, %s records up to round %s.", self.path, len(self.records), self.last_round)
+
+    def segment_path(self, segment, ext='.seg'):
+        """
+        :param segment: first round of the segment
+        :type segment: int
+        :param ext: .seg for records, .idx for the index
+        :type ext: str
+        :return: path of the segment file
+        :rtype: str
+        """
+        return os.path.join(self.path, '%012d%s' % (segment, ext))
+
+    def load_segment(self, segment):
+        """
+        Loads the index of a segment. Records and index entries written partly
+        before a crash are cut off, so both files end with the last complete record.
+
+        :param segment: first round of the segment
+        :type segment: int
+        :return: None
+        """
+        end = 0
+        with open(self.segment_path(segment, '.idx'), 'a+b') as index:
+            index.seek(0)
+            data = index.read()
+            entries = len(data) // INDEX_ENTRY.size
+            segment_length = os.path.getsize(self.segment_path(segment))
+            for i in range(entries):
+                first, last, offset, length = INDEX_ENTRY.unpack_from(data, i * INDEX_ENTRY.size)
+                if offset + length > segment_length:
+                    entries = i
+                    break
+                self.last_rounds.append(last)
+                self.records.append((first, segment, offset, length))
+                self.last_round = last
+                end = offset + length
+            index.truncate(entries * INDEX_ENTRY.size)
+        with open(self.segment_path(segment), 'r+b') as records:
+            records.truncate(end)
+
+    def append(self, first, last, data):
+        """
+        Appends a record of pruned rounds (first; last].
+
+        :param first: last round of the previous record
+        :type first: int
+        :param last: last round of the record
+        :type last: int
+        :param data: json serializable data of the rounds
+        :type data: dict
+        :return: None
+        """
+        record = zlib.compress(json.dumps(data).encode(), 9)
+        with self.lock:
+            if last <= self.last_round:
+                return
+            segment = self.records[-1][1] if self.records else None
+            if segment is None or os.path.getsize(self.segment_path(segment)) >= self.segment_size:
+                segment = first + 1
+            with open(self.segment_path(segment), 'ab') as records:
+                offset = records.tell()
+                records.write(record)
+                records.flush()
+                os.fsync(records.fileno())
+            with open(self.segment_path(segment, '.idx'), 'ab') as index:
+                index.write(INDEX_ENTRY.pack(first, last, offset, len(record)))
+                index.flush()
+                os.fsync(index.fileno())
+            self.last_rounds.append(last)
+            self.records.append((first, segment, offset, len(record)))
+            self.last_round = last
+
+    def get(self, r):
+        """
+        Reads the record holding a round.
+
+        :param r: round
+        :type r: int
+        :return: record data or None if the round is not archived
+        :rtype: dict or None
+        """
+        with self.lock:
+            i = bisect.bisect_left(self.last_rounds, r)
+            if i == len(self.records) or self.records[i][0] >= r:
+                return None
+            first, segment, offset, length = self.records[i]
+            view = self.maps.get(segment)
+            if view is None or len(view) < offset + length:
+                if view is not None:
+                    view.close()
+                with open(self.segment_path(segment), 'rb') as records:
+                    view = mmap.mmap(records.fileno(), 0, access=mmap.ACCESS_READ)
+                self.maps[segment] = view
+            record = view[offset:offset + length]
+        return json.loads(zlib.decompress(record).decode())
+
+    def stats(self):
+        """
+        :return: count of records, last archived round and size of segments in bytes
+        :rtype: dict
+        """
+        with self.lock:
+            segments = set(segment for _, segment, _, _ in self.records)
+            return {'records': len(self.records), 'last_round': self.last_round,
+                    'bytes': sum(os.path.getsize(self.segment_path(segment)) for segment in segments)}
+
+    def close(self):
+        """
+        Closes memory maps of segments.
+
+        :return: None
+        """
+        with self.lock:
+            for view in self.maps.values():
+                view.close()
+            self.maps.clear()
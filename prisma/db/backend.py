@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 Prisma crypto currency and its Authors.
+This file is part of prisma crypto currency.
+Licensed under the GNU Lesser General Public License, version 3 or later. See LICENSING for details.
+"""
+
+import logging
+import sys
+
+from prisma.config import CONFIG
+
+
+def create_db(db_name):
+    """
+    Creates the storage engine selected with [database] backend:
+
+    * mongodb - MongoDB server on localhost (default), with [database] schema
+      collections (a collection per kind of data) or consolidated (a document per event)
+    * lmdb - embedded LMDB environment, see [database] path
+    * memory - kept in memory only, for tests and simulations
+
+    :param db_name: database name
+    :type db_name: str
+    :return: database instance
+    :rtype: BaseDB
+    """
+    backend = CONFIG.get('database', 'backend', fallback='mongodb')
+    if backend == 'mongodb':
+        if CONFIG.get('database', 'schema', fallback='collections') == 'consolidated':
+            from prisma.db.consolidated import ConsolidatedDB
+            return ConsolidatedDB(db_name)
+        from prisma.db.database import PrismaDB
+        return PrismaDB(db_name)
+    if backend == 'lmdb':
+        from prisma.db.lmdb_database import LmdbDB
+        return LmdbDB(db_name)
+    if backend == 'memory':
+        from prisma.db.memory_database import MemoryDB
+        return MemoryDB(db_name)
+
+    logging.getLogger('PrismaDB').error("Unknown database backend %s, exiting.", backend)
+    sys.exit(1)
@@ -0,0 +1,1310 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 Prisma crypto currency and its Authors.
+This file is part of prisma crypto currency.
+Licensed under the GNU Lesser General Public License, version 3 or later. See LICENSING for details.
+"""
+
+import logging
+import threading
+from collections import defaultdict
+from functools import partial
+
+from prisma.db.cache import ReadCache, CACHED_COLLECTIONS
+from prisma.utils.common import Common
+
+
+class BaseDB(object):
+    """
+    Storage interface of Prisma.
+
+    Every storage engine implements these methods with the semantics of the
+    MongoDB backend (PrismaDB): hashes are passed and returned as hex strings,
+    getters return False on error and setters return whether they succeeded.
+    Methods that only combine other methods are implemented here.
+    """
+    def __init__(self, db_name):
+        """
+        Creates class instance
+
+        :param db_name: database name
+        :type db_name: str
+        :returns instance of BaseDB class
+        :rtype: object
+        """
+        self.logger = logging.getLogger('PrismaDB')
+        self.common = Common()
+        self.db_name = db_name
+        # state kept per thread (unit of work, transactions)
+        self.local = threading.local()
+        # read cache of point lookups, engines reading from local storage do not need one
+        self.cache = ReadCache(0)
+
+    # Memory
+
+    def register_memory(self, memory):
+        """
+        Registers in-memory structures of the engine in the memory manager,
+        values of every kind of the read cache under the name of their collection.
+        Evicted values of the read cache are loaded from the database again.
+
+        :param memory: memory manager
+        :type memory: MemoryManager
+        :return: None
+        """
+        for kind, collection in CACHED_COLLECTIONS.items():
+            memory.register(collection, partial(self.cache.usage, kind),
+                            evict_cold=partial(self.cache.evict_cold, kind=kind))
+
+    # Unit of work
+
+    def get_unit_of_work(self):
+        """
+        Gets unit of work opened in the current thread
+
+        :return: unit of work or None if writes are not buffered
+        :rtype: object or None
+        """
+        return None
+
+    def begin_unit_of_work(self):
+        """
+        Starts a unit of work, writes of the current thread may be buffered until it is committed.
+        Backends that have nothing to buffer keep this default.
+
+        :return: None
+        """
+        pass
+
+    def flush_unit_of_work(self):
+        """
+        Writes buffered data and keeps the unit of work open
+
+        :return: was the write successful
+        :rtype: bool
+        """
+        return True
+
+    def commit_unit_of_work(self):
+        """
+        Writes buffered data and closes the unit of work
+
+        :return: was the write successful
+        :rtype: bool
+        """
+        return True
+
+    def discard_unit_of_work(self):
+        """
+        Drops data of the unit of work that was not written yet and closes it.
+        Invoked when the work failed.
+
+        :return: None
+        """
+        pass
+
+    # Database
+
+    def create_indexes(self):
+        """
+        Creates indexes used by queries
+
+        :return: None
+        """
+        raise NotImplementedError()
+
+    def destroy_db(self, name=None):
+        """
+        Destroys database
+
+        :param name: database name
+        :type name: str or None
+        :return: was the destruction successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def create_collections(self):
+        """
+        Creates all collections
+
+        :return: was the creation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def drop_collections_many(self, exceptions=[]):
+        """
+        Drop all collections exept given ones
+
+        :param exceptions: collections that should not be deleted
+        :type exceptions: list
+        :return: was the drop operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def drop_collection(self, collection_name):
+        """
+        Drop one collection from db
+
+        :param collection_name: name of collection to drop
+        :type collection_name: str
+        :return: was the drop operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def get_db_name(self):
+        """
+        :return: database name
+        :rtype: str
+        """
+        return self.db_name
+
+    def get_version(self):
+        """
+        :return: version of the storage engine
+        :rtype: str
+        """
+        raise NotImplementedError()
+
+    def get_query_stats(self):
+        """
+        :return: latency of queries, empty for engines that do not send queries to a server
+        :rtype: dict
+        """
+        return {}
+
+    def is_running(self):
+        """
+        :return: is the storage engine available
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def disconnect(self):
+        """
+        Closes the storage engine
+
+        :return: None
+        """
+        raise NotImplementedError()
+
+    # Events
+
+    def get_event(self, event_id, as_tuple=True, clear_parent=False, payload=True):
+        """
+        Gets one event
+
+        :param event_id: event id (hash)
+        :type event_id: str
+        :param as_tuple: returns result as named tuple or as dict
+        :type as_tuple: bool
+        :param clear_parent: removes parents if they were signed or doesn't remove them
+        :type clear_parent: bool
+        :param payload: load the transaction list (d) or return d as None
+        :type payload: bool
+        :return: Event or False if error
+        :rtype: named tuple, dict or bool
+        """
+        raise NotImplementedError()
+
+    def get_events_many(self, as_tuple=True):
+        """
+        Gets all events ordered by time
+
+        :param as_tuple: returns result as named tuple or as dict
+        :type as_tuple: bool
+        :return: events in format {hash: event}
+        :rtype: dict
+        """
+        raise NotImplementedError()
+
+    def iter_events(self, batch_size=1000):
+        """
+        Streams events ordered by time.
+        Engines that read from local storage return everything in one batch.
+
+        :param batch_size: count of events in one batch
+        :type batch_size: int
+        :return: batches in format {hash: event}
+        :rtype: generator
+        """
+        events = self.get_events_many(as_tuple=False)
+        if events:
+            yield events
+
+    def get_events_by_hash(self, hash_list, batch_size=1000):
+        """
+        Gets events by their hashes, events that are not found are left out
+
+        :param hash_list: event hashes
+        :type hash_list: list
+        :param batch_size: count of events read with one query
+        :type batch_size: int
+        :return: events in format {hash: event} or False if error
+        :rtype: dict or bool
+        """
+        raise NotImplementedError()
+
+    def get_events_by_time(self, time):
+        """
+        Gets events created after given time
+
+        :param time: timestamp
+        :type time: float
+        :return: documents in format {'_id': hash, 'event': event dict} or False if error
+        :rtype: list or bool
+        """
+        raise NotImplementedError()
+
+    def get_latest_event_time(self):
+        """
+        :return: latest event time, 0.0 if there are no events or False if error
+        :rtype: float or bool
+        """
+        raise NotImplementedError()
+
+    def insert_event(self, event):
+        """
+        :param event: events in format {hash: event named tuple}
+        :type event: dict
+        :return: was the insertion successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def delete_event(self, h):
+        """
+        :param h: event hash
+        :type h: str
+        :return: was the delete operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def delete_events_many(self, hash_list, batch_size=1000):
+        """
+        Deletes events and everything stored per event (can_see, votes, famous)
+
+        :param hash_list: event hashes
+        :type hash_list: list
+        :param batch_size: count of hashes deleted at once
+        :type batch_size: int
+        :return: was the delete operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    # Rounds
+
+    def get_round(self, h):
+        """
+        :param h: event hash
+        :type h: str
+        :return: round or False if it was not found
+        :rtype: int or bool
+        """
+        raise NotImplementedError()
+
+    def get_rounds_many(self, less_than=False):
+        """
+        :param less_than: only rounds <= less_than are returned if given
+        :type less_than: int or bool
+        :return: rounds in format {hash: round} or False if error
+        :rtype: dict or bool
+        """
+        raise NotImplementedError()
+
+    def iter_rounds(self, less_than=False, start=None, batch_size=1000):
+        """
+        Streams rounds.
+        Engines that read from local storage return everything in one batch.
+
+        :param less_than: only rounds <= less_than are returned if given
+        :type less_than: int or bool
+        :param start: if given, only rounds greater than it are returned
+        :type start: int or None
+        :param batch_size: count of rounds in one batch
+        :type batch_size: int
+        :return: batches in format {hash: round}
+        :rtype: generator
+        """
+        rounds = self.get_rounds_many(less_than)
+        if rounds and start is not None:
+            rounds = {h: r for h, r in rounds.items() if r > start}
+        if rounds:
+            yield rounds
+
+    def get_rounds_by_hash(self, hash_list, batch_size=1000):
+        """
+        Gets rounds of events by their hashes, events without round are left out
+
+        :param hash_list: event hashes
+        :type hash_list: list
+        :param batch_size: count of rounds read with one query
+        :type batch_size: int
+        :return: rounds in format {hash: {'round': round, 'round_handled': round}} or False if error,
+                 round_handled is only present if the order of the event was found
+        :rtype: dict or bool
+        """
+        raise NotImplementedError()
+
+    def get_rounds_max(self):
+        """
+        :return: max round, 0 if there are no rounds or False if error
+        :rtype: int or bool
+        """
+        raise NotImplementedError()
+
+    def get_rounds_hash_list(self, value, start=None):
+        """
+        Gets hashes of events handled in rounds (start; value]
+
+        :param value: last round
+        :type value: int
+        :param start: if given, only events with round greater than it are returned
+        :type start: int or None
+        :return: event hashes or False if error
+        :rtype: list or bool
+        """
+        raise NotImplementedError()
+
+    def get_rounds_unhandled(self):
+        """
+        Gets hashes of events whose order is not found yet
+
+        :return: event hashes or False if error
+        :rtype: list or bool
+        """
+        raise NotImplementedError()
+
+    def get_rounds_less_than(self, r):
+        """
+        :param r: round num
+        :type r: int
+        :return: rounds less than r in format {hash: round} or False if error
+        :rtype: dict or bool
+        """
+        raise NotImplementedError()
+
+    def insert_round(self, round_info):
+        """
+        :param round_info: dict in format {hash: round}
+        :type round_info: dict
+        :return: was the insertion successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def set_round_handled(self, round_info):
+        """
+        Sets round when event was handled, events without round are skipped
+
+        :param round_info: dict in format {hash: round}
+        :type round_info: dict
+        :return: was the setting operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def delete_round_less_than(self, value):
+        """
+        :param value: round num
+        :type value: int
+        :return: was the delete operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def delete_round_greater_than(self, value):
+        """
+        :param value: round num
+        :type value: int
+        :return: was the delete operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    # Can see
+
+    def get_can_see(self, event_id):
+        """
+        :param event_id: event hash
+        :type event_id: str
+        :return: events that event can see in format {creator: hash} or False if error
+        :rtype: dict or bool
+        """
+        raise NotImplementedError()
+
+    def insert_can_see(self, can_see):
+        """
+        :param can_see: data in format {hash: {creator: hash}}
+        :type can_see: dict
+        :return: was the insertion successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def delete_can_see(self, h):
+        """
+        :param h: event hash
+        :type h: str
+        :return: was the delete operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    # Head
+
+    def get_head(self):
+        """
+        :return: hash of head event, empty list if there is no head or False if error
+        :rtype: str, list or bool
+        """
+        raise NotImplementedError()
+
+    def insert_head(self, head):
+        """
+        :param head: hash of head event
+        :type head: str
+        :return: was the insertion successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    # Height
+
+    def get_height(self, event_id):
+        """
+        :param event_id: event hash
+        :type event_id: str
+        :return: height or False if it was not found
+        :rtype: int or bool
+        """
+        raise NotImplementedError()
+
+    def get_heights_many(self):
+        """
+        :return: heights in format {hash: height} or False if error
+        :rtype: dict or bool
+        """
+        raise NotImplementedError()
+
+    def iter_heights(self, batch_size=1000):
+        """
+        Streams heights.
+        Engines that read from local storage return everything in one batch.
+
+        :param batch_size: count of heights in one batch
+        :type batch_size: int
+        :return: batches in format {hash: height}
+        :rtype: generator
+        """
+        heights = self.get_heights_many()
+        if heights:
+            yield heights
+
+    def insert_height(self, height_info):
+        """
+        :param height_info: data in format {hash: height}
+        :type height_info: dict
+        :return: was the insertion successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def delete_height(self, h):
+        """
+        :param h: event hash
+        :type h: str
+        :return: was the delete operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    # Witness
+
+    def get_witness(self, r):
+        """
+        :param r: round num
+        :type r: int
+        :return: witnesses of round in format {creator: hash} or False if error
+        :rtype: dict or bool
+        """
+        raise NotImplementedError()
+
+    def get_witness_max_round(self):
+        """
+        :return: max round with witnesses, 0 if there are none or False if error
+        :rtype: int or bool
+        """
+        raise NotImplementedError()
+
+    def insert_witness(self, witness_info):
+        """
+        :param witness_info: data in format {round: {creator: hash}}
+        :type witness_info: dict
+        :return: was the insertion successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def delete_witnesses_less_than(self, r):
+        """
+        :param r: round num
+        :type r: int
+        :return: was the delete operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    # Transactions
+
+    def get_transactions_many(self):
+        """
+        :return: ids of all transactions
+        :rtype: list
+        """
+        raise NotImplementedError()
+
+    def get_unsent_transactions_many(self, account_id):
+        """
+        Gets transactions for which event was not created yet
+
+        :param account_id: our local account id
+        :type account_id: str
+        :return: list of ids and list of transactions
+        :rtype: tuple
+        """
+        raise NotImplementedError()
+
+    def get_account_balance(self, account_id, r=False):
+        """
+        Gets account balance from transactions and last state
+
+        :param account_id: wallet id
+        :type account_id: str
+        :param r: range of rounds [first, last] or False
+        :type r: list or bool
+        :return: account balance or False if error
+        :rtype: int or bool
+        """
+        if not r:
+            return self.get_ledger_balance(account_id)
+        balances = self.compute_balances(r)
+        if balances is False:
+            return False
+        return balances.get(account_id, 0)
+
+    def get_account_balance_many(self, range=False):
+        """
+        Gets balance for all known wallets
+
+        :param range: range of rounds
+        :type range: list
+        :return: balance for all known wallets in format {address: amount}
+        :rtype: dict
+        """
+        balances = self.get_balances(range)
+        if not balances:
+            return {}
+        return {w_id: bal for w_id, bal in balances.items() if bal}
+
+    def insert_transactions(self, tx_list):
+        """
+        :param tx_list: transactions to be inserted
+        :type tx_list: list
+        :return: was the insertion successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def set_transaction_hash(self, tx_list):
+        """
+        Marks transactions as sent with hash of head event
+
+        :param tx_list: transaction ids
+        :type tx_list: list
+        :return: was the setting operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def set_transaction_round(self, ev_hash, r):
+        """
+        :param ev_hash: event hash of transactions
+        :type ev_hash: str
+        :param r: round of event
+        :type r: int
+        :return: was the setting operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def delete_transaction_less_than(self, r):
+        """
+        :param r: round num, transactions with round <= r are deleted
+        :type r: int
+        :return: was the delete operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def delete_money_transfer_transaction_less_than(self, r):
+        """
+        :param r: round num, money transfers with round <= r are deleted
+        :type r: int
+        :return: was the delete operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def delete_processed_transactions(self, rounds):
+        """
+        :param rounds: rounds whose order was found, transactions inserted from their events are deleted
+        :type rounds: list
+        :return: was the delete operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    # Balance ledger
+
+    @staticmethod
+    def get_transfer_changes(tx_list, sign=1):
+        """
+        Sums balance changes made by money transfers
+
+        :param tx_list: transactions
+        :type tx_list: iterable
+        :param sign: 1 for inserted transactions, -1 for deleted ones
+        :type sign: int
+        :return: changes in format {address: amount}
+        :rtype: dict
+        """
+        changes = defaultdict(int)
+        for tx in tx_list:
+            amount = tx.get('amount')
+            if isinstance(amount, (int, float)):
+                if 'senderId' in tx:
+                    changes[tx['senderId']] -= sign * amount
+                if 'recipientId' in tx:
+                    changes[tx['recipientId']] += sign * amount
+        return changes
+
+    @staticmethod
+    def get_rebase_changes(last_state, state):
+        """
+        Gets balance changes made by a new last state, balance of transactions stays the same
+
+        :param last_state: previous last state or False if there was none
+        :type last_state: dict or bool
+        :param state: new last state
+        :type state: dict
+        :return: changes in format {address: amount}
+        :rtype: dict
+        """
+        last_balance = last_state['balance'] if last_state else {}
+        return {address: state['balance'].get(address, 0) - last_balance.get(address, 0)
+                for address in set(last_balance) | set(state['balance'])}
+
+    def compute_balances(self, r=False):
+        """
+        Computes balance of wallets from the last state and transactions
+
+        :param r: range of rounds [first, last] of transactions or False for all
+        :type r: list or bool
+        :return: balance in format {address: amount} or False if error
+        :rtype: dict or bool
+        """
+        changes = self.get_transfers_balance(r)
+        if changes is False:
+            return False
+        last_state = self.get_last_state()
+        balances = dict(last_state['balance']) if last_state else {}
+        for address, amount in changes.items():
+            balances[address] = balances.get(address, 0) + amount
+        return balances
+
+    def get_balances(self, r=False):
+        """
+        Gets balance of wallets known from transactions and last state.
+        Without a range it is read from the balance ledger, which is updated
+        when transactions are inserted or deleted and rebased on a new last state.
+
+        :param r: range of rounds [first, last] of transactions or False for all
+        :type r: list or bool
+        :return: balance in format {address: amount} or False if error
+        :rtype: dict or bool
+        """
+        if r:
+            return self.compute_balances(r)
+        return self.get_balance_ledger()
+
+    def get_transfers_balance(self, r=False):
+        """
+        Sums balance changes made by stored money transfers
+
+        :param r: range of rounds [first, last] or False for all transactions
+        :type r: list or bool
+        :return: changes in format {address: amount} or False if error
+        :rtype: dict or bool
+        """
+        raise NotImplementedError()
+
+    def get_balance_ledger(self):
+        """
+        Gets balance of all known wallets from the balance ledger, it is built on first use
+
+        :return: balance in format {address: amount} or False if error
+        :rtype: dict or bool
+        """
+        raise NotImplementedError()
+
+    def get_ledger_balance(self, address):
+        """
+        Gets balance of one wallet from the balance ledger
+
+        :param address: wallet id
+        :type address: str
+        :return: balance or False if error
+        :rtype: int or bool
+        """
+        raise NotImplementedError()
+
+    # Votes
+
+    def get_vote(self, vote_id):
+        """
+        :param vote_id: hash of voter
+        :type vote_id: str
+        :return: votes in format {hash: vote(T/F)} or False if there are none
+        :rtype: dict or bool
+        """
+        raise NotImplementedError()
+
+    def insert_vote(self, vote):
+        """
+        :param vote: votes in format {voter hash: {hash: vote(T/F)}}
+        :type vote: dict
+        :return: was the insertion successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def delete_votes(self, h):
+        """
+        :param h: hash of voter
+        :type h: str
+        :return: was the delete operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    # Famous
+
+    def get_famous(self, witness):
+        """
+        :param witness: witness hash
+        :type witness: str
+        :return: [is famous] or None if fame is not decided
+        :rtype: list or None
+        """
+        raise NotImplementedError()
+
+    def get_famous_many(self):
+        """
+        :return: fame in format {hash: is famous(T/F)} or False if error
+        :rtype: dict or bool
+        """
+        raise NotImplementedError()
+
+    def insert_famous(self, famous_info):
+        """
+        :param famous_info: data in format {hash: is famous(T/F)}
+        :type famous_info: dict
+        :return: was the insertion successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def check_famous(self, h):
+        """
+        :param h: witness hash
+        :type h: str
+        :return: 1 if fame is decided, 0 otherwise
+        :rtype: int
+        """
+        raise NotImplementedError()
+
+    def delete_famous(self, h):
+        """
+        :param h: witness hash
+        :type h: str
+        :return: was the delete operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    # Consensus
+
+    def get_consensus_many(self, lim=0, sign=False, sort=False):
+        """
+        :param lim: limit of rounds, 0 means there is no limit
+        :type lim: int
+        :param sign: gets signed or unsigned
+        :type sign: bool
+        :param sort: False - by insertion, 1 - ascending, -1 - descending
+        :type sort: bool or int
+        :return: consensus rounds
+        :rtype: list
+        """
+        raise NotImplementedError()
+
+    def get_consensus_count(self):
+        """
+        :return: count of consensus rounds
+        :rtype: int
+        """
+        raise NotImplementedError()
+
+    def get_consensus_greater_than(self, value, lim=0):
+        """
+        :param value: round num
+        :type value: int
+        :param lim: limit of rounds, 0 means there is no limit
+        :type lim: int
+        :return: consensus rounds greater than value
+        :rtype: list
+        """
+        raise NotImplementedError()
+
+    def get_consensus_last_sent(self):
+        """
+        :return: round with last sent flag, last signed round if there is no flag or False if error
+        :rtype: int or bool
+        """
+        raise NotImplementedError()
+
+    def get_consensus_last_created_sign(self):
+        """
+        :return: round with last created signature flag, last sent round if there is no flag
+                 or False if error
+        :rtype: int or bool
+        """
+        raise NotImplementedError()
+
+    def get_consensus_last_signed(self):
+        """
+        Gets last signed round from db
+
+        :return: last signed round or -1 if it does not exist
+        :rtype: int
+        """
+        con = self.get_consensus_many(sign=True, lim=1, sort=-1)
+        if con:
+            return con[0]
+        else:
+            return -1
+
+    def get_last_consensus(self):
+        """
+        :return: last consensus round or -1 if there is none
+        :rtype: int
+        """
+        raise NotImplementedError()
+
+    def insert_consensus(self, consensus, signed=False):
+        """
+        :param consensus: decided rounds
+        :type consensus: list
+        :param signed: are rounds signed
+        :type signed: bool
+        :return: was the insertion successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def check_consensus(self, r):
+        """
+        :param r: round num
+        :type r: int
+        :return: 1 if round is decided, 0 otherwise
+        :rtype: int
+        """
+        raise NotImplementedError()
+
+    def sign_consensus(self, count):
+        """
+        Signs first count unsigned rounds
+
+        :param count: how many rounds should be signed
+        :type count: int
+        :return: was the sign operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def set_consensus_last_sent(self, consensus):
+        """
+        :param consensus: round num
+        :type consensus: int
+        :return: was the setting operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def set_consensus_last_created_sign(self, consensus):
+        """
+        :param consensus: round num
+        :type consensus: int
+        :return: was the setting operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def get_consensus_last_pruned(self):
+        """
+        :return: last round whose events were pruned, -1 if none was or False if error
+        :rtype: int or bool
+        """
+        raise NotImplementedError()
+
+    def set_consensus_last_pruned(self, r):
+        """
+        :param r: last round whose events were pruned
+        :type r: int
+        :return: was the setting operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    # Journal
+
+    def get_journal(self):
+        """
+        Gets the journal of the consensus step in progress
+
+        :return: journal, None if no step is in progress or False if error
+        :rtype: dict or None or bool
+        """
+        raise NotImplementedError()
+
+    def insert_journal(self, journal, buffered=True):
+        """
+        Replaces the journal of the consensus step in progress.
+        A buffered journal is written with the unit of work after events and heights and before
+        the rest of the buffered data, otherwise it is written before anything buffered.
+
+        :param journal: journal in format {'step': name, ...data of the step}
+        :type journal: dict
+        :param buffered: can the write be buffered by the unit of work
+        :type buffered: bool
+        :return: was the insertion successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def delete_journal(self):
+        """
+        Deletes the journal when no consensus step is in progress
+
+        :return: was the delete operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    # Signature
+
+    def get_signature(self, last_round):
+        """
+        :param last_round: last round of state
+        :type last_round: int
+        :return: signature document or False if it was not found
+        :rtype: dict or bool
+        """
+        raise NotImplementedError()
+
+    def get_signature_grater_than(self, last_round):
+        """
+        :param last_round: last round of state
+        :type last_round: int
+        :return: first signature document after last_round or False if it was not found
+        :rtype: dict or bool
+        """
+        raise NotImplementedError()
+
+    def check_if_signature_present(self, last_round, ver_key):
+        """
+        :param last_round: last round of state
+        :type last_round: int
+        :param ver_key: verify_key of sign
+        :type ver_key: str
+        :return: True if it was found or error, False otherwise
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def insert_signature(self, signature):
+        """
+        :param signature: data in format {'last_round': int, 'hash': str, 'sign': dict}
+        :type signature: dict
+        :return: was the insertion successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def unset_unchecked_signature(self, last_round):
+        """
+        :param last_round: last round of state
+        :type last_round: int
+        :return: was the delete operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def insert_signature_unchecked(self, signature):
+        """
+        :param signature: data in format {'last_round': int, 'hash': str, 'sign': dict}
+        :type signature: dict
+        :return: was the insertion successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    # State
+
+    def get_state(self, r, for_sync=False, balance=True):
+        """
+        :param r: last round of state
+        :type r: int
+        :param for_sync: remove hash and signed flag from result or not
+        :type for_sync: bool
+        :param balance: load balance of all wallets or only the state header
+        :type balance: bool
+        :return: state or None if it was not found
+        :rtype: dict or None
+        """
+        raise NotImplementedError()
+
+    def get_last_state(self, balance=True):
+        """
+        :param balance: load balance of all wallets or only the state header
+        :type balance: bool
+        :return: state with the greatest last round or False if there is none
+        :rtype: dict or bool
+        """
+        raise NotImplementedError()
+
+    def get_state_many(self, gt=0, signed=True, for_sync=True):
+        """
+        :param gt: state round for greater than
+        :type gt: int
+        :param signed: get only signed or not
+        :type signed: bool
+        :param for_sync: remove hash and signed flag from result or not
+        :type for_sync: bool
+        :return: list of states or False if error
+        :rtype: list or bool
+        """
+        raise NotImplementedError()
+
+    def iter_states(self, gt=0, signed=True, for_sync=True, batch_size=10):
+        """
+        Streams states ordered by round.
+        Engines that read from local storage return everything in one batch.
+
+        :param gt: state round for greater than
+        :type gt: int
+        :param signed: get only signed or not
+        :type signed: bool
+        :param for_sync: remove hash and signed flag from result or not
+        :type for_sync: bool
+        :param batch_size: count of states in one batch
+        :type batch_size: int
+        :return: batches of states
+        :rtype: generator
+        """
+        states = self.get_state_many(gt, signed, for_sync)
+        if states:
+            yield states
+
+    def get_state_balance(self, address):
+        """
+        :param address: address of wallet
+        :type address: str
+        :return: wallet balance in the last state that has it, 0 if there is none
+        :rtype: int
+        """
+        raise NotImplementedError()
+
+    def get_wallets_state(self):
+        """
+        :return: wallets of the last state
+        :rtype: set
+        """
+        raise NotImplementedError()
+
+    def insert_state(self, state, hash, signed=False):
+        """
+        :param state: state itself
+        :type state: dict
+        :param hash: state hash
+        :type hash: str
+        :param signed: is state already signed
+        :type signed: bool
+        :return: was the insertion successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def set_state_signed(self, round):
+        """
+        :param round: last round of state
+        :type round: int
+        :return: was the setting operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def delete_state_less_than(self, round):
+        """
+        Deletes signed states with round less than given
+
+        :param round: last round of state
+        :type round: int
+        :return: was the delete operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def get_state_with_proof_many(self, gt):
+        return [stateunit for batch in self.iter_state_with_proof(gt) for stateunit in batch]
+
+    def iter_state_with_proof(self, gt):
+        """
+        Streams signed states with their signatures as proof, one batch of states at a time
+
+        :param gt: state round for greater than
+        :type gt: int
+        :return: batches in format [{'state': state, 'signatures': {verify_key: signed}}]
+        :rtype: generator
+        """
+        for db_states in self.iter_states(gt):
+            stateunit_list = []
+            for state in db_states:
+                signatures = {}
+                for sign in self.get_signature(state['_id'])['sign']:
+                    signatures[sign['verify_key']] = sign['signed']
+
+                stateunit = {
+                    'state': state,
+                    'signatures': signatures
+                }
+                stateunit_list.append(stateunit)
+            yield stateunit_list
+
+    def get_state_with_proof(self, r):
+        db_state = self.get_state(r, True)
+
+        signatures = {}
+        for sign in self.get_signature(r)['sign']:
+            signatures[sign['verify_key']] = sign['signed']
+
+        stateunit = {
+            'state': db_state,
+            'signatures': signatures
+        }
+
+        return stateunit
+
+    # Peer
+
+    def get_peer(self, ip):
+        """
+        :param ip: peer id
+        :type ip: str
+        :return: peer or None if it was not found
+        :rtype: dict or None
+        """
+        raise NotImplementedError()
+
+    def get_peers_many(self):
+        """
+        :return: peer list or False if error
+        :rtype: list or bool
+        """
+        raise NotImplementedError()
+
+    def iter_peers(self, batch_size=1000):
+        """
+        Streams peers.
+        Engines that read from local storage return everything in one batch.
+
+        :param batch_size: count of peers in one batch
+        :type batch_size: int
+        :return: batches of peers
+        :rtype: generator
+        """
+        peers = self.get_peers_many()
+        if peers:
+            yield peers
+
+    def count_peers(self):
+        """
+        :return: peer count
+        :rtype: int
+        """
+        raise NotImplementedError()
+
+    def insert_peer(self, peer):
+        """
+        :param peer: peer info
+        :type peer: dict
+        :return: was the insertion successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def insert_peers_many(self, peers):
+        """
+        :param peers: peers in format [{'_id', 'host', 'port', 'seen', 'latest_event'}]
+        :type peers: list
+        :return: was the insertion successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def delete_peers(self):
+        """
+        :return: was the delete operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def delete_peer(self, ip):
+        """
+        :param ip: peer id
+        :type ip: str
+        :return: was the delete operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def delete_peers_many(self, ids):
+        """
+        :param ids: peer ids
+        :type ids: list
+        :return: was the delete operation successful
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def get_random_peer(self):
+        """
+        :return: list with one random peer (empty if there are no peers) or False if error
+        :rtype: list or bool
+        """
+        raise NotImplementedError()
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 Prisma crypto currency and its Authors.
+This file is part of prisma crypto currency.
+Licensed under the GNU Lesser General Public License, version 3 or later. See LICENSING for details.
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+
+# cached lookups: collection that invalidates them when dropped
+CACHED_COLLECTIONS = OrderedDict([
+    ('event', 'events'),
+    ('round', 'rounds'),
+    ('height', 'height'),
+    ('can_see', 'can_see'),
+    ('witness', 'witness'),
+    ('vote', 'votes')
+])
+
+
+class ReadCache(object):
+    """
+    Read-through LRU cache of point lookups, one per kind of lookup, each holding up to size values.
+    Values that were not found are not cached. Writes discard the values they change,
+    a value loaded while its kind was changed is not cached.
+    Bytes taken by the values of every kind are counted as they are added and removed.
+    """
+    def __init__(self, size):
+        """
+        :param size: maximum count of values of one kind, 0 disables the cache
+        :type size: int
+        """
+        self.size = size
+        self.lock = threading.Lock()
+        self.values = {kind: OrderedDict() for kind in CACHED_COLLECTIONS}
+        self.generation = {kind: 0 for kind in CACHED_COLLECTIONS}
+        self.hits = {kind: 0 for kind in CACHED_COLLECTIONS}
+        self.misses = {kind: 0 for kind in CACHED_COLLECTIONS}
+        self.bytes = {kind: 0 for kind in CACHED_COLLECTIONS}
+
+    @staticmethod
+    def entry_size(key, value):
+        """
+        Estimates memory taken by one cached value
+
+        :param key: key of the value
+        :type key: hashable
+        :param value: cached value
+        :return: size in bytes
+        :rtype: int
+        """
+        return sys.getsizeof(key) + sys.getsizeof(value)
+
+    def get(self, kind, key, load):
+        """
+        Gets a value from the cache or loads and caches it.
+
+        :param kind: kind of lookup
+        :type kind: str
+        :param key: key of the value
+        :type key: hashable
+        :param load: function loading the value from the database
+        :type load: function
+        :return: value, None or False if it was not found
+        """
+        if self.size <= 0:
+            return load()
+
+        values = self.values[kind]
+        with self.lock:
+            if key in values:
+                values.move_to_end(key)
+                self.hits[kind] += 1
+                return values[key]
+            self.misses[kind] += 1
+            generation = self.generation[kind]
+
+        value = load()
+        if value is not None and value is not False:
+            with self.lock:
+                if self.generation[kind] == generation and key not in values:
+                    values[key] = value
+                    self.bytes[kind] += self.entry_size(key, value)
+                    if len(values) > self.size:
+                        self.bytes[kind] -= self.entry_size(*values.popitem(last=False))
+        return value
+
+    def discard(self, kind, keys):
+        """
+        Removes changed values.
+
+        :param kind: kind of lookup
+        :type kind: str
+        :param keys: keys of changed values
+        :type keys: iterable
+        :return: None
+        """
+        with self.lock:
+            self.generation[kind] += 1
+            values = self.values[kind]
+            for key in keys:
+                if key in values:
+                    self.bytes[kind] -= self.entry_size(key, values.pop(key))
+
+    def clear(self, kind=None):
+        """
+        Removes all values of a kind.
+
+        :param kind: kind of lookup or None for all kinds
+        :type kind: str or None
+        :return: None
+        """
+        with self.lock:
+            for k in ([kind] if kind else CACHED_COLLECTIONS):
+                self.generation[k] += 1
+                self.values[k].clear()
+                self.bytes[k] = 0
+
+    def clear_collection(self, collection_name):
+        """
+        Removes values loaded from a collection.
+
+        :param collection_name: name of a dropped collection
+        :type collection_name: str
+        :return: None
+        """
+        for kind, collection in CACHED_COLLECTIONS.items():
+            if collection == collection_name:
+                self.clear(kind)
+
+    def usage(self, kind=None):
+        """
+        Gets estimated memory taken by cached values
+
+        :param kind: kind of lookup or None for all kinds
+        :type kind: str or None
+        :return: size in bytes
+        :rtype: int
+        """
+        return sum(sys.getsizeof(self.values[k]) + self.bytes[k] for k in ([kind] if kind else CACHED_COLLECTIONS))
+
+    def evict_cold(self, nbytes, kind=None):
+        """
+        Drops least recently used values until nbytes are freed, kind by kind
+
+        :param nbytes: bytes to free
+        :type nbytes: int
+        :param kind: kind of lookup or None for all kinds
+        :type kind: str or None
+        :return: freed bytes
+        :rtype: int
+        """
+        freed = 0
+        with self.lock:
+            for k in ([kind] if kind else CACHED_COLLECTIONS):
+                values = self.values[k]
+                while values and freed < nbytes:
+                    size = self.entry_size(*values.popitem(last=False))
+                    self.bytes[k] -= size
+                    freed += size
+        return freed
+
+    def stats(self):
+        """
+        :return: hits, misses and count of cached values of each kind
+        :rtype: dict
+        """
+        with self.lock:
+            return {kind: {'hits': self.hits[kind], 'misses': self.misses[kind], 'size': len(self.values[kind])}
+                    for kind in CACHED_COLLECTIONS}
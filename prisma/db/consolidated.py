@@ -0,0 +1,664 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 Prisma crypto currency and its Authors.
+This file is part of prisma crypto currency.
+Licensed under the GNU Lesser General Public License, version 3 or later. See LICENSING for details.
+"""
+
+from collections import OrderedDict
+from pymongo import ASCENDING
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from prisma.db.database import PrismaDB
+from prisma.db.indexes import CONSOLIDATED_INDEXES
+
+# former collection: fields of the cryptograph document that replace it
+MERGED_COLLECTIONS = OrderedDict([
+    ('events', ('event',)),
+    ('height', ('height',)),
+    ('rounds', ('round', 'round_handled')),
+    ('can_see', ('can_see',)),
+    ('witness', ('witness', 'creator')),
+    ('votes', ('vote',)),
+    ('famous', ('famous',))
+])
+
+# event metadata without transactions
+EVENT_META = {'event.p': True, 'event.t': True, 'event.c': True, 'event.s': True}
+
+
+class ConsolidatedDB(PrismaDB):
+    """
+    MongoDB storage engine keeping everything stored per event in one document
+    of the cryptograph collection:
+
+    {'_id': hash, 'event': {d, p, t, c, s}, 'height': int, 'round': int, 'round_handled': int,
+     'witness': round, 'creator': creator of witness, 'can_see': {creator: hash},
+     'vote': {hash: vote}, 'famous': bool}
+
+    Fields are written independently (a round can be known before the event, e.g. after
+    a state sync) and methods of the former collections read and unset only their fields.
+    Selected with [database] schema = consolidated, a database is converted by migrate_collections
+    (prismad --migrate-schema).
+    """
+    collections_list = ['cryptograph', 'head', 'peers', 'transactions', 'consensus', 'signature', 'state',
+                        'balance', 'metadata']
+    index_registry = CONSOLIDATED_INDEXES
+
+    def drop_collections_many(self, exceptions=[]):
+        """
+        Drop all collections exept given ones, former collections can be given too
+
+        :param exceptions: collections that should not be deleted
+        :type exceptions: list
+        :return: was the drop operation successful
+        :rtype: bool
+        """
+        self.flush_unit_of_work()
+        for collection_name in list(MERGED_COLLECTIONS) + self.collections_list[1:]:
+            if collection_name not in exceptions:
+                if not self.drop_collection(collection_name):
+                    return False
+        return True
+
+    def drop_collection(self, collection_name):
+        """
+        Drop one collection from db, for a former collection its fields are unset
+
+        :param collection_name: name of collection to drop
+        :type collection_name: str
+        :return: was the drop operation successful
+        :rtype: bool
+        """
+        if collection_name not in MERGED_COLLECTIONS:
+            return super(ConsolidatedDB, self).drop_collection(collection_name)
+        result = self._unset({}, MERGED_COLLECTIONS[collection_name])
+        self.cache.clear_collection(collection_name)
+        return result
+
+    def _unset(self, query, fields):
+        """
+        Unsets fields of all documents matching the query
+
+        :param query: query
+        :type query: dict
+        :param fields: fields to unset
+        :type fields: tuple
+        :return: was the operation successful
+        :rtype: bool
+        """
+        self.flush_unit_of_work()
+        try:
+            self.logger.debug("Unset %s of cryptograph documents %s", str(fields), str(query))
+            self.db.cryptograph.update_many(query, {'$unset': {field: '' for field in fields}})
+            return True
+        except Exception as e:
+            self.logger.error("Could not unset %s. Reason: %s", str(fields), str(e))
+        return False
+
+    def _set_many(self, values, upsert=True, query=None):
+        """
+        Sets fields of documents with one bulk write
+
+        :param values: fields to set in format {hash: {field: value}}
+        :type values: dict
+        :param upsert: create documents that do not exist
+        :type upsert: bool
+        :param query: additional condition for documents to update
+        :type query: dict or None
+        :return: None
+        """
+        requests = [UpdateOne(dict(query or {}, _id=self.common.hash_to_bin(h)), {'$set': fields}, upsert=upsert)
+                    for h, fields in values.items() if fields]
+        if requests:
+            res = self.db.cryptograph.bulk_write(requests, ordered=False)
+            self.logger.debug("Result %s", str(res.bulk_api_result))
+
+    def _find_field(self, h, field, projection=None):
+        """
+        Gets the document of event if it has field
+
+        :param h: event hash
+        :type h: str
+        :param field: field that has to be present
+        :type field: str
+        :param projection: fields to return, only the field by default
+        :type projection: dict or None
+        :return: document or None
+        :rtype: dict or None
+        """
+        return self.db.cryptograph.find_one({'_id': self.common.hash_to_bin(h), field: {'$exists': True}},
+                                            projection or {field: True})
+
+    def migrate_collections(self, batch_size=1000):
+        """
+        Moves documents of the former collections (schema = collections) into the cryptograph
+        collection and drops each collection when it is moved. An interrupted migration
+        can be run again, documents are upserted.
+
+        :param batch_size: count of documents written with one bulk write
+        :type batch_size: int
+        :return: was the migration successful
+        :rtype: bool
+        """
+        try:
+            for collection_name in MERGED_COLLECTIONS:
+                self.logger.info("Migrating collection %s.", collection_name)
+                requests = []
+                for doc in self.db[collection_name].find():
+                    requests.extend(self._migration_requests(collection_name, doc))
+                    if len(requests) >= batch_size:
+                        self.db.cryptograph.bulk_write(requests, ordered=False)
+                        requests = []
+                if requests:
+                    self.db.cryptograph.bulk_write(requests, ordered=False)
+                self.db[collection_name].drop()
+            return True
+        except Exception as e:
+            self.logger.error("Could not migrate collections. Reason: %s", str(e))
+        return False
+
+    @staticmethod
+    def _migration_requests(collection_name, doc):
+        """
+        Converts a document of a former collection to updates of the cryptograph collection
+
+        :param collection_name: former collection
+        :type collection_name: str
+        :param doc: document of the former collection
+        :type doc: dict
+        :return: update requests
+        :rtype: list
+        """
+        if collection_name == 'witness':
+            # {_id: round, witness: {creator: hash}}
+            return [UpdateOne({'_id': h}, {'$set': {'witness': doc['_id'], 'creator': c}}, upsert=True)
+                    for c, h in doc.get('witness', {}).items()]
+        fields = {field: doc[field] for field in MERGED_COLLECTIONS[collection_name] if field in doc}
+        if not fields:
+            return []
+        return [UpdateOne({'_id': doc['_id']}, {'$set': fields}, upsert=True)]
+
+    # Events
+
+    def get_event(self, event_id, as_tuple=True, clear_parent=False, payload=True):
+        try:
+            cg_dict = {}
+
+            uow = self.get_unit_of_work()
+            if uow is not None and event_id in uow.events:
+                _event = {'_id': event_id, 'event': self.common.tuple_to_dict(uow.events[event_id])}
+            else:
+                _event = self.cache.get('event', (event_id, payload), lambda: self._find_field(
+                    event_id, 'event', None if payload else EVENT_META))
+
+            if not _event:
+                return False if as_tuple else cg_dict
+
+            cg_dict[event_id] = dict(_event['event'])
+            if not payload:
+                cg_dict[event_id]['d'] = None
+
+            if clear_parent:
+                new_parents_list = []
+                last_signed = self.get_consensus_last_signed()
+                for p in cg_dict[event_id]['p']:
+                    rnd = self.get_round(p)
+                    if rnd == -1:
+                        self.logger.error("Could not find hash in rounds !")
+                        return False
+
+                    if rnd > last_signed:
+                        new_parents_list.append(p)
+                cg_dict[event_id]['p'] = new_parents_list
+
+            if as_tuple:
+                return self.common.dict_to_tuple(cg_dict)[event_id]
+            return cg_dict
+        except Exception as e:
+            self.logger.error("Could not get event. Reason: %s", str(e))
+            self.logger.debug("Event: %s", str(event_id))
+        return False
+
+    def get_events_by_hash(self, hash_list, batch_size=1000):
+        self.flush_unit_of_work()
+        events = {}
+        try:
+            for i in range(0, len(hash_list), batch_size):
+                bin_ids = [self.common.hash_to_bin(h) for h in hash_list[i:i + batch_size]]
+                for doc in self.db.cryptograph.find({'_id': {'$in': bin_ids}, 'event': {'$exists': True}},
+                                                    {'event': True}):
+                    events[self.common.bin_to_hash(doc['_id'])] = doc['event']
+            return events
+        except Exception as e:
+            self.logger.error("Could not get events. Reason: %s", str(e))
+        return False
+
+    def iter_events(self, batch_size=1000):
+        self.flush_unit_of_work()
+        return self.iter_batches(self.db.cryptograph.find({'event': {'$exists': True}},
+                                                          {'event': True}).sort('event.t', ASCENDING),
+                                 'event', batch_size)
+
+    def get_latest_event_time(self):
+        self.flush_unit_of_work()
+        try:
+            for doc in self.db.cryptograph.find({'event': {'$exists': True}},
+                                                {'event.t': True}).sort('event.t', -1).limit(1):
+                return doc['event']['t']
+            return 0.0
+        except Exception as e:
+            self.logger.error("Could not retrieve latest event timestamp. Reason: %s", str(e))
+        return False
+
+    def get_events_by_time(self, time):
+        ev_list = []
+        self.flush_unit_of_work()
+        try:
+            for doc in self.db.cryptograph.find({'event.t': {'$gt': time}}, {'event': True}):
+                ev_list.append({'_id': self.common.bin_to_hash(doc['_id']), 'event': doc['event']})
+            return ev_list
+        except Exception as e:
+            self.logger.error("Could not retrieve events based on time. Reason: %s", str(e))
+        return False
+
+    def insert_event(self, event):
+        """
+        Inserts events, a document that already has an event is not overwritten
+
+        :param event: event info including blake2 hash as a key
+        :type event: dict
+        :return: was the insertion successful
+        :rtype: bool
+        """
+        try:
+            if event:
+                uow = self.get_unit_of_work()
+                if uow is not None:
+                    for ev_id in event:
+                        if ev_id in uow.events:
+                            raise DuplicateKeyError(ev_id)
+                        uow.events[ev_id] = event[ev_id]
+                    return True
+
+                # the filter does not match a document with an event, so the upsert fails on _id
+                self.db.cryptograph.bulk_write(
+                    [UpdateOne({'_id': self.common.hash_to_bin(ev_id), 'event': {'$exists': False}},
+                               {'$set': {'event': self.common.tuple_to_dict(event[ev_id])}}, upsert=True)
+                     for ev_id in event])
+                return True
+        except (BulkWriteError, DuplicateKeyError):
+            self.logger.error("Could not insert event. Reason: duplicate (_id) event id.")
+        except Exception as e:
+            self.logger.error("Could not insert event(s). Reason: %s", str(e))
+        return False
+
+    def delete_event(self, h):
+        result = self._unset({'_id': self.common.hash_to_bin(h)}, MERGED_COLLECTIONS['events'])
+        self.cache.discard('event', [(h, True), (h, False)])
+        return result
+
+    def delete_events_many(self, hash_list, batch_size=1000):
+        """
+        Deletes events and everything stored per event (can_see, votes, famous),
+        rounds and heights are kept as with separate collections. One query per batch
+
+        :param hash_list: event hashes
+        :type hash_list: list
+        :param batch_size: count of hashes deleted by one query
+        :type batch_size: int
+        :return: was the delete operation successful
+        :rtype: bool
+        """
+        self.flush_unit_of_work()
+        try:
+            for i in range(0, len(hash_list), batch_size):
+                batch = [self.common.hash_to_bin(h) for h in hash_list[i:i + batch_size]]
+                self.logger.debug("Delete %s events", str(len(batch)))
+                self.db.cryptograph.update_many({'_id': {'$in': batch}},
+                                                {'$unset': {'event': '', 'can_see': '', 'vote': '', 'famous': ''}})
+                self.cache.discard('event', [(h, payload) for h in hash_list[i:i + batch_size]
+                                             for payload in (True, False)])
+                self.cache.discard('can_see', hash_list[i:i + batch_size])
+                self.cache.discard('vote', hash_list[i:i + batch_size])
+            return True
+        except Exception as e:
+            self.logger.error("Could not delete events. Reason: %s", str(e))
+        return False
+
+    # Rounds
+
+    def get_round(self, h):
+        if h:
+            uow = self.get_unit_of_work()
+            if uow is not None and h in uow.rounds:
+                return uow.rounds[h]
+            try:
+                doc = self.cache.get('round', h, lambda: self._find_field(h, 'round'))
+                if doc:
+                    return doc['round']
+            except Exception as e:
+                self.logger.error("Could not get round. Reason: %s", str(e))
+        return False
+
+    def _find_rounds(self, query):
+        return {self.common.bin_to_hash(doc['_id']): doc['round']
+                for doc in self.db.cryptograph.find(query, {'round': True})}
+
+    def iter_rounds(self, less_than=False, start=None, batch_size=1000):
+        self.flush_unit_of_work()
+        query = {'round': {'$lte': less_than}} if less_than else {'round': {'$exists': True}}
+        if start is not None:
+            query['round']['$gt'] = start
+        return self.iter_batches(self.db.cryptograph.find(query, {'round': True}), 'round', batch_size)
+
+    def get_rounds_by_hash(self, hash_list, batch_size=1000):
+        self.flush_unit_of_work()
+        rounds = {}
+        try:
+            for i in range(0, len(hash_list), batch_size):
+                bin_ids = [self.common.hash_to_bin(h) for h in hash_list[i:i + batch_size]]
+                for doc in self.db.cryptograph.find({'_id': {'$in': bin_ids}, 'round': {'$exists': True}},
+                                                    {'round': True, 'round_handled': True}):
+                    rounds[self.common.bin_to_hash(doc['_id'])] = {field: doc[field] for field in
+                                                                   ('round', 'round_handled') if field in doc}
+            return rounds
+        except Exception as e:
+            self.logger.error("Could not get rounds. Reason: %s", str(e))
+        return False
+
+    def get_rounds_max(self):
+        self.flush_unit_of_work()
+        try:
+            for doc in self.db.cryptograph.find({'round': {'$exists': True}},
+                                                {'round': True}).sort('round', -1).limit(1):
+                return doc['round']
+            return 0
+        except Exception as e:
+            self.logger.error("Could not get max round. Reason: %s", str(e))
+        return False
+
+    def get_rounds_hash_list(self, value, start=None):
+        self.flush_unit_of_work()
+        try:
+            round_range = {'$lte': value}
+            if start is not None:
+                round_range['$gt'] = start
+            return [self.common.bin_to_hash(doc['_id'])
+                    for doc in self.db.cryptograph.find({'round_handled': round_range, 'round': {'$exists': True}},
+                                                        {'_id': True})]
+        except Exception as e:
+            self.logger.error("Could not get from rounds less than %s. Reason: %s", str(value), str(e))
+        return False
+
+    def get_rounds_unhandled(self):
+        self.flush_unit_of_work()
+        try:
+            return [self.common.bin_to_hash(doc['_id'])
+                    for doc in self.db.cryptograph.find({'round': {'$exists': True}, 'round_handled': {'$exists': False}},
+                                                        {'_id': True})]
+        except Exception as e:
+            self.logger.error("Could not get unhandled rounds. Reason: %s", str(e))
+        return False
+
+    def get_rounds_less_than(self, r):
+        self.flush_unit_of_work()
+        try:
+            return self._find_rounds({'round': {'$lt': r}})
+        except Exception as e:
+            self.logger.error("Could not get hash list from Rounds. Reason: %s", str(e))
+        return False
+
+    def insert_round(self, round_info):
+        try:
+            if round_info:
+                uow = self.get_unit_of_work()
+                if uow is not None:
+                    uow.rounds.update((h, int(r)) for h, r in round_info.items())
+                    return True
+                self._set_many({h: {'round': int(r)} for h, r in round_info.items()})
+                self.cache.discard('round', round_info)
+                return True
+        except Exception as e:
+            self.logger.error("Could not insert round. Reason: %s", str(e))
+        return False
+
+    def set_round_handled(self, round_info):
+        try:
+            if round_info:
+                uow = self.get_unit_of_work()
+                if uow is not None:
+                    uow.round_handled.update((h, int(r)) for h, r in round_info.items())
+                    return True
+                self._set_many({h: {'round_handled': int(r)} for h, r in round_info.items()},
+                               upsert=False, query={'round': {'$exists': True}})
+                return True
+        except Exception as e:
+            self.logger.error("Could not set handled round. Reason: %s", str(e))
+        return False
+
+    def delete_round_less_than(self, value):
+        result = self._unset({'round': {'$lt': value}}, MERGED_COLLECTIONS['rounds'])
+        self.cache.clear('round')
+        return result
+
+    def delete_round_greater_than(self, value):
+        result = self._unset({'round': {'$gt': value}}, MERGED_COLLECTIONS['rounds'])
+        self.cache.clear('round')
+        return result
+
+    # Can see
+
+    def get_can_see(self, event_id):
+        try:
+            if event_id:
+                uow = self.get_unit_of_work()
+                if uow is not None and event_id in uow.can_see:
+                    return dict(uow.can_see[event_id])
+                doc = self.cache.get('can_see', event_id, lambda: self._find_field(event_id, 'can_see'))
+                if doc:
+                    return {c: self.common.bin_to_hash(h) for c, h in doc['can_see'].items()}
+                return {}
+        except Exception as e:
+            self.logger.error("Could not get can_see. Reason: %s", str(e))
+        return False
+
+    def insert_can_see(self, can_see):
+        try:
+            if can_see:
+                uow = self.get_unit_of_work()
+                if uow is not None:
+                    for see_id in can_see:
+                        uow.can_see.setdefault(see_id, {}).update(can_see[see_id])
+                    return True
+
+                self._set_many({see_id: {'can_see.' + c: self.common.hash_to_bin(h) for c, h in items.items()}
+                                for see_id, items in can_see.items()})
+                self.cache.discard('can_see', can_see)
+                return True
+        except Exception as e:
+            self.logger.error("Could not insert can_see. Reason: %s", str(e))
+        return False
+
+    def delete_can_see(self, h):
+        result = self._unset({'_id': self.common.hash_to_bin(h)}, MERGED_COLLECTIONS['can_see'])
+        self.cache.discard('can_see', [h])
+        return result
+
+    # Height
+
+    def get_height(self, event_id):
+        try:
+            if event_id:
+                uow = self.get_unit_of_work()
+                if uow is not None and event_id in uow.height:
+                    return uow.height[event_id]
+                doc = self.cache.get('height', event_id, lambda: self._find_field(event_id, 'height'))
+                if doc:
+                    return doc['height']
+        except Exception as e:
+            self.logger.error("Could not get height. Reason: %s", str(e))
+        return False
+
+    def iter_heights(self, batch_size=1000):
+        self.flush_unit_of_work()
+        return self.iter_batches(self.db.cryptograph.find({'height': {'$exists': True}}, {'height': True}),
+                                 'height', batch_size)
+
+    def insert_height(self, height_info):
+        try:
+            if height_info:
+                uow = self.get_unit_of_work()
+                if uow is not None:
+                    uow.height.update((h, int(height)) for h, height in height_info.items())
+                    return True
+                self._set_many({h: {'height': int(height)} for h, height in height_info.items()})
+                self.cache.discard('height', height_info)
+                return True
+        except Exception as e:
+            self.logger.error("Could not insert height. Reason: %s", str(e))
+        return False
+
+    def delete_height(self, h):
+        result = self._unset({'_id': self.common.hash_to_bin(h)}, MERGED_COLLECTIONS['height'])
+        self.cache.discard('height', [h])
+        return result
+
+    # Witness
+
+    def get_witness(self, r):
+        try:
+            witness = dict(self.cache.get('witness', r, lambda: {
+                doc['creator']: self.common.bin_to_hash(doc['_id'])
+                for doc in self.db.cryptograph.find({'witness': r}, {'creator': True})}))
+            uow = self.get_unit_of_work()
+            if uow is not None and r in uow.witness:
+                witness.update(uow.witness[r])
+            return witness
+        except Exception as e:
+            self.logger.error("Could not get witness. Reason: %s", str(e))
+        return False
+
+    def get_witness_max_round(self):
+        try:
+            max_round = 0
+            for doc in self.db.cryptograph.find({'witness': {'$exists': True}},
+                                                {'witness': True}).sort('witness', -1).limit(1):
+                max_round = doc['witness']
+            uow = self.get_unit_of_work()
+            if uow is not None and uow.witness:
+                max_round = max(max_round, max(uow.witness))
+            return max_round
+        except Exception as e:
+            self.logger.error("Could not get max round from Witness. Reason: %s", str(e))
+        return False
+
+    def insert_witness(self, witness_info):
+        try:
+            if witness_info:
+                uow = self.get_unit_of_work()
+                if uow is not None:
+                    for r in witness_info:
+                        uow.witness.setdefault(int(r), {}).update(witness_info[r])
+                    return True
+                self._set_many({h: {'witness': int(r), 'creator': c}
+                                for r in witness_info for c, h in witness_info[r].items()})
+                self.cache.discard('witness', [int(r) for r in witness_info])
+                return True
+        except Exception as e:
+            self.logger.error("Could not insert witness. Reason: %s", str(e))
+        return False
+
+    def delete_witnesses_less_than(self, r):
+        result = self._unset({'witness': {'$lt': r}}, MERGED_COLLECTIONS['witness'])
+        self.cache.clear('witness')
+        return result
+
+    # Votes
+
+    def get_vote(self, vote_id):
+        try:
+            if vote_id:
+                doc = self.cache.get('vote', vote_id, lambda: self._find_field(vote_id, 'vote'))
+                uow = self.get_unit_of_work()
+                if uow is not None and vote_id in uow.votes:
+                    vote = dict(doc['vote']) if doc else {}
+                    vote.update(uow.votes[vote_id])
+                    return vote
+                if doc:
+                    return doc['vote']
+        except Exception as e:
+            self.logger.error("Could not get vote. Reason: %s", str(e))
+        return False
+
+    def insert_vote(self, vote):
+        try:
+            if vote:
+                uow = self.get_unit_of_work()
+                if uow is not None:
+                    for vote_id in vote:
+                        uow.votes.setdefault(vote_id, {}).update(vote[vote_id])
+                    return True
+                self._set_many({vote_id: {'vote.' + key: val for key, val in vote[vote_id].items()}
+                                for vote_id in vote})
+                self.cache.discard('vote', vote)
+                return True
+        except Exception as e:
+            self.logger.error("Could not insert Vote. Reason: %s", str(e))
+        return False
+
+    def delete_votes(self, h):
+        result = self._unset({'_id': self.common.hash_to_bin(h)}, MERGED_COLLECTIONS['votes'])
+        self.cache.discard('vote', [h])
+        return result
+
+    # Famous
+
+    def get_famous(self, witness):
+        try:
+            if witness:
+                uow = self.get_unit_of_work()
+                if uow is not None and witness in uow.famous:
+                    return [uow.famous[witness]]
+                doc = self._find_field(witness, 'famous')
+                if doc:
+                    return [doc['famous']]
+        except Exception as e:
+            self.logger.error("Could not get famous witness. Reason: %s", str(e))
+        return None
+
+    def get_famous_many(self):
+        self.flush_unit_of_work()
+        try:
+            return {self.common.bin_to_hash(doc['_id']): doc['famous']
+                    for doc in self.db.cryptograph.find({'famous': {'$exists': True}}, {'famous': True})}
+        except Exception as e:
+            self.logger.error("Could not get famous witnesses. Reason: %s", str(e))
+        return False
+
+    def insert_famous(self, famous_info):
+        try:
+            if famous_info:
+                uow = self.get_unit_of_work()
+                if uow is not None:
+                    uow.famous.update(famous_info)
+                    return True
+                self._set_many({h: {'famous': famous} for h, famous in famous_info.items()})
+                return True
+        except Exception as e:
+            self.logger.error("Could not insert Famous. Reason: %s", str(e))
+        return False
+
+    def check_famous(self, h):
+        uow = self.get_unit_of_work()
+        if uow is not None and h in uow.famous:
+            return 1
+        try:
+            return int(self._find_field(h, 'famous', {'_id': True}) is not None)
+        except Exception as e:
+            self.logger.error("Could not check famous. Reason: %s", str(e))
+        return False
+
+    def delete_famous(self, h):
+        return self._unset({'_id': self.common.hash_to_bin(h)}, MERGED_COLLECTIONS['famous'])
@@ -5,25 +5,38 @@ This file is part of prisma crypto currency.
 Licensed under the GNU Lesser General Public License, version 3 or later. See LICENSING for details.
 """
 
-import logging
 import sys
+import threading
 from collections import OrderedDict
+from contextlib import contextmanager
 from pymongo import ASCENDING, DESCENDING
 from pymongo import MongoClient
-from pymongo.errors import DuplicateKeyError
+from pymongo import UpdateOne, ReplaceOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from pymongo.errors import CollectionInvalid
 from pymongo.errors import ConnectionFailure
 from bson import CodecOptions
 
-from prisma.utils.common import Common
 from prisma.config import CONFIG
+from prisma.db.base import BaseDB
+from prisma.db.cache import ReadCache
+from prisma.db.indexes import COLLECTIONS_INDEXES
+from prisma.db.query_monitor import QueryMonitor
+from prisma.db.query_plan import QueryPlanChecker
+from prisma.db.unit_of_work import UnitOfWork
 from prisma.cryptograph.transaction import TYPE_SIGNED_STATE, TYPE_MONEY_TRANSFER
 
 
-class PrismaDB(object):
+class PrismaDB(BaseDB):
     """
-    Database class.
+    Database class, MongoDB storage engine.
     """
+    collections_list = ['events', 'rounds', 'can_see', 'height', 'head', 'peers', 'witness', 'famous',
+                        'votes', 'transactions', 'consensus', 'signature', 'state', 'balance', 'metadata']
+    # wallets in one document of state balance
+    state_chunk_size = 1000
+    index_registry = COLLECTIONS_INDEXES
+
     def __init__(self, db_name):
         """
         Creates class instance
@@ -31,11 +44,34 @@ class PrismaDB(object):
         :returns instance of PrismaDB class
         :rtype: object
         """
-        self.logger = logging.getLogger('PrismaDB')
-        self.common = Common()
-
-        try:
-            self.connection = MongoClient(serverSelectionTimeoutMS=2000, connect=False)
+        super(PrismaDB, self).__init__(db_name)
+        # balance ledger in memory, mirrors the balance collection once loaded
+        self.balances = None
+        # bytes taken by the entries of the balance ledger
+        self.balances_size = 0
+        self.balance_lock = threading.RLock()
+        # last sent, last created signature and last signed consensus, mirrors a document of metadata once loaded
+        self.consensus_pointers = None
+        self.consensus_lock = threading.RLock()
+        # point lookups of events, rounds, heights, can_see and witnesses
+        self.cache = ReadCache(CONFIG.getint('database', 'cache_size', fallback=10000))
+
+        listeners = []
+        # latency of commands and the slowest commands
+        self.query_monitor = None
+        if CONFIG.getboolean('database', 'monitor_queries', fallback=True):
+            self.query_monitor = QueryMonitor(CONFIG.getint('database', 'slow_queries', fallback=20),
+                                              CONFIG.getfloat('database', 'slow_query_ms', fallback=0))
+            listeners.append(self.query_monitor)
+
+        # test mode, records queries to check their plans
+        self.query_plan = None
+        if CONFIG.getboolean('developer', 'explain_queries', fallback=False):
+            self.query_plan = QueryPlanChecker(CONFIG.getint('developer', 'explain_min_documents', fallback=100))
+            listeners.append(self.query_plan)
+
+        try:
+            self.connection = MongoClient(serverSelectionTimeoutMS=2000, connect=False, event_listeners=listeners)
         except Exception as e:
             self.logger.error('%s.', str(e))
             sys.exit(1)
@@ -51,34 +87,147 @@ class PrismaDB(object):
             sys.exit(1)
 
         self.logger.info('MongoDB v%s, using database "%s".', self.get_version(), self.get_db_name())
-        self.collections_list = ['events', 'rounds', 'can_see', 'height', 'head', 'peers', 'witness', 'famous',
-                                 'votes', 'transactions', 'consensus', 'signature', 'state']
         self.create_collections()
         self.create_indexes()
 
+        if not self.check_hash_format():
+            self.logger.critical('Database "%s" stores event hashes as hex strings, it was written by an older '
+                                 'version. Drop it and start again to sync it from peers.', self.get_db_name())
+            sys.exit(1)
+
     def create_indexes(self):
         """
-        Creates index based on event time.
-        This will be useful for remote graphs that want to sync events between particular time stamps.
+        Brings indexes to the version declared in the index registry.
+        Peers are indexed by host unless in developer mode.
 
         :returns: None
         """
-        try:
-
-            self.logger.debug("Creating index in descending order for events.")
-            self.db.events.create_index([("event.t", DESCENDING)], background=True)
-        except Exception as e:
-            self.logger.error("Could not create index on events collection. Reason:", str(e))
-            self.logger.warning("Running a database collection without an index might impact performance.")
+        self.index_registry.migrate(self.db)
 
         if not CONFIG.getboolean('developer', 'developer_mode'):
             try:
                 self.logger.debug("Creating indexes for peers.")
                 self.db.peers.create_index([("host", DESCENDING)], background=True, unique=True)
             except Exception as e:
-                self.logger.error("Could not create index on peers collection. Reason:", str(e))
+                self.logger.error("Could not create index on peers collection. Reason: %s", str(e))
                 self.logger.warning("Running a database collection without an index might impact performance.")
 
+    def check_hash_format(self):
+        """
+        Checks that event hashes are stored as binary digests. A database written before
+        hashes were stored in binary keeps hex strings, which are not found by lookups.
+
+        :return: are hashes stored in binary
+        :rtype: bool
+        """
+        for collection_name, field in (('events', '_id'), ('cryptograph', '_id'), ('head', 'head')):
+            if self.db[collection_name].find_one({field: {'$type': 'string'}}, {'_id': True}):
+                return False
+        return True
+
+    def check_query_plans(self):
+        """
+        Test mode, runs every query made since the last check through explain.
+        Enabled by explain_queries in the developer section of the config.
+
+        :return: list of (collection, command) that scan a collection with at least explain_min_documents
+        :rtype: list
+        """
+        if self.query_plan is None:
+            return []
+        return self.query_plan.check(self.connection)
+
+    def get_query_stats(self):
+        """
+        Gets latency histograms per collection and operation and the slowest commands.
+        Enabled by monitor_queries in the database section of the config.
+
+        :return: query stats, empty if monitoring is disabled
+        :rtype: dict
+        """
+        if self.query_monitor is None:
+            return {}
+        return self.query_monitor.stats()
+
+    # Unit of work
+
+    def get_unit_of_work(self):
+        """
+        Gets unit of work opened in the current thread
+
+        :return: unit of work or None if writes are not buffered
+        :rtype: UnitOfWork or None
+        """
+        return getattr(self.local, 'unit_of_work', None)
+
+    def begin_unit_of_work(self):
+        """
+        Starts buffering writes to events, height, rounds, can_see, witness, votes, famous and head.
+        Point reads of those collections are served from the buffer first,
+        other queries flush it before reading.
+
+        :return: None
+        """
+        if self.get_unit_of_work() is None:
+            self.local.unit_of_work = UnitOfWork()
+
+    def flush_unit_of_work(self):
+        """
+        Writes buffered data with one bulk write per collection and keeps buffering.
+        Events go first and head goes last, so the head never points to an unwritten event.
+        The journal follows events and heights, so data of consensus steps is written only
+        after the journal of the last step, which has the data needed to write it again.
+        Collections after one that could not be written are not written.
+
+        :return: was the write successful
+        :rtype: bool
+        """
+        uow = self.get_unit_of_work()
+        if uow is None or uow.is_empty():
+            return True
+
+        self.local.unit_of_work = None
+        try:
+            self.logger.debug("Flush unit of work, events = %s", str(len(uow.events)))
+            result = True
+            for insert, data in ((self.insert_event, uow.events),
+                                 (self.insert_height, uow.height),
+                                 (self.insert_journal, uow.journal),
+                                 (self.insert_round, uow.rounds),
+                                 (self.set_round_handled, uow.round_handled),
+                                 (self.insert_can_see, uow.can_see),
+                                 (self.insert_witness, uow.witness),
+                                 (self.insert_vote, uow.votes),
+                                 (self.insert_famous, uow.famous),
+                                 (self.insert_head, uow.head)):
+                if data and not insert(data):
+                    result = False
+                    break
+            if not result:
+                self.logger.error("Could not write unit of work completely.")
+            return result
+        finally:
+            self.local.unit_of_work = UnitOfWork()
+
+    def commit_unit_of_work(self):
+        """
+        Writes buffered data and stops buffering
+
+        :return: was the write successful
+        :rtype: bool
+        """
+        result = self.flush_unit_of_work()
+        self.local.unit_of_work = None
+        return result
+
+    def discard_unit_of_work(self):
+        """
+        Drops buffered data that was not flushed yet and stops buffering
+
+        :return: None
+        """
+        self.local.unit_of_work = None
+
     def destroy_db(self, name=None):
         """
         Destroys database
@@ -91,6 +240,8 @@ class PrismaDB(object):
         try:
             name = name or self.get_db_name()
             self.connection.drop_database(name)
+            self.cache.clear()
+            self.consensus_pointers = None
             self.logger.info('Deleted database: %s.', str(name))
             return True
         except Exception as e:
@@ -124,6 +275,7 @@ class PrismaDB(object):
         :return: was the drop operation successful
         :rtype: bool
         """
+        self.flush_unit_of_work()
         for collection_name in self.collections_list:
             if collection_name not in exceptions:
                 if not self.drop_collection(collection_name):
@@ -141,6 +293,18 @@ class PrismaDB(object):
         """
         try:
             getattr(self.db, collection_name).drop()
+            self.cache.clear_collection(collection_name)
+            self.index_registry.create_indexes(self.db, collection_name)
+            # balance of states is a part of the state collection
+            if collection_name == 'state':
+                self.db.state_balance.drop()
+                self.index_registry.create_indexes(self.db, 'state_balance')
+            # the balance ledger is built from transactions and the last state
+            if collection_name in ('transactions', 'state', 'balance', 'metadata'):
+                self.reset_balance_ledger()
+            # consensus pointers are built from the consensus collection
+            if collection_name in ('consensus', 'metadata'):
+                self.reset_consensus_pointers()
         except Exception as e:
             self.logger.error('Could not delete collection: %s. Reason: %s', collection_name, str(e))
             return False
@@ -149,7 +313,7 @@ class PrismaDB(object):
 
     # Events
 
-    def get_event(self, event_id, as_tuple=True, clear_parent=False):
+    def get_event(self, event_id, as_tuple=True, clear_parent=False, payload=True):
         """
         Gets one event from db
 
@@ -159,6 +323,9 @@ class PrismaDB(object):
         :type as_tuple: bool
         :param clear_parent: removes parents if they were signed or doesn't remove them
         :type clear_parent: bool
+        :param payload: load the transaction list (d) or only the event metadata (p, t, c, s).
+                        Consensus only needs metadata, in that case d is returned as None
+        :type payload: bool
         :return: Event or False if error
         :rtype:     * dict of events
                     * dict of named tuple
@@ -167,10 +334,21 @@ class PrismaDB(object):
         try:
             cg_dict = {}
 
-            _event = self.db.events.find_one({'_id': event_id})
+            uow = self.get_unit_of_work()
+            if uow is not None and event_id in uow.events:
+                _event = {'_id': event_id, 'event': self.common.tuple_to_dict(uow.events[event_id])}
+            else:
+                projection = None
+                if not payload:
+                    projection = {'event.d': False}
+
+                _event = self.cache.get('event', (event_id, payload), lambda: self.db.events.find_one(
+                    {'_id': self.common.hash_to_bin(event_id)}, projection))
 
             if _event and '_id' in _event and 'event' in _event:
-                cg_dict[_event['_id']] = _event['event']
+                cg_dict[event_id] = dict(_event['event'])
+                if not payload:
+                    cg_dict[event_id]['d'] = None
 
                 if clear_parent:
                     new_parents_list = []
@@ -206,18 +384,75 @@ class PrismaDB(object):
         """
         cg_dict = {}
         try:
-            for event in self.db.events.find().sort('event.t', ASCENDING):
-                if '_id' in event and 'event' in event:
-                    cg_dict[event['_id']] = event['event']
+            for batch in self.iter_events():
+                cg_dict.update(batch)
         except Exception as e:
             self.logger.error("Could not get events. Reason: %s", str(e))
             return cg_dict
 
-        self.logger.debug("Get from Events %s", str(cg_dict))
+        self.logger.debug("Get from Events %s", cg_dict)
         if as_tuple and len(cg_dict) > 0:
             return self.common.dict_to_tuple(cg_dict)
         return cg_dict
 
+    def get_events_by_hash(self, hash_list, batch_size=1000):
+        """
+        Gets events by their hashes with one query per batch
+
+        :param hash_list: event hashes
+        :type hash_list: list
+        :param batch_size: count of events read with one query
+        :type batch_size: int
+        :return: events in format {hash: event} or False if error
+        :rtype: dict or bool
+        """
+        self.flush_unit_of_work()
+        events = {}
+        try:
+            for i in range(0, len(hash_list), batch_size):
+                bin_ids = [self.common.hash_to_bin(h) for h in hash_list[i:i + batch_size]]
+                for doc in self.db.events.find({'_id': {'$in': bin_ids}}):
+                    events[self.common.bin_to_hash(doc['_id'])] = doc['event']
+            return events
+        except Exception as e:
+            self.logger.error("Could not get events. Reason: %s", str(e))
+        return False
+
+    def iter_events(self, batch_size=1000):
+        """
+        Streams events ordered by time, errors are raised to the caller
+
+        :param batch_size: count of events in one batch
+        :type batch_size: int
+        :return: batches in format {hash: event}
+        :rtype: generator
+        """
+        self.flush_unit_of_work()
+        return self.iter_batches(self.db.events.find().sort('event.t', ASCENDING), 'event', batch_size)
+
+    def iter_batches(self, cursor, field, batch_size):
+        """
+        Reads documents of a cursor in batches of the given size
+
+        :param cursor: query result
+        :type cursor: pymongo.cursor.Cursor
+        :param field: field holding the value of a document
+        :type field: str
+        :param batch_size: count of documents in one batch
+        :type batch_size: int
+        :return: batches in format {hash: value}
+        :rtype: generator
+        """
+        batch = {}
+        for doc in cursor.batch_size(batch_size):
+            if field in doc:
+                batch[self.common.bin_to_hash(doc['_id'])] = doc[field]
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = {}
+        if batch:
+            yield batch
+
     def get_latest_event_time(self):
         """
         Gets latest (largest) time of event stored in db
@@ -228,6 +463,7 @@ class PrismaDB(object):
         :rtype: float or bool
         """
         ev_time_list = []
+        self.flush_unit_of_work()
         try:
             for event in self.db.events.find().sort('event.t', -1).limit(1):
                 ev_time_list.append(event)
@@ -249,10 +485,19 @@ class PrismaDB(object):
         """
         try:
             if event:
+                uow = self.get_unit_of_work()
+                if uow is not None:
+                    # duplicates are found before they are buffered, the bulk write stops at the first one
+                    if any(ev_id in uow.events for ev_id in event) or self.db.events.find_one(
+                            {'_id': {'$in': [self.common.hash_to_bin(ev_id) for ev_id in event]}}, {'_id': True}):
+                        raise DuplicateKeyError(str(list(event)))
+                    uow.events.update(event)
+                    return True
+
                 self.logger.debug("Inserting into events collection: %s", str(event))
-                for ev_id in event:
-                    self.logger.debug("result %s", str(self.db.events.insert_one(
-                        {'_id': ev_id, 'event': self.common.tuple_to_dict(event[ev_id])})))
+                self.logger.debug("result %s", str(self.db.events.insert_many(
+                    [{'_id': self.common.hash_to_bin(ev_id),
+                      'event': self.common.tuple_to_dict(event[ev_id])} for ev_id in event])))
                 return True
         except DuplicateKeyError:
             self.logger.error("Could not insert event. Reason: duplicate (_id) event id.")
@@ -268,16 +513,46 @@ class PrismaDB(object):
         :type h: str
         :return: was the delete operation successful
         """
+        self.flush_unit_of_work()
         try:
             self.logger.debug("Delete from Events %s", str(h))
             self.db.events.remove(
-                {'_id': h},
+                {'_id': self.common.hash_to_bin(h)},
                 {'justOne': True})
+            self.cache.discard('event', [(h, True), (h, False)])
             return True
         except Exception as e:
             self.logger.error("Delete from Event. Reason: %s", str(e))
         return False
 
+    def delete_events_many(self, hash_list, batch_size=1000):
+        """
+        Deletes events and everything stored per event (can_see, votes, famous)
+        with one $in query per batch and collection
+
+        :param hash_list: event hashes
+        :type hash_list: list
+        :param batch_size: count of hashes deleted by one query
+        :type batch_size: int
+        :return: was the delete operation successful
+        :rtype: bool
+        """
+        self.flush_unit_of_work()
+        try:
+            for i in range(0, len(hash_list), batch_size):
+                batch = [self.common.hash_to_bin(h) for h in hash_list[i:i + batch_size]]
+                self.logger.debug("Delete %s events", str(len(batch)))
+                for collection in (self.db.events, self.db.can_see, self.db.votes, self.db.famous):
+                    collection.remove({'_id': {'$in': batch}})
+                self.cache.discard('event', [(h, payload) for h in hash_list[i:i + batch_size]
+                                             for payload in (True, False)])
+                self.cache.discard('can_see', hash_list[i:i + batch_size])
+                self.cache.discard('vote', hash_list[i:i + batch_size])
+            return True
+        except Exception as e:
+            self.logger.error("Could not delete events. Reason: %s", str(e))
+        return False
+
     # Rounds
 
     def get_round(self, h):
@@ -291,8 +566,12 @@ class PrismaDB(object):
         :rtype: int
         """
         if h:
+            uow = self.get_unit_of_work()
+            if uow is not None and h in uow.rounds:
+                return uow.rounds[h]
             try:
-                _round = self.db.rounds.find_one({'_id': h})
+                _round = self.cache.get('round', h, lambda: self.db.rounds.find_one(
+                    {'_id': self.common.hash_to_bin(h)}))
                 if _round and 'round' in _round:
                     self.logger.debug("Get from Rounds for hash %s, round = %s", str(h), str(_round['round']))
                     return _round['round']
@@ -313,20 +592,57 @@ class PrismaDB(object):
         """
         rounds_dict = {}
         try:
-            if less_than:
-                _rounds = self.db.rounds.find({'round': {'$lte': less_than}})
-            else:
-                _rounds = self.db.rounds.find()
-            if _rounds:
-                for r in _rounds:
-                    if '_id' in r and 'round' in r:
-                        rounds_dict[r['_id']] = r['round']
-                    self.logger.debug("Get from Rounds %s", str(rounds_dict))
+            for batch in self.iter_rounds(less_than):
+                rounds_dict.update(batch)
+            self.logger.debug("Get from Rounds %s", rounds_dict)
             return rounds_dict
         except Exception as e:
             self.logger.error("Could not get rounds. Reason: %s", str(e))
         return False
 
+    def iter_rounds(self, less_than=False, start=None, batch_size=1000):
+        """
+        Streams rounds, errors are raised to the caller
+
+        :param less_than: limitation for round num
+        :type less_than: int/bool(by default)
+        :param start: if given, only rounds greater than it are returned
+        :type start: int or None
+        :param batch_size: count of rounds in one batch
+        :type batch_size: int
+        :return: batches in format {hash: round}
+        :rtype: generator
+        """
+        self.flush_unit_of_work()
+        query = {'round': {'$lte': less_than}} if less_than else {}
+        if start is not None:
+            query.setdefault('round', {})['$gt'] = start
+        return self.iter_batches(self.db.rounds.find(query, {'round': True}), 'round', batch_size)
+
+    def get_rounds_by_hash(self, hash_list, batch_size=1000):
+        """
+        Gets rounds of events by their hashes with one query per batch
+
+        :param hash_list: event hashes
+        :type hash_list: list
+        :param batch_size: count of rounds read with one query
+        :type batch_size: int
+        :return: rounds in format {hash: {'round': round, 'round_handled': round}} or False if error
+        :rtype: dict or bool
+        """
+        self.flush_unit_of_work()
+        rounds = {}
+        try:
+            for i in range(0, len(hash_list), batch_size):
+                bin_ids = [self.common.hash_to_bin(h) for h in hash_list[i:i + batch_size]]
+                for doc in self.db.rounds.find({'_id': {'$in': bin_ids}}, {'round': True, 'round_handled': True}):
+                    rounds[self.common.bin_to_hash(doc['_id'])] = {field: doc[field] for field in
+                                                                   ('round', 'round_handled') if field in doc}
+            return rounds
+        except Exception as e:
+            self.logger.error("Could not get rounds. Reason: %s", str(e))
+        return False
+
     def get_rounds_max(self):
         """
         Gets max round stored in db
@@ -336,6 +652,7 @@ class PrismaDB(object):
                     * False -  in the case of error
         :rtype: int
         """
+        self.flush_unit_of_work()
         try:
             _rounds = self.db.rounds.find().sort('round', -1).limit(1)
             if _rounds:
@@ -348,28 +665,49 @@ class PrismaDB(object):
             self.logger.error("Could not get max round from Round. Reason: %s", str(e))
         return False
 
-    def get_rounds_hash_list(self, value):
+    def get_rounds_hash_list(self, value, start=None):
         """
         Gets hashes of events with round less than given value
 
         :param value: start round num
         :type value: int
+        :param start: if given, only events with round greater than it are returned
+        :type start: int or None
         :return: id (hash) values from all documents with round less than given value
         :rtype: list
         """
         hash_list = []
+        self.flush_unit_of_work()
         try:
-            _hashes = self.db.rounds.find({'round_handled': {'$lte': value}})
+            round_range = {'$lte': value}
+            if start is not None:
+                round_range['$gt'] = start
+            _hashes = self.db.rounds.find({'round_handled': round_range})
             if _hashes:
                 for h in _hashes:
                     if '_id' in h and 'round' in h:
-                        hash_list.append(h['_id'])
+                        hash_list.append(self.common.bin_to_hash(h['_id']))
                     self.logger.debug("Get from Rounds less than %s", str(value))
             return hash_list
         except Exception as e:
             self.logger.error("Could not get from rounds less than %s. Reason: %s", str(value), str(e))
         return False
 
+    def get_rounds_unhandled(self):
+        """
+        Gets hashes of events whose order is not found yet
+
+        :return: event hashes or False if error
+        :rtype: list or bool
+        """
+        self.flush_unit_of_work()
+        try:
+            return [self.common.bin_to_hash(doc['_id'])
+                    for doc in self.db.rounds.find({'round_handled': {'$exists': False}}, {'_id': True})]
+        except Exception as e:
+            self.logger.error("Could not get unhandled rounds. Reason: %s", str(e))
+        return False
+
     def get_rounds_less_than(self, r):
         """
         Gets documents with round less than given one
@@ -379,13 +717,14 @@ class PrismaDB(object):
         :return: documents with round less than given one
         :rtype: list
         """
+        self.flush_unit_of_work()
         try:
             res_dict = {}
             _hashes = self.db.rounds.find({'round': {'$lt': r}})
             if _hashes:
                 for h in _hashes:
                     if '_id' in h and 'round' in h:
-                        res_dict[h['_id']] = h['round']
+                        res_dict[self.common.bin_to_hash(h['_id'])] = h['round']
                     self.logger.debug("Get hash list from Rounds, round = %s", str(r))
             return res_dict
         except Exception as e:
@@ -394,7 +733,7 @@ class PrismaDB(object):
 
     def insert_round(self, round_info):
         """
-        Inserts one round into db
+        Inserts rounds into db with one bulk write
 
         :param round_info: dict in format {hash:round}
         :type round_info: dict
@@ -403,11 +742,21 @@ class PrismaDB(object):
         """
         try:
             if round_info:
+                uow = self.get_unit_of_work()
+                if uow is not None:
+                    uow.rounds.update((h, int(r)) for h, r in round_info.items())
+                    return True
+
                 self.logger.debug("Insert into Rounds %s", str(round_info))
+                requests = []
                 for round_id in round_info:
-                    res = self.db.rounds.update({'_id': round_id},
-                                                {'$set':{'_id': round_id, 'round': int(round_info[round_id])}}, upsert=True)
-                    self.logger.debug("Insert into Rounds collection result %s", str(res))
+                    bin_id = self.common.hash_to_bin(round_id)
+                    requests.append(UpdateOne({'_id': bin_id},
+                                              {'$set': {'_id': bin_id, 'round': int(round_info[round_id])}},
+                                              upsert=True))
+                res = self.db.rounds.bulk_write(requests, ordered=False)
+                self.cache.discard('round', round_info)
+                self.logger.debug("Insert into Rounds collection result %s", str(res.bulk_api_result))
                 return True
         except DuplicateKeyError:
             self.logger.error("Could not insert round. Reason: duplicate (_id) round id.")
@@ -427,11 +776,16 @@ class PrismaDB(object):
         """
         try:
             if round_info:
+                uow = self.get_unit_of_work()
+                if uow is not None:
+                    uow.round_handled.update((h, int(r)) for h, r in round_info.items())
+                    return True
+
                 self.logger.debug("Set round handled %s", str(round_info))
-                for round_id in round_info:
-                    self.db.rounds.update({'_id': round_id},
-                                                {'$set': {'round_handled': int(round_info[round_id])}}
-                                                , upsert=False)
+                self.db.rounds.bulk_write(
+                    [UpdateOne({'_id': self.common.hash_to_bin(round_id)},
+                               {'$set': {'round_handled': int(round_info[round_id])}})
+                     for round_id in round_info], ordered=False)
                 return True
         except DuplicateKeyError:
             self.logger.error("Could not set handled round. Reason: duplicate (_id) round id.")
@@ -449,9 +803,11 @@ class PrismaDB(object):
         :return: was the delete operation successful
         :rtype: bool
         """
+        self.flush_unit_of_work()
         try:
             self.logger.debug("Delete from Rounds less than %s", str(value))
             self.db.rounds.remove({'round': {'$lt': value}})
+            self.cache.clear('round')
             return True
         except Exception as e:
             self.logger.error("Could not delete round. Reason: %s", str(e))
@@ -466,9 +822,11 @@ class PrismaDB(object):
         :return: was the delete operation successful
         :rtype: bool
         """
+        self.flush_unit_of_work()
         try:
             self.logger.debug("Delete from Rounds greater than %s", str(value))
             self.db.rounds.remove({'round': {'$gt': value}})
+            self.cache.clear('round')
             return True
         except Exception as e:
             self.logger.error("Could not delete round. Reason: %s", str(e))
@@ -478,8 +836,7 @@ class PrismaDB(object):
 
     def get_can_see(self, event_id):
         """
-        Gets events that can be seen based on event hash
-        Note: parent is actually parent hash
+        Gets events that can be seen based on event hash, stored as a map keyed by creator
 
         :param event_id: event hash
         :type event_id: str
@@ -489,12 +846,14 @@ class PrismaDB(object):
         """
         try:
             if event_id:
-                _can_see = self.db.can_see.find_one({'_id': event_id})
+                uow = self.get_unit_of_work()
+                if uow is not None and event_id in uow.can_see:
+                    # can_see of an event is written once, when its round is divided
+                    return dict(uow.can_see[event_id])
+                _can_see = self.cache.get('can_see', event_id, lambda: self.db.can_see.find_one(
+                    {'_id': self.common.hash_to_bin(event_id)}))
                 if _can_see and 'can_see' in _can_see:
-                    result_dict = {}
-                    for item in _can_see['can_see']:
-                        if 'parent' in item and 'event' in item:
-                            result_dict[item['parent']] = item['event']
+                    result_dict = {c: self.common.bin_to_hash(h) for c, h in _can_see['can_see'].items()}
                     self.logger.debug("Get from Can_see %s", str(result_dict))
                     return result_dict
                 return {}
@@ -505,8 +864,7 @@ class PrismaDB(object):
 
     def insert_can_see(self, can_see):
         """
-        Inserts can see info
-        Note: parent is actually parent hash
+        Inserts can see info, one update of the creator keys per event in one bulk write
 
         :param can_see: event hash and hash of event that can see it
                         format {event:{node_id:event}}
@@ -516,13 +874,24 @@ class PrismaDB(object):
         """
         try:
             if can_see:
+                uow = self.get_unit_of_work()
+                if uow is not None:
+                    for see_id in can_see:
+                        uow.can_see.setdefault(see_id, {}).update(can_see[see_id])
+                    return True
+
+                requests = []
                 for see_id in can_see:
-                    for parent, val in can_see[see_id].items():
-                        self.logger.debug("result %s", str(self.db.can_see.update(
-                            {'_id': see_id},
-                            {'$addToSet': {'can_see': {'parent': parent, 'event': val}}},
+                    if can_see[see_id]:
+                        requests.append(UpdateOne(
+                            {'_id': self.common.hash_to_bin(see_id)},
+                            {'$set': {'can_see.' + c: self.common.hash_to_bin(h) for c, h in can_see[see_id].items()}},
                             upsert=True
-                        )))
+                        ))
+                if requests:
+                    self.logger.debug("result %s",
+                                      str(self.db.can_see.bulk_write(requests, ordered=False).bulk_api_result))
+                    self.cache.discard('can_see', can_see)
                 return True
         except Exception as e:
             self.logger.error("Could not insert can_see. Reason: %s", str(e))
@@ -538,31 +907,13 @@ class PrismaDB(object):
         :return: was the delete operation successful
         :rtype: bool
         """
+        self.flush_unit_of_work()
         try:
             self.logger.debug("Delete from Can_see %s", str(h))
             self.db.can_see.remove(
-                {'_id': h},
+                {'_id': self.common.hash_to_bin(h)},
                 {'justOne': True})
-            return True
-        except Exception as e:
-            self.logger.error("Could not delete from Can_see. Reason: %s", str(e))
-        return False
-
-    def delete_references_can_see(self, hash_list):
-        """
-        Deletes all references to signed hashes
-
-        :param hash_list: list of signed events
-        :type hash_list: tuple
-        :return: was the delete operation successful
-        :rtype: bool
-        """
-        try:
-            for h in hash_list:
-                self.logger.debug("Delete reference from Can_see hash = %s", str(h))
-                self.db.can_see.update({}, {
-                    '$pull': {'can_see': {'$or': [{'parent': h}, {'event': h}]}}
-                }, upsert=False, multi=True)
+            self.cache.discard('can_see', [h])
             return True
         except Exception as e:
             self.logger.error("Could not delete from Can_see. Reason: %s", str(e))
@@ -578,6 +929,9 @@ class PrismaDB(object):
                     * False if error
         :rtype: str or bool
         """
+        uow = self.get_unit_of_work()
+        if uow is not None and uow.head:
+            return uow.head
         head_list = []
         try:
             _heads = self.db.head.find()
@@ -585,8 +939,9 @@ class PrismaDB(object):
                 for _head in _heads:
                     head_list.append(_head)
                 if len(head_list) > 0 and 'head' in head_list[0]:
-                    self.logger.debug("Get from Head %s", str(head_list[0]['head']))
-                    return head_list[0]['head']
+                    head = self.common.bin_to_hash(head_list[0]['head'])
+                    self.logger.debug("Get from Head %s", head)
+                    return head
             return head_list
         except Exception as e:
             self.logger.error("Could not get head. Reason: %s", str(e))
@@ -603,7 +958,12 @@ class PrismaDB(object):
         """
         try:
             if head:
-                self.logger.debug("Insert Head %s", str(self.db.head.update({}, {"$set": {'head': head}}, upsert=True)))
+                uow = self.get_unit_of_work()
+                if uow is not None:
+                    uow.head = head
+                    return True
+                self.logger.debug("Insert Head %s", str(self.db.head.update(
+                    {}, {"$set": {'head': self.common.hash_to_bin(head)}}, upsert=True)))
                 return True
         except Exception as e:
             self.logger.error("Could not insert head. Reason: %s", str(e))
@@ -624,7 +984,11 @@ class PrismaDB(object):
         """
         try:
             if event_id:
-                _height = self.db.height.find_one({'_id': event_id})
+                uow = self.get_unit_of_work()
+                if uow is not None and event_id in uow.height:
+                    return uow.height[event_id]
+                _height = self.cache.get('height', event_id, lambda: self.db.height.find_one(
+                    {'_id': self.common.hash_to_bin(event_id)}))
                 if _height and 'height' in _height:
                     self.logger.debug("Get from Heights %s", str(_height['height']))
                     return _height['height']
@@ -642,20 +1006,29 @@ class PrismaDB(object):
         """
         heights_dict = {}
         try:
-            _heights = self.db.height.find()
-            if _heights:
-                for event in _heights:
-                    if '_id' in event and 'height' in event:
-                        heights_dict[event['_id']] = event['height']
-                self.logger.debug("Get from Heights %s", str(heights_dict))
+            for batch in self.iter_heights():
+                heights_dict.update(batch)
+            self.logger.debug("Get from Heights %s", heights_dict)
             return heights_dict
         except Exception as e:
             self.logger.error("Could not get heights. Reason: %s", str(e))
         return False
 
+    def iter_heights(self, batch_size=1000):
+        """
+        Streams heights, errors are raised to the caller
+
+        :param batch_size: count of heights in one batch
+        :type batch_size: int
+        :return: batches in format {hash: height}
+        :rtype: generator
+        """
+        self.flush_unit_of_work()
+        return self.iter_batches(self.db.height.find({}, {'height': True}), 'height', batch_size)
+
     def insert_height(self, height_info):
         """
-        Inserts height of event to db
+        Inserts heights of events to db with one bulk write
 
         :param height_info: data in format {hash: height}
         :type height_info: dict
@@ -664,13 +1037,20 @@ class PrismaDB(object):
         """
         try:
             if height_info:
+                uow = self.get_unit_of_work()
+                if uow is not None:
+                    uow.height.update((h, int(height)) for h, height in height_info.items())
+                    return True
+
                 self.logger.debug("Insert into Height %s", str(height_info))
+                requests = []
                 for height_id in height_info:
-                    self.logger.debug("Result %s", str(self.db.height.update(
-                        {'_id': height_id},
-                        {'_id': height_id, 'height': int(height_info[height_id])},
-                        upsert=True
-                    )))
+                    bin_id = self.common.hash_to_bin(height_id)
+                    requests.append(ReplaceOne({'_id': bin_id},
+                                               {'_id': bin_id, 'height': int(height_info[height_id])},
+                                               upsert=True))
+                self.logger.debug("Result %s", str(self.db.height.bulk_write(requests, ordered=False).bulk_api_result))
+                self.cache.discard('height', height_info)
                 return True
         except Exception as e:
             self.logger.error("Could not insert height. Reason: %s", str(e))
@@ -686,11 +1066,13 @@ class PrismaDB(object):
         :return: was the delete operation successful
         :rtype: bool
         """
+        self.flush_unit_of_work()
         try:
             self.logger.debug("Delete from Height %s", str(h))
             self.db.height.remove(
-                {'_id': h},
+                {'_id': self.common.hash_to_bin(h)},
                 {'justOne': True})
+            self.cache.discard('height', [h])
             return True
         except Exception as e:
             self.logger.error("Could not delete from Height. Reason: %s", str(e))
@@ -710,11 +1092,15 @@ class PrismaDB(object):
         """
         try:
             self.logger.debug("GET FROM WIT, WIT = %s", str(r))
-            _witness = self.db.witness.find_one({'_id': r})
+            _witness = self.cache.get('witness', r, lambda: self.db.witness.find_one({'_id': r}))
+            witness = {}
             if _witness and 'witness' in _witness:
-                self.logger.debug("Get from Witness %s", str(_witness['witness']))
-                return _witness['witness']
-            return {}
+                witness = {c: self.common.bin_to_hash(h) for c, h in _witness['witness'].items()}
+                self.logger.debug("Get from Witness %s", str(witness))
+            uow = self.get_unit_of_work()
+            if uow is not None and r in uow.witness:
+                witness.update(uow.witness[r])
+            return witness
         except Exception as e:
             self.logger.error("Could not get witness. Reason: %s", str(e))
             self.logger.debug("Witness:", r)
@@ -730,20 +1116,24 @@ class PrismaDB(object):
         :rtype: int or bool
         """
         try:
+            max_round = 0
             _witness = self.db.witness.find().sort('_id', -1).limit(1)
             if _witness:
                 for wit in _witness:
                     if '_id' in wit:
                         self.logger.debug("Get max round from Witness %s", str(wit['_id']))
-                        return wit['_id']
-            return 0
+                        max_round = wit['_id']
+            uow = self.get_unit_of_work()
+            if uow is not None and uow.witness:
+                max_round = max(max_round, max(uow.witness))
+            return max_round
         except Exception as e:
             self.logger.error("Could not get max round  from Witness. Reason: %s", str(e))
         return False
 
     def insert_witness(self, witness_info):
         """
-        Inserts one witness to db
+        Inserts witnesses to db, one update per round in one bulk write
 
         :param witness_info: witness data in format {round:{hash:hash}}
         :type witness_info: dict
@@ -753,15 +1143,25 @@ class PrismaDB(object):
 
         try:
             if witness_info:
+                uow = self.get_unit_of_work()
+                if uow is not None:
+                    for r in witness_info:
+                        uow.witness.setdefault(int(r), {}).update(witness_info[r])
+                    return True
+
                 self.logger.debug("Insert into witness collection %s", str(witness_info))
+                requests = []
                 for r in witness_info:
-                    for key, val in witness_info[r].items():
-                        res = self.db.witness.update(
+                    if witness_info[r]:
+                        requests.append(UpdateOne(
                             {'_id': int(r)},
-                            {'$set': {'witness.' + key: val}},
+                            {'$set': {'witness.' + key: self.common.hash_to_bin(val)
+                                      for key, val in witness_info[r].items()}},
                             upsert=True
-                        )
-                        #self.logger.debug("Insert into witness collection result %s", str(res))
+                        ))
+                if requests:
+                    self.db.witness.bulk_write(requests, ordered=False)
+                    self.cache.discard('witness', [int(r) for r in witness_info])
                 return True
         except Exception as e:
             self.logger.error("Could not insert witness. Reason: %s", str(e))
@@ -777,9 +1177,11 @@ class PrismaDB(object):
         :return: was the delete operation successful
         :rtype: bool
         """
+        self.flush_unit_of_work()
         try:
             self.logger.debug("Delete from Witnesses %s", str(r))
             self.db.witness.remove({'_id': {'$lt': r}})
+            self.cache.clear('witness')
             return True
         except Exception as e:
             self.logger.error("Could not delete from Witnesses. Reason: %s", str(e))
@@ -835,99 +1237,203 @@ class PrismaDB(object):
             self.logger.error("Could not get transactions. Reason: %s", str(e))
         return id_list, transaction_list
 
-    def get_all_known_wallets(self):
+    def get_transfers_balance(self, r=False):
         """
-        Finds and returns all unique wallets in transactions and last state
+        Sums balance changes made by stored money transfers, one aggregation
+        for senders and one for recipients
 
-        :return: unique wallets stored in db
-        :rtype: set
+        :param r: range of rounds [first, last] or False for all transactions
+        :type r: list or bool
+        :return: changes in format {address: amount} or False if error
+        :rtype: dict or bool
         """
-        wallets = set()
+        changes = {}
         try:
-            # Gets all wallets in transactions
-            db_res = self.db.transactions.aggregate([
-                {'$group': {'_id': 0,
-                            'sender_wallets': {'$addToSet': '$senderId'},
-                            'recipient_wallets': {'$addToSet': '$recipientId'}}},
-                {'$project': {'balance': {'$setUnion': ['$sender_wallets', '$recipient_wallets']}}}])
-            if db_res:
-                for wal in db_res:
-                    self.logger.debug("TX_WAL %s", str(wal))
-                    wallets |= set(wal['balance'])
+            match_dict = {}
+            if r:
+                match_dict['round'] = {'$gte': r[0], '$lte': r[1]}
 
-                # Gets all wallets saved in state
-                wallets |= self.get_wallets_state()
+            for field, sign in (('senderId', -1), ('recipientId', 1)):
+                pipe = [{'$match': match_dict},
+                        {'$group': {'_id': '$' + field, 'amount': {'$sum': '$amount'}}}]
+                for i in self.db.transactions.aggregate(pipeline=pipe):
+                    if i['_id'] is not None:
+                        changes[i['_id']] = changes.get(i['_id'], 0) + sign * i['amount']
+            return changes
         except Exception as e:
-            self.logger.error("Could not get all known wallets. Reason: %s", str(e))
-        return wallets
+            self.logger.error("Could not sum transactions balance. Reason: %s", str(e))
+        return False
 
-    def get_account_balance(self, account_id, r=False):
+    def get_balance_ledger(self):
         """
-        Gets account balance from transactions and last state
+        Gets balance of all known wallets from the in-memory balance ledger
 
-        :param account_id: wallet id to search
-        :type account_id: str
-        :param r: range of rounds
-        :type r: list
-        :return: account balance
-        :rtype: int
+        :return: balance in format {address: amount} or False if error
+        :rtype: dict or bool
         """
-        sent = 0
-        received = 0
+        with self.balance_lock:
+            if not self.load_balance_ledger():
+                return False
+            return dict(self.balances)
 
-        round_check = None
-        if r:
-            round_check = {'$gte': r[0], '$lte': r[1]}
+    def get_ledger_balance(self, address):
+        """
+        Gets balance of one wallet from the in-memory balance ledger
 
-        try:
-            match_dict = {'senderId': account_id}
-            if round_check:
-                match_dict['round'] = round_check
+        :param address: wallet id
+        :type address: str
+        :return: balance or False if error
+        :rtype: int or bool
+        """
+        with self.balance_lock:
+            if not self.load_balance_ledger():
+                return False
+            return self.balances.get(address, 0)
 
-            pipe_sent = [{'$match': match_dict},
-                         {'$group': {'_id': None, 'amount': {'$sum': '$amount'}}}]
-            for i in self.db.transactions.aggregate(pipeline=pipe_sent):
-                if 'amount' in i:
-                    sent = i['amount']
-        except Exception as e:
-            self.logger.debug("Could not retrieve account balance. Reason: %s", str(e))
-            return False
+    def load_balance_ledger(self):
+        """
+        Loads the in-memory balance ledger from the balance collection.
+        The collection is trusted only when its document of the metadata collection marks it
+        consistent, otherwise (first use or a stop in the middle of a balance write)
+        the ledger is built again from transactions and the last state.
+        Writes that change balance hold balance_lock and load the ledger before they write.
 
-        try:
-            match_dict = {'recipientId': account_id}
-            if round_check:
-                match_dict['round'] = round_check
+        :return: is the ledger loaded
+        :rtype: bool
+        """
+        if self.balances is None:
+            try:
+                marker = self.db.metadata.find_one({'_id': 'balance'})
+                if marker and marker.get('consistent'):
+                    balances = {doc['_id']: doc['balance'] for doc in self.db.balance.find()}
+                else:
+                    self.logger.info("Building balance ledger from transactions and the last state.")
+                    balances = self.compute_balances()
+                    if balances is False:
+                        return False
+                    self.db.balance.drop()
+                    self.write_balance_ledger(balances)
+                    self.set_balance_ledger_consistent(True)
+                self.balances = balances
+                self.balances_size = sum(self.ledger_entry_size(address, amount)
+                                         for address, amount in balances.items())
+            except Exception as e:
+                self.logger.error("Could not load balance ledger. Reason: %s", str(e))
+                return False
+        return True
 
-            pipe_rec = [{'$match': match_dict},
-                        {'$group': {'_id': None, 'amount': {'$sum': '$amount'}}}]
-            for i in self.db.transactions.aggregate(pipeline=pipe_rec):
-                if 'amount' in i:
-                    received = i['amount']
-        except Exception as e:
-            self.logger.debug("Could not retrieve account balance. Reason: %s", str(e))
-            return False
+    def set_balance_ledger_consistent(self, consistent):
+        """
+        Marks if the balance collection matches transactions and the last state
 
-        tx_balance = received - sent
-        bal_res = tx_balance + self.get_state_balance(account_id)
-        self.logger.debug("BAl_RES %s", str(bal_res))
-        return bal_res
+        :param consistent: does the balance collection match
+        :type consistent: bool
+        :return: None
+        """
+        self.db.metadata.update({'_id': 'balance'}, {'_id': 'balance', 'consistent': consistent}, upsert=True)
 
-    def get_account_balance_many(self, range=False):
+    @contextmanager
+    def balance_write(self):
         """
-        Gets balance for all known wallets
+        Wraps a write of transactions or state and the balance changes it makes,
+        which are separate Mongo writes. The balance collection is marked not consistent
+        until both are done and the in-memory ledger is dropped if the write fails.
 
-        :param range: range of rounds
-        :type range: list
-        :return: balance for all known wallets in format {address: amount}
-        :rtype: dict
+        :return: None
+        """
+        with self.balance_lock:
+            if not self.load_balance_ledger():
+                raise ValueError("Could not load balance ledger.")
+            self.set_balance_ledger_consistent(False)
+            try:
+                yield
+            except Exception:
+                self.balances = None
+                raise
+            self.set_balance_ledger_consistent(True)
+
+    def update_balance_ledger(self, changes):
+        """
+        Adds balance changes of a write to the in-memory ledger and the balance collection.
+        If the ledger was not loaded before the write it is dropped and built on next use.
+
+        :param changes: changes in format {address: amount}
+        :type changes: dict
+        :return: None
+        """
+        if self.balances is None:
+            self.reset_balance_ledger()
+            return
+        for address, amount in changes.items():
+            old = self.balances.get(address)
+            self.balances[address] = (old or 0) + amount
+            self.balances_size += self.ledger_entry_size(address, self.balances[address])
+            if old is not None:
+                self.balances_size -= self.ledger_entry_size(address, old)
+        self.write_balance_ledger(changes)
+
+    def write_balance_ledger(self, changes):
+        """
+        Adds balance changes to the balance collection with one bulk write
+
+        :param changes: changes in format {address: amount}
+        :type changes: dict
+        :return: None
+        """
+        requests = [UpdateOne({'_id': address}, {'$inc': {'balance': amount}}, upsert=True)
+                    for address, amount in changes.items()]
+        if requests:
+            self.logger.debug("Update balance ledger %s",
+                              str(self.db.balance.bulk_write(requests, ordered=False).bulk_api_result))
+
+    def reset_balance_ledger(self):
+        """
+        Drops the balance ledger, it is built again on next use
+
+        :return: None
+        """
+        with self.balance_lock:
+            self.balances = None
+            self.db.balance.drop()
+            self.db.metadata.remove({'_id': 'balance'})
+
+    def balance_ledger_usage(self):
+        """
+        Gets estimated memory taken by the balance ledger
+
+        :return: size in bytes
+        :rtype: int
+        """
+        balances = self.balances
+        if balances is None:
+            return 0
+        return sys.getsizeof(balances) + self.balances_size
+
+    @staticmethod
+    def ledger_entry_size(address, amount):
+        """
+        Estimates memory taken by one entry of the balance ledger
+
+        :param address: wallet id
+        :type address: str
+        :param amount: balance
+        :type amount: int
+        :return: size in bytes
+        :rtype: int
         """
-        wallets_balance = {}
-        for w_id in self.get_all_known_wallets():
-            bal = self.get_account_balance(w_id, range)
+        return sys.getsizeof(address) + sys.getsizeof(amount)
 
-            if bal:
-                wallets_balance[w_id] = bal
-        return wallets_balance
+    def register_memory(self, memory):
+        """
+        Registers the read cache and the balance ledger in the memory manager.
+        The ledger is only reported, balance queries need all of it and it grows with wallets, not events.
+
+        :param memory: memory manager
+        :type memory: MemoryManager
+        :return: None
+        """
+        super(PrismaDB, self).register_memory(memory)
+        memory.register('balance_ledger', self.balance_ledger_usage)
 
     def insert_transactions(self, tx_list):
         """
@@ -942,7 +1448,19 @@ class PrismaDB(object):
         try:
             self.logger.debug("TX LSIT : %s", str(tx_list))
             if len(tx_list) > 0:
-                self.db.transactions.insert_many(tx_list)
+                # documents are copied, insert_many adds _id and ev_hash is stored binary
+                tx_list = [dict(tx, ev_hash=self.common.hash_to_bin(tx['ev_hash'])) if 'ev_hash' in tx else dict(tx)
+                           for tx in tx_list]
+                with self.balance_write():
+                    try:
+                        self.db.transactions.insert_many(tx_list)
+                        inserted = tx_list
+                    except BulkWriteError as e:
+                        # ordered insert stops at the first error, documents before it are written
+                        inserted = tx_list[:e.details['nInserted']]
+                        self.logger.error("Could not insert all transactions. Reason: %s", str(e))
+                    self.update_balance_ledger(self.get_transfer_changes(inserted))
+                return len(inserted) == len(tx_list)
             return True
         except Exception as e:
             self.logger.error("Could not insert transactions. Reason: %s", str(e))
@@ -964,7 +1482,8 @@ class PrismaDB(object):
             if event_hash:
                 for tx_id in tx_list:
                     self.logger.debug("Set event hash to transaction with id = %s", str(tx_id))
-                    self.db.transactions.update({'_id': tx_id}, {'$set': {'event_hash': event_hash}})
+                    self.db.transactions.update({'_id': tx_id},
+                                                {'$set': {'event_hash': self.common.hash_to_bin(event_hash)}})
                 return True
         except Exception as e:
             self.logger.error("Could not set event hash to transaction. Reason: %s", str(e))
@@ -985,7 +1504,7 @@ class PrismaDB(object):
         :rtype: bool
         """
         try:
-            res = self.db.transactions.update({'event_hash': ev_hash}, {'$set': {'round': r}},
+            res = self.db.transactions.update({'event_hash': self.common.hash_to_bin(ev_hash)}, {'$set': {'round': r}},
                                               upsert=False, multi=True)
             self.logger.debug("Set round for our tx ev_hash = %s, round = %s, result = %s", str(ev_hash),
                               str(r), str(res))
@@ -1006,7 +1525,7 @@ class PrismaDB(object):
         """
         try:
             self.logger.debug("Delete from Transaction less than %s", str(r))
-            result = self.db.transactions.remove({'round': {'$lte': r}})
+            result = self.remove_transactions({'round': {'$lte': r}})
             self.logger.debug("Delete from Transaction result %s", str(result))
             return True
         except Exception as e:
@@ -1026,7 +1545,7 @@ class PrismaDB(object):
         """
         try:
             self.logger.debug("Delete from money transfer transaction less than %s", str(r))
-            result = self.db.transactions.remove({'round': {'$lte': r}, 'type': str(TYPE_MONEY_TRANSFER)})
+            result = self.remove_transactions({'round': {'$lte': r}, 'type': str(TYPE_MONEY_TRANSFER)})
             self.logger.debug("Delete from money transfer transaction result %s", str(result))
             return True
         except Exception as e:
@@ -1034,6 +1553,41 @@ class PrismaDB(object):
             self.logger.debug("Round:", r)
         return False
 
+    def delete_processed_transactions(self, rounds):
+        """
+        Deletes transactions inserted when the order of rounds was found,
+        the transactions of this node are kept
+
+        :param rounds: rounds whose order was found
+        :type rounds: list
+        :return: was the delete operation successful
+        :rtype: bool
+        """
+        try:
+            result = self.remove_transactions({'round': {'$in': list(rounds)}, 'ev_hash': {'$exists': True}})
+            self.logger.debug("Delete processed transactions of rounds %s, result %s", str(rounds), str(result))
+            return True
+        except Exception as e:
+            self.logger.error("Could not delete processed transactions. Reason: %s", str(e))
+        return False
+
+    def remove_transactions(self, query):
+        """
+        Removes transactions and takes their money transfers out of the balance ledger
+
+        :param query: query of transactions to remove
+        :type query: dict
+        :return: result of remove
+        :rtype: dict
+        """
+        with self.balance_write():
+            removed = list(self.db.transactions.find(query, {'amount': True, 'senderId': True, 'recipientId': True}))
+            result = self.db.transactions.remove(query)
+            if result.get('n') != len(removed):
+                raise ValueError("Transactions changed while they were removed.")
+            self.update_balance_ledger(self.get_transfer_changes(removed, -1))
+            return result
+
     # Votes
 
     def get_vote(self, vote_id):
@@ -1047,7 +1601,13 @@ class PrismaDB(object):
         """
         try:
             if vote_id:
-                _vote = self.db.votes.find_one({'_id': vote_id})
+                _vote = self.cache.get('vote', vote_id, lambda: self.db.votes.find_one(
+                    {'_id': self.common.hash_to_bin(vote_id)}))
+                uow = self.get_unit_of_work()
+                if uow is not None and vote_id in uow.votes:
+                    vote = dict(_vote['vote']) if _vote and 'vote' in _vote else {}
+                    vote.update(uow.votes[vote_id])
+                    return vote
                 if _vote and 'vote' in _vote:
                     self.logger.debug("Get from Vote %s", str(_vote['vote']))
                     return _vote['vote']
@@ -1057,7 +1617,7 @@ class PrismaDB(object):
 
     def insert_vote(self, vote):
         """
-        Inserts vote to db
+        Inserts votes to db, one update per voter in one bulk write
 
         :param vote: vote info in format {who vote(hash):{for whom(hash): vote(T/F)}}
         :type vote: dict
@@ -1066,12 +1626,22 @@ class PrismaDB(object):
         """
         try:
             if vote:
+                uow = self.get_unit_of_work()
+                if uow is not None:
+                    for vote_id in vote:
+                        uow.votes.setdefault(vote_id, {}).update(vote[vote_id])
+                    return True
+
+                requests = []
                 for vote_id in vote:
-                    for key, val in vote[vote_id].items():
-                        self.logger.debug("Result %s", self.db.votes.update(
-                            {'_id': vote_id},
-                            {'$set': {'_id': vote_id, 'vote.' + key: val}}, upsert=True
-                        ))
+                    if vote[vote_id]:
+                        bin_id = self.common.hash_to_bin(vote_id)
+                        update = {'vote.' + key: val for key, val in vote[vote_id].items()}
+                        update['_id'] = bin_id
+                        requests.append(UpdateOne({'_id': bin_id}, {'$set': update}, upsert=True))
+                if requests:
+                    self.logger.debug("Result %s", self.db.votes.bulk_write(requests, ordered=False).bulk_api_result)
+                self.cache.discard('vote', vote)
                 return True
         except Exception as e:
             self.logger.error("Could not insert Vote. Reason: %s", str(e))
@@ -1086,11 +1656,13 @@ class PrismaDB(object):
         :return: was the delete operation successful
         :rtype: bool
         """
+        self.flush_unit_of_work()
         try:
             self.logger.debug("Delete from Votes %s", str(h))
             self.db.votes.remove(
-                {'_id': h},
+                {'_id': self.common.hash_to_bin(h)},
                 {'justOne': True})
+            self.cache.discard('vote', [h])
             return True
         except Exception as e:
             self.logger.error("Could not delete from Votes. Reason: %s", str(e))
@@ -1114,7 +1686,10 @@ class PrismaDB(object):
         """
         try:
             if witness:
-                _witness = self.db.famous.find_one({'_id': witness})
+                uow = self.get_unit_of_work()
+                if uow is not None and witness in uow.famous:
+                    return [uow.famous[witness]]
+                _witness = self.db.famous.find_one({'_id': self.common.hash_to_bin(witness)})
                 if _witness:
                     self.logger.debug("Get from Famous hash = %s, result =  %s", str(witness), str(_witness['famous']))
                     return [_witness['famous']]
@@ -1133,12 +1708,13 @@ class PrismaDB(object):
         :rtype: dict or bool
         """
         mfamous_dict = {}
+        self.flush_unit_of_work()
         try:
             _mfamous = self.db.famous.find()
             if _mfamous:
                 for famous in _mfamous:
                     if '_id' in famous and 'famous' in famous:
-                        mfamous_dict[famous['_id']] = famous['famous']
+                        mfamous_dict[self.common.bin_to_hash(famous['_id'])] = famous['famous']
             return mfamous_dict
         except Exception as e:
             self.logger.error("Could not get famous witnesses. Reason: %s", str(e))
@@ -1146,7 +1722,7 @@ class PrismaDB(object):
 
     def insert_famous(self, famous_info):
         """
-        Inserts famous info into db
+        Inserts famous info into db with one bulk write
         
         :param famous_info: data in format {hash: is famous(T/F)}
         :type famous_info: dict
@@ -1155,12 +1731,20 @@ class PrismaDB(object):
         """
         try:
             if famous_info:
+                uow = self.get_unit_of_work()
+                if uow is not None:
+                    uow.famous.update(famous_info)
+                    return True
+
                 self.logger.debug("Insert into Famous %s", str(famous_info))
+                requests = []
                 for wit_id in famous_info:
-                    self.logger.debug("Result Famous %s", str(self.db.famous.update(
-                        {'_id': wit_id},
-                        {'$set': {'_id': wit_id, 'famous': famous_info[wit_id]}}, upsert=True
-                    )))
+                    bin_id = self.common.hash_to_bin(wit_id)
+                    requests.append(UpdateOne({'_id': bin_id},
+                                              {'$set': {'_id': bin_id, 'famous': famous_info[wit_id]}},
+                                              upsert=True))
+                self.logger.debug("Result Famous %s",
+                                  str(self.db.famous.bulk_write(requests, ordered=False).bulk_api_result))
                 return True
         except Exception as e:
             self.logger.error("Could not insert Famous. Reason: %s", str(e))
@@ -1176,8 +1760,11 @@ class PrismaDB(object):
         :return: is present or not
         :rtype: int
         """
+        uow = self.get_unit_of_work()
+        if uow is not None and h in uow.famous:
+            return 1
         try:
-            is_famous = self.db.famous.find({'_id': h}, {'_id': 1}).limit(1).count()
+            is_famous = self.db.famous.find({'_id': self.common.hash_to_bin(h)}, {'_id': 1}).limit(1).count()
             self.logger.debug("Check famous for hash = %s, result = %s", str(h), str(is_famous))
             return is_famous
         except Exception as e:
@@ -1192,10 +1779,11 @@ class PrismaDB(object):
         :return: was the delete operation successful
         :rtype: bool
         """
+        self.flush_unit_of_work()
         try:
             self.logger.debug("Delete from Famous %s", str(h))
             self.db.famous.remove(
-                {'_id': h},
+                {'_id': self.common.hash_to_bin(h)},
                 {'justOne': True})
             return True
         except Exception as e:
@@ -1279,66 +1867,115 @@ class PrismaDB(object):
             self.logger.error("Could from consensus greater than value. Reason: %s", str(e))
         return result
 
+    def get_consensus_pointers(self):
+        """
+        Gets the in-memory consensus pointers, loads them on first use
+
+        :return: pointers in format {'last_sent': round or None, 'last_created_sign': round or None,
+                 'last_signed': round or -1, 'last_pruned': round, if any was pruned} or False if error
+        :rtype: dict or bool
+        """
+        pointers = self.consensus_pointers
+        if pointers is None:
+            with self.consensus_lock:
+                if not self.load_consensus_pointers():
+                    return False
+                pointers = self.consensus_pointers
+        return pointers
+
+    def load_consensus_pointers(self):
+        """
+        Loads the consensus pointers from their document of the metadata collection.
+        Without the document they are built from the consensus collection, where
+        former versions flagged the last sent and last created signature rounds.
+
+        :return: are the pointers loaded
+        :rtype: bool
+        """
+        if self.consensus_pointers is None:
+            try:
+                pointers = self.db.metadata.find_one({'_id': 'consensus'})
+                if pointers is None:
+                    pointers = {'_id': 'consensus', 'last_signed': -1}
+                    for name in ('last_sent', 'last_created_sign'):
+                        flagged = self.db.consensus.find_one({name: {'$exists': True}})
+                        pointers[name] = flagged['consensus'] if flagged else None
+                    for cs in self.db.consensus.find({'signed': True}).sort('consensus', -1).limit(1):
+                        pointers['last_signed'] = cs['consensus']
+                    self.db.metadata.update({'_id': 'consensus'}, pointers, upsert=True)
+                self.consensus_pointers = pointers
+            except Exception as e:
+                self.logger.error("Could not load consensus pointers. Reason: %s", str(e))
+                return False
+        return True
+
+    def set_consensus_pointers(self, **pointers):
+        """
+        Sets consensus pointers in memory and in the metadata collection with one write
+
+        :param pointers: new values of pointers
+        :type pointers: dict
+        :return: None
+        """
+        with self.consensus_lock:
+            if not self.load_consensus_pointers():
+                raise RuntimeError("Consensus pointers are not loaded.")
+            self.db.metadata.update({'_id': 'consensus'}, {'$set': pointers}, upsert=True)
+            self.consensus_pointers.update(pointers)
+
+    def reset_consensus_pointers(self):
+        """
+        Drops the consensus pointers, they are built again on next use
+
+        :return: None
+        """
+        with self.consensus_lock:
+            self.consensus_pointers = None
+            self.db.metadata.remove({'_id': 'consensus'})
+
     def get_consensus_last_sent(self):
         """
         Gets consensus with last sent flag
 
         :return:    * Last sent consensus - if found
-                    * -1 - if it does not exist
+                    * last signed consensus or -1 - if it does not exist
                     * False - if error
         :rtype: int or bool
         """
-        try:
-            _consensus = self.db.consensus.find({'last_sent': {'$exists': True}})
-
-            if _consensus:
-                for item in _consensus:
-                    self.logger.debug("CHECK = %s", str(item))
-                    if 'consensus' in item:
-                        self.logger.debug("Get consensus last sent %s", str(item['consensus']))
-                        return item['consensus']
-            self.logger.debug("Last sent not found return last signed consensus")
-            return self.get_consensus_last_signed()
-        except Exception as e:
-            self.logger.error("Could not get last sent from consensus. Reason: %s", str(e))
-        return False
+        pointers = self.get_consensus_pointers()
+        if not pointers:
+            return False
+        if pointers['last_sent'] is not None:
+            return pointers['last_sent']
+        return pointers['last_signed']
 
     def get_consensus_last_created_sign(self):
         """
         Gets consensus with last created signature flag
 
         :return:    * Last created signature - if it was found
-                    * -1 - if it does not exist
+                    * last sent consensus - if it does not exist
                     * False - if error
         :rtype: int or bool
         """
-        try:
-            _consensus = self.db.consensus.find({'last_created_sign': {'$exists': True}})
-
-            if _consensus:
-                for item in _consensus:
-                    self.logger.debug("CHECK = %s", str(item))
-                    if 'consensus' in item:
-                        self.logger.debug("Get consensus last sent %s", str(item['consensus']))
-                        return item['consensus']
-            self.logger.debug("Last created signature not found return last sent sign")
-            return self.get_consensus_last_sent()
-        except Exception as e:
-            self.logger.error("Could not get last sent from consensus. Reason: %s", str(e))
+        pointers = self.get_consensus_pointers()
+        if not pointers:
             return False
+        if pointers['last_created_sign'] is not None:
+            return pointers['last_created_sign']
+        return self.get_consensus_last_sent()
 
     def get_consensus_last_signed(self):
         """
-        Gets last signed round from db
+        Gets last signed round
 
-        :return: last signed round or -1 if it does not exist
-        :rtype: int
+        :return: last signed round, -1 if it does not exist or False if error
+        :rtype: int or bool
         """
-        con = self.get_consensus_many(sign=True, lim=1, sort=-1)
-        if con:
-            return con[0]
-        else:
-            return -1
+        pointers = self.get_consensus_pointers()
+        if not pointers:
+            return False
+        return pointers['last_signed']
 
     def get_last_consensus(self):
         """
@@ -1365,9 +2002,16 @@ class PrismaDB(object):
         :return: was the insertion successful
         :rtype: bool
         """
+        if consensus:
+            # rounds are marked as decided only after the votes and fame they depend on are written
+            self.flush_unit_of_work()
         try:
             for con in consensus:
                 self.db.consensus.insert({'consensus': con, 'signed': signed})
+            if consensus and signed:
+                last_signed = max(consensus)
+                if last_signed > self.get_consensus_last_signed():
+                    self.set_consensus_pointers(last_signed=last_signed)
             return True
         except Exception as e:
             self.logger.error("Could not insert consensus. Reason: %s", str(e))
@@ -1405,6 +2049,8 @@ class PrismaDB(object):
                 for i in range(count):
                     self.logger.debug("Result of sign consensus %s",
                                       str(self.db.consensus.update({'signed': False}, {'$set': {'signed': True}})))
+                for cs in self.db.consensus.find({'signed': True}).sort('consensus', -1).limit(1):
+                    self.set_consensus_pointers(last_signed=cs['consensus'])
             return True
         except Exception as e:
             self.logger.error("Could not sign consensus. Reason: %s", str(e))
@@ -1422,9 +2068,7 @@ class PrismaDB(object):
         """
         try:
             self.logger.debug("Set consensus last sent con = %s", str(consensus))
-            self.db.consensus.update({'last_sent': {'$exists': True}}, {'$unset': {'last_sent': ''}})
-            self.db.consensus.update({'consensus': consensus},
-                                     {'$set': {'last_sent': True}})
+            self.set_consensus_pointers(last_sent=consensus if self.check_consensus(consensus) else None)
             return True
         except Exception as e:
             self.logger.error("Could not set consensus last sent. Reason: %s", str(e))
@@ -1442,15 +2086,104 @@ class PrismaDB(object):
         """
         try:
             self.logger.debug("Set last created signature con = %s", str(consensus))
-            self.db.consensus.update({'last_created_sign': {'$exists': True}}, {'$unset': {'last_created_sign': ''}})
-            self.db.consensus.update({'consensus': consensus},
-                                     {'$set': {'last_created_sign': True}})
+            self.set_consensus_pointers(last_created_sign=consensus if self.check_consensus(consensus) else None)
             return True
         except Exception as e:
             self.logger.error("Could not set last created signature. Reason: %s", str(e))
             self.logger.debug("Consensus:", consensus)
             return False
 
+    def get_consensus_last_pruned(self):
+        """
+        Gets last round whose events were pruned
+
+        :return: last pruned round, -1 if no round was pruned or False if error
+        :rtype: int or bool
+        """
+        pointers = self.get_consensus_pointers()
+        if not pointers:
+            return False
+        return pointers.get('last_pruned', -1)
+
+    def set_consensus_last_pruned(self, r):
+        """
+        Sets last round whose events were pruned
+
+        :param r: round num
+        :type r: int
+        :return: was the setting operation successful
+        :rtype: bool
+        """
+        try:
+            self.set_consensus_pointers(last_pruned=r)
+            return True
+        except Exception as e:
+            self.logger.error("Could not set last pruned round. Reason: %s", str(e))
+            return False
+
+    # Journal
+
+    def get_journal(self):
+        """
+        Gets the journal of the consensus step in progress from its document of the metadata collection
+
+        :return: journal, None if no step is in progress or False if error
+        :rtype: dict or None or bool
+        """
+        uow = self.get_unit_of_work()
+        if uow is not None and uow.journal is not None:
+            return dict(uow.journal)
+        try:
+            journal = self.db.metadata.find_one({'_id': 'journal'})
+            if journal is not None:
+                del journal['_id']
+            return journal
+        except Exception as e:
+            self.logger.error("Could not get journal. Reason: %s", str(e))
+        return False
+
+    def insert_journal(self, journal, buffered=True):
+        """
+        Replaces the journal of the consensus step in progress. A buffered journal is written
+        by the flush of the unit of work after events and heights.
+
+        :param journal: journal in format {'step': name, ...data of the step}
+        :type journal: dict
+        :param buffered: can the write be buffered by the unit of work
+        :type buffered: bool
+        :return: was the insertion successful
+        :rtype: bool
+        """
+        uow = self.get_unit_of_work()
+        if uow is not None:
+            if buffered:
+                uow.journal = dict(journal)
+                return True
+            uow.journal = None
+        try:
+            self.db.metadata.update({'_id': 'journal'}, dict(journal, _id='journal'), upsert=True)
+            return True
+        except Exception as e:
+            self.logger.error("Could not insert journal. Reason: %s", str(e))
+        return False
+
+    def delete_journal(self):
+        """
+        Deletes the journal when no consensus step is in progress
+
+        :return: was the delete operation successful
+        :rtype: bool
+        """
+        uow = self.get_unit_of_work()
+        if uow is not None:
+            uow.journal = None
+        try:
+            self.db.metadata.remove({'_id': 'journal'})
+            return True
+        except Exception as e:
+            self.logger.error("Could not delete journal. Reason: %s", str(e))
+        return False
+
     # Signature
 
     def get_signature(self, last_round):
@@ -1571,7 +2304,7 @@ class PrismaDB(object):
 
     # State
 
-    def get_state(self, r, for_sync=False):
+    def get_state(self, r, for_sync=False, balance=True):
         """
         Gets state by last_round
 
@@ -1579,6 +2312,8 @@ class PrismaDB(object):
         :type r: int
         :param for_sync: remove hash and signed flag from result or not
         :type for_sync: bool
+        :param balance: load balance of all wallets or only the state header
+        :type balance: bool
         :return: state (balance of all wallets)
         :rtype: dict
         """
@@ -1588,22 +2323,29 @@ class PrismaDB(object):
                 projection = {'hash': False, 'signed': False}
 
             state = self.db.state.find_one({'_id': r}, projection)
+            if state and balance:
+                state = self.join_state_balance([state])[0]
             self.logger.debug("Get state %s", str(state))
             return state
         except Exception as e:
             self.logger.error("Could not get state for round %s. Reason: %s", r, str(e))
         return False
 
-    def get_last_state(self):
+    def get_last_state(self, balance=True):
         """
         Gets the last state and round of the state.
 
-        :return:
+        :param balance: load balance of all wallets or only the state header
+        :type balance: bool
+        :return: state with the greatest last round or False if there is none
+        :rtype: dict or bool
         """
         try:
             state = list(self.db.state.find().sort('_id', -1).limit(1))
             if not state:
                 return False
+            if balance:
+                state = self.join_state_balance(state)
             return state[0]
         except Exception as e:
             self.logger.error("Could not get the last state. Reason: %s", str(e))
@@ -1622,26 +2364,77 @@ class PrismaDB(object):
         :return: list of states
         :rtype: list
         """
-        state = []
         try:
-            query = {'_id': {'$gt': gt}}
-            if signed:
-                query['signed'] = True
-
-            projection = None
-            if for_sync:
-                projection = {'hash': False, 'signed': False}
-
-            db_res = self.db.state.find(query, projection)
-            if db_res:
-                for s in db_res:
-                    state.append(s)
-            self.logger.debug("Get state MANY %s", str(state))
+            state = []
+            for batch in self.iter_states(gt, signed, for_sync):
+                state.extend(batch)
+            self.logger.debug("Get state MANY %s", state)
             return state
         except Exception as e:
             self.logger.error("Could not get state. Reason: %s", str(e))
         return False
 
+    def iter_states(self, gt=0, signed=True, for_sync=True, batch_size=10):
+        """
+        Streams states ordered by round, errors are raised to the caller
+
+        :param gt: state round for greater than
+        :type gt: int
+        :param signed: get only signed or not
+        :type signed: bool
+        :param for_sync: remove hash and signed flag from result or not
+        :type for_sync: bool
+        :param batch_size: count of states in one batch, every state holds balance of all wallets
+        :type batch_size: int
+        :return: batches of states
+        :rtype: generator
+        """
+        query = {'_id': {'$gt': gt}}
+        if signed:
+            query['signed'] = True
+
+        projection = None
+        if for_sync:
+            projection = {'hash': False, 'signed': False}
+
+        batch = []
+        for state in self.db.state.find(query, projection).sort('_id', 1).batch_size(batch_size):
+            batch.append(state)
+            if len(batch) == batch_size:
+                yield self.join_state_balance(batch)
+                batch = []
+        if batch:
+            yield self.join_state_balance(batch)
+
+    def join_state_balance(self, states):
+        """
+        Puts balance of all wallets into state headers.
+        Balance is placed right after prev_hash, so a joined state is the same
+        as the one that was hashed and inserted.
+
+        :param states: state headers
+        :type states: list
+        :return: states with balance
+        :rtype: list
+        """
+        balances = OrderedDict((state['_id'], OrderedDict()) for state in states)
+        chunks = self.db.state_balance.find({'state': {'$in': list(balances.keys())}},
+                                            {'_id': False}).sort([('state', ASCENDING), ('chunk', ASCENDING)])
+        for chunk in chunks:
+            balances[chunk['state']].update(zip(chunk['address'], chunk['balance']))
+
+        result = []
+        for state in states:
+            joined = OrderedDict()
+            for key, value in state.items():
+                joined[key] = value
+                if key == 'prev_hash':
+                    joined['balance'] = balances[state['_id']]
+            if 'balance' not in joined:
+                joined['balance'] = balances[state['_id']]
+            result.append(joined)
+        return result
+
     def get_state_balance(self, address):
         """
         Gets wallet balance by address from last state
@@ -1652,15 +2445,14 @@ class PrismaDB(object):
         :rtype: int
         """
         try:
-            db_res = self.db.state.find({'balance.' + address: {'$exists': True}},
-                                           {'_id': 0, 'balance.' + address: 1}).limit(1).sort('_id', -1)
-            if db_res:
-                for balance in db_res:
-                    self.logger.debug("Get balance for address %s from state result = %s", str(address), str(balance['balance'][address]))
-                    return balance['balance'][address]
-                else:
-                    self.logger.debug("No balance for address %s, return 0", str(address))
-                    return 0
+            db_res = self.db.state_balance.find({'address': address}, {'_id': False, 'chunk': False}) \
+                .sort('state', DESCENDING).limit(1)
+            for chunk in db_res:
+                balance = chunk['balance'][chunk['address'].index(address)]
+                self.logger.debug("Get balance for address %s from state result = %s", str(address), str(balance))
+                return balance
+            self.logger.debug("No balance for address %s, return 0", str(address))
+            return 0
         except Exception as e:
             self.logger.error("Could not get state balance. Reason: %s", str(e))
             self.logger.debug("Address: %s", address)
@@ -1674,12 +2466,9 @@ class PrismaDB(object):
         :rtype: set
         """
         try:
-            db_res = self.db.state.find().limit(1).sort('_id', -1)
-            if db_res:
-                for res in db_res:
-                    self.logger.debug("Get wallets from state %s", str(res))
-                    wallets = set(res['balance'].keys())
-                    return wallets
+            state = self.get_last_state(balance=False)
+            if state:
+                return set(self.db.state_balance.distinct('address', {'state': state['_id']}))
             return set()
         except Exception as e:
             self.logger.error("Could not get state. Reason: %s", str(e))
@@ -1687,7 +2476,9 @@ class PrismaDB(object):
 
     def insert_state(self, state, hash, signed=False):
         """
-        Inserts state into db
+        Inserts state into db.
+        Balance is stored in chunks of wallets apart from the state header,
+        the header is inserted last so a state without it is never read.
 
         :param state: state itself
         :type state: dict
@@ -1701,7 +2492,29 @@ class PrismaDB(object):
         try:
             state['hash'] = hash
             state['signed'] = signed
-            self.db.state.insert(state)
+            header = OrderedDict((key, value) for key, value in state.items() if key != 'balance')
+            with self.balance_lock:
+                if self.db.state.find_one({'_id': state['_id']}, {'_id': True}):
+                    self.logger.error("Could not insert state. Reason: duplicate (_id) state id.")
+                    return False
+                with self.balance_write():
+                    last_state = self.get_last_state()
+
+                    # chunks left by an insertion that did not finish
+                    self.db.state_balance.remove({'state': state['_id']})
+                    wallets = list(state['balance'].items())
+                    chunks = [{'state': state['_id'],
+                               'chunk': i // self.state_chunk_size,
+                               'address': [address for address, _ in wallets[i:i + self.state_chunk_size]],
+                               'balance': [balance for _, balance in wallets[i:i + self.state_chunk_size]]}
+                              for i in range(0, len(wallets), self.state_chunk_size)]
+                    if chunks:
+                        self.db.state_balance.insert_many(chunks)
+                    self.db.state.insert(header)
+
+                    # balance of a new last state replaces balance of the previous one
+                    if not last_state or state['_id'] > last_state['_id']:
+                        self.update_balance_ledger(self.get_rebase_changes(last_state, state))
             self.logger.debug("Insert into state balance = %s, hash = %s, signed = %s",
                               str(state), str(hash), str(signed))
             return True
@@ -1740,42 +2553,19 @@ class PrismaDB(object):
         """
         try:
             self.logger.debug("Delete from state less than round %s", str(round))
-            result = self.db.state.remove({'_id': {'$lt': round}, 'signed': True})
+            last_state = self.get_last_state(balance=False)
+            query = {'_id': {'$lt': round}, 'signed': True}
+            deleted = [state['_id'] for state in self.db.state.find(query, {'_id': True})]
+            result = self.db.state.remove(query)
+            self.db.state_balance.remove({'state': {'$in': deleted}})
+            if last_state and last_state['_id'] < round and last_state['signed']:
+                self.reset_balance_ledger()
             self.logger.debug("Delete from state result %s", str(result))
             return True
         except Exception as e:
             self.logger.error("Could not delete from state. Reason: %s", str(e))
         return False
 
-    def get_state_with_proof_many(self, gt):
-        db_states = self.get_state_many(gt)
-        stateunit_list = []
-        for state in db_states:
-            signatures = {}
-            for sign in self.get_signature(state['_id'])['sign']:
-                signatures[sign['verify_key']] = sign['signed']
-
-            stateunit = {
-                'state': state,
-                'signatures': signatures
-            }
-            stateunit_list.append(stateunit)
-        return stateunit_list
-
-    def get_state_with_proof(self, r):
-        db_state = self.get_state(r, True)
-
-        signatures = {}
-        for sign in self.get_signature(r)['sign']:
-            signatures[sign['verify_key']] = sign['signed']
-
-        stateunit = {
-            'state': db_state,
-            'signatures': signatures
-        }
-
-        return stateunit
-
     # Peer
 
     def get_peer(self, ip):
@@ -1798,15 +2588,31 @@ class PrismaDB(object):
         """
         peer_list = []
         try:
-            _peers = self.db.peers.find()
-            if _peers:
-                for _peer in _peers:
-                    peer_list.append(_peer)
+            for batch in self.iter_peers():
+                peer_list.extend(batch)
             return peer_list
         except Exception as e:
             self.logger.error("Could not get peers. Reason: %s", str(e))
         return False
 
+    def iter_peers(self, batch_size=1000):
+        """
+        Streams peers, errors are raised to the caller
+
+        :param batch_size: count of peers in one batch
+        :type batch_size: int
+        :return: batches of peers
+        :rtype: generator
+        """
+        batch = []
+        for peer in self.db.peers.find().batch_size(batch_size):
+            batch.append(peer)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
     def count_peers(self):
         """
         Counts number of peers before the start of events syncing.
@@ -1847,6 +2653,28 @@ class PrismaDB(object):
             self.logger.debug("Peer:", peer)
         return False
 
+    def insert_peers_many(self, peers):
+        """
+        Inserts or updates peers with one bulk write
+
+        :param peers: peers in format [{'_id', 'host', 'port', 'seen', 'latest_event'}]
+        :type peers: list
+        :return: was the insertion successful
+        :rtype: bool
+        """
+        try:
+            if peers:
+                requests = [UpdateOne({'_id': peer['_id']}, {'$set': {'seen': peer['seen'],
+                                                                      'latest_event': peer['latest_event'],
+                                                                      'host': peer['host'],
+                                                                      'port': peer['port']}}, upsert=True)
+                            for peer in peers]
+                self.db.peers.bulk_write(requests, ordered=False)
+            return True
+        except Exception as e:
+            self.logger.error("Could not insert peers. Reason: %s", str(e))
+        return False
+
     def delete_peers(self):
         """
         Deletes all peers stored in db
@@ -1870,6 +2698,23 @@ class PrismaDB(object):
             self.logger.error("Could not delete peer %s from peer table: %s", str(ip), str(e))
         return False
 
+    def delete_peers_many(self, ids):
+        """
+        Deletes peers with one query
+
+        :param ids: peer ids
+        :type ids: list
+        :return: was the delete operation successful
+        :rtype: bool
+        """
+        try:
+            if ids:
+                self.db.peers.remove({'_id': {'$in': list(ids)}})
+            return True
+        except Exception as e:
+            self.logger.error("Could not delete peers from peer table: %s", str(e))
+        return False
+
     def get_random_peer(self):
         # No usage
         try:
@@ -1884,8 +2729,10 @@ class PrismaDB(object):
 
     def get_events_by_time(self, time):
         ev_list = []
+        self.flush_unit_of_work()
         try:
             for event in self.db.events.find({'event.t': {'$gt': time}}):
+                event['_id'] = self.common.bin_to_hash(event['_id'])
                 ev_list.append(event)
             return ev_list
         except Exception as e:
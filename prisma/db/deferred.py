@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 Prisma crypto currency and its Authors.
+This file is part of prisma crypto currency.
+Licensed under the GNU Lesser General Public License, version 3 or later. See LICENSING for details.
+"""
+
+import logging
+from twisted.internet import defer, reactor, threads
+from twisted.python.threadpool import ThreadPool
+
+
+class DeferredDB(object):
+    """
+    Database facade for the reactor thread, every call returns a Deferred.
+    Queries run in a bounded thread pool, so slow storage makes calls wait in the
+    queue of the pool instead of stalling the reactor. Work on the cryptograph
+    (adding events, consensus, signing states) runs in one more thread, in order.
+    With 0 threads calls run right away in the calling thread, used by tests.
+    """
+    def __init__(self, db, threads):
+        """
+        :param db: storage engine
+        :type db: BaseDB
+        :param threads: maximum count of threads running queries, 0 to run them in the calling thread
+        :type threads: int
+        """
+        self.logger = logging.getLogger('PrismaDB')
+        self.db = db
+        self.pool = None
+        self.serial_pool = None
+        if threads > 0:
+            self.pool = ThreadPool(1, threads, name='PrismaDB')
+            self.serial_pool = ThreadPool(1, 1, name='Cryptograph')
+
+    def __getattr__(self, name):
+        """
+        Methods of the storage engine, called in the thread pool.
+
+        :param name: method name
+        :type name: str
+        :return: function returning a Deferred of the method result
+        :rtype: function
+        """
+        method = getattr(self.db, name)
+
+        def call(*args, **kwargs):
+            return self.defer(method, *args, **kwargs)
+        return call
+
+    def start(self):
+        """
+        Starts the thread pools, they are stopped when the reactor shuts down.
+
+        :return: None
+        """
+        if self.pool is None:
+            return
+        self.logger.debug("Starting database thread pool, %s threads.", self.pool.max)
+        self.pool.start()
+        self.serial_pool.start()
+        reactor.addSystemEventTrigger('during', 'shutdown', self.stop)
+
+    def stop(self):
+        """
+        Stops the thread pools, waits for running calls.
+
+        :return: None
+        """
+        if self.pool is not None and self.pool.started:
+            self.pool.stop()
+            self.serial_pool.stop()
+
+    def defer(self, f, *args, **kwargs):
+        """
+        Calls a function doing only queries in the thread pool.
+
+        :param f: function to call
+        :type f: function
+        :return: Deferred of the function result
+        :rtype: Deferred
+        """
+        if self.pool is None:
+            return defer.maybeDeferred(f, *args, **kwargs)
+        return threads.deferToThreadPool(reactor, self.pool, f, *args, **kwargs)
+
+    def defer_serial(self, f, *args, **kwargs):
+        """
+        Calls a function working on the cryptograph in its thread, one call at a time.
+
+        :param f: function to call
+        :type f: function
+        :return: Deferred of the function result
+        :rtype: Deferred
+        """
+        if self.serial_pool is None:
+            return defer.maybeDeferred(f, *args, **kwargs)
+        return threads.deferToThreadPool(reactor, self.serial_pool, f, *args, **kwargs)
+
+    def call_in_reactor(self, f, *args, **kwargs):
+        """
+        Calls a function in the reactor thread from a function called by defer_serial,
+        for example to start a job in a worker thread.
+
+        :param f: function to call
+        :type f: function
+        :return: None
+        """
+        if self.serial_pool is None:
+            f(*args, **kwargs)
+        else:
+            reactor.callFromThread(f, *args, **kwargs)
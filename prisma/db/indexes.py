@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 Prisma crypto currency and its Authors.
+This file is part of prisma crypto currency.
+Licensed under the GNU Lesser General Public License, version 3 or later. See LICENSING for details.
+"""
+
+import logging
+from collections import namedtuple, OrderedDict
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+# indexes created and dropped by one version of the database
+Migration = namedtuple('Migration', 'version create drop')
+
+
+class Index(object):
+    """
+    Index of one collection, named the way MongoDB names indexes by default.
+    """
+    def __init__(self, collection, keys, **options):
+        """
+        :param collection: collection name
+        :type collection: str
+        :param keys: list of (field, direction) pairs
+        :type keys: list
+        :param options: create_index options, for example unique or sparse
+        :type options: dict
+        """
+        self.collection = collection
+        self.keys = keys
+        self.options = options
+        self.name = '_'.join('%s_%s' % key for key in keys)
+
+    @property
+    def id(self):
+        """
+        :return: collection and name of the index
+        :rtype: tuple
+        """
+        return self.collection, self.name
+
+
+class IndexRegistry(object):
+    """
+    Declared indexes of a database schema as a list of versioned migrations.
+    The version applied last is stored in the migrations collection.
+    """
+    VERSION_ID = 'indexes'
+
+    def __init__(self, migrations):
+        """
+        :param migrations: migrations in order of version
+        :type migrations: list
+        """
+        self.logger = logging.getLogger('PrismaDB')
+        self.migrations = migrations
+        self.version = migrations[-1].version if migrations else 0
+
+        self.indexes = OrderedDict()
+        for migration in migrations:
+            for collection, name in migration.drop:
+                self.indexes.pop((collection, name), None)
+            for index in migration.create:
+                self.indexes[index.id] = index
+
+    def get_version(self, db):
+        """
+        :param db: MongoDB database
+        :type db: pymongo.database.Database
+        :return: version of indexes applied to the database, 0 if none
+        :rtype: int
+        """
+        version = db.migrations.find_one({'_id': self.VERSION_ID})
+        return version['version'] if version else 0
+
+    def migrate(self, db):
+        """
+        Drops indexes removed by migrations that were not applied yet,
+        creates all declared indexes and stores the current version.
+
+        :param db: MongoDB database
+        :type db: pymongo.database.Database
+        :return: were all indexes created
+        :rtype: bool
+        """
+        version = self.get_version(db)
+        for migration in self.migrations:
+            if migration.version <= version:
+                continue
+            self.logger.info("Migrating indexes to version %s.", migration.version)
+            for collection, name in migration.drop:
+                try:
+                    getattr(db, collection).drop_index(name)
+                except OperationFailure:
+                    # index was not created or its collection was dropped
+                    pass
+
+        result = self.create_indexes(db)
+        if result and version != self.version:
+            db.migrations.update({'_id': self.VERSION_ID}, {'$set': {'version': self.version}}, upsert=True)
+        return result
+
+    def create_indexes(self, db, collection=None):
+        """
+        Creates declared indexes, existing indexes are left as they are.
+
+        :param db: MongoDB database
+        :type db: pymongo.database.Database
+        :param collection: create indexes of this collection only
+        :type collection: str or None
+        :return: were all indexes created
+        :rtype: bool
+        """
+        result = True
+        for index in self.indexes.values():
+            if collection is not None and index.collection != collection:
+                continue
+            try:
+                self.logger.debug("Creating index %s on %s.", index.name, index.collection)
+                getattr(db, index.collection).create_index(index.keys, name=index.name, background=True,
+                                                           **index.options)
+            except Exception as e:
+                self.logger.error("Could not create index on %s collection. Reason: %s", index.collection, str(e))
+                self.logger.warning("Running a database collection without an index might impact performance.")
+                result = False
+        return result
+
+
+# indexes of collections that are the same in both schemas
+STATE_INDEXES = [
+    Index('state_balance', [('state', ASCENDING), ('chunk', ASCENDING)], unique=True),
+    Index('state_balance', [('address', ASCENDING), ('state', DESCENDING)])
+]
+
+TRANSACTION_INDEXES = [
+    Index('transactions', [('senderId', ASCENDING)]),
+    Index('transactions', [('recipientId', ASCENDING)]),
+    Index('transactions', [('round', ASCENDING)]),
+    Index('transactions', [('type', ASCENDING), ('round', ASCENDING)]),
+    Index('transactions', [('event_hash', ASCENDING)])
+]
+
+CONSENSUS_INDEXES = [
+    Index('consensus', [('consensus', ASCENDING)]),
+    Index('consensus', [('signed', ASCENDING), ('consensus', ASCENDING)]),
+    Index('consensus', [('last_sent', ASCENDING)], sparse=True),
+    Index('consensus', [('last_created_sign', ASCENDING)], sparse=True)
+]
+
+# consensus pointers moved to the metadata collection
+CONSENSUS_FLAG_INDEXES = [('consensus', 'last_sent_1'), ('consensus', 'last_created_sign_1')]
+
+# a collection per kind of data
+COLLECTIONS_INDEXES = IndexRegistry([
+    Migration(1, [
+        Index('events', [('event.t', DESCENDING)]),
+        Index('rounds', [('round_handled', ASCENDING)])
+    ] + STATE_INDEXES, []),
+    Migration(2, [
+        Index('rounds', [('round', ASCENDING)])
+    ] + TRANSACTION_INDEXES + CONSENSUS_INDEXES, []),
+    Migration(3, [], CONSENSUS_FLAG_INDEXES)
+])
+
+# a document per event in the cryptograph collection
+CONSOLIDATED_INDEXES = IndexRegistry([
+    Migration(1, [
+        Index('cryptograph', [('event.t', DESCENDING)], sparse=True),
+        Index('cryptograph', [('round', ASCENDING)], sparse=True),
+        Index('cryptograph', [('round_handled', ASCENDING)], sparse=True),
+        Index('cryptograph', [('witness', ASCENDING)], sparse=True)
+    ] + STATE_INDEXES, []),
+    Migration(2, TRANSACTION_INDEXES + CONSENSUS_INDEXES, []),
+    Migration(3, [], CONSENSUS_FLAG_INDEXES)
+])
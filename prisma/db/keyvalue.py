@@ -0,0 +1,1566 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 Prisma crypto currency and its Authors.
+This file is part of prisma crypto currency.
+Licensed under the GNU Lesser General Public License, version 3 or later. See LICENSING for details.
+"""
+
+import pickle
+import random
+import struct
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from prisma.config import CONFIG
+from prisma.db.base import BaseDB
+from prisma.cryptograph.transaction import TYPE_SIGNED_STATE, TYPE_MONEY_TRANSFER
+
+# Mongo collection: tables that store it
+COLLECTIONS = OrderedDict([
+    ('events', ('events', 'payload', 'events_by_time')),
+    ('rounds', ('rounds', 'rounds_by_round', 'rounds_by_handled')),
+    ('can_see', ('can_see',)),
+    ('height', ('height',)),
+    ('head', ('head',)),
+    ('peers', ('peers',)),
+    ('witness', ('witness',)),
+    ('famous', ('famous',)),
+    ('votes', ('votes',)),
+    ('transactions', ('transactions', 'tx_by_event', 'tx_by_round', 'tx_by_address')),
+    ('consensus', ('consensus', 'consensus_flags')),
+    ('signature', ('signature',)),
+    ('state', ('state', 'state_by_address')),
+    ('balance', ('balance',))
+])
+TABLES = [table for tables in COLLECTIONS.values() for table in tables] + ['meta']
+
+HEAD_KEY = b'head'
+TX_SEQ_KEY = b'tx_seq'
+# set when the balance table is built
+BALANCE_KEY = b'balance'
+# consensus step in progress, written with the unit of work it belongs to
+JOURNAL_KEY = b'journal'
+# last round whose events were pruned
+LAST_PRUNED_KEY = b'last_pruned'
+
+
+def int_key(n):
+    """
+    Encodes a signed integer so that byte order is numeric order
+
+    :param n: number
+    :type n: int
+    :return: 8 bytes key
+    :rtype: bytes
+    """
+    return (int(n) + 2 ** 63).to_bytes(8, 'big')
+
+
+def key_int(key):
+    """
+    Decodes the integer prefix of a key created with int_key
+
+    :param key: key
+    :type key: bytes
+    :return: number
+    :rtype: int
+    """
+    return int.from_bytes(key[:8], 'big') - 2 ** 63
+
+
+def time_key(t):
+    """
+    Encodes a (positive) timestamp so that byte order is time order
+
+    :param t: timestamp
+    :type t: float
+    :return: 8 bytes key
+    :rtype: bytes
+    """
+    return struct.pack('>d', t)
+
+
+def address_key(address):
+    """
+    Encodes a wallet address as a key prefix that no other address starts with
+
+    :param address: wallet address
+    :type address: str
+    :return: key prefix
+    :rtype: bytes
+    """
+    return address.encode('utf-8') + b'\x00'
+
+
+def successor(prefix):
+    """
+    Gets the first key greater than every key starting with prefix
+
+    :param prefix: key prefix
+    :type prefix: bytes
+    :return: key or None if there is no such key
+    :rtype: bytes or None
+    """
+    prefix = prefix.rstrip(b'\xff')
+    if not prefix:
+        return None
+    return prefix[:-1] + bytes([prefix[-1] + 1])
+
+
+class KeyValueDB(BaseDB):
+    """
+    Storage engine on top of an ordered key-value store with transactions.
+
+    Every Mongo collection is kept in one table keyed by its _id (binary hash,
+    round encoded with int_key), secondary indexes are separate tables whose
+    keys are the indexed value followed by the _id. Values are pickled.
+
+    Subclasses provide the primitives: begin_transaction, commit_transaction,
+    abort_transaction, kv_get, kv_put, kv_delete, kv_range, kv_drop and kv_count.
+    A unit of work is one write transaction, so a sync is written atomically.
+    """
+    def __init__(self, db_name):
+        """
+        Creates class instance
+
+        :param db_name: database name
+        :type db_name: str
+        :returns instance of KeyValueDB class
+        :rtype: object
+        """
+        super(KeyValueDB, self).__init__(db_name)
+        self.collections_list = list(COLLECTIONS)
+
+    # Primitives
+
+    def begin_transaction(self, write):
+        """
+        :param write: is the transaction going to write
+        :type write: bool
+        :return: transaction handle
+        """
+        raise NotImplementedError()
+
+    def commit_transaction(self, txn):
+        raise NotImplementedError()
+
+    def abort_transaction(self, txn):
+        raise NotImplementedError()
+
+    def kv_get(self, txn, table, key):
+        """
+        :return: value or None if key is not present
+        :rtype: bytes or None
+        """
+        raise NotImplementedError()
+
+    def kv_put(self, txn, table, key, value):
+        raise NotImplementedError()
+
+    def kv_delete(self, txn, table, key):
+        raise NotImplementedError()
+
+    def kv_range(self, txn, table, lo=None, hi=None, reverse=False):
+        """
+        Iterates over keys in [lo; hi) in key order
+
+        :return: iterator of (key, value)
+        :rtype: iterator
+        """
+        raise NotImplementedError()
+
+    def kv_drop(self, txn, table):
+        raise NotImplementedError()
+
+    def kv_count(self, txn, table):
+        raise NotImplementedError()
+
+    # Helpers
+
+    @contextmanager
+    def transaction(self, write=False):
+        """
+        Opens a transaction or joins the one opened in the current thread (unit of work)
+
+        :param write: is the transaction going to write
+        :type write: bool
+        :return: transaction handle
+        """
+        txn = getattr(self.local, 'txn', None)
+        if txn is not None:
+            if write and not self.local.txn_write:
+                raise RuntimeError("Write inside of a read only transaction.")
+            yield txn
+            return
+
+        txn = self.begin_transaction(write)
+        self.local.txn = txn
+        self.local.txn_write = write
+        try:
+            yield txn
+        except Exception:
+            self.local.txn = None
+            self.abort_transaction(txn)
+            raise
+        self.local.txn = None
+        self.commit_transaction(txn)
+
+    def get(self, txn, table, key, default=None):
+        value = self.kv_get(txn, table, key)
+        if value is None:
+            return default
+        return pickle.loads(value)
+
+    def put(self, txn, table, key, value):
+        self.kv_put(txn, table, key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+    def items(self, txn, table, lo=None, hi=None, reverse=False):
+        for key, value in self.kv_range(txn, table, lo, hi, reverse):
+            yield key, pickle.loads(value)
+
+    def keys(self, txn, table, lo=None, hi=None, reverse=False):
+        return [key for key, _ in self.kv_range(txn, table, lo, hi, reverse)]
+
+    def first(self, txn, table, lo=None, hi=None, reverse=False):
+        for item in self.items(txn, table, lo, hi, reverse):
+            return item
+        return None
+
+    # Unit of work
+
+    def get_unit_of_work(self):
+        if getattr(self.local, 'unit_of_work', False):
+            return self.local.txn
+        return None
+
+    def begin_unit_of_work(self):
+        """
+        Opens a write transaction that is kept until the unit of work is committed.
+        Reads of the current thread see its writes, other threads see them after commit.
+
+        :return: None
+        """
+        if getattr(self.local, 'txn', None) is None:
+            self.local.txn = self.begin_transaction(True)
+            self.local.txn_write = True
+            self.local.unit_of_work = True
+
+    def commit_unit_of_work(self):
+        """
+        Commits the transaction of the unit of work
+
+        :return: was the commit successful
+        :rtype: bool
+        """
+        txn = self.get_unit_of_work()
+        if txn is None:
+            return True
+        self.local.txn = None
+        self.local.unit_of_work = False
+        try:
+            self.commit_transaction(txn)
+            return True
+        except Exception as e:
+            self.logger.error("Could not commit unit of work. Reason: %s", str(e))
+        return False
+
+    def discard_unit_of_work(self):
+        """
+        Aborts the transaction of the unit of work
+
+        :return: None
+        """
+        txn = self.get_unit_of_work()
+        if txn is not None:
+            self.local.txn = None
+            self.local.unit_of_work = False
+            self.abort_transaction(txn)
+
+    # Database
+
+    def create_indexes(self):
+        """
+        Indexes are tables maintained on every write, nothing to create.
+
+        :return: None
+        """
+        pass
+
+    def destroy_db(self, name=None):
+        return self.drop_collections_many()
+
+    def create_collections(self):
+        return True
+
+    def drop_collections_many(self, exceptions=[]):
+        for collection_name in self.collections_list:
+            if collection_name not in exceptions:
+                if not self.drop_collection(collection_name):
+                    return False
+        return True
+
+    def drop_collection(self, collection_name):
+        try:
+            with self.transaction(write=True) as txn:
+                for table in COLLECTIONS[collection_name]:
+                    self.kv_drop(txn, table)
+                # the balance ledger is built from transactions and the last state
+                if collection_name in ('transactions', 'state', 'balance'):
+                    self._reset_balances(txn)
+            return True
+        except Exception as e:
+            self.logger.error('Could not delete collection: %s. Reason: %s', collection_name, str(e))
+        return False
+
+    def is_running(self):
+        return True
+
+    # Events
+
+    def get_event(self, event_id, as_tuple=True, clear_parent=False, payload=True):
+        """
+        Gets one event, metadata and transaction list (d) are stored separately
+
+        :param event_id: event id (hash)
+        :type event_id: str
+        :param as_tuple: returns result as named tuple or as dict
+        :type as_tuple: bool
+        :param clear_parent: removes parents if they were signed or doesn't remove them
+        :type clear_parent: bool
+        :param payload: load the transaction list (d) or return d as None
+        :type payload: bool
+        :return: Event or False if error
+        :rtype: named tuple, dict or bool
+        """
+        try:
+            cg_dict = {}
+            with self.transaction() as txn:
+                bin_id = self.common.hash_to_bin(event_id)
+                event = self.get(txn, 'events', bin_id)
+                if event is None:
+                    return False if as_tuple else cg_dict
+                event['d'] = self.get(txn, 'payload', bin_id) if payload else None
+
+                if clear_parent:
+                    last_signed = self.get_consensus_last_signed()
+                    new_parents_list = []
+                    for p in event['p']:
+                        rnd = self.get_round(p)
+                        if rnd == -1:
+                            self.logger.error("Could not find hash in rounds !")
+                            return False
+                        if rnd > last_signed:
+                            new_parents_list.append(p)
+                    event['p'] = new_parents_list
+
+            cg_dict[event_id] = event
+            if as_tuple:
+                return self.common.dict_to_tuple(cg_dict)[event_id]
+            return cg_dict
+        except Exception as e:
+            self.logger.error("Could not get event. Reason: %s", str(e))
+            self.logger.debug("Event: %s", str(event_id))
+        return False
+
+    def get_events_many(self, as_tuple=True):
+        cg_dict = {}
+        try:
+            with self.transaction() as txn:
+                for key in self.keys(txn, 'events_by_time'):
+                    bin_id = key[8:]
+                    event = self.get(txn, 'events', bin_id)
+                    event['d'] = self.get(txn, 'payload', bin_id)
+                    cg_dict[self.common.bin_to_hash(bin_id)] = event
+        except Exception as e:
+            self.logger.error("Could not get events. Reason: %s", str(e))
+            return cg_dict
+
+        if as_tuple and len(cg_dict) > 0:
+            return self.common.dict_to_tuple(cg_dict)
+        return cg_dict
+
+    def get_events_by_hash(self, hash_list, batch_size=1000):
+        try:
+            events = {}
+            with self.transaction() as txn:
+                for h in hash_list:
+                    bin_id = self.common.hash_to_bin(h)
+                    event = self.get(txn, 'events', bin_id)
+                    if event is not None:
+                        event['d'] = self.get(txn, 'payload', bin_id)
+                        events[h] = event
+            return events
+        except Exception as e:
+            self.logger.error("Could not get events. Reason: %s", str(e))
+        return False
+
+    def get_events_by_time(self, time):
+        ev_list = []
+        try:
+            with self.transaction() as txn:
+                for key in self.keys(txn, 'events_by_time', time_key(time)):
+                    bin_id = key[8:]
+                    event = self.get(txn, 'events', bin_id)
+                    if event['t'] > time:
+                        event['d'] = self.get(txn, 'payload', bin_id)
+                        ev_list.append({'_id': self.common.bin_to_hash(bin_id), 'event': event})
+            return ev_list
+        except Exception as e:
+            self.logger.error("Could not retrieve events based on time. Reason: %s", str(e))
+        return False
+
+    def get_latest_event_time(self):
+        try:
+            with self.transaction() as txn:
+                for key in self.keys(txn, 'events_by_time', reverse=True)[:1]:
+                    return struct.unpack('>d', key[:8])[0]
+            return 0.0
+        except Exception as e:
+            self.logger.error("Could not retrieve latest event timestamp. Reason: %s", str(e))
+        return False
+
+    def insert_event(self, event):
+        try:
+            if event:
+                with self.transaction(write=True) as txn:
+                    for ev_id, ev in event.items():
+                        bin_id = self.common.hash_to_bin(ev_id)
+                        if self.kv_get(txn, 'events', bin_id) is not None:
+                            self.logger.error("Could not insert event. Reason: duplicate (_id) event id.")
+                            return False
+                        ev_dict = self.common.tuple_to_dict(ev)
+                        self.put(txn, 'payload', bin_id, ev_dict.pop('d'))
+                        self.put(txn, 'events', bin_id, ev_dict)
+                        self.kv_put(txn, 'events_by_time', time_key(ev_dict['t']) + bin_id, b'')
+                return True
+        except Exception as e:
+            self.logger.error("Could not insert event(s). Reason: %s", str(e))
+        return False
+
+    def delete_event(self, h):
+        try:
+            with self.transaction(write=True) as txn:
+                self._delete_event(txn, self.common.hash_to_bin(h))
+            return True
+        except Exception as e:
+            self.logger.error("Delete from Event. Reason: %s", str(e))
+        return False
+
+    def _delete_event(self, txn, bin_id):
+        event = self.get(txn, 'events', bin_id)
+        if event is not None:
+            self.kv_delete(txn, 'events_by_time', time_key(event['t']) + bin_id)
+            self.kv_delete(txn, 'events', bin_id)
+            self.kv_delete(txn, 'payload', bin_id)
+
+    def delete_events_many(self, hash_list, batch_size=1000):
+        """
+        Deletes events and everything stored per event (can_see, votes, famous),
+        one transaction per batch
+
+        :param hash_list: event hashes
+        :type hash_list: list
+        :param batch_size: count of hashes deleted in one transaction
+        :type batch_size: int
+        :return: was the delete operation successful
+        :rtype: bool
+        """
+        try:
+            for i in range(0, len(hash_list), batch_size):
+                with self.transaction(write=True) as txn:
+                    for h in hash_list[i:i + batch_size]:
+                        bin_id = self.common.hash_to_bin(h)
+                        self._delete_event(txn, bin_id)
+                        self.kv_delete(txn, 'can_see', bin_id)
+                        self.kv_delete(txn, 'votes', bin_id)
+                        self.kv_delete(txn, 'famous', bin_id)
+            return True
+        except Exception as e:
+            self.logger.error("Could not delete events. Reason: %s", str(e))
+        return False
+
+    # Rounds
+
+    def get_round(self, h):
+        if h:
+            try:
+                with self.transaction() as txn:
+                    doc = self.get(txn, 'rounds', self.common.hash_to_bin(h))
+                if doc and 'round' in doc:
+                    return doc['round']
+            except Exception as e:
+                self.logger.error("Could not get round. Reason: %s", str(e))
+        return False
+
+    def _rounds_index(self, txn, index, lo=None, hi=None):
+        return {self.common.bin_to_hash(key[8:]): key_int(key) for key in self.keys(txn, index, lo, hi)}
+
+    def get_rounds_many(self, less_than=False):
+        try:
+            with self.transaction() as txn:
+                if less_than:
+                    return self._rounds_index(txn, 'rounds_by_round', hi=int_key(less_than + 1))
+                return self._rounds_index(txn, 'rounds_by_round')
+        except Exception as e:
+            self.logger.error("Could not get rounds. Reason: %s", str(e))
+        return False
+
+    def iter_rounds(self, less_than=False, start=None, batch_size=1000):
+        with self.transaction() as txn:
+            rounds = self._rounds_index(txn, 'rounds_by_round', int_key(start + 1) if start is not None else None,
+                                        int_key(less_than + 1) if less_than else None)
+        if rounds:
+            yield rounds
+
+    def get_rounds_by_hash(self, hash_list, batch_size=1000):
+        try:
+            rounds = {}
+            with self.transaction() as txn:
+                for h in hash_list:
+                    doc = self.get(txn, 'rounds', self.common.hash_to_bin(h))
+                    if doc and 'round' in doc:
+                        rounds[h] = {field: doc[field] for field in ('round', 'round_handled') if field in doc}
+            return rounds
+        except Exception as e:
+            self.logger.error("Could not get rounds. Reason: %s", str(e))
+        return False
+
+    def get_rounds_max(self):
+        try:
+            with self.transaction() as txn:
+                for key in self.keys(txn, 'rounds_by_round', reverse=True)[:1]:
+                    return key_int(key)
+            return 0
+        except Exception as e:
+            self.logger.error("Could not get max round from Round. Reason: %s", str(e))
+        return False
+
+    def get_rounds_hash_list(self, value, start=None):
+        try:
+            lo = int_key(start + 1) if start is not None else None
+            with self.transaction() as txn:
+                return list(self._rounds_index(txn, 'rounds_by_handled', lo, int_key(value + 1)))
+        except Exception as e:
+            self.logger.error("Could not get from rounds less than %s. Reason: %s", str(value), str(e))
+        return False
+
+    def get_rounds_unhandled(self):
+        try:
+            with self.transaction() as txn:
+                handled = {key[8:] for key in self.keys(txn, 'rounds_by_handled')}
+                return [self.common.bin_to_hash(key) for key in self.keys(txn, 'rounds') if key not in handled]
+        except Exception as e:
+            self.logger.error("Could not get unhandled rounds. Reason: %s", str(e))
+        return False
+
+    def get_rounds_less_than(self, r):
+        try:
+            with self.transaction() as txn:
+                return self._rounds_index(txn, 'rounds_by_round', hi=int_key(r))
+        except Exception as e:
+            self.logger.error("Could not get hash list from Rounds. Reason: %s", str(e))
+        return False
+
+    def _set_round_field(self, txn, bin_id, field, index, value, upsert):
+        doc = self.get(txn, 'rounds', bin_id)
+        if doc is None:
+            if not upsert:
+                return
+            doc = {}
+        if field in doc:
+            self.kv_delete(txn, index, int_key(doc[field]) + bin_id)
+        doc[field] = value
+        self.put(txn, 'rounds', bin_id, doc)
+        self.kv_put(txn, index, int_key(value) + bin_id, b'')
+
+    def insert_round(self, round_info):
+        try:
+            if round_info:
+                with self.transaction(write=True) as txn:
+                    for h, r in round_info.items():
+                        self._set_round_field(txn, self.common.hash_to_bin(h), 'round', 'rounds_by_round',
+                                              int(r), True)
+                return True
+        except Exception as e:
+            self.logger.error("Could not insert round. Reason: %s", str(e))
+        return False
+
+    def set_round_handled(self, round_info):
+        try:
+            if round_info:
+                with self.transaction(write=True) as txn:
+                    for h, r in round_info.items():
+                        self._set_round_field(txn, self.common.hash_to_bin(h), 'round_handled', 'rounds_by_handled',
+                                              int(r), False)
+                return True
+        except Exception as e:
+            self.logger.error("Could not set handled round. Reason: %s", str(e))
+        return False
+
+    def _delete_rounds(self, lo=None, hi=None):
+        with self.transaction(write=True) as txn:
+            for key in self.keys(txn, 'rounds_by_round', lo, hi):
+                bin_id = key[8:]
+                doc = self.get(txn, 'rounds', bin_id)
+                if 'round_handled' in doc:
+                    self.kv_delete(txn, 'rounds_by_handled', int_key(doc['round_handled']) + bin_id)
+                self.kv_delete(txn, 'rounds', bin_id)
+                self.kv_delete(txn, 'rounds_by_round', key)
+
+    def delete_round_less_than(self, value):
+        try:
+            self._delete_rounds(hi=int_key(value))
+            return True
+        except Exception as e:
+            self.logger.error("Could not delete round. Reason: %s", str(e))
+        return False
+
+    def delete_round_greater_than(self, value):
+        try:
+            self._delete_rounds(lo=int_key(value + 1))
+            return True
+        except Exception as e:
+            self.logger.error("Could not delete round. Reason: %s", str(e))
+        return False
+
+    # Can see
+
+    def get_can_see(self, event_id):
+        try:
+            if event_id:
+                with self.transaction() as txn:
+                    can_see = self.get(txn, 'can_see', self.common.hash_to_bin(event_id), {})
+                return {parent: self.common.bin_to_hash(h) for parent, h in can_see.items()}
+        except Exception as e:
+            self.logger.error("Could not get can_see. Reason: %s", str(e))
+        return False
+
+    def insert_can_see(self, can_see):
+        """
+        Inserts can see info, updates the creator keys of stored can_see
+
+        :param can_see: data in format {hash: {creator: hash}}
+        :type can_see: dict
+        :return: was the insertion successful
+        :rtype: bool
+        """
+        try:
+            if can_see:
+                with self.transaction(write=True) as txn:
+                    for see_id, items in can_see.items():
+                        if not items:
+                            continue
+                        bin_id = self.common.hash_to_bin(see_id)
+                        doc = self.get(txn, 'can_see', bin_id, {})
+                        doc.update((c, self.common.hash_to_bin(h)) for c, h in items.items())
+                        self.put(txn, 'can_see', bin_id, doc)
+                return True
+        except Exception as e:
+            self.logger.error("Could not insert can_see. Reason: %s", str(e))
+        return False
+
+    def delete_can_see(self, h):
+        try:
+            with self.transaction(write=True) as txn:
+                self.kv_delete(txn, 'can_see', self.common.hash_to_bin(h))
+            return True
+        except Exception as e:
+            self.logger.error("Could not delete from Can_see. Reason: %s", str(e))
+        return False
+
+    # Head
+
+    def get_head(self):
+        try:
+            with self.transaction() as txn:
+                head = self.get(txn, 'head', HEAD_KEY)
+            if head is not None:
+                return self.common.bin_to_hash(head)
+            return []
+        except Exception as e:
+            self.logger.error("Could not get head. Reason: %s", str(e))
+        return False
+
+    def insert_head(self, head):
+        try:
+            if head:
+                with self.transaction(write=True) as txn:
+                    self.put(txn, 'head', HEAD_KEY, self.common.hash_to_bin(head))
+                return True
+        except Exception as e:
+            self.logger.error("Could not insert head. Reason: %s", str(e))
+        return False
+
+    # Height
+
+    def get_height(self, event_id):
+        try:
+            if event_id:
+                with self.transaction() as txn:
+                    height = self.get(txn, 'height', self.common.hash_to_bin(event_id))
+                if height is not None:
+                    return height
+        except Exception as e:
+            self.logger.error("Could not get height. Reason: %s", str(e))
+        return False
+
+    def get_heights_many(self):
+        try:
+            with self.transaction() as txn:
+                return {self.common.bin_to_hash(key): height for key, height in self.items(txn, 'height')}
+        except Exception as e:
+            self.logger.error("Could not get heights. Reason: %s", str(e))
+        return False
+
+    def insert_height(self, height_info):
+        try:
+            if height_info:
+                with self.transaction(write=True) as txn:
+                    for h, height in height_info.items():
+                        self.put(txn, 'height', self.common.hash_to_bin(h), int(height))
+                return True
+        except Exception as e:
+            self.logger.error("Could not insert height. Reason: %s", str(e))
+        return False
+
+    def delete_height(self, h):
+        try:
+            with self.transaction(write=True) as txn:
+                self.kv_delete(txn, 'height', self.common.hash_to_bin(h))
+            return True
+        except Exception as e:
+            self.logger.error("Could not delete from Height. Reason: %s", str(e))
+        return False
+
+    # Witness
+
+    def get_witness(self, r):
+        try:
+            with self.transaction() as txn:
+                witness = self.get(txn, 'witness', int_key(r), {})
+            return {c: self.common.bin_to_hash(h) for c, h in witness.items()}
+        except Exception as e:
+            self.logger.error("Could not get witness. Reason: %s", str(e))
+        return False
+
+    def get_witness_max_round(self):
+        try:
+            with self.transaction() as txn:
+                for key in self.keys(txn, 'witness', reverse=True)[:1]:
+                    return key_int(key)
+            return 0
+        except Exception as e:
+            self.logger.error("Could not get max round  from Witness. Reason: %s", str(e))
+        return False
+
+    def insert_witness(self, witness_info):
+        try:
+            if witness_info:
+                with self.transaction(write=True) as txn:
+                    for r, items in witness_info.items():
+                        if items:
+                            witness = self.get(txn, 'witness', int_key(r), {})
+                            witness.update((c, self.common.hash_to_bin(h)) for c, h in items.items())
+                            self.put(txn, 'witness', int_key(r), witness)
+                return True
+        except Exception as e:
+            self.logger.error("Could not insert witness. Reason: %s", str(e))
+        return False
+
+    def delete_witnesses_less_than(self, r):
+        try:
+            with self.transaction(write=True) as txn:
+                for key in self.keys(txn, 'witness', hi=int_key(r)):
+                    self.kv_delete(txn, 'witness', key)
+            return True
+        except Exception as e:
+            self.logger.error("Could not delete from Witnesses. Reason: %s", str(e))
+        return False
+
+    # Transactions
+
+    def _transactions(self, txn):
+        return [tx for _, tx in self.items(txn, 'transactions')]
+
+    def get_transactions_many(self):
+        try:
+            with self.transaction() as txn:
+                return [key_int(key) for key in self.keys(txn, 'transactions')]
+        except Exception as e:
+            self.logger.error("Could not get transactions. Reason: %s", str(e))
+        return []
+
+    def _indexed_transactions(self, txn, index, prefix=None, lo=None, hi=None):
+        """
+        Gets transactions through an index table, the _id is the last 8 bytes of an index key
+
+        :param txn: transaction handle
+        :param index: index table
+        :type index: str
+        :param prefix: indexed value, if set lo and hi are ignored
+        :type prefix: bytes
+        :return: transactions in index order
+        :rtype: list
+        """
+        if prefix is not None:
+            lo, hi = prefix, successor(prefix)
+        return [self.get(txn, 'transactions', key[-8:]) for key in self.keys(txn, index, lo, hi)]
+
+    @staticmethod
+    def _transaction_index_keys(tx):
+        """
+        Gets keys of a transaction in the index tables: event hash (local tx), round,
+        sender and recipient (signed state tx has no address)
+
+        :param tx: transaction
+        :type tx: dict
+        :return: (index, key) pairs
+        :rtype: list
+        """
+        tx_key = int_key(tx['_id'])
+        keys = []
+        if 'event_hash' in tx:
+            keys.append(('tx_by_event', tx['event_hash'] + tx_key))
+        if 'round' in tx:
+            keys.append(('tx_by_round', int_key(tx['round']) + tx_key))
+        addresses = {tx[field] for field in ('senderId', 'recipientId') if field in tx} or {''}
+        for address in addresses:
+            keys.append(('tx_by_address', address_key(address) + tx_key))
+        return keys
+
+    def _put_transaction(self, txn, tx, old=None):
+        if old is not None:
+            for index, key in self._transaction_index_keys(old):
+                self.kv_delete(txn, index, key)
+        self.put(txn, 'transactions', int_key(tx['_id']), tx)
+        for index, key in self._transaction_index_keys(tx):
+            self.kv_put(txn, index, key, b'')
+
+    def _delete_transaction(self, txn, tx):
+        for index, key in self._transaction_index_keys(tx):
+            self.kv_delete(txn, index, key)
+        self.kv_delete(txn, 'transactions', int_key(tx['_id']))
+
+    def get_unsent_transactions_many(self, account_id):
+        transaction_list = []
+        id_list = []
+        try:
+            with self.transaction() as txn:
+                for tx in (self._indexed_transactions(txn, 'tx_by_address', address_key(account_id)) +
+                           self._indexed_transactions(txn, 'tx_by_address', address_key(''))):
+                    if 'event_hash' in tx:
+                        continue
+                    if tx.get('senderId') == account_id or tx.get('type') == TYPE_SIGNED_STATE:
+                        if 'tx_dict_hex' in tx:
+                            id_list.append(tx['_id'])
+                            transaction_list.append(tx['tx_dict_hex'])
+                        else:
+                            self.logger.error("Incorrect tx in db !")
+        except Exception as e:
+            self.logger.error("Could not get transactions. Reason: %s", str(e))
+        return id_list, transaction_list
+
+    def insert_transactions(self, tx_list):
+        """
+        Inserts prepared tx, _id of a transaction is a sequence number stored in meta
+
+        :param tx_list: transactions to be inserted
+        :type tx_list: list
+        :return: was the insertion successful
+        :rtype: bool
+        """
+        try:
+            if len(tx_list) > 0:
+                with self.transaction(write=True) as txn:
+                    self._load_balances(txn)
+                    seq = self.get(txn, 'meta', TX_SEQ_KEY, 0)
+                    tx_list = [dict(tx) for tx in tx_list]
+                    for tx in tx_list:
+                        if 'ev_hash' in tx:
+                            tx['ev_hash'] = self.common.hash_to_bin(tx['ev_hash'])
+                        seq += 1
+                        tx['_id'] = seq
+                        self._put_transaction(txn, tx)
+                    self.put(txn, 'meta', TX_SEQ_KEY, seq)
+                    self._update_balances(txn, self.get_transfer_changes(tx_list))
+            return True
+        except Exception as e:
+            self.logger.error("Could not insert transactions. Reason: %s", str(e))
+        return False
+
+    def _delete_transactions(self, match, hi_round):
+        """
+        Deletes matching transactions of rounds up to hi_round
+
+        :param match: filter of transactions
+        :type match: function
+        :param hi_round: last round
+        :type hi_round: int
+        :return: None
+        """
+        with self.transaction(write=True) as txn:
+            self._load_balances(txn)
+            deleted = [tx for tx in self._indexed_transactions(txn, 'tx_by_round', hi=int_key(hi_round + 1))
+                       if match(tx)]
+            for tx in deleted:
+                self._delete_transaction(txn, tx)
+            self._update_balances(txn, self.get_transfer_changes(deleted, -1))
+
+    def set_transaction_hash(self, tx_list):
+        try:
+            event_hash = self.get_head()
+            if event_hash:
+                with self.transaction(write=True) as txn:
+                    for tx_id in tx_list:
+                        old = self.get(txn, 'transactions', int_key(tx_id))
+                        if old is not None:
+                            tx = dict(old, event_hash=self.common.hash_to_bin(event_hash))
+                            self._put_transaction(txn, tx, old)
+                return True
+        except Exception as e:
+            self.logger.error("Could not set event hash to transaction. Reason: %s", str(e))
+        return False
+
+    def set_transaction_round(self, ev_hash, r):
+        try:
+            with self.transaction(write=True) as txn:
+                for old in self._indexed_transactions(txn, 'tx_by_event', self.common.hash_to_bin(ev_hash)):
+                    self._put_transaction(txn, dict(old, round=r), old)
+            return True
+        except Exception as e:
+            self.logger.error("Could not set round for transaction. Reason: %s", str(e))
+        return False
+
+    def delete_transaction_less_than(self, r):
+        try:
+            self._delete_transactions(lambda tx: True, r)
+            return True
+        except Exception as e:
+            self.logger.error("Could not delete transaction. Reason: %s", str(e))
+        return False
+
+    def delete_money_transfer_transaction_less_than(self, r):
+        try:
+            self._delete_transactions(lambda tx: tx.get('type') == str(TYPE_MONEY_TRANSFER), r)
+            return True
+        except Exception as e:
+            self.logger.error("Could not delete transaction. Reason: %s", str(e))
+        return False
+
+    def delete_processed_transactions(self, rounds):
+        try:
+            with self.transaction(write=True) as txn:
+                self._load_balances(txn)
+                deleted = []
+                for r in set(rounds):
+                    deleted += [tx for tx in self._indexed_transactions(txn, 'tx_by_round', int_key(r))
+                                if 'ev_hash' in tx]
+                for tx in deleted:
+                    self._delete_transaction(txn, tx)
+                self._update_balances(txn, self.get_transfer_changes(deleted, -1))
+            return True
+        except Exception as e:
+            self.logger.error("Could not delete processed transactions. Reason: %s", str(e))
+        return False
+
+    # Balance ledger
+
+    def get_transfers_balance(self, r=False):
+        try:
+            with self.transaction() as txn:
+                if r:
+                    return self.get_transfer_changes(self._indexed_transactions(
+                        txn, 'tx_by_round', lo=int_key(r[0]), hi=int_key(r[1] + 1)))
+                return self.get_transfer_changes(self._transactions(txn))
+        except Exception as e:
+            self.logger.error("Could not sum transactions balance. Reason: %s", str(e))
+        return False
+
+    @contextmanager
+    def _balance_transaction(self):
+        """
+        Opens a read transaction when the balance table is built, otherwise builds it in a write transaction
+
+        :return: transaction handle
+        """
+        with self.transaction() as txn:
+            if self.get(txn, 'meta', BALANCE_KEY):
+                yield txn
+                return
+        with self.transaction(write=True) as txn:
+            self._load_balances(txn)
+            yield txn
+
+    def get_balance_ledger(self):
+        try:
+            with self._balance_transaction() as txn:
+                return {key.decode('utf-8'): amount for key, amount in self.items(txn, 'balance')}
+        except Exception as e:
+            self.logger.error("Could not get balance ledger. Reason: %s", str(e))
+        return False
+
+    def get_ledger_balance(self, address):
+        try:
+            with self._balance_transaction() as txn:
+                return self.get(txn, 'balance', address.encode('utf-8'), 0)
+        except Exception as e:
+            self.logger.error("Could not get balance. Reason: %s", str(e))
+        return False
+
+    def _load_balances(self, txn):
+        """
+        Builds the balance table from transactions and the last state if it is not built.
+        Writes that change balance call it before they write.
+
+        :param txn: write transaction
+        :return: None
+        """
+        if not self.get(txn, 'meta', BALANCE_KEY):
+            balances = self.compute_balances()
+            if balances is False:
+                raise ValueError("Could not build balance ledger.")
+            self.kv_drop(txn, 'balance')
+            for address, amount in balances.items():
+                self.put(txn, 'balance', address.encode('utf-8'), amount)
+            self.put(txn, 'meta', BALANCE_KEY, True)
+
+    def _update_balances(self, txn, changes):
+        for address, amount in changes.items():
+            key = address.encode('utf-8')
+            self.put(txn, 'balance', key, self.get(txn, 'balance', key, 0) + amount)
+
+    def _reset_balances(self, txn):
+        self.kv_drop(txn, 'balance')
+        self.kv_delete(txn, 'meta', BALANCE_KEY)
+
+    # Votes
+
+    def get_vote(self, vote_id):
+        try:
+            if vote_id:
+                with self.transaction() as txn:
+                    vote = self.get(txn, 'votes', self.common.hash_to_bin(vote_id))
+                if vote is not None:
+                    return vote
+        except Exception as e:
+            self.logger.error("Could not get vote. Reason: %s", str(e))
+        return False
+
+    def insert_vote(self, vote):
+        try:
+            if vote:
+                with self.transaction(write=True) as txn:
+                    for vote_id, items in vote.items():
+                        if items:
+                            bin_id = self.common.hash_to_bin(vote_id)
+                            doc = self.get(txn, 'votes', bin_id, {})
+                            doc.update(items)
+                            self.put(txn, 'votes', bin_id, doc)
+                return True
+        except Exception as e:
+            self.logger.error("Could not insert Vote. Reason: %s", str(e))
+        return False
+
+    def delete_votes(self, h):
+        try:
+            with self.transaction(write=True) as txn:
+                self.kv_delete(txn, 'votes', self.common.hash_to_bin(h))
+            return True
+        except Exception as e:
+            self.logger.error("Could not delete from Votes. Reason: %s", str(e))
+        return False
+
+    # Famous
+
+    def get_famous(self, witness):
+        try:
+            if witness:
+                with self.transaction() as txn:
+                    famous = self.get(txn, 'famous', self.common.hash_to_bin(witness))
+                if famous is not None:
+                    return [famous]
+        except Exception as e:
+            self.logger.error("Could not get famous witness. Reason: %s", str(e))
+        return None
+
+    def get_famous_many(self):
+        try:
+            with self.transaction() as txn:
+                return {self.common.bin_to_hash(key): famous for key, famous in self.items(txn, 'famous')}
+        except Exception as e:
+            self.logger.error("Could not get famous witnesses. Reason: %s", str(e))
+        return False
+
+    def insert_famous(self, famous_info):
+        try:
+            if famous_info:
+                with self.transaction(write=True) as txn:
+                    for h, famous in famous_info.items():
+                        self.put(txn, 'famous', self.common.hash_to_bin(h), famous)
+                return True
+        except Exception as e:
+            self.logger.error("Could not insert Famous. Reason: %s", str(e))
+        return False
+
+    def check_famous(self, h):
+        try:
+            with self.transaction() as txn:
+                return int(self.kv_get(txn, 'famous', self.common.hash_to_bin(h)) is not None)
+        except Exception as e:
+            self.logger.error("Could not check famous. Reason: %s", str(e))
+        return False
+
+    def delete_famous(self, h):
+        try:
+            with self.transaction(write=True) as txn:
+                self.kv_delete(txn, 'famous', self.common.hash_to_bin(h))
+            return True
+        except Exception as e:
+            self.logger.error("Could not delete from Famous. Reason: %s", str(e))
+        return False
+
+    # Consensus
+
+    def get_consensus_many(self, lim=0, sign=False, sort=False):
+        result = []
+        try:
+            with self.transaction() as txn:
+                for _, cs in self.items(txn, 'consensus', reverse=sort == -1):
+                    if cs['signed'] == sign:
+                        result.append(cs['consensus'])
+                        if lim and len(result) == lim:
+                            break
+        except Exception as e:
+            self.logger.error("Could not get consensus. Reason: %s", str(e))
+        return result
+
+    def get_consensus_count(self):
+        try:
+            with self.transaction() as txn:
+                return self.kv_count(txn, 'consensus')
+        except Exception as e:
+            self.logger.error("Could not get consensus. Reason: %s", str(e))
+        return 0
+
+    def get_consensus_greater_than(self, value, lim=0):
+        result = []
+        try:
+            with self.transaction() as txn:
+                for key in self.keys(txn, 'consensus', int_key(value + 1)):
+                    result.append(key_int(key))
+                    if lim and len(result) == lim:
+                        break
+        except Exception as e:
+            self.logger.error("Could from consensus greater than value. Reason: %s", str(e))
+        return result
+
+    def _get_consensus_flag(self, flag):
+        with self.transaction() as txn:
+            return self.get(txn, 'consensus_flags', flag)
+
+    def _set_consensus_flag(self, flag, consensus):
+        with self.transaction(write=True) as txn:
+            self.kv_delete(txn, 'consensus_flags', flag)
+            if self.kv_get(txn, 'consensus', int_key(consensus)) is not None:
+                self.put(txn, 'consensus_flags', flag, consensus)
+
+    def get_consensus_last_sent(self):
+        try:
+            last_sent = self._get_consensus_flag(b'last_sent')
+            if last_sent is not None:
+                return last_sent
+            return self.get_consensus_last_signed()
+        except Exception as e:
+            self.logger.error("Could not get last sent from consensus. Reason: %s", str(e))
+        return False
+
+    def get_consensus_last_created_sign(self):
+        try:
+            last_created_sign = self._get_consensus_flag(b'last_created_sign')
+            if last_created_sign is not None:
+                return last_created_sign
+            return self.get_consensus_last_sent()
+        except Exception as e:
+            self.logger.error("Could not get last created signature from consensus. Reason: %s", str(e))
+        return False
+
+    def get_last_consensus(self):
+        try:
+            with self.transaction() as txn:
+                for key in self.keys(txn, 'consensus', reverse=True)[:1]:
+                    return key_int(key)
+            return -1
+        except Exception as e:
+            self.logger.error("Could not get consensus. Reason: %s", str(e))
+        return False
+
+    def insert_consensus(self, consensus, signed=False):
+        try:
+            if consensus:
+                with self.transaction(write=True) as txn:
+                    for con in consensus:
+                        self.put(txn, 'consensus', int_key(con), {'consensus': con, 'signed': signed})
+            return True
+        except Exception as e:
+            self.logger.error("Could not insert consensus. Reason: %s", str(e))
+        return False
+
+    def check_consensus(self, r):
+        try:
+            with self.transaction() as txn:
+                return int(self.kv_get(txn, 'consensus', int_key(r)) is not None)
+        except Exception as e:
+            self.logger.error("Could not check consensus. Reason: %s", str(e))
+        return False
+
+    def sign_consensus(self, count):
+        try:
+            if count:
+                with self.transaction(write=True) as txn:
+                    unsigned = [(key, cs) for key, cs in self.items(txn, 'consensus') if not cs['signed']]
+                    for key, cs in unsigned[:count]:
+                        cs['signed'] = True
+                        self.put(txn, 'consensus', key, cs)
+            return True
+        except Exception as e:
+            self.logger.error("Could not sign consensus. Reason: %s", str(e))
+        return False
+
+    def set_consensus_last_sent(self, consensus):
+        try:
+            self._set_consensus_flag(b'last_sent', consensus)
+            return True
+        except Exception as e:
+            self.logger.error("Could not set consensus last sent. Reason: %s", str(e))
+        return False
+
+    def set_consensus_last_created_sign(self, consensus):
+        try:
+            self._set_consensus_flag(b'last_created_sign', consensus)
+            return True
+        except Exception as e:
+            self.logger.error("Could not set last created signature. Reason: %s", str(e))
+        return False
+
+    def get_consensus_last_pruned(self):
+        try:
+            with self.transaction() as txn:
+                last_pruned = self.get(txn, 'meta', LAST_PRUNED_KEY)
+            return last_pruned if last_pruned is not None else -1
+        except Exception as e:
+            self.logger.error("Could not get last pruned round. Reason: %s", str(e))
+        return False
+
+    def set_consensus_last_pruned(self, r):
+        try:
+            with self.transaction(write=True) as txn:
+                self.put(txn, 'meta', LAST_PRUNED_KEY, r)
+            return True
+        except Exception as e:
+            self.logger.error("Could not set last pruned round. Reason: %s", str(e))
+        return False
+
+    # Journal
+
+    def get_journal(self):
+        try:
+            with self.transaction() as txn:
+                return self.get(txn, 'meta', JOURNAL_KEY)
+        except Exception as e:
+            self.logger.error("Could not get journal. Reason: %s", str(e))
+        return False
+
+    def insert_journal(self, journal, buffered=True):
+        try:
+            with self.transaction(write=True) as txn:
+                self.put(txn, 'meta', JOURNAL_KEY, journal)
+            return True
+        except Exception as e:
+            self.logger.error("Could not insert journal. Reason: %s", str(e))
+        return False
+
+    def delete_journal(self):
+        try:
+            with self.transaction(write=True) as txn:
+                self.kv_delete(txn, 'meta', JOURNAL_KEY)
+            return True
+        except Exception as e:
+            self.logger.error("Could not delete journal. Reason: %s", str(e))
+        return False
+
+    # Signature
+
+    def get_signature(self, last_round):
+        try:
+            with self.transaction() as txn:
+                sign = self.get(txn, 'signature', int_key(last_round))
+            if sign is not None:
+                return sign
+        except Exception as e:
+            self.logger.error("Could not signature for last_round = %s. Reason: %s", str(last_round), str(e))
+        return False
+
+    def get_signature_grater_than(self, last_round):
+        try:
+            with self.transaction() as txn:
+                item = self.first(txn, 'signature', int_key(last_round + 1))
+            if item:
+                return item[1]
+        except Exception as e:
+            self.logger.error("Could not signature grater than %s witness. Reason: %s", str(last_round), str(e))
+        return False
+
+    def check_if_signature_present(self, last_round, ver_key):
+        try:
+            sign = self.get_signature(last_round)
+            return bool(sign) and any(s.get('verify_key') == ver_key for s in sign.get('sign', []))
+        except Exception as e:
+            self.logger.error("Could not check if signature present. Reason: %s", str(e))
+        return True
+
+    def _update_signature(self, last_round, field, item, values=None):
+        with self.transaction(write=True) as txn:
+            sign = self.get(txn, 'signature', int_key(last_round), {'_id': last_round})
+            sign.setdefault(field, [])
+            if item not in sign[field]:
+                sign[field].append(item)
+            sign.update(values or {})
+            self.put(txn, 'signature', int_key(last_round), sign)
+
+    def insert_signature(self, signature):
+        try:
+            if signature and not self.check_if_signature_present(signature['last_round'],
+                                                                 signature['sign']['verify_key']):
+                self._update_signature(signature['last_round'], 'sign', signature['sign'],
+                                       {'hash': signature['hash']})
+                return True
+        except Exception as e:
+            self.logger.error("Could not insert signature. Reason: %s", str(e))
+        return False
+
+    def unset_unchecked_signature(self, last_round):
+        try:
+            with self.transaction(write=True) as txn:
+                sign = self.get(txn, 'signature', int_key(last_round))
+                if sign is not None and 'unchecked_pair' in sign:
+                    del sign['unchecked_pair']
+                    self.put(txn, 'signature', int_key(last_round), sign)
+            return True
+        except Exception as e:
+            self.logger.error("Could not unset unchecked in signature. Reason: %s", str(e))
+        return False
+
+    def insert_signature_unchecked(self, signature):
+        try:
+            if signature:
+                self._update_signature(signature['last_round'], 'unchecked_pair',
+                                       {signature['hash']: signature['sign']})
+                return True
+        except Exception as e:
+            self.logger.error("Could not insert unchecked signature. Reason: %s", str(e))
+        return False
+
+    # State
+
+    @staticmethod
+    def _state_for_sync(state, for_sync, balance=True):
+        if not balance:
+            state.pop('balance', None)
+        if for_sync:
+            state.pop('hash', None)
+            state.pop('signed', None)
+        return state
+
+    def get_state(self, r, for_sync=False, balance=True):
+        try:
+            with self.transaction() as txn:
+                state = self.get(txn, 'state', int_key(r))
+            if state is not None:
+                return self._state_for_sync(state, for_sync, balance)
+            return None
+        except Exception as e:
+            self.logger.error("Could not get state for round %s. Reason: %s", r, str(e))
+        return False
+
+    def get_last_state(self, balance=True):
+        try:
+            with self.transaction() as txn:
+                item = self.first(txn, 'state', reverse=True)
+            if item:
+                return self._state_for_sync(item[1], False, balance)
+        except Exception as e:
+            self.logger.error("Could not get the last state. Reason: %s", str(e))
+        return False
+
+    def get_state_many(self, gt=0, signed=True, for_sync=True):
+        try:
+            with self.transaction() as txn:
+                return [self._state_for_sync(state, for_sync)
+                        for _, state in self.items(txn, 'state', int_key(gt + 1))
+                        if not signed or state.get('signed') is True]
+        except Exception as e:
+            self.logger.error("Could not get state. Reason: %s", str(e))
+        return False
+
+    def get_state_balance(self, address):
+        try:
+            with self.transaction() as txn:
+                item = self.first(txn, 'state_by_address', address_key(address),
+                                  successor(address_key(address)), reverse=True)
+            if item:
+                return item[1]
+            return 0
+        except Exception as e:
+            self.logger.error("Could not get state balance. Reason: %s", str(e))
+        return False
+
+    def get_wallets_state(self):
+        try:
+            state = self.get_last_state()
+            if state:
+                return set(state['balance'].keys())
+            return set()
+        except Exception as e:
+            self.logger.error("Could not get state. Reason: %s", str(e))
+        return False
+
+    def insert_state(self, state, hash, signed=False):
+        try:
+            state['hash'] = hash
+            state['signed'] = signed
+            with self.transaction(write=True) as txn:
+                if self.kv_get(txn, 'state', int_key(state['_id'])) is not None:
+                    self.logger.error("Could not insert state. Reason: duplicate (_id) state id.")
+                    return False
+                self._load_balances(txn)
+                last_state = self.get_last_state()
+                self.put(txn, 'state', int_key(state['_id']), state)
+                for address, amount in state.get('balance', {}).items():
+                    self.put(txn, 'state_by_address', address_key(address) + int_key(state['_id']), amount)
+                # balance of a new last state replaces balance of the previous one
+                if not last_state or state['_id'] > last_state['_id']:
+                    self._update_balances(txn, self.get_rebase_changes(last_state, state))
+            return True
+        except Exception as e:
+            self.logger.error("Could not insert state. Reason: %s", str(e))
+        return False
+
+    def set_state_signed(self, round):
+        try:
+            with self.transaction(write=True) as txn:
+                state = self.get(txn, 'state', int_key(round))
+                if state is not None:
+                    state['signed'] = True
+                    self.put(txn, 'state', int_key(round), state)
+            return True
+        except Exception as e:
+            self.logger.error("Could set state signed. Reason: %s", str(e))
+        return False
+
+    def delete_state_less_than(self, round):
+        try:
+            with self.transaction(write=True) as txn:
+                last_state = self.get_last_state()
+                for key, state in list(self.items(txn, 'state', hi=int_key(round))):
+                    if state.get('signed') is True:
+                        self.kv_delete(txn, 'state', key)
+                        for address in state.get('balance', {}):
+                            self.kv_delete(txn, 'state_by_address', address_key(address) + key)
+                if last_state and last_state['_id'] < round and last_state['signed']:
+                    self._reset_balances(txn)
+            return True
+        except Exception as e:
+            self.logger.error("Could not delete from state. Reason: %s", str(e))
+        return False
+
+    # Peer
+
+    def get_peer(self, ip):
+        try:
+            if ip:
+                with self.transaction() as txn:
+                    return self.get(txn, 'peers', ip.encode('utf-8'))
+        except Exception as e:
+            self.logger.error("Could not get peer. Reason: %s", str(e))
+        return False
+
+    def get_peers_many(self):
+        try:
+            with self.transaction() as txn:
+                return [peer for _, peer in self.items(txn, 'peers')]
+        except Exception as e:
+            self.logger.error("Could not get peers. Reason: %s", str(e))
+        return False
+
+    def count_peers(self):
+        try:
+            with self.transaction() as txn:
+                return self.kv_count(txn, 'peers')
+        except Exception as e:
+            self.logger.error("Could not get peer count. Reason: %s", str(e))
+        return 0
+
+    def insert_peer(self, peer):
+        try:
+            if peer and '_id' in peer:
+                # host is forced to 8000 unless it's in developer mode
+                port = 8000
+                if CONFIG.getboolean('developer', 'developer_mode'):
+                    port = peer['port']
+                with self.transaction(write=True) as txn:
+                    key = peer['_id'].encode('utf-8')
+                    doc = self.get(txn, 'peers', key, {'_id': peer['_id']})
+                    doc.update({'seen': peer['seen'], 'latest_event': peer['latest_event'],
+                                'host': peer['host'], 'port': port})
+                    self.put(txn, 'peers', key, doc)
+            return True
+        except Exception as e:
+            self.logger.error("Could not insert peer. Reason: %s", str(e))
+        return False
+
+    def insert_peers_many(self, peers):
+        try:
+            if peers:
+                with self.transaction(write=True) as txn:
+                    for peer in peers:
+                        self.put(txn, 'peers', peer['_id'].encode('utf-8'),
+                                 {'_id': peer['_id'], 'seen': peer['seen'], 'latest_event': peer['latest_event'],
+                                  'host': peer['host'], 'port': peer['port']})
+            return True
+        except Exception as e:
+            self.logger.error("Could not insert peers. Reason: %s", str(e))
+        return False
+
+    def delete_peers(self):
+        return self.drop_collection('peers')
+
+    def delete_peer(self, ip):
+        try:
+            if ip:
+                with self.transaction(write=True) as txn:
+                    self.kv_delete(txn, 'peers', ip.encode('utf-8'))
+                return True
+        except Exception as e:
+            self.logger.error("Could not delete peer %s from peer table: %s", str(ip), str(e))
+        return False
+
+    def delete_peers_many(self, ids):
+        try:
+            if ids:
+                with self.transaction(write=True) as txn:
+                    for ip in ids:
+                        self.kv_delete(txn, 'peers', ip.encode('utf-8'))
+            return True
+        except Exception as e:
+            self.logger.error("Could not delete peers from peer table: %s", str(e))
+        return False
+
+    def get_random_peer(self):
+        try:
+            peer_list = self.get_peers_many()
+            if peer_list:
+                return [random.choice(peer_list)]
+            return []
+        except Exception as e:
+            self.logger.error("Could not retrieve a random peer from database. Reason: %s", str(e))
+        return False
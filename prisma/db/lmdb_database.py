@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 Prisma crypto currency and its Authors.
+This file is part of prisma crypto currency.
+Licensed under the GNU Lesser General Public License, version 3 or later. See LICENSING for details.
+"""
+
+import os
+import sys
+
+from prisma.config import CONFIG
+from prisma.db.keyvalue import KeyValueDB, TABLES
+
+
+class LmdbDB(KeyValueDB):
+    """
+    Embedded storage engine on LMDB, every table is a named LMDB database.
+    Readers never block, writers are serialized by LMDB.
+    """
+    def __init__(self, db_name):
+        """
+        Opens (or creates) the environment in [database] path/<db_name>.lmdb
+
+        :param db_name: database name
+        :type db_name: str
+        :returns instance of LmdbDB class
+        :rtype: object
+        """
+        super(LmdbDB, self).__init__(db_name)
+        try:
+            import lmdb
+        except ImportError:
+            self.logger.error("LMDB backend requires the lmdb package (pip install lmdb), exiting.")
+            sys.exit(1)
+        self.lmdb = lmdb
+
+        self.path = os.path.join(os.path.expanduser(CONFIG.get('database', 'path', fallback='~/.prisma')),
+                                 db_name + '.lmdb')
+        map_size = CONFIG.getint('database', 'map_size_mb', fallback=1024) * 1024 * 1024
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            self.env = lmdb.open(self.path, map_size=map_size, max_dbs=len(TABLES))
+            self.tables = {table: self.env.open_db(table.encode('utf-8')) for table in TABLES}
+        except Exception as e:
+            self.logger.error("Could not open LMDB environment %s. Reason: %s", self.path, str(e))
+            sys.exit(1)
+
+        self.logger.info('LMDB v%s, using database "%s".', self.get_version(), self.path)
+
+    def begin_transaction(self, write):
+        return self.env.begin(write=write)
+
+    def commit_transaction(self, txn):
+        txn.commit()
+
+    def abort_transaction(self, txn):
+        txn.abort()
+
+    def kv_get(self, txn, table, key):
+        return txn.get(key, db=self.tables[table])
+
+    def kv_put(self, txn, table, key, value):
+        txn.put(key, value, db=self.tables[table])
+
+    def kv_delete(self, txn, table, key):
+        txn.delete(key, db=self.tables[table])
+
+    def kv_range(self, txn, table, lo=None, hi=None, reverse=False):
+        cursor = txn.cursor(db=self.tables[table])
+        if not reverse:
+            found = cursor.set_range(lo) if lo is not None else cursor.first()
+            while found:
+                key = cursor.key()
+                if hi is not None and key >= hi:
+                    break
+                yield key, cursor.value()
+                found = cursor.next()
+        else:
+            if hi is not None:
+                # position on the last key before hi
+                found = cursor.prev() if cursor.set_range(hi) else cursor.last()
+            else:
+                found = cursor.last()
+            while found:
+                key = cursor.key()
+                if lo is not None and key < lo:
+                    break
+                yield key, cursor.value()
+                found = cursor.prev()
+
+    def kv_drop(self, txn, table):
+        txn.drop(self.tables[table], delete=False)
+
+    def kv_count(self, txn, table):
+        return txn.stat(self.tables[table])['entries']
+
+    def get_version(self):
+        return '.'.join(str(v) for v in self.lmdb.version())
+
+    def disconnect(self):
+        self.env.close()
+        self.logger.info('Database closed.')
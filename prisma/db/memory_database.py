@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 Prisma crypto currency and its Authors.
+This file is part of prisma crypto currency.
+Licensed under the GNU Lesser General Public License, version 3 or later. See LICENSING for details.
+"""
+
+import bisect
+import threading
+
+from prisma.db.keyvalue import KeyValueDB, TABLES
+
+
+class MemoryTransaction(object):
+    """
+    Transaction of MemoryDB, keeps the previous values of written keys to roll back on abort.
+    """
+    def __init__(self, write):
+        self.write = write
+        # (table, key, previous value or None)
+        self.undo = []
+
+
+class MemoryTable(object):
+    """
+    Table of MemoryDB: a dict and the list of its keys kept sorted.
+    """
+    def __init__(self):
+        self.data = {}
+        self.keys = []
+
+    def put(self, key, value):
+        if key not in self.data:
+            bisect.insort(self.keys, key)
+        self.data[key] = value
+
+    def delete(self, key):
+        if self.data.pop(key, None) is not None:
+            del self.keys[bisect.bisect_left(self.keys, key)]
+
+
+class MemoryDB(KeyValueDB):
+    """
+    In-memory storage engine with the semantics of the other engines,
+    for tests, simulations of many nodes and benchmarks. Nothing is persisted.
+
+    Write transactions are serialized with a lock, readers do not wait for writers
+    but see their writes before commit (as with MongoDB).
+    """
+    def __init__(self, db_name):
+        """
+        Creates class instance
+
+        :param db_name: database name
+        :type db_name: str
+        :returns instance of MemoryDB class
+        :rtype: object
+        """
+        super(MemoryDB, self).__init__(db_name)
+        self.tables = {table: MemoryTable() for table in TABLES}
+        self.write_lock = threading.Lock()
+        self.logger.info('Using in-memory database "%s".', db_name)
+
+    def begin_transaction(self, write):
+        if write:
+            self.write_lock.acquire()
+        return MemoryTransaction(write)
+
+    def commit_transaction(self, txn):
+        if txn.write:
+            txn.undo = []
+            self.write_lock.release()
+
+    def abort_transaction(self, txn):
+        if txn.write:
+            for table, key, value in reversed(txn.undo):
+                if value is None:
+                    self.tables[table].delete(key)
+                else:
+                    self.tables[table].put(key, value)
+            txn.undo = []
+            self.write_lock.release()
+
+    def kv_get(self, txn, table, key):
+        return self.tables[table].data.get(key)
+
+    def kv_put(self, txn, table, key, value):
+        txn.undo.append((table, key, self.tables[table].data.get(key)))
+        self.tables[table].put(key, value)
+
+    def kv_delete(self, txn, table, key):
+        txn.undo.append((table, key, self.tables[table].data.get(key)))
+        self.tables[table].delete(key)
+
+    def kv_range(self, txn, table, lo=None, hi=None, reverse=False):
+        t = self.tables[table]
+        start = bisect.bisect_left(t.keys, lo) if lo is not None else 0
+        end = bisect.bisect_left(t.keys, hi) if hi is not None else len(t.keys)
+        keys = t.keys[start:end]
+        if reverse:
+            keys.reverse()
+        for key in keys:
+            value = t.data.get(key)
+            if value is not None:
+                yield key, value
+
+    def kv_drop(self, txn, table):
+        t = self.tables[table]
+        txn.undo.extend((table, key, value) for key, value in t.data.items())
+        self.tables[table] = MemoryTable()
+
+    def kv_count(self, txn, table):
+        return len(self.tables[table].data)
+
+    def get_version(self):
+        return 'memory'
+
+    def disconnect(self):
+        self.logger.info('Database closed.')
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 Prisma crypto currency and its Authors.
+This file is part of prisma crypto currency.
+Licensed under the GNU Lesser General Public License, version 3 or later. See LICENSING for details.
+"""
+
+import heapq
+import logging
+import os
+import sys
+import threading
+from pymongo import monitoring
+
+# upper bounds of latency histogram buckets in milliseconds, the last bucket holds slower commands
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# fields holding the filter of a command
+FILTER_FIELDS = ('filter', 'query', 'q', 'pipeline')
+
+# modules of storage engines, their methods are reported as callers of commands
+DB_PATH = os.path.dirname(os.path.abspath(__file__))
+SKIPPED_MODULES = ('cache.py', 'query_monitor.py', 'deferred.py')
+
+
+class QueryMonitor(monitoring.CommandListener):
+    """
+    Records latency of every command sent to MongoDB in a histogram per collection and operation
+    and keeps the slowest commands with their filters and the PrismaDB methods that sent them.
+    Commands slower than the threshold are logged.
+    """
+    def __init__(self, slow_queries, slow_query_ms=0):
+        """
+        :param slow_queries: count of slowest commands that are kept
+        :type slow_queries: int
+        :param slow_query_ms: log commands slower than this, 0 disables the log
+        :type slow_query_ms: int or float
+        """
+        self.logger = logging.getLogger('PrismaDB')
+        self.slow_queries = slow_queries
+        self.slow_query_ms = slow_query_ms
+        self.lock = threading.Lock()
+        self.started_commands = {}
+        self.latency = {}
+        self.slowest = []
+        # breaks ties between commands of the same duration in the heap of slowest commands
+        self.counter = 0
+
+    @staticmethod
+    def get_caller():
+        """
+        Searches the stack of the calling thread for the storage engine method that sent a command.
+
+        :return: method name or None if it was not sent by a storage engine
+        :rtype: str or None
+        """
+        frame = sys._getframe(2)
+        while frame is not None:
+            code = frame.f_code
+            directory, module = os.path.split(code.co_filename)
+            if directory == DB_PATH and module not in SKIPPED_MODULES and not code.co_name.startswith('<'):
+                return code.co_name
+            frame = frame.f_back
+        return None
+
+    @staticmethod
+    def get_filter(command):
+        """
+        :param command: command sent to the server
+        :type command: dict
+        :return: filter of the command, statements of a write command or None
+        """
+        for field in FILTER_FIELDS:
+            if field in command:
+                return command[field]
+        for field in ('updates', 'deletes'):
+            if field in command:
+                return [statement.get('q') for statement in command[field]]
+        return None
+
+    def started(self, event):
+        name = event.command_name
+        collection = event.command.get(name)
+        if name == 'getMore':
+            collection = event.command.get('collection')
+        if not isinstance(collection, str):
+            collection = event.database_name
+        command_filter = self.get_filter(event.command)
+        with self.lock:
+            self.started_commands[(event.connection_id, event.request_id)] = (
+                collection, name, command_filter, self.get_caller())
+
+    def succeeded(self, event):
+        self.finished(event)
+
+    def failed(self, event):
+        self.finished(event)
+
+    def finished(self, event):
+        """
+        Records the duration of a command.
+
+        :param event: succeeded or failed event of a command
+        :type event: CommandSucceededEvent or CommandFailedEvent
+        :return: None
+        """
+        duration_ms = event.duration_micros / 1000.0
+        with self.lock:
+            started = self.started_commands.pop((event.connection_id, event.request_id), None)
+            if started is None:
+                return
+            collection, name, command_filter, method = started
+
+            key = collection + '.' + name
+            if key not in self.latency:
+                self.latency[key] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                                     'buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1)}
+            latency = self.latency[key]
+            latency['count'] += 1
+            latency['total_ms'] += duration_ms
+            latency['max_ms'] = max(latency['max_ms'], duration_ms)
+            bucket = 0
+            while bucket < len(LATENCY_BUCKETS_MS) and duration_ms > LATENCY_BUCKETS_MS[bucket]:
+                bucket += 1
+            latency['buckets'][bucket] += 1
+
+            if self.slow_queries > 0 and (len(self.slowest) < self.slow_queries or duration_ms > self.slowest[0][0]):
+                self.counter += 1
+                entry = (duration_ms, self.counter, key, method, command_filter)
+                if len(self.slowest) < self.slow_queries:
+                    heapq.heappush(self.slowest, entry)
+                else:
+                    heapq.heapreplace(self.slowest, entry)
+
+        if self.slow_query_ms and duration_ms >= self.slow_query_ms:
+            self.logger.warning("Slow query %s by %s took %.1f ms, filter: %s",
+                                key, method, duration_ms, str(command_filter))
+
+    def stats(self):
+        """
+        :return: latency histograms in format {collection.operation: {count, total_ms, max_ms, buckets}}
+                 with buckets as {upper bound in ms: count}, and the slowest commands, slowest first
+        :rtype: dict
+        """
+        bounds = [str(bound) for bound in LATENCY_BUCKETS_MS] + ['inf']
+        with self.lock:
+            latency = {key: {'count': value['count'],
+                             'total_ms': round(value['total_ms'], 3),
+                             'max_ms': round(value['max_ms'], 3),
+                             'buckets': dict(zip(bounds, value['buckets']))}
+                       for key, value in self.latency.items()}
+            slowest = [{'ms': round(duration_ms, 3), 'command': key, 'method': method, 'filter': str(command_filter)}
+                       for duration_ms, _, key, method, command_filter in sorted(self.slowest, reverse=True)]
+        return {'latency': latency, 'slowest': slowest}
+
+    def reset(self):
+        """
+        Clears recorded latency and slowest commands.
+
+        :return: None
+        """
+        with self.lock:
+            self.latency.clear()
+            del self.slowest[:]
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 Prisma crypto currency and its Authors.
+This file is part of prisma crypto currency.
+Licensed under the GNU Lesser General Public License, version 3 or later. See LICENSING for details.
+"""
+
+import logging
+from collections import OrderedDict
+from pymongo import monitoring
+from bson import SON
+
+# commands that can be explained
+EXPLAINED_COMMANDS = ('find', 'count', 'distinct', 'aggregate', 'update', 'delete', 'findAndModify')
+
+# write commands, with the field that holds their statements, a batch is explained statement by statement
+WRITE_COMMANDS = {'update': 'updates', 'delete': 'deletes'}
+
+# fields added by the driver that are not a part of the query
+DRIVER_FIELDS = ('lsid', '$db', '$clusterTime', '$readPreference', 'txnNumber', 'writeConcern')
+
+
+class QueryPlanChecker(monitoring.CommandListener):
+    """
+    Test mode of the MongoDB storage engine.
+    Records every query sent to the server, so they can be run through explain
+    afterwards and collection scans of big collections can be found.
+    """
+    def __init__(self, min_documents):
+        """
+        :param min_documents: collection scans of collections with fewer documents are fine
+        :type min_documents: int
+        """
+        self.logger = logging.getLogger('PrismaDB')
+        self.min_documents = min_documents
+        self.commands = OrderedDict()
+        self.checking = False
+
+    def started(self, event):
+        name = event.command_name
+        if self.checking or name not in EXPLAINED_COMMANDS:
+            return
+        command = SON((key, value) for key, value in event.command.items() if key not in DRIVER_FIELDS)
+        commands = [command]
+        if name in WRITE_COMMANDS:
+            statements = WRITE_COMMANDS[name]
+            commands = [SON(command, **{statements: [statement]}) for statement in command[statements]]
+        for command in commands:
+            self.commands.setdefault(str(command), (event.database_name, command))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    @staticmethod
+    def is_full_read(command):
+        """
+        A query without a filter and sort reads the whole collection on purpose.
+
+        :param command: recorded command
+        :type command: SON
+        :return: is it a read of the whole collection
+        :rtype: bool
+        """
+        name = next(iter(command))
+        if name == 'find':
+            return not command.get('filter') and not command.get('sort')
+        if name in ('count', 'distinct'):
+            return not command.get('query')
+        if name == 'aggregate':
+            return not command['pipeline'] or not command['pipeline'][0].get('$match')
+        if name in WRITE_COMMANDS:
+            return not command[WRITE_COMMANDS[name]][0]['q']
+        return False
+
+    @classmethod
+    def find_stage(cls, plan, stage):
+        """
+        Searches an explain result for a stage of the winning plan.
+
+        :param plan: explain result or a part of it
+        :type plan: dict or list
+        :param stage: stage name, for example COLLSCAN
+        :type stage: str
+        :return: is the stage in the plan
+        :rtype: bool
+        """
+        if isinstance(plan, dict):
+            if plan.get('stage') == stage:
+                return True
+            return any(cls.find_stage(value, stage) for key, value in plan.items() if key != 'rejectedPlans')
+        if isinstance(plan, list):
+            return any(cls.find_stage(value, stage) for value in plan)
+        return False
+
+    def check(self, client):
+        """
+        Runs every recorded query through explain.
+
+        :param client: client connected to the server the queries were sent to
+        :type client: MongoClient
+        :return: list of (collection, command) that scan a collection with at least min_documents
+        :rtype: list
+        """
+        collscans = []
+        self.checking = True
+        try:
+            for database_name, command in self.commands.values():
+                name = next(iter(command))
+                collection = command[name]
+                if self.is_full_read(command):
+                    continue
+                if client[database_name][collection].count() < self.min_documents:
+                    continue
+
+                plan = client[database_name].command('explain', command, verbosity='queryPlanner')
+                if self.find_stage(plan, 'COLLSCAN'):
+                    self.logger.warning("Collection scan on %s: %s", collection, str(command))
+                    collscans.append((collection, command))
+        finally:
+            self.checking = False
+            self.commands.clear()
+        return collscans
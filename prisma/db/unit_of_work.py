@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 Prisma crypto currency and its Authors.
+This file is part of prisma crypto currency.
+Licensed under the GNU Lesser General Public License, version 3 or later. See LICENSING for details.
+"""
+
+from collections import OrderedDict
+
+
+class UnitOfWork(object):
+    """
+    Writes to the cryptograph collections buffered by PrismaDB for the duration of one sync.
+
+    Data is kept in the format of the PrismaDB insert methods (hex hashes as keys),
+    so the unit is written with those methods, one bulk write per collection.
+    Consensus and transactions are not buffered, they are queried by ranges.
+    """
+    def __init__(self):
+        """
+        Create class instance
+
+        :returns instance of UnitOfWork class
+        :rtype: object
+        """
+        # hash: event dict
+        self.events = OrderedDict()
+        # hash: height
+        self.height = {}
+        # hash: round
+        self.rounds = {}
+        # hash: round when event was handled
+        self.round_handled = {}
+        # hash: {creator: hash}
+        self.can_see = {}
+        # round: {creator: hash}
+        self.witness = {}
+        # hash: {hash: vote}
+        self.votes = {}
+        # hash: is famous
+        self.famous = {}
+        self.head = None
+        # journal of the last consensus step
+        self.journal = None
+
+    def is_empty(self):
+        """
+        Checks if anything was written
+
+        :return: is empty
+        :rtype: bool
+        """
+        return not (self.events or self.height or self.rounds or self.round_handled or self.can_see
+                    or self.witness or self.votes or self.famous or self.head or self.journal)
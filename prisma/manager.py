@@ -1,4 +1,5 @@
 import logging
+import os
 from twisted.internet import reactor, error
 
 from prisma import __version__
@@ -16,7 +17,9 @@ def Prisma():
 
 from prisma.config import CONFIG
 from prisma.utils.singleton import Singleton
-from prisma.db.database import PrismaDB
+from prisma.db.archive import SegmentArchive
+from prisma.db.backend import create_db
+from prisma.db.deferred import DeferredDB
 from prisma.client.prompt import Prompt
 from prisma.crypto.crypto import Crypto
 from prisma.crypto.wallet import Wallet
@@ -24,7 +27,9 @@ from prisma.cryptograph.graph import Graph
 from prisma.cryptograph.signed_state import SignedStateManager
 from prisma.api.service import ApiService
 from prisma.network.service import NetworkService
+from prisma.network.snapshot import Snapshot
 from prisma.utils.common import Common
+from prisma.utils.memory import MemoryManager
 
 
 @Singleton
@@ -37,32 +42,50 @@ class PrismaManager:
         self.logger = logging.getLogger('Prisma')
         self.config = CONFIG
         self.db = None
+        self.deferred_db = None
+        self.archive = None
         self.wallet = None
         self.crypto = None
         self.common = None
         self.graph = None
+        self.memory = None
         self.callLater = reactor.callLater  # this is because when testing we're not using reactor
         self.api = None
         self.network = None
         self.version = __version__
 
-    def start(self, is_prompt):
+    def start(self, is_prompt, snapshot=None):
         """
         Start the app.
 
         :param is_prompt:
+        :param snapshot: snapshot file to start from, see prismad --import-snapshot
         :return:
         """
         self.logger.info('Starting Prisma v{0}'.format(self.version))
         try:
             self.common = Common()
-            self.db = PrismaDB(self.config.get('general', 'database'))
+            self.db = create_db(self.config.get('general', 'database'))
+            # calls from the reactor thread
+            self.deferred_db = DeferredDB(self.db, self.config.getint('database', 'threads', fallback=4))
+            self.deferred_db.start()
+            if self.config.getboolean('archive', 'enabled', fallback=False):
+                self.archive = SegmentArchive(os.path.join(
+                    os.path.expanduser(self.config.get('database', 'path', fallback='~/.prisma')),
+                    self.config.get('general', 'database') + '.archive'),
+                    self.config.getint('archive', 'segment_mb', fallback=64) * 1024 * 1024)
             self.wallet = Wallet()
             self.crypto = Crypto()
+            self.memory = MemoryManager()
+            self.db.register_memory(self.memory)
 
             self.graph = Graph()
             self.graph.init_graph()
             self.state_manager = SignedStateManager(self.graph)
+            if snapshot is not None and not Snapshot.import_snapshot(snapshot):
+                exit(1)
+            # blocks of rounds could have been decided before the last shutdown
+            self.state_manager.precompute_states()
 
             self.api = ApiService()
             self.network = NetworkService()
@@ -87,6 +110,8 @@ class PrismaManager:
         self.logger.debug('Stopping Prisma')
         self.network.stop()
         self.api.stop()
+        if self.archive is not None:
+            self.archive.close()
         # reactor is not running while running tests, that's why checks status
         if reactor.running:
             reactor.stop()
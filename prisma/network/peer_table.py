@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 Prisma crypto currency and its Authors.
+This file is part of prisma crypto currency.
+Licensed under the GNU Lesser General Public License, version 3 or later. See LICENSING for details.
+"""
+
+import logging
+import random
+import threading
+
+from prisma.config import CONFIG
+from prisma.manager import Prisma
+from prisma.utils.common import Common
+
+PEER_FIELDS = ('_id', 'host', 'port', 'seen', 'latest_event')
+
+
+class PeerTable(object):
+    """
+    Known peers kept in memory with the time they were last seen, peers not seen
+    for ttl seconds expire. Gossip reads and updates the table, changes are written
+    to the peers collection in batches by flush() instead of once per message.
+    """
+    def __init__(self, ttl):
+        """
+        :param ttl: seconds after the last time a peer was seen when it expires, 0 disables expiry
+        :type ttl: int
+        """
+        self.logger = logging.getLogger('PeerTable')
+        self.ttl_ms = ttl * 1000
+        self.lock = threading.Lock()
+        # _id: peer
+        self.peers = {}
+        # ids of peers changed or deleted since the last flush
+        self.changed = set()
+        self.deleted = set()
+        # all peers are deleted from db on next flush
+        self.cleared = False
+
+    def load(self):
+        """
+        Loads the peers written by a previous run, expired ones are deleted on next flush
+
+        :return: were the peers loaded
+        :rtype: bool
+        """
+        peers = Prisma().db.get_peers_many()
+        if peers is False:
+            return False
+        with self.lock:
+            for peer in peers:
+                if self.is_valid_peer(peer):
+                    self.peers[peer['_id']] = {field: peer[field] for field in PEER_FIELDS}
+            self.expire()
+        self.logger.info("Loaded %s peers.", len(self.peers))
+        return True
+
+    def add(self, peer):
+        """
+        Adds or updates a peer, a peer is never moved back to an older last seen time
+
+        :param peer: peer in format {'_id', 'host', 'port', 'seen', 'latest_event'}
+        :type peer: dict
+        :return: None
+        """
+        self.add_many([peer])
+
+    @staticmethod
+    def is_valid_peer(peer):
+        """
+        Checks that a peer has every field and a numeric last seen time
+
+        :param peer: peer received from the network
+        :type peer: dict
+        :return: is the peer valid
+        :rtype: bool
+        """
+        return (isinstance(peer, dict) and all(field in peer for field in PEER_FIELDS) and
+                isinstance(peer['_id'], str) and
+                isinstance(peer['seen'], (int, float)) and not isinstance(peer['seen'], bool))
+
+    def add_many(self, peers):
+        """
+        Adds or updates peers, invalid peers are skipped
+
+        :param peers: list of peers
+        :type peers: list
+        :return: None
+        """
+        # host is forced to 8000 unless it's in developer mode
+        developer_mode = CONFIG.getboolean('developer', 'developer_mode')
+        with self.lock:
+            for peer in peers:
+                if not self.is_valid_peer(peer):
+                    self.logger.debug("Skipping invalid peer %s", str(peer))
+                    continue
+                known = self.peers.get(peer['_id'])
+                if known is not None and known['seen'] > peer['seen']:
+                    continue
+                self.peers[peer['_id']] = {
+                    '_id': peer['_id'],
+                    'host': peer['host'],
+                    'port': peer['port'] if developer_mode else 8000,
+                    'seen': peer['seen'],
+                    'latest_event': peer['latest_event']
+                }
+                self.changed.add(peer['_id'])
+                self.deleted.discard(peer['_id'])
+
+    def remove(self, _id):
+        """
+        Removes a peer, e.g. one that could not be connected
+
+        :param _id: peer id
+        :type _id: str
+        :return: None
+        """
+        with self.lock:
+            if self.peers.pop(_id, None) is not None:
+                self.changed.discard(_id)
+                self.deleted.add(_id)
+
+    def clear(self):
+        """
+        Removes all peers
+
+        :return: None
+        """
+        with self.lock:
+            self.peers.clear()
+            self.changed.clear()
+            self.deleted.clear()
+            self.cleared = True
+
+    def expire(self):
+        """
+        Removes peers not seen for ttl seconds. Invoked with the lock held.
+
+        :return: None
+        """
+        if not self.ttl_ms:
+            return
+        oldest = Common.get_timestamp() - self.ttl_ms
+        expired = [_id for _id, peer in self.peers.items() if peer['seen'] < oldest]
+        for _id in expired:
+            del self.peers[_id]
+            self.changed.discard(_id)
+            self.deleted.add(_id)
+        if expired:
+            self.logger.debug("Expired %s peers.", len(expired))
+
+    def get_many(self):
+        """
+        :return: peer list
+        :rtype: list
+        """
+        with self.lock:
+            self.expire()
+            return [dict(peer) for peer in self.peers.values()]
+
+    def count(self):
+        """
+        :return: peer count
+        :rtype: int
+        """
+        with self.lock:
+            self.expire()
+            return len(self.peers)
+
+    def get_random(self):
+        """
+        :return: list with a random peer or an empty list
+        :rtype: list
+        """
+        with self.lock:
+            self.expire()
+            if not self.peers:
+                return []
+            return [dict(random.choice(list(self.peers.values())))]
+
+    def flush(self):
+        """
+        Writes peers changed since the last flush with one bulk write and deletes
+        removed and expired ones. Runs in a database thread.
+
+        :return: was the write successful
+        :rtype: bool
+        """
+        with self.lock:
+            self.expire()
+            cleared = self.cleared
+            changed = [dict(self.peers[_id]) for _id in self.changed]
+            deleted = list(self.deleted)
+            self.cleared = False
+            self.changed.clear()
+            self.deleted.clear()
+
+        if ((not cleared or Prisma().db.delete_peers()) and Prisma().db.delete_peers_many(deleted)
+                and Prisma().db.insert_peers_many(changed)):
+            return True
+
+        # written again on next flush
+        with self.lock:
+            self.cleared = self.cleared or cleared
+            self.changed.update(peer['_id'] for peer in changed if peer['_id'] in self.peers)
+            self.deleted.update(_id for _id in deleted if _id not in self.peers)
+        return False
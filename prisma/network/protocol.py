@@ -7,10 +7,16 @@ Licensed under the GNU Lesser General Public License, version 3 or later. See LI
 
 import logging
 import json
+import os
+import tempfile
+import types
 import zlib
 from collections import OrderedDict
+from twisted.internet import defer
+from twisted.internet.interfaces import IPushProducer
 from twisted.internet.protocol import Factory
 from twisted.protocols.basic import NetstringReceiver
+from zope.interface import implementer
 
 from prisma.manager import Prisma
 from prisma.network.validator import Validator
@@ -21,6 +27,76 @@ from prisma.network.syncevents import SyncEvents
 TIMEOUT = 5  # general timeout, of which it closes the connection
 
 
+@implementer(IPushProducer)
+class EncodedSender(object):
+    """
+    Writes a payload encoded by NetworkProtocol.encode_data to a transport as a netstring.
+    The payload is read in chunks while the transport wants more data, so it is never
+    held in memory at once.
+    """
+    CHUNK_SIZE = 2 ** 16
+
+    def __init__(self, payload, consumer):
+        """
+        :param payload: compressed json
+        :type payload: file object
+        :param consumer: transport of the peer
+        :type consumer: twisted.internet.interfaces.IConsumer
+        """
+        self.payload = payload
+        self.consumer = consumer
+        self.length = 0
+        self.paused = False
+        self.deferred = defer.Deferred()
+
+    def start(self):
+        """
+        Writes the length prefix and starts streaming the payload
+
+        :return: deferred fired with the length of the payload when it is written
+        """
+        self.payload.seek(0, os.SEEK_END)
+        self.length = self.payload.tell()
+        self.payload.seek(0)
+        self.consumer.write(str(self.length).encode() + b':')
+        self.consumer.registerProducer(self, True)
+        self.resumeProducing()
+        return self.deferred
+
+    def resumeProducing(self):
+        self.paused = False
+        while not self.paused and self.payload is not None:
+            chunk = self.payload.read(self.CHUNK_SIZE)
+            if chunk:
+                self.consumer.write(chunk)
+            else:
+                self.consumer.write(b',')
+                self.finish()
+
+    def pauseProducing(self):
+        self.paused = True
+
+    def stopProducing(self):
+        if self.payload is not None:
+            self.finish(Exception('Connection closed while sending.'))
+
+    def finish(self, error=None):
+        """
+        Closes the payload and fires the deferred
+
+        :param error: reason why the payload was not written completely
+        :type error: Exception or None
+        :return: None
+        """
+        self.payload.close()
+        self.payload = None
+        self.consumer.unregisterProducer()
+        if error is None:
+            self.deferred.callback(self.length)
+        else:
+            self.deferred.errback(error)
+
+
 class NetworkProtocol(NetstringReceiver):
     """
     This protocol will be used for communicate between peers. The methods are
@@ -68,24 +144,37 @@ class NetworkProtocol(NetstringReceiver):
             # validate
             if not self.validate.validate_method(data):
                 raise Exception('Malformed payload: not a valid method.')
-            # do the corresponding action
+            # do the corresponding action, handlers query the database in threads and return a deferred
             if data['method'] == 'get_state':
-                SyncState.handle_get_state(self, data['last_round'])
+                d = SyncState.handle_get_state(self, data['last_round'])
             elif data['method'] == 'get_state_response':
-                SyncState.handle_get_state_response(self, data['states'], data['start_data'])
+                d = SyncState.handle_get_state_response(self, data['states'], data['start_data'])
             elif data['method'] == 'get_peers':
-                SyncPeers.handle_get_peers(self, data['_id'], data['port'], data['latest_event'])
+                d = SyncPeers.handle_get_peers(self, data['_id'], data['port'], data['latest_event'])
             elif data['method'] == 'get_peers_response':
-                SyncPeers.handle_get_peers_response(self, data['peers'])
+                d = SyncPeers.handle_get_peers_response(self, data['peers'])
             elif data['method'] == 'get_events':
-                SyncEvents.handle_get_events(self, data['latest_event'], data['event_info'])
+                d = SyncEvents.handle_get_events(self, data['latest_event'], data['event_info'])
             elif data['method'] == 'get_events_response':
-                SyncEvents.handle_get_events_response(self, data['events'])
+                d = SyncEvents.handle_get_events_response(self, data['events'])
             else:
                 raise Exception('Malformed payload: not a valid method.')
         except Exception as e:
             self.logger.exception(str(e))
             self.d.errback(Exception('Error when receiving data: ' + str(e)))
+            return
+        d.addErrback(self.handler_error)
+
+    def handler_error(self, failure):
+        """
+        Errback of the sync handlers.
+
+        :param failure: failure of a handler
+        :type failure: twisted.python.failure.Failure
+        """
+        self.logger.error('Error when handling data: {0}'.format(failure.getTraceback()))
+        if self.d is not None:
+            self.d.errback(Exception('Error when receiving data: ' + failure.getErrorMessage()))
 
     def send_data(self, data):
         """
@@ -106,6 +195,92 @@ class NetworkProtocol(NetstringReceiver):
             # to acknowledge that, we will have to wait for the response.
             self.d.errback(Exception('Could not send message: {0}'.format(e)))
 
+    @classmethod
+    def encode_data(cls, data):
+        """
+        Transforms data object into compressed json piece by piece, one batch of a generator at a time.
+        The compressed json is kept in memory up to MAX_LENGTH (what a peer accepts) and in a
+        temporary file above it. Can be called in a database thread.
+
+        :param data: object, generators of dicts in it are encoded as one json object
+                     and generators of lists as one json array
+        :return: compressed json
+        :rtype: file object
+        """
+        compressor = zlib.compressobj(Prisma().config.getint('network', 'zlib_level'))
+        payload = tempfile.SpooledTemporaryFile(cls.MAX_LENGTH)
+        for part in cls.iter_json(data):
+            payload.write(compressor.compress(part.encode()))
+        payload.write(compressor.flush())
+        return payload
+
+    @classmethod
+    def iter_json(cls, data):
+        """
+        Encodes data object into json string parts.
+
+        :param data: object, generators of dicts in it are encoded as one json object
+                     and generators of lists as one json array
+        :return: json string parts
+        :rtype: generator
+        """
+        if isinstance(data, types.GeneratorType):
+            first = next(data, None)
+            if isinstance(first, list):
+                separator = '['
+                for batch in cls.chain_first(first, data):
+                    for value in batch:
+                        yield separator
+                        yield from cls.iter_json(value)
+                        separator = ', '
+                yield '[]' if separator == '[' else ']'
+                return
+            data = cls.chain_first(first, data)
+        if isinstance(data, (dict, types.GeneratorType)):
+            batches = [data.items()] if isinstance(data, dict) else (batch.items() for batch in data)
+            separator = '{'
+            for items in batches:
+                for key, value in items:
+                    yield separator + json.dumps(key if isinstance(key, str) else json.dumps(key)) + ': '
+                    yield from cls.iter_json(value)
+                    separator = ', '
+            yield '{}' if separator == '{' else '}'
+        else:
+            yield json.dumps(data)
+
+    @staticmethod
+    def chain_first(first, batches):
+        """
+        Puts back the first batch taken from a generator.
+
+        :param first: first batch or None if the generator was empty
+        :param batches: rest of the batches
+        :type batches: generator
+        :return: all batches
+        :rtype: generator
+        """
+        if first is not None:
+            yield first
+        yield from batches
+
+    def send_encoded(self, payload):
+        """
+        Sends data encoded by encode_data to the peer as a netstring, streamed in chunks.
+
+        :param payload: compressed json
+        :type payload: file object
+        :return: deferred fired when all of the payload is written
+        """
+        try:
+            d = EncodedSender(payload, self.transport).start()
+        except Exception as e:
+            payload.close()
+            self.d.errback(Exception('Could not send message: {0}'.format(e)))
+            return defer.succeed(None)
+        d.addCallback(lambda length: self.logger.debug('Sent to {0}:{1}: {2} bytes'.format(
+            self.peer.host, str(self.peer.port), length)))
+        return d
+
     def send_get_state(self):
         """
         Sends get state.
@@ -113,7 +288,7 @@ class NetworkProtocol(NetstringReceiver):
         if self.is_connected_to_myself():
             self.d.errback(Exception('Connected to myself.'))
         else:
-            SyncState.send_get_state(self)
+            SyncState.send_get_state(self).addErrback(self.handler_error)
 
     def send_get_peers(self):
         """
@@ -122,7 +297,7 @@ class NetworkProtocol(NetstringReceiver):
         if self.is_connected_to_myself():
             self.d.errback(Exception('Connected to myself.'))
         else:
-            SyncPeers.send_get_peers(self)
+            SyncPeers.send_get_peers(self).addErrback(self.handler_error)
 
     def send_get_events(self):
         """
@@ -131,7 +306,7 @@ class NetworkProtocol(NetstringReceiver):
         if self.is_connected_to_myself():
             self.d.errback(Exception('Connected to myself.'))
         else:
-            SyncEvents.send_get_events(self)
+            SyncEvents.send_get_events(self).addErrback(self.handler_error)
 
     def is_client(self):
         """
@@ -155,6 +330,14 @@ class NetworkProtocol(NetstringReceiver):
         if self.d is not None:
             self.d.errback(TimeoutError('Protocol timed out'))
 
+    def finish(self, _=None):
+        """
+        Everything ok, so do the callback and close connection.
+        """
+        if self.d is not None:
+            self.d.callback(None)
+        self.close_connection()
+
     def close_connection(self):
         """
         Closes the connection cleanly.
@@ -16,6 +16,7 @@ from twisted.internet import defer
 from prisma.manager import Prisma
 from prisma.config import CONFIG
 from prisma.network.protocol import NetworkFactory
+from prisma.network.peer_table import PeerTable
 from prisma.crypto.crypto import Crypto
 
 STATUS_INIT = 0
@@ -38,7 +39,11 @@ class NetworkService:
         self.node_id = self.get_node_id()
         self.get_peers_lc = None
         self.get_events_lc = None
+        self.flush_peers_lc = None
         self.get_peers_timer = CONFIG.getint('network', 'get_peers_timer')
+        self.flush_peers_timer = CONFIG.getint('network', 'flush_peers_timer', fallback=30)
+        # known peers, written to db every flush_peers_timer seconds
+        self.peers = PeerTable(CONFIG.getint('network', 'peer_ttl', fallback=3600))
         self.get_events_timer = CONFIG.getint('network', 'get_events_timer')
         self.timeout = CONFIG.getint('network', 'timeout')
 
@@ -51,6 +56,9 @@ class NetworkService:
         # listen to the port
         self.listener = self.reactor.listenTCP(self.listen_port, self.factory)
 
+        # peers known before the last shutdown
+        self.peers.load()
+
         # bootstrap
         self.bootstrap()
 
@@ -62,6 +70,10 @@ class NetworkService:
         self.get_events_lc = LoopingCall(lambda: self.get_events_from_random_peer())
         self.get_events_lc.start(self.get_events_timer)
 
+        # start flush_peers looping call
+        self.flush_peers_lc = LoopingCall(lambda: self.flush_peers())
+        self.flush_peers_lc.start(self.flush_peers_timer, now=False)
+
     def stop(self):
         """
         Close connections.
@@ -71,20 +83,20 @@ class NetworkService:
                 self.get_peers_lc.stop()
             if self.get_events_lc is not None:
                 self.get_events_lc.stop()
+            if self.flush_peers_lc is not None:
+                self.flush_peers_lc.stop()
+                self.peers.flush()
             self.listener.stopListening()
         except Exception as e:
             self.logger.critical('Error while stopping Prisma network: ' + str(e))
 
     def bootstrap(self):
         """
-        Delete all peers and bootstrap the peers in the config file by connecting and asking
-        them the peers they know.
+        Bootstrap the peers in the config file by connecting and asking them the peers they know.
+        Peers loaded from db are kept, expired ones were already dropped by the peer table.
         """
         self.status = STATUS_BOOTSTRAPPING
 
-        # delete first all peers
-        Prisma().db.delete_peers()
-
         # bootstrap each of the nodes
         bootstrap_nodes = json.loads(CONFIG.get('bootstrap', 'bootstrap_nodes'))
         for bootstrap in bootstrap_nodes:
@@ -128,12 +140,40 @@ class NetworkService:
             self.logger.warning('Error while connecting to {0}:{1}: {2}'.format(host, port, reason.getErrorMessage()))
         d.addErrback(connection_error)
 
+    def database_error(self, reason):
+        """
+        Errback of database calls made by the service.
+
+        :param reason: failure
+        """
+        self.logger.error('Database error: {0}'.format(reason.getErrorMessage()))
+
+    def delete_peer(self, peer_id):
+        """
+        Deletes a peer that could not be connected.
+
+        :param peer_id: id of the peer
+        """
+        self.peers.remove(peer_id)
+
+    def flush_peers(self):
+        """
+        Writes changes of the peer table to the database in a database thread.
+        """
+        Prisma().deferred_db.defer(self.peers.flush).addErrback(self.database_error)
+
     def download_state_from_random_peer(self):
         """
         This will get the state of a random peer.
         """
-        random_peer = Prisma().db.get_random_peer()
+        self.download_state_from_peer(self.peers.get_random())
+
+    def download_state_from_peer(self, random_peer):
+        """
+        Connects to a peer and asks for the state.
 
+        :param random_peer: list with the peer or an empty list
+        """
         # if list is empty
         if not random_peer:
             self.logger.info('No peers to connect to. Wait to some peer to connect with you or restart with a peer.')
@@ -170,18 +210,23 @@ class NetworkService:
             # in case of error remove the peer from the database
             addr = random_peer['host'] + ':' + str(random_peer['port'])
             self.logger.debug('Error while connecting to {0}: {1}'.format(addr, reason.getErrorMessage()))
-            Prisma().db.delete_peer(random_peer['_id'])
+            self.delete_peer(random_peer['_id'])
             # then call later again
             self.callLater(0, lambda: self.download_state_from_random_peer())
         d.addErrback(connection_error)
 
     def get_peers_from_random_peer(self):
         """
-        Gets a random a peer from the database and connects to it and asks for peers.
+        Gets a random a peer from the peer table and connects to it and asks for peers.
+        """
+        self.get_peers_from_peer(self.peers.get_random())
+
+    def get_peers_from_peer(self, random_peer):
         """
-        # get a random peer from database
-        random_peer = Prisma().db.get_random_peer()
+        Connects to a peer and asks for peers.
 
+        :param random_peer: list with the peer or an empty list
+        """
         # if list is empty
         if not random_peer:
             self.logger.info('No peers to connect to. Wait to some peer to connect with you or restart with a peer.')
@@ -217,7 +262,7 @@ class NetworkService:
             # in case of error remove the peer from the database
             addr = random_peer['host'] + ':' + str(random_peer['port'])
             self.logger.debug('Error while connecting to {0}: {1}'.format(addr, reason.getErrorMessage()))
-            Prisma().db.delete_peer(random_peer['_id'])
+            self.delete_peer(random_peer['_id'])
             # then restart timer and try again get_peers_from_random_peer
             self.get_peers_lc.reset()
             self.get_peers_from_random_peer()
@@ -225,22 +270,41 @@ class NetworkService:
 
     def get_events_from_random_peer(self):
         """
-        Gets a random a peer from the database and connects to it and asks for events.
+        Gets a random a peer from the peer table and connects to it and asks for events.
         """
         # check first if ready
         if self.status != STATUS_READY:
             self.logger.info('Not ready, still bootstrapping.')
             return
 
+        self.get_events_from_peer(self.get_events_peer())
+
+    def get_events_peer(self):
+        """
+        Gets a random peer if there are enough peers.
+
+        :return: list with the peer or an empty list
+        """
         # check that we have enough peers
-        peer_count = Prisma().db.count_peers()
+        peer_count = self.peers.count()
 
         if peer_count < 3:
             if not CONFIG.getboolean('developer', 'developer_mode') or peer_count < 1:
                 self.logger.debug('Not enough peers found in the network, skipping...')
-                return
+                return []
 
-        random_peer = Prisma().db.get_random_peer().pop()
+        return self.peers.get_random()
+
+    def get_events_from_peer(self, random_peer):
+        """
+        Connects to a peer and asks for events.
+
+        :param random_peer: list with the peer or an empty list
+        """
+        if not random_peer:
+            return
+
+        random_peer = random_peer.pop()
         host = random_peer['host']
         port = random_peer['port']
         client = TCP4ClientEndpoint(self.reactor, host, port, self.timeout)
@@ -270,7 +334,7 @@ class NetworkService:
             # in case of error remove the peer from the database
             addr = random_peer['host'] + ':' + str(random_peer['port'])
             self.logger.debug('Error while connecting to {0}: {1}'.format(addr, reason.getErrorMessage()))
-            Prisma().db.delete_peer(random_peer['_id'])
+            self.delete_peer(random_peer['_id'])
             # then restart timer and try again get_peers_from_random_peer
             self.get_events_lc.reset()
             self.get_events_from_random_peer()
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 Prisma crypto currency and its Authors.
+This file is part of prisma crypto currency.
+Licensed under the GNU Lesser General Public License, version 3 or later. See LICENSING for details.
+"""
+import gzip
+import json
+import logging
+import socket
+from collections import OrderedDict
+
+from prisma.config import CONFIG
+from prisma.manager import Prisma
+from prisma.network.syncstate import SyncState
+
+SNAPSHOT_VERSION = 1
+
+
+class Snapshot:
+    """
+    Local snapshot of the data a new node starts from, the same data as a get_state_response:
+    signed states with signatures as proof, and rounds, heights and witnesses of the last state.
+
+    Only the frontier of the last signed state is exported: rounds above the round before it
+    with heights of their events and witnesses of the last two rounds. Everything below is
+    pruned by the node and is not needed to continue from the state.
+
+    A snapshot is a gzip file of json lines. The first line holds the states and witnesses,
+    the next lines hold batches of rounds and then of heights, so neither export nor import
+    holds all rounds or heights in memory.
+    """
+
+    @staticmethod
+    def is_node_running():
+        """
+        Checks if a node listens on the network port of the configuration.
+
+        :return: is the port taken
+        :rtype: bool
+        """
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            return sock.connect_ex(('127.0.0.1', CONFIG.getint('network', 'listen_port'))) == 0
+
+    @staticmethod
+    def export_snapshot(path):
+        """
+        Writes the snapshot of the last signed state to a file.
+        The node must be stopped, the last signed round is read at the start and
+        the export fails if it changed before the end.
+
+        :param path: snapshot file
+        :type path: str
+        :return: last round of the snapshot or False if it could not be exported
+        :rtype: int or bool
+        """
+        logger = logging.getLogger('Snapshot')
+        if Snapshot.is_node_running():
+            logger.error("The node is running, stop it before exporting a snapshot.")
+            return False
+
+        db = Prisma().db
+        last_round = db.get_consensus_last_signed()
+        if last_round is False or last_round < 0:
+            logger.error("There is no signed state to export.")
+            return False
+        witnesses = {last_round: db.get_witness(last_round), last_round - 1: db.get_witness(last_round - 1)}
+        if not witnesses[last_round]:
+            logger.error("There are no witnesses of round %s to export.", last_round)
+            return False
+        # the last state may be precomputed and not signed yet
+        states = [unit for unit in db.get_state_with_proof_many(-1) if unit['state']['_id'] <= last_round]
+        if not states or states[-1]['state']['_id'] != last_round:
+            logger.error("There is no signed state of round %s to export.", last_round)
+            return False
+
+        with gzip.open(path, 'wt') as snapshot:
+            header = {
+                'snapshot': SNAPSHOT_VERSION,
+                'last_round': last_round,
+                'states': states,
+                'witnesses': witnesses
+            }
+            snapshot.write(json.dumps(header) + '\n')
+            frontier = []
+            for batch in db.iter_rounds(last_round, start=last_round - 2):
+                frontier.append(list(batch))
+                snapshot.write(json.dumps({'rounds': batch}) + '\n')
+            for hashes in frontier:
+                heights = {h: db.get_height(h) for h in hashes}
+                snapshot.write(json.dumps({'heights': {h: height for h, height in heights.items()
+                                                       if height is not False}}) + '\n')
+
+        if db.get_consensus_last_signed() != last_round:
+            logger.error("Round %s was signed while exporting, export the snapshot again.",
+                         db.get_consensus_last_signed())
+            return False
+        logger.info("Exported snapshot of round %s to %s.", last_round, path)
+        return last_round
+
+    @staticmethod
+    def read_section(path, name):
+        """
+        Reads batches of rounds or heights from a snapshot file.
+
+        :param path: snapshot file
+        :type path: str
+        :param name: rounds or heights
+        :type name: str
+        :return: batches in format {hash: value}
+        :rtype: generator
+        """
+        with gzip.open(path, 'rt') as snapshot:
+            next(snapshot)
+            for line in snapshot:
+                batch = json.loads(line)
+                if name in batch:
+                    yield batch[name]
+
+    @staticmethod
+    def import_snapshot(path):
+        """
+        Validates the states of a snapshot file like states received from a peer and
+        starts from the last of them. Called when starting, before syncing with peers.
+
+        :param path: snapshot file
+        :type path: str
+        :return: was the snapshot imported
+        :rtype: bool
+        """
+        logger = logging.getLogger('Snapshot')
+        try:
+            with gzip.open(path, 'rt') as snapshot:
+                # states are hashed as they are ordered
+                header = json.loads(next(snapshot), object_pairs_hook=OrderedDict)
+            if header.get('snapshot') != SNAPSHOT_VERSION:
+                raise Exception('unknown snapshot version {0}'.format(header.get('snapshot')))
+
+            # rounds of witnesses are strings in json, insert_witness converts them
+            start_data = {
+                'rounds': Snapshot.read_section(path, 'rounds'),
+                'heights': Snapshot.read_section(path, 'heights'),
+                'witnesses': header['witnesses']
+            }
+            result = SyncState.start_from_states(header['states'], start_data)
+        except Exception as e:
+            logger.error("Could not import snapshot %s. Reason: %s", path, str(e))
+            return False
+
+        if result is None:
+            logger.info("Snapshot of round %s is not newer than the local state.", header['last_round'])
+        elif result:
+            logger.info("Imported snapshot of round %s.", header['last_round'])
+        else:
+            logger.error("Could not validate states of snapshot %s.", path)
+        return result is not False
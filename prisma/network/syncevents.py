@@ -6,8 +6,10 @@ Licensed under the GNU Lesser General Public License, version 3 or later. See LI
 """
 
 import logging
+from twisted.internet import defer
 
 from prisma.manager import Prisma
+from prisma.cryptograph.journal import STEP_ROUNDS
 
 
 class SyncEvents:
@@ -26,17 +28,34 @@ class SyncEvents:
         remote node shall be able to sync from us.
 
         :param protocol:
+        :return: deferred fired when the request is sent
+        """
+        def send(get_events):
+            if get_events:
+                protocol.send_data(get_events)
+
+        d = Prisma().deferred_db.defer_serial(SyncEvents.get_events_request)
+        d.addCallback(send)
+        return d
+
+    @staticmethod
+    def get_events_request():
+        """
+        Gets my event info. Runs in the cryptograph thread.
+
+        :return: get_events data or None if there are no events
+        :rtype: dict or None
         """
         latest_event = Prisma().db.get_latest_event_time()
         event_info = Prisma().graph.signed_event_response()
 
         if event_info and latest_event:
-            get_events = {
+            return {
                 'method': 'get_events',
                 'latest_event': latest_event,
                 'event_info': event_info
             }
-            protocol.send_data(get_events)
+        return None
 
     @staticmethod
     def handle_get_events(protocol, latest_event, event_info):
@@ -51,13 +70,18 @@ class SyncEvents:
         :param protocol:
         :param latest_event:
         :param event_info:
+        :return: deferred fired when the response is sent
         """
-        events = Prisma().graph.local_cryptograph_response(event_info)
-        event_data = {
-            'method': 'get_events_response',
-            'events': events
-        }
-        protocol.send_data(event_data)
+        def send(events):
+            event_data = {
+                'method': 'get_events_response',
+                'events': events
+            }
+            protocol.send_data(event_data)
+
+        d = Prisma().deferred_db.defer_serial(Prisma().graph.local_cryptograph_response, event_info)
+        d.addCallback(send)
+        return d
 
     @staticmethod
     def handle_get_events_response(protocol, data):
@@ -68,13 +92,42 @@ class SyncEvents:
         :type protocol: instance of protocol
         :param data: sign of remote hash graph
         :type data: dict
+        :return: deferred fired when the connection is closed
+        :rtype: Deferred
         """
-        logger = logging.getLogger('Protocol')
-
         if not data:
-            protocol.d.callback(None)
-            protocol.close_connection()
-            return
+            protocol.finish()
+            return defer.succeed(None)
+
+        def done(new_c):
+            if new_c:
+                # States are built off the sync path, signing only uses ready ones
+                Prisma().state_manager.precompute_states()
+
+            # Maybe do the next line based on some config variable in the development section?
+            # SyncEvents.send_get_events(protocol)
+
+            # everything ok, so do the callback and close connection
+            protocol.finish()
+
+        d = Prisma().deferred_db.defer_serial(SyncEvents.add_events, protocol, data)
+        d.addCallback(done)
+        return d
+
+    @staticmethod
+    def add_events(protocol, data):
+        """
+        Adds remote events and finds consensus. Runs in the cryptograph thread.
+
+        :param protocol:
+        :type protocol: instance of protocol
+        :param data: sign of remote hash graph
+        :type data: dict
+        :return: rounds where famousness was decided
+        :rtype: list
+        """
+        logger = logging.getLogger('Protocol')
+        new_c = []
 
         remote_cg, remote_head = Prisma().graph.validate_add_event(data)
         protocol.logger.debug("sync_events_remote_cg %s", str(remote_cg))
@@ -84,36 +137,47 @@ class SyncEvents:
             id_list, transaction_list = Prisma().db.get_unsent_transactions_many(
                 Prisma().graph.keystore['address'])
 
-            # Pass signatures as payload argument to new event
-            new_remote_events = Prisma().graph.insert_new_events(remote_cg, remote_head, transaction_list)
-            logger.debug("new remote events: %s", str(new_remote_events))
+            # Steps are journaled, so a sync interrupted by a crash is recovered at next start
+            journal = Prisma().graph._journal
+            journal.begin(remote_cg.keys())
+
+            # Writes of events and consensus are buffered and written in batches
+            Prisma().db.begin_unit_of_work()
+            try:
+                # Pass signatures as payload argument to new event
+                new_remote_events = Prisma().graph.insert_new_events(remote_cg, remote_head, transaction_list)
+                logger.debug("new remote events: %s", str(new_remote_events))
+
+                if new_remote_events:
+                    journal.step(STEP_ROUNDS, events=list(new_remote_events), transactions=list(id_list))
+                    Prisma().db.set_consensus_last_sent(Prisma().db.get_consensus_last_created_sign())
+
+                    Prisma().graph._round.divide_rounds(new_remote_events)
+                    Prisma().db.set_transaction_hash(id_list)
+
+                    new_c = Prisma().graph._fame.decide_fame()
+                    Prisma().graph._order.find_order(new_c)
+            except Exception:
+                # writes of the failed sync are dropped, the next sync recovers it from the journal
+                Prisma().db.discard_unit_of_work()
+                raise
+            committed = Prisma().db.commit_unit_of_work()
+            if committed:
+                journal.commit()
 
             if new_remote_events:
-                Prisma().db.set_consensus_last_sent(Prisma().db.get_consensus_last_created_sign())
-
-                Prisma().graph._round.divide_rounds(new_remote_events)
-                Prisma().db.set_transaction_hash(id_list)
-
-                new_c = Prisma().graph._fame.decide_fame()
-                Prisma().graph._order.find_order(new_c)
-
                 # Control unsent signatures count
                 if len(new_c):
                     logger.debug("New_c is not empty ! %s", str(new_c))
 
+                # states are signed once they are precomputed
                 Prisma().graph.unsent_count += len(new_c)
 
-                # Get data(list of signatures) to send to remote
-                Prisma().state_manager.try_create_state_signatures()
+                # Keep in-memory structures within the budget
+                Prisma().memory.enforce(Prisma().graph.last_signed_state)
 
                 logger.debug("[--->FINAL RESPONSE<---]")
         # Demo for tx pool and genesis event
         logger.debug("All NODES BALANCE: %s", str(Prisma().db.get_account_balance_many()))
         logger.debug("STATE: %s", str(Prisma().db.get_last_state()))
-
-        # Maybe do the next line based on some config variable in the development section?
-        # SyncEvents.send_get_events(protocol)
-
-        # everything ok, so do the callback and close connection
-        protocol.d.callback(None)
-        protocol.close_connection()
+        return new_c
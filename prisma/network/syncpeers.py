@@ -5,6 +5,8 @@ This file is part of prisma crypto currency.
 Licensed under the GNU Lesser General Public License, version 3 or later. See LICENSING for details.
 """
 
+from twisted.internet import defer
+
 from prisma.manager import Prisma
 from prisma.utils.common import Common
 
@@ -21,26 +23,33 @@ class SyncPeers:
         Prepare and send get_peers.
 
         :param protocol:
+        :return: deferred fired when the request is sent
         """
-        request_data = {
-            'method': 'get_peers',
-            '_id': Prisma().network.node_id,
-            'port': Prisma().network.listen_port,
-            'latest_event': Prisma().db.get_latest_event_time()
-        }
-        protocol.send_data(request_data)
+        def send(latest_event):
+            request_data = {
+                'method': 'get_peers',
+                '_id': Prisma().network.node_id,
+                'port': Prisma().network.listen_port,
+                'latest_event': latest_event
+            }
+            protocol.send_data(request_data)
+
+        d = Prisma().deferred_db.get_latest_event_time()
+        d.addCallback(send)
+        return d
 
     @staticmethod
     def handle_get_peers(protocol, _id, port, latest_event):
         """
-        Add remote peer to database and send my peers.
+        Add remote peer to the peer table and send my peers.
 
         :param protocol:
         :param _id:
         :param port:
         :param latest_event:
+        :return: deferred fired when the response is sent
         """
-        # add peer to database
+        # add peer to the peer table
         data = {
             '_id': _id,
             'host': protocol.peer.host,
@@ -48,34 +57,43 @@ class SyncPeers:
             'latest_event': latest_event,
             'seen': Common.get_timestamp()
         }
-        Prisma().db.insert_peer(data)
-        # send the remote peer my known peers, including myself
-        peers_response = Prisma().db.get_peers_many()
+        d = Prisma().deferred_db.defer(SyncPeers.get_peers_response, data, protocol.host.host)
+        d.addCallback(protocol.send_data)
+        return d
+
+    @staticmethod
+    def get_peers_response(peer, host):
+        """
+        Adds the remote peer and gets my known peers, including myself. Runs in a database thread.
+
+        :param peer: remote peer
+        :param host: my host
+        :return: get_peers_response data
+        """
+        Prisma().network.peers.add(peer)
+        peers_response = Prisma().network.peers.get_many()
         peers_response.append({
             '_id': Prisma().network.node_id,
-            'host': protocol.host.host,
+            'host': host,
             'port': Prisma().network.listen_port,
             'latest_event': Prisma().db.get_latest_event_time(),
             'seen': Common.get_timestamp()
         })
-        response_data = {
+        return {
             'method': 'get_peers_response',
             'peers': peers_response
         }
-        protocol.send_data(response_data)
 
     @staticmethod
     def handle_get_peers_response(protocol, peers):
         """
-        Add peers from the response to the database. Then close connection.
+        Add peers from the response to the peer table. Then close connection.
 
         :param protocol:
         :param peers:
+        :return: deferred fired when the connection is closed
         """
-        for peer in peers:
-            if Prisma().network.node_id != peer['_id'] and protocol.validate.is_valid_node_ip(peer['host']):
-                Prisma().db.insert_peer(peer)
-
-        # everything ok, so do the callback and close connection
-        protocol.d.callback(None)
-        protocol.close_connection()
+        Prisma().network.peers.add_many([peer for peer in peers if Prisma().network.node_id != peer['_id'] and
+                                         protocol.validate.is_valid_node_ip(peer['host'])])
+        protocol.finish()
+        return defer.succeed(None)
@@ -6,6 +6,7 @@ Licensed under the GNU Lesser General Public License, version 3 or later. See LI
 """
 import json
 import collections
+from twisted.internet import defer
 
 from prisma.manager import Prisma
 
@@ -22,12 +23,18 @@ class SyncState:
         Prepare and send get_state.
 
         :param protocol:
+        :return: deferred fired when the request is sent
         """
-        request_data = {
-            'method': 'get_state',
-            'last_round': Prisma().db.get_last_state()['_id']
-        }
-        protocol.send_data(request_data)
+        def send(last_state):
+            request_data = {
+                'method': 'get_state',
+                'last_round': last_state['_id']
+            }
+            protocol.send_data(request_data)
+
+        d = Prisma().deferred_db.get_last_state(balance=False)
+        d.addCallback(send)
+        return d
 
     @staticmethod
     def handle_get_state(protocol, last_round):
@@ -36,19 +43,35 @@ class SyncState:
         
         :param last_round: last round of state that remote has
         :type last_round: int
+        :return: deferred fired when the response is sent
+        """
+        d = Prisma().deferred_db.defer(lambda: protocol.encode_data(SyncState.get_state_response(last_round)))
+        d.addCallback(protocol.send_encoded)
+        return d
+
+    @staticmethod
+    def get_state_response(last_round):
+        """
+        Gets states newer than the remote one with data to start from. States, rounds and heights
+        are streamed from the database in batches while the response is encoded. Runs in a database thread.
+
+        :param last_round: last round of state that remote has
+        :type last_round: int
+        :return: get_state_response data
+        :rtype: dict
         """
-        local_round = Prisma().db.get_last_state()['_id']
+        local_round = Prisma().db.get_last_state(balance=False)['_id']
         if local_round > last_round:
             # Gets data for new node start from db
-            rounds = Prisma().db.get_rounds_many(local_round)
+            rounds = Prisma().db.iter_rounds(local_round)
             witnesses = {local_round: Prisma().db.get_witness(local_round),
                          local_round-1: Prisma().db.get_witness(local_round-1)}
-            height = Prisma().db.get_heights_many()
+            height = Prisma().db.iter_heights()
 
             # Formats response dict
             response_data = {
                 'method': 'get_state_response',
-                'states':  Prisma().db.get_state_with_proof_many(last_round),
+                'states':  Prisma().db.iter_state_with_proof(last_round),
                 'start_data': {
                     'rounds': rounds,
                     'witnesses': witnesses,
@@ -62,7 +85,7 @@ class SyncState:
                 'states': None,
                 'start_data': None
             }
-        protocol.send_data(response_data)
+        return response_data
 
     @staticmethod
     def handle_get_state_response(protocol, states, start_data):
@@ -71,40 +94,73 @@ class SyncState:
 
         :param protocol:
         :param data:
+        :return: deferred fired when the connection is closed
         """
         protocol.logger.debug("sync_state states = %s, start_data = %s", str(states), str(start_data))
         # state is empty, we are before the first state creation!
         if not states:
-            protocol.d.callback(None)
-            protocol.close_connection()
-            return
+            protocol.finish()
+            return defer.succeed(None)
+
+        d = Prisma().deferred_db.defer_serial(SyncState.insert_states, protocol, states, start_data)
+        d.addCallback(protocol.finish)
+        return d
+
+    @staticmethod
+    def insert_states(protocol, states, start_data):
+        """
+        Validates received states and starts from the last of them. Runs in the cryptograph thread.
+
+        :param protocol:
+        :param states: received chain of states
+        :param start_data: rounds, witnesses and heights to start from
+        """
+        if SyncState.start_from_states(states, start_data) is False:
+            protocol.logger.error("Could not validate recived states, states = %s", str(states))
+            # TODO everything is NOT ok what shall we do ?
+
+    @staticmethod
+    def start_from_states(states, start_data):
+        """
+        Validates a chain of states and starts from the last of them,
+        used for states received from a peer and for imported snapshots.
 
+        :param states: chain of states with signatures as proof
+        :type states: list
+        :param start_data: rounds, witnesses and heights to start from,
+                           rounds and heights as a dict or as an iterable of dict batches
+        :type start_data: dict
+        :return: * True - if started from the last state
+                 * None - if the last state is not newer than the local one
+                 * False - if states are not valid
+        :rtype: bool or None
+        """
         # Checks if last of received states has last round greater than local one
-        last_state_id = Prisma().db.get_last_state()['_id']
-        if last_state_id < states[-1]['state']['_id']:
-            state_handle_res = Prisma().state_manager.handle_received_state_chain(states)
-
-            # If received states are successfuly validated, then inserts start_data and starts working
-            if state_handle_res:
-                # After handling received states at least one state should be inserted
-                last_state_id = Prisma().db.get_last_state()['_id']
-
-                # Clear db
-                Prisma().db.drop_collections_many(['events', 'height', 'rounds', 'head', 'state', 'signature'])
-                Prisma().db.delete_round_greater_than(last_state_id)
-
-                # Inserts start data and sets some initial values
-                Prisma().db.insert_round(start_data['rounds'])
-                Prisma().db.insert_height(start_data['heights'])
-                Prisma().db.insert_consensus([last_state_id], True)
-                Prisma().db.set_consensus_last_sent(last_state_id)
-                Prisma().graph.last_signed_state = last_state_id
-                Prisma().graph.unsent_count = 0
-                Prisma().db.insert_witness(start_data['witnesses'])
-            else:
-                protocol.logger.error("Could not validate recived states, states = %s", str(states))
-                # TODO everything is NOT ok what shall we do ?
-
-        # everything ok, so do the callback and close connection
-        protocol.d.callback(None)
-        protocol.close_connection()
+        last_state_id = Prisma().db.get_last_state(balance=False)['_id']
+        if last_state_id >= states[-1]['state']['_id']:
+            return None
+
+        # If received states are successfuly validated, then inserts start_data and starts working
+        if not Prisma().state_manager.handle_received_state_chain(states):
+            return False
+
+        # After handling received states at least one state should be inserted
+        last_state_id = Prisma().db.get_last_state(balance=False)['_id']
+
+        # Clear db
+        Prisma().db.drop_collections_many(['events', 'height', 'rounds', 'head', 'state', 'signature'])
+        Prisma().db.delete_round_greater_than(last_state_id)
+
+        # Inserts start data and sets some initial values
+        for name, insert in (('rounds', Prisma().db.insert_round), ('heights', Prisma().db.insert_height)):
+            batches = start_data[name]
+            for batch in ([batches] if isinstance(batches, dict) else batches):
+                insert(batch)
+        Prisma().db.insert_consensus([last_state_id], True)
+        Prisma().db.set_consensus_last_sent(last_state_id)
+        Prisma().graph.last_signed_state = last_state_id
+        Prisma().graph.unsent_count = 0
+        Prisma().db.insert_witness(start_data['witnesses'])
+        # consensus and famous collections were replaced
+        Prisma().graph._decided.restore()
+        return True
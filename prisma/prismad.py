@@ -44,6 +44,12 @@ def main():
     parser.add_argument('--listenport', help='what port the manager should bind to')
     parser.add_argument('--apiport', help='what port for the API should bind to')
     parser.add_argument('--database', help='mongodb database name')
+    parser.add_argument('--migrate-schema', action='store_true',
+                        help='move a mongodb database to the consolidated schema and exit')
+    parser.add_argument('--export-snapshot', metavar='FILE',
+                        help='write the last signed state with data to start from to a file and exit')
+    parser.add_argument('--import-snapshot', metavar='FILE',
+                        help='start from a snapshot file instead of downloading the state from peers')
     parser.add_argument('--prompt', '-p', action='store_true', help='show prompt')
     parser.add_argument('--log', '-l', help='log into a file')
     parser.add_argument('--version', action='store_true', help='print version')
@@ -108,6 +114,27 @@ def main():
     if args.database:
         CONFIG.set('general', 'database', args.database)
 
+    # migrate database if --migrate-schema
+    if args.migrate_schema:
+        from prisma.db.consolidated import ConsolidatedDB
+        db = ConsolidatedDB(CONFIG.get('general', 'database'))
+        if not db.migrate_collections():
+            print('Migration failed, run it again to continue.')
+            exit(1)
+        print('Migration done, set schema = consolidated in the [database] section of the configuration.')
+        exit()
+
+    # export snapshot if --export-snapshot
+    if args.export_snapshot:
+        from prisma.db.backend import create_db
+        from prisma.network.snapshot import Snapshot
+        Prisma().db = create_db(CONFIG.get('general', 'database'))
+        if Snapshot.export_snapshot(args.export_snapshot) is False:
+            print('Could not export snapshot.')
+            exit(1)
+        print('Snapshot exported to ' + args.export_snapshot)
+        exit()
+
     # preparing manager
     def signal_handler(sig, frame):
         Prisma().stop()
@@ -116,7 +143,7 @@ def main():
     signal.signal(signal.SIGQUIT, signal_handler)
 
     # starting manager
-    Prisma().start(args.prompt)
+    Prisma().start(args.prompt, args.import_snapshot)
     reactor.run()
 
 # if this module is called directly then go to the entry point
@@ -1,6 +1,10 @@
+from collections import namedtuple
+
 from prisma.test.testutils.testcase import PrismaTestCase
 
 from prisma.api.methods import ApiMethods
+from prisma.cryptograph.signed_state import SignedStateManager
+from prisma.db.archive import SegmentArchive
 
 
 class PrismaApiMethods(PrismaTestCase):
@@ -10,3 +14,26 @@ class PrismaApiMethods(PrismaTestCase):
     def test_last_event_time(self):
         r = ApiMethods.last_event_time()
         self.assertTrue('latest_event_time' in r)
+
+    def test_archive_stats(self):
+        self.assertRaises(Exception, ApiMethods.archive_stats)
+
+    def test_archive_stats_enabled(self):
+        archive = SegmentArchive(self.mktemp())
+        self.addCleanup(archive.close)
+        self.patch(self.prisma, 'archive', archive)
+        ev = namedtuple('Event_', 'd p t c s')
+        h1, h2, h3 = 'aa' * 64, 'bb' * 64, 'cc' * 64
+        db = self.prisma.db
+        db.insert_event({h1: ev(['tx'], (), 1.5, 'creator1', 's1'), h2: ev([], (h1,), 2.5, 'creator1', 's2'),
+                         h3: ev([], (h2,), 3.5, 'creator1', 's3')})
+        db.insert_round({h1: 1, h2: 1, h3: 2})
+        db.set_round_handled({h1: 2, h2: 2, h3: 3})
+
+        SignedStateManager.archive_events([h1, h2, h3], 3)
+        self.assertEqual(ApiMethods.archive_stats()['archive_stats']['records'], 2)
+        self.assertEqual(ApiMethods.archive_stats()['archive_stats']['last_round'], 3)
+        record = ApiMethods.get_archived_round(2)['archived_round']
+        self.assertEqual(record['rounds'], {h1: 1, h2: 1})
+        self.assertEqual(record['events'][h1]['d'], ['tx'])
+        self.assertIsNone(ApiMethods.get_archived_round(1)['archived_round'])
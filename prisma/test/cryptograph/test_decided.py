@@ -0,0 +1,44 @@
+from prisma.test.testutils.testcase import PrismaTestCase
+
+
+class PrismaCryptographDecided(PrismaTestCase):
+    """
+    Test cases for the in-memory decided rounds and famous witnesses.
+    """
+    def test_restore(self):
+        decided = self.prisma.graph._decided
+        witness = self.prisma.db.get_head()
+        self.assertFalse(decided.is_round_decided(0))
+        self.assertFalse(decided.is_fame_decided(witness))
+
+        self.prisma.db.insert_consensus([0, 2])
+        self.prisma.db.insert_famous({witness: True})
+        decided.restore()
+
+        self.assertTrue(decided.is_round_decided(0))
+        self.assertFalse(decided.is_round_decided(1))
+        self.assertTrue(decided.is_round_decided(2))
+        self.assertTrue(decided.is_fame_decided(witness))
+
+    def test_delete_famous(self):
+        decided = self.prisma.graph._decided
+        witness = self.prisma.db.get_head()
+        decided.set_famous(witness, False)
+        self.assertTrue(decided.is_fame_decided(witness))
+        decided.delete_famous([witness])
+        self.assertFalse(decided.is_fame_decided(witness))
+
+    def test_delete_rounds(self):
+        decided = self.prisma.graph._decided
+        decided.add_rounds([3, 4, 6])
+        decided.delete_rounds(4)
+        self.assertEqual(decided.rounds, {6})
+        self.assertTrue(decided.is_round_decided(1))
+        self.assertFalse(decided.is_round_decided(5))
+        self.assertTrue(decided.is_round_decided(6))
+
+        self.prisma.db.set_consensus_last_pruned(4)
+        self.prisma.db.insert_consensus([3, 4, 6])
+        decided.restore()
+        self.assertEqual(decided.rounds, {6})
+        self.assertTrue(decided.is_round_decided(4))
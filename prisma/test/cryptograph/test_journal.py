@@ -0,0 +1,69 @@
+from prisma.cryptograph.journal import STEP_FAME, STEP_ORDER
+from prisma.test.testutils.testcase import PrismaTestCase
+
+
+class PrismaCryptographJournal(PrismaTestCase):
+    """
+    Test cases for recovery of consensus steps from the journal.
+    """
+    def recover(self, journal):
+        """
+        Stores a journal as left by a node that stopped during a sync and recovers it.
+        """
+        self.prisma.db.insert_journal(journal)
+        self.prisma.graph._journal.journal = None
+        self.assertTrue(self.prisma.graph._journal.recover())
+        self.assertIsNone(self.prisma.db.get_journal())
+
+    def test_roll_back_events(self):
+        db = self.prisma.db
+        graph = self.prisma.graph
+        head = db.get_head()
+        graph._journal.begin([])
+        h, ev = graph._event.new_event([], (head, head))
+        graph._journal.add_events([h])
+        graph._event.add_event(h, ev)
+        db.insert_head(h)
+
+        self.recover(graph._journal.journal)
+        self.assertFalse(db.get_event(h))
+        self.assertFalse(db.get_height(h))
+        self.assertEqual(db.get_head(), head)
+        self.assertFalse(graph.is_ancestor(head, h))
+
+    def test_redo_fame(self):
+        db = self.prisma.db
+        head = db.get_head()
+        self.recover({'step': STEP_FAME, 'events': [], 'transactions': [], 'famous': {head: True}, 'consensus': [0]})
+        self.assertTrue(db.get_famous(head))
+        self.assertTrue(db.check_consensus(0))
+        self.assertTrue(self.prisma.graph._decided.is_round_decided(0))
+
+    def test_redo_order(self):
+        db = self.prisma.db
+        head = db.get_head()
+        self.recover({'step': STEP_ORDER, 'events': [], 'transactions': [], 'famous': {}, 'consensus': [],
+                      'order': [[0, [head]]]})
+        self.assertEqual(db.get_rounds_hash_list(0), [head])
+        self.assertNotIn(self.prisma.common.hash_to_bin(head), self.prisma.graph.tbd)
+
+    def test_failed_sync(self):
+        db = self.prisma.db
+        graph = self.prisma.graph
+        head = db.get_head()
+        graph._journal.begin([])
+        db.begin_unit_of_work()
+        h, ev = graph._event.new_event([], (head, head))
+        graph._journal.add_events([h])
+        graph._event.add_event(h, ev)
+        db.insert_head(h)
+        graph._decided.set_famous(h, True)
+        db.discard_unit_of_work()
+
+        self.assertTrue(graph._journal.recover())
+        self.assertIsNone(graph._journal.journal)
+        self.assertIsNone(db.get_journal())
+        self.assertFalse(db.get_event(h))
+        self.assertEqual(db.get_head(), head)
+        self.assertFalse(graph._decided.is_fame_decided(h))
+        self.assertNotIn(self.prisma.common.hash_to_bin(h), graph.tbd)
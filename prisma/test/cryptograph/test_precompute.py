@@ -0,0 +1,42 @@
+from collections import OrderedDict
+from twisted.internet import defer
+
+from prisma.test.testutils.testcase import PrismaTestCase
+
+
+class PrismaCryptographPrecompute(PrismaTestCase):
+    """
+    Test cases for precomputation of signed states.
+    """
+    def test_precompute_after_sync(self):
+        """
+        Tests that a block decided during a sync is read after the sync has ordered its transactions.
+        """
+        # calls to the cryptograph thread, run one at a time in order
+        queue = []
+
+        def defer_serial(f, *args, **kwargs):
+            d = defer.Deferred()
+            queue.append(lambda: d.callback(f(*args, **kwargs)))
+            return d
+        self.patch(self.prisma.deferred_db, 'defer_serial', defer_serial)
+
+        db = self.prisma.db
+        last_round = self.prisma.graph.to_sign_count - 1
+        db.insert_state(OrderedDict([('_id', -1), ('prev_hash', '0' * 64), ('balance', {'w1': 10})]), 'hash-1', True)
+
+        def sync():
+            db.begin_unit_of_work()
+            # fame is decided before the order is found
+            db.insert_consensus(list(range(last_round + 1)))
+            self.prisma.state_manager.precompute_states()
+            db.insert_transactions([{'type': '0', 'senderId': 'w1', 'recipientId': 'w2', 'amount': 3,
+                                     'round': last_round}])
+            db.commit_unit_of_work()
+
+        queue.append(sync)
+        while queue:
+            queue.pop(0)()
+
+        self.assertEqual(dict(db.get_state(last_round)['balance']), {'w1': 7, 'w2': 3})
+        self.assertEqual(db.get_account_balance_many(), {'w1': 7, 'w2': 3})
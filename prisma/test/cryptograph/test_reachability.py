@@ -0,0 +1,62 @@
+from collections import OrderedDict
+
+from prisma.test.testutils.testcase import PrismaTestCase
+
+
+class PrismaCryptographReachability(PrismaTestCase):
+    """
+    Test cases for the reachability index.
+    """
+    def test_genesis(self):
+        head = self.prisma.db.get_head()
+        creator = self.prisma.db.get_event(head).c
+        self.assertTrue(self.prisma.graph.is_ancestor(head, head))
+        self.assertEqual(self.prisma.graph.first_descendant(head, creator), head)
+
+    def test_new_event(self):
+        head = self.prisma.db.get_head()
+        graph = self.prisma.graph
+        h, ev = graph._event.new_event([], (head, head))
+        graph._event.add_event(h, ev)
+
+        self.assertTrue(graph.is_ancestor(head, h))
+        self.assertFalse(graph.is_ancestor(h, head))
+        self.assertEqual(graph.first_descendant(head, ev.c), head)
+
+    def test_lazy_rebuild(self):
+        head = self.prisma.db.get_head()
+        reachability = self.prisma.graph._reachability
+        reachability.events = OrderedDict()
+        reachability.chains = {}
+        self.assertTrue(reachability.is_ancestor(head, head))
+        self.assertFalse(reachability.is_ancestor(head, 'ff' * 64))
+
+    def test_drop(self):
+        head = self.prisma.db.get_head()
+        graph = self.prisma.graph
+        graph._reachability.drop()
+        h, ev = graph._event.new_event([], (head, head))
+        graph._event.add_event(h, ev)
+        self.assertEqual(len(graph._reachability.events), 0)
+
+        # built from db on first use, with events added in the meantime
+        self.assertEqual(graph.first_descendant(head, ev.c), head)
+        self.assertTrue(graph.is_ancestor(head, h))
+        self.assertEqual(len(graph._reachability.events), 2)
+
+    def test_evict_cold(self):
+        head = self.prisma.db.get_head()
+        graph = self.prisma.graph
+        h1, ev1 = graph._event.new_event([], (head, head))
+        graph._event.add_event(h1, ev1)
+        h2, ev2 = graph._event.new_event([], (h1, h1))
+        graph._event.add_event(h2, ev2)
+
+        reachability = graph._reachability
+        size = reachability.usage()
+        freed = reachability.evict_cold(size)
+        self.assertEqual(reachability.usage(), size - freed)
+        # the last event of the creator is kept
+        self.assertEqual(len(reachability.events), 1)
+        self.assertEqual(graph.first_descendant(head, ev2.c), head)
+        self.assertTrue(graph.is_ancestor(head, h2))
@@ -63,6 +63,9 @@ class TestSignedState(object):
         # Check if it was successfully inserted
         assert signed_state_instance.graph.database.get_consensus_count() == 5
 
+        # States are precomputed before signing
+        signed_state_instance.create_pending_states()
+
         # From 0 to 4
         created_sign = signed_state_instance.create_state_sign()
 
@@ -105,6 +108,9 @@ class TestSignedState(object):
         # Check the consensus was successfully inserted
         assert signed_state_instance.graph.database.get_consensus_count() == 10
 
+        # States are precomputed before signing
+        signed_state_instance.create_pending_states()
+
         sign_list = signed_state_instance.try_create_state_signatures()
         # Check if precisely two signatures were created
         assert len(sign_list) == 2
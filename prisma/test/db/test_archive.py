@@ -0,0 +1,55 @@
+import os
+from twisted.trial.unittest import TestCase
+
+from prisma.db.archive import SegmentArchive
+
+
+class PrismaDbArchive(TestCase):
+    """
+    Test cases for the archive of pruned history.
+    """
+    def setUp(self):
+        self.path = self.mktemp()
+        self.archive = SegmentArchive(self.path, segment_size=100)
+
+    def tearDown(self):
+        self.archive.close()
+
+    def test_append_get(self):
+        """
+        Tests that records are found by any round of their range and segments are rolled over.
+        """
+        self.archive.append(-1, 4, {'events': {'aa': 1}})
+        self.archive.append(4, 9, {'events': {'bb': 2}})
+        # already archived
+        self.archive.append(4, 9, {'events': {'cc': 3}})
+        self.assertEqual(self.archive.get(0), {'events': {'aa': 1}})
+        self.assertEqual(self.archive.get(4), {'events': {'aa': 1}})
+        self.assertEqual(self.archive.get(7), {'events': {'bb': 2}})
+        self.assertIsNone(self.archive.get(10))
+
+        self.archive.segment_size = 1
+        self.archive.append(20, 30, {'events': {'cc': 3}})
+        self.archive.append(30, 31, {'events': {'dd': 4}})
+        self.assertIsNone(self.archive.get(15))
+        self.assertEqual(self.archive.get(31), {'events': {'dd': 4}})
+        self.assertEqual(sorted(os.listdir(self.path))[::2], ['000000000000.idx', '000000000021.idx',
+                                                              '000000000031.idx'])
+        self.assertEqual(self.archive.stats()['records'], 4)
+
+    def test_reopen(self):
+        """
+        Tests that a record written partly before a crash is cut off when the archive is opened.
+        """
+        self.archive.append(-1, 4, {'events': {'aa': 1}})
+        self.archive.append(4, 9, {'events': {'bb': 2}})
+        index = self.archive.segment_path(0, '.idx')
+        with open(index, 'r+b') as f:
+            f.truncate(os.path.getsize(index) - 3)
+
+        archive = SegmentArchive(self.path, segment_size=100)
+        self.assertEqual(archive.last_round, 4)
+        self.assertEqual(archive.get(2), {'events': {'aa': 1}})
+        archive.append(4, 9, {'events': {'cc': 3}})
+        self.assertEqual(archive.get(9), {'events': {'cc': 3}})
+        archive.close()
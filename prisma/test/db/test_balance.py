@@ -0,0 +1,44 @@
+from prisma.test.testutils.testcase import PrismaTestCase
+
+
+class PrismaDbBalance(PrismaTestCase):
+    DATABASE_BACKEND = 'mongodb'
+
+    def test_balance_ledger(self):
+        """
+        Tests that the balance ledger follows transactions and is rebased on a new state.
+        """
+        db = self.prisma.db
+        db.insert_state({'_id': 4, 'balance': {'w1': 10}}, 'hash4', True)
+        db.insert_transactions([
+            {'type': '0', 'senderId': 'w1', 'recipientId': 'w2', 'amount': 3, 'round': 5},
+            {'type': '0', 'senderId': 'w2', 'recipientId': 'w1', 'amount': 1, 'round': 7}
+        ])
+        self.assertEqual(db.get_account_balance('w1'), 8)
+        self.assertEqual(db.get_account_balance_many([5, 6]), {'w1': 7, 'w2': 3})
+
+        # state of rounds 5 - 6 replaces transactions of those rounds
+        db.delete_money_transfer_transaction_less_than(6)
+        db.insert_state({'_id': 6, 'balance': {'w1': 7, 'w2': 3}}, 'hash6', False)
+        self.assertEqual(db.get_account_balance_many(), {'w1': 8, 'w2': 2})
+
+        # loaded from the balance collection
+        db.balances = None
+        self.assertEqual(db.get_balance_ledger(), {'w1': 8, 'w2': 2})
+
+        # a stop between the transactions write and the balance write leaves the ledger not consistent
+        db.balances = None
+        db.set_balance_ledger_consistent(False)
+        db.db.balance.update({'_id': 'w1'}, {'$inc': {'balance': 100}})
+        self.assertEqual(db.get_ledger_balance('w1'), 8)
+        db.balances = None
+        self.assertEqual(db.get_balance_ledger(), {'w1': 8, 'w2': 2})
+
+        # balance changes by the transactions that were inserted before the duplicate
+        db.insert_transactions([{'_id': 1, 'type': '0', 'senderId': 'w1', 'recipientId': 'w2', 'amount': 1},
+                                {'_id': 1, 'type': '0', 'senderId': 'w1', 'recipientId': 'w2', 'amount': 1}])
+        self.assertEqual(db.get_balance_ledger(), {'w1': 7, 'w2': 3})
+        db.remove_transactions({'_id': 1})
+
+        db.drop_collection('transactions')
+        self.assertEqual(db.get_account_balance_many(), {'w1': 7, 'w2': 3})
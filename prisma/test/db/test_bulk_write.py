@@ -0,0 +1,34 @@
+from prisma.test.testutils.testcase import PrismaTestCase
+
+
+class PrismaDbBulkWrite(PrismaTestCase):
+    DATABASE_BACKEND = 'mongodb'
+
+    def test_insert_many(self):
+        """
+        Tests inserting several documents with one call.
+        """
+        db = self.prisma.db
+        h1, h2 = 'aa' * 64, 'bb' * 64
+        self.assertTrue(db.insert_round({h1: 1, h2: 2}))
+        self.assertTrue(db.insert_height({h1: 3, h2: 4}))
+        self.assertTrue(db.insert_witness({5: {'creator1': h1, 'creator2': h2}}))
+        self.assertTrue(db.insert_famous({h1: True, h2: False}))
+
+        self.assertEqual((db.get_round(h1), db.get_round(h2)), (1, 2))
+        self.assertEqual((db.get_height(h1), db.get_height(h2)), (3, 4))
+        self.assertEqual(db.get_witness(5), {'creator1': h1, 'creator2': h2})
+        self.assertEqual(db.get_famous_many(), {h1: True, h2: False})
+
+    def test_insert_vote_and_can_see(self):
+        """
+        Tests that updates of one document are merged.
+        """
+        db = self.prisma.db
+        h1, h2 = 'aa' * 64, 'bb' * 64
+        self.assertTrue(db.insert_vote({h1: {h1: True, h2: False}}))
+        self.assertTrue(db.insert_vote({h1: {h2: True}}))
+        self.assertEqual(db.get_vote(h1), {h1: True, h2: True})
+
+        self.assertTrue(db.insert_can_see({h1: {'creator1': h1, 'creator2': h2}}))
+        self.assertEqual(db.get_can_see(h1), {'creator1': h1, 'creator2': h2})
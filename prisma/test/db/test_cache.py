@@ -0,0 +1,104 @@
+import sys
+from collections import namedtuple
+from pymongo import MongoClient
+from twisted.trial.unittest import TestCase
+
+from prisma.db.cache import ReadCache
+from prisma.db.database import PrismaDB
+from prisma.db.consolidated import ConsolidatedDB
+
+
+class PrismaDbCache(TestCase):
+    """
+    Test cases for the read cache of point lookups.
+    """
+    DATABASE_NAME = 'prisma_testing'
+
+    def setUp(self):
+        client = MongoClient(serverSelectionTimeoutMS=2000, connect=False)
+        client.drop_database(self.DATABASE_NAME)
+        client.drop_database(self.DATABASE_NAME + '_consolidated')
+        self.dbs = [PrismaDB(self.DATABASE_NAME), ConsolidatedDB(self.DATABASE_NAME + '_consolidated')]
+
+    def tearDown(self):
+        for db in self.dbs:
+            db.destroy_db()
+
+    def test_lru(self):
+        """
+        Tests that the least recently used value is evicted and missing values are not cached.
+        """
+        cache = ReadCache(2)
+        self.assertEqual(cache.get('round', 'a', lambda: 1), 1)
+        self.assertEqual(cache.get('round', 'b', lambda: 2), 2)
+        self.assertEqual(cache.get('round', 'a', lambda: None), 1)
+        self.assertEqual(cache.get('round', 'c', lambda: 3), 3)
+        self.assertEqual(cache.get('round', 'b', lambda: False), False)
+        self.assertEqual(cache.get('round', 'b', lambda: 4), 4)
+        self.assertEqual(cache.stats()['round'], {'hits': 1, 'misses': 5, 'size': 2})
+
+        cache.discard('round', ['b'])
+        self.assertEqual(cache.get('round', 'b', lambda: 5), 5)
+        self.assertEqual(ReadCache(0).get('round', 'a', lambda: 1), 1)
+
+    def test_evict_cold(self):
+        """
+        Tests that least recently used values are evicted to free memory.
+        """
+        cache = ReadCache(10)
+        for key in range(3):
+            cache.get('round', key, lambda: 'x' * 100)
+        used = cache.usage()
+        self.assertGreater(cache.evict_cold(1), 0)
+        self.assertLess(cache.usage(), used)
+        self.assertEqual(list(cache.values['round']), [1, 2])
+        cache.evict_cold(used)
+        self.assertEqual(cache.stats()['round']['size'], 0)
+
+    def test_usage(self):
+        """
+        Tests that bytes of cached values are counted per kind as values are added and removed.
+        """
+        cache = ReadCache(2)
+        for key in range(3):
+            cache.get('vote', key, lambda: {'x': True})
+        cache.get('can_see', 'a', lambda: {'c': 'h'})
+        self.assertEqual(cache.usage('vote'),
+                         sys.getsizeof(cache.values['vote']) +
+                         sum(ReadCache.entry_size(k, v) for k, v in cache.values['vote'].items()))
+        cache.discard('vote', [1, 5])
+        cache.clear('can_see')
+        cache.evict_cold(1, kind='vote')
+        self.assertEqual(cache.bytes, {kind: 0 for kind in cache.bytes})
+
+    def test_invalidation(self):
+        """
+        Tests that lookups are served from the cache until the values are written or deleted.
+        """
+        ev = namedtuple('Event_', 'd p t c s')
+        h1 = 'aa' * 64
+        for db in self.dbs:
+            self.assertTrue(db.insert_event({h1: ev(['tx'], (), 1.5, 'creator1', 's1')}))
+            self.assertTrue(db.insert_round({h1: 1}))
+            self.assertTrue(db.insert_witness({1: {'creator1': h1}}))
+            for _ in range(2):
+                self.assertEqual(db.get_round(h1), 1)
+                self.assertEqual(db.get_witness(1), {'creator1': h1})
+                self.assertIsNone(db.get_event(h1, payload=False).d)
+                self.assertEqual(db.get_event(h1).d, ['tx'])
+            stats = db.cache.stats()
+            self.assertEqual(stats['round'], {'hits': 1, 'misses': 1, 'size': 1})
+            self.assertEqual(stats['event'], {'hits': 2, 'misses': 2, 'size': 2})
+
+            self.assertTrue(db.insert_round({h1: 2}))
+            self.assertEqual(db.get_round(h1), 2)
+            self.assertTrue(db.delete_round_less_than(3))
+            self.assertFalse(db.get_round(h1))
+
+            self.assertTrue(db.insert_witness({1: {'creator2': 'bb' * 64}}))
+            self.assertEqual(db.get_witness(1), {'creator1': h1, 'creator2': 'bb' * 64})
+
+            self.assertTrue(db.delete_events_many([h1]))
+            self.assertFalse(db.get_event(h1))
+            self.assertTrue(db.drop_collection('witness'))
+            self.assertEqual(db.get_witness(1), {})
@@ -0,0 +1,57 @@
+from pymongo import MongoClient
+from twisted.trial.unittest import TestCase
+
+from prisma.db.database import PrismaDB
+
+
+class PrismaDbConsensus(TestCase):
+    """
+    Test cases for the consensus pointers.
+    """
+    DATABASE_NAME = 'prisma_testing'
+
+    def setUp(self):
+        MongoClient(serverSelectionTimeoutMS=2000, connect=False).drop_database(self.DATABASE_NAME)
+        self.db = PrismaDB(self.DATABASE_NAME)
+
+    def tearDown(self):
+        self.db.destroy_db()
+
+    def test_pointers(self):
+        """
+        Tests that the pointers fall back to each other and are stored in the metadata collection.
+        """
+        db = self.db
+        self.assertEqual(db.get_consensus_last_signed(), -1)
+        self.assertEqual(db.get_consensus_last_created_sign(), -1)
+
+        db.insert_consensus([0, 1, 2, 3])
+        db.sign_consensus(2)
+        self.assertEqual(db.get_consensus_last_signed(), 1)
+        self.assertEqual(db.get_consensus_last_sent(), 1)
+
+        self.assertTrue(db.set_consensus_last_created_sign(3))
+        self.assertTrue(db.set_consensus_last_sent(2))
+        # not a decided round
+        self.assertTrue(db.set_consensus_last_sent(7))
+        self.assertEqual(db.get_consensus_last_created_sign(), 3)
+        self.assertEqual(db.get_consensus_last_sent(), 1)
+
+        db.consensus_pointers = None
+        self.assertEqual(db.get_consensus_pointers(), {'_id': 'consensus', 'last_sent': None,
+                                                       'last_created_sign': 3, 'last_signed': 1})
+
+        db.drop_collection('consensus')
+        self.assertEqual(db.get_consensus_last_created_sign(), -1)
+
+    def test_former_flags(self):
+        """
+        Tests that the pointers are built from flags of the consensus collection.
+        """
+        db = self.db
+        db.db.consensus.insert_many([{'consensus': 4, 'signed': True, 'last_sent': True},
+                                     {'consensus': 5, 'signed': False, 'last_created_sign': True}])
+        self.assertEqual(db.get_consensus_last_signed(), 4)
+        self.assertEqual(db.get_consensus_last_sent(), 4)
+        self.assertEqual(db.get_consensus_last_created_sign(), 5)
+        self.assertEqual(db.db.metadata.find_one({'_id': 'consensus'})['last_created_sign'], 5)
@@ -0,0 +1,78 @@
+from collections import namedtuple
+from pymongo import MongoClient
+from twisted.trial.unittest import TestCase
+
+from prisma.db.database import PrismaDB
+from prisma.db.consolidated import ConsolidatedDB
+
+
+class PrismaDbConsolidated(TestCase):
+    """
+    Test cases for the consolidated schema, one document per event.
+    """
+    DATABASE_NAME = 'prisma_testing'
+
+    def setUp(self):
+        MongoClient(serverSelectionTimeoutMS=2000, connect=False).drop_database(self.DATABASE_NAME)
+        self.db = ConsolidatedDB(self.DATABASE_NAME)
+
+    def tearDown(self):
+        self.db.destroy_db()
+
+    def test_event_document(self):
+        """
+        Tests that everything about an event is stored in one document and fields are removed independently.
+        """
+        ev = namedtuple('Event_', 'd p t c s')
+        h1, h2 = 'aa' * 64, 'bb' * 64
+        self.assertTrue(self.db.insert_event({h1: ev(['tx'], (), 1.5, 'creator1', 's1')}))
+        self.assertFalse(self.db.insert_event({h1: ev([], (), 1.5, 'creator1', 's1')}))
+        self.assertTrue(self.db.insert_height({h1: 0}))
+        self.assertTrue(self.db.insert_round({h1: 1, h2: 2}))
+        self.assertTrue(self.db.set_round_handled({h1: 1}))
+        self.assertTrue(self.db.insert_witness({1: {'creator1': h1}}))
+        self.assertTrue(self.db.insert_can_see({h1: {'creator1': h1}}))
+        self.assertTrue(self.db.insert_famous({h1: True}))
+
+        self.assertEqual(self.db.db.cryptograph.count(), 2)
+        self.assertEqual(self.db.get_event(h1).d, ['tx'])
+        self.assertIsNone(self.db.get_event(h1, payload=False).d)
+        self.assertFalse(self.db.get_event(h2))
+        self.assertEqual(self.db.get_witness(1), {'creator1': h1})
+        self.assertEqual(self.db.get_rounds_hash_list(1), [h1])
+
+        self.assertTrue(self.db.delete_events_many([h1]))
+        self.assertFalse(self.db.get_event(h1))
+        self.assertEqual(self.db.get_can_see(h1), {})
+        self.assertIsNone(self.db.get_famous(h1))
+        self.assertEqual(self.db.get_round(h1), 1)
+
+        self.assertTrue(self.db.drop_collections_many(['events', 'height']))
+        self.assertEqual(self.db.get_rounds_many(), {})
+        self.assertEqual(self.db.get_height(h1), 0)
+
+    def test_migrate_collections(self):
+        """
+        Tests moving a database with a collection per kind of data to the consolidated schema.
+        """
+        ev = namedtuple('Event_', 'd p t c s')
+        h1, h2 = 'aa' * 64, 'bb' * 64
+        old = PrismaDB(self.DATABASE_NAME)
+        old.insert_event({h1: ev([], (), 1.5, 'creator1', 's1'), h2: ev([], (h1,), 2.5, 'creator2', 's2')})
+        old.insert_round({h1: 1, h2: 1})
+        old.insert_height({h1: 0, h2: 1})
+        old.insert_witness({1: {'creator1': h1, 'creator2': h2}})
+        old.insert_can_see({h2: {'creator1': h1, 'creator2': h2}})
+        old.insert_vote({h2: {h1: True}})
+        old.insert_famous({h1: False})
+
+        self.assertTrue(self.db.migrate_collections(batch_size=2))
+        self.assertTrue(self.db.migrate_collections())
+        self.assertEqual(self.db.db.events.count(), 0)
+        self.assertEqual(list(self.db.get_event(h2).p), [h1])
+        self.assertEqual(self.db.get_rounds_many(), {h1: 1, h2: 1})
+        self.assertEqual(self.db.get_heights_many(), {h1: 0, h2: 1})
+        self.assertEqual(self.db.get_witness(1), {'creator1': h1, 'creator2': h2})
+        self.assertEqual(self.db.get_can_see(h2), {'creator1': h1, 'creator2': h2})
+        self.assertEqual(self.db.get_vote(h2), {h1: True})
+        self.assertEqual(self.db.get_famous_many(), {h1: False})
@@ -0,0 +1,42 @@
+import threading
+from twisted.internet import defer
+from twisted.trial.unittest import TestCase
+
+from prisma.db.deferred import DeferredDB
+from prisma.db.memory_database import MemoryDB
+
+
+class PrismaDbDeferred(TestCase):
+    """
+    Test cases for the database facade of the reactor thread.
+    """
+    def setUp(self):
+        self.db = MemoryDB('prisma_testing')
+
+    def test_sync(self):
+        """
+        Tests that without threads calls are done when they return.
+        """
+        deferred_db = DeferredDB(self.db, 0)
+        deferred_db.insert_round({'aa' * 64: 1})
+        self.assertEqual(self.successResultOf(deferred_db.get_round('aa' * 64)), 1)
+        self.failureResultOf(deferred_db.defer(lambda: 1 / 0), ZeroDivisionError)
+
+    @defer.inlineCallbacks
+    def test_thread_pool(self):
+        """
+        Tests that calls run out of the reactor thread and the cryptograph calls run in order.
+        """
+        deferred_db = DeferredDB(self.db, 2)
+        deferred_db.start()
+        self.addCleanup(deferred_db.stop)
+
+        yield deferred_db.insert_round({'aa' * 64: 1})
+        result = yield deferred_db.get_round('aa' * 64)
+        self.assertEqual(result, 1)
+        thread = yield deferred_db.defer(threading.current_thread)
+        self.assertIsNot(thread, threading.current_thread())
+
+        calls = []
+        yield defer.gatherResults([deferred_db.defer_serial(calls.append, i) for i in range(20)])
+        self.assertEqual(calls, list(range(20)))
@@ -0,0 +1,55 @@
+from pymongo import MongoClient, ASCENDING
+from twisted.trial.unittest import TestCase
+
+from prisma.db.database import PrismaDB
+from prisma.db.indexes import Index, IndexRegistry, Migration
+
+
+class PrismaDbIndexes(TestCase):
+    """
+    Test cases for the index registry.
+    """
+    DATABASE_NAME = 'prisma_testing'
+
+    def setUp(self):
+        MongoClient(serverSelectionTimeoutMS=2000, connect=False).drop_database(self.DATABASE_NAME)
+        self.db = PrismaDB(self.DATABASE_NAME)
+
+    def tearDown(self):
+        self.db.destroy_db()
+
+    def test_migrate(self):
+        """
+        Tests that pending migrations drop indexes and the version is stored.
+        """
+        registry = IndexRegistry([
+            Migration(1, [Index('votes', [('round', ASCENDING)]), Index('votes', [('x', ASCENDING)])], []),
+            Migration(2, [Index('votes', [('y', ASCENDING)])], [('votes', 'x_1')])
+        ])
+        self.assertEqual(list(registry.indexes), [('votes', 'round_1'), ('votes', 'y_1')])
+
+        self.db.db.votes.create_index([('x', ASCENDING)], name='x_1')
+        self.db.db.migrations.update({'_id': IndexRegistry.VERSION_ID}, {'$set': {'version': 1}})
+        self.assertTrue(registry.migrate(self.db.db))
+        self.assertEqual(registry.get_version(self.db.db), 2)
+        self.assertEqual(set(self.db.db.votes.index_information()), {'_id_', 'round_1', 'y_1'})
+
+    def test_hash_format(self):
+        """
+        Tests that a database written with hex event hashes is detected at start.
+        """
+        self.assertTrue(self.db.insert_head('aa' * 64))
+        self.assertTrue(self.db.check_hash_format())
+        self.db.db.events.insert_one({'_id': 'bb' * 64, 'event': {}})
+        self.assertFalse(self.db.check_hash_format())
+        self.assertRaises(SystemExit, PrismaDB, self.DATABASE_NAME)
+
+    def test_drop_collection(self):
+        """
+        Tests that a dropped collection gets its indexes back.
+        """
+        self.assertEqual(self.db.index_registry.get_version(self.db.db), self.db.index_registry.version)
+        self.db.drop_collection('transactions')
+        self.assertIn('event_hash_1', self.db.db.transactions.index_information())
+        self.db.drop_collection('state')
+        self.assertIn('address_1_state_-1', self.db.db.state_balance.index_information())
@@ -0,0 +1,95 @@
+import threading
+from collections import namedtuple
+from twisted.trial.unittest import TestCase
+
+from prisma.config import CONFIG
+
+try:
+    import lmdb
+except ImportError:
+    lmdb = None
+
+
+class PrismaDbLmdb(TestCase):
+    """
+    Test cases for the LMDB storage engine.
+    """
+    if lmdb is None:
+        skip = "lmdb is not installed"
+
+    def setUp(self):
+        from prisma.db.lmdb_database import LmdbDB
+        CONFIG.set('database', 'path', self.mktemp())
+        self.db = LmdbDB('prisma_testing')
+
+    def tearDown(self):
+        self.db.disconnect()
+
+    def test_events(self):
+        """
+        Tests inserting events and reading them by id and by time.
+        """
+        ev = namedtuple('Event_', 'd p t c s')
+        h1, h2 = 'aa' * 64, 'bb' * 64
+        self.assertTrue(self.db.insert_event({h1: ev(['tx'], (), 1.5, 'creator1', 's1')}))
+        self.assertTrue(self.db.insert_event({h2: ev([], (h1,), 2.5, 'creator1', 's2')}))
+        self.assertFalse(self.db.insert_event({h1: ev([], (), 1.5, 'creator1', 's1')}))
+
+        self.assertEqual(self.db.get_event(h1).d, ['tx'])
+        self.assertIsNone(self.db.get_event(h1, payload=False).d)
+        self.assertEqual(self.db.get_event(h2).p, (h1,))
+        self.assertFalse(self.db.get_event('cc' * 64))
+        self.assertEqual(list(self.db.get_events_many()), [h1, h2])
+        self.assertEqual([e['_id'] for e in self.db.get_events_by_time(1.5)], [h2])
+        self.assertEqual(self.db.get_latest_event_time(), 2.5)
+
+    def test_rounds(self):
+        """
+        Tests that round indexes follow updates and deletes.
+        """
+        h1, h2, h3 = 'aa' * 64, 'bb' * 64, 'cc' * 64
+        self.db.insert_round({h1: 1, h2: 2, h3: 3})
+        self.db.insert_round({h1: 4})
+        self.db.set_round_handled({h1: 4, h2: 2})
+
+        self.assertEqual(self.db.get_rounds_max(), 4)
+        self.assertEqual(self.db.get_rounds_many(3), {h2: 2, h3: 3})
+        self.assertEqual(self.db.get_rounds_hash_list(4, start=2), [h1])
+        self.assertEqual(self.db.get_rounds_unhandled(), [h3])
+
+        self.db.delete_round_greater_than(3)
+        self.assertFalse(self.db.get_round(h1))
+        self.assertEqual(self.db.get_rounds_hash_list(4), [h2])
+
+    def test_can_see(self):
+        """
+        Tests that can_see is updated by creator and deleted with its event.
+        """
+        h1, h2, h3 = 'aa' * 64, 'bb' * 64, 'cc' * 64
+        self.db.insert_can_see({h1: {'creator1': h2, 'creator2': h3}, h2: {'creator1': h2}})
+        self.db.insert_can_see({h1: {'creator1': h1}})
+        self.assertTrue(self.db.delete_events_many([h2]))
+
+        self.assertEqual(self.db.get_can_see(h1), {'creator1': h1, 'creator2': h3})
+        self.assertEqual(self.db.get_can_see(h2), {})
+
+    def test_unit_of_work(self):
+        """
+        Tests that writes of a unit of work are visible to other threads only after commit.
+        """
+        h1 = 'aa' * 64
+        seen = []
+
+        def read():
+            seen.append(self.db.get_height(h1))
+
+        self.db.begin_unit_of_work()
+        self.db.insert_height({h1: 3})
+        self.assertEqual(self.db.get_height(h1), 3)
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join()
+
+        self.assertTrue(self.db.commit_unit_of_work())
+        read()
+        self.assertEqual(seen, [False, 3])
@@ -0,0 +1,88 @@
+from twisted.trial.unittest import TestCase
+
+from prisma.db.memory_database import MemoryDB
+
+
+class PrismaDbMemory(TestCase):
+    """
+    Test cases for the in-memory storage engine.
+    """
+    def setUp(self):
+        self.db = MemoryDB('prisma_testing')
+
+    def test_abort(self):
+        """
+        Tests that writes of an aborted transaction are rolled back.
+        """
+        h1, h2 = 'aa' * 64, 'bb' * 64
+        self.db.insert_round({h1: 1})
+
+        def write():
+            with self.db.transaction(write=True):
+                self.db.insert_round({h1: 2, h2: 3})
+                self.db.drop_collection('height')
+                raise ValueError()
+
+        self.assertRaises(ValueError, write)
+        self.assertEqual(self.db.get_rounds_many(), {h1: 1})
+        self.assertEqual(self.db.get_rounds_max(), 1)
+
+    def test_consensus_flags(self):
+        """
+        Tests that flags fall back to the last signed round and are set only on decided rounds.
+        """
+        self.db.insert_consensus([0, 1, 2, 3])
+        self.db.sign_consensus(2)
+        self.assertEqual(self.db.get_consensus_last_signed(), 1)
+        self.assertEqual(self.db.get_consensus_last_created_sign(), 1)
+
+        self.db.set_consensus_last_sent(3)
+        self.db.set_consensus_last_created_sign(7)
+        self.assertEqual(self.db.get_consensus_last_sent(), 3)
+        self.assertEqual(self.db.get_consensus_last_created_sign(), 3)
+
+    def test_account_balance(self):
+        """
+        Tests balance from transactions in a range of rounds and the last state.
+        """
+        self.db.insert_state({'_id': 4, 'balance': {'w1': 10}}, 'hash', True)
+        self.db.insert_transactions([
+            {'type': '0', 'senderId': 'w1', 'recipientId': 'w2', 'amount': 3, 'round': 5},
+            {'type': '0', 'senderId': 'w2', 'recipientId': 'w1', 'amount': 1, 'round': 7}
+        ])
+        self.assertEqual(self.db.get_account_balance('w1'), 8)
+        self.assertEqual(self.db.get_account_balance('w1', [6, 7]), 11)
+        self.assertEqual(self.db.get_account_balance_many(), {'w1': 8, 'w2': 2})
+
+    def test_transaction_indexes(self):
+        """
+        Tests that transaction and state balance queries follow the index tables on update and delete.
+        """
+        h = 'cc' * 32
+        self.db.insert_head(h)
+        self.db.insert_state({'_id': 2, 'balance': {'w1': 10, 'w2': 1}}, 'hash', True)
+        self.db.insert_state({'_id': 4, 'balance': {'w1': 8}}, 'hash', True)
+        self.db.insert_transactions([
+            {'type': '0', 'senderId': 'w1', 'recipientId': 'w2', 'amount': 3, 'tx_dict_hex': 'a'},
+            {'type': '0', 'senderId': 'w2', 'recipientId': 'w1', 'amount': 1, 'round': 6, 'ev_hash': h,
+             'tx_dict_hex': 'c'},
+            {'type': 1, 'tx_dict_hex': 'b'}
+        ])
+        self.assertEqual(self.db.get_unsent_transactions_many('w1'), ([1, 3], ['a', 'b']))
+        self.assertEqual(self.db.get_unsent_transactions_many('w2'), ([2, 3], ['c', 'b']))
+
+        self.db.set_transaction_hash([1])
+        self.db.set_transaction_round(h, 7)
+        self.assertEqual(self.db.get_unsent_transactions_many('w1'), ([3], ['b']))
+        self.assertEqual(self.db.get_transfers_balance([7, 7]), {'w1': -3, 'w2': 3})
+        self.assertEqual(self.db.get_transfers_balance([6, 6]), {'w1': 1, 'w2': -1})
+
+        self.db.delete_processed_transactions([6, 7])
+        self.assertEqual(self.db.get_transactions_many(), [1, 3])
+        self.db.delete_transaction_less_than(7)
+        self.assertEqual(self.db.get_transactions_many(), [3])
+
+        self.assertEqual(self.db.get_state_balance('w1'), 8)
+        self.assertEqual(self.db.get_state_balance('w2'), 1)
+        self.db.delete_state_less_than(3)
+        self.assertEqual(self.db.get_state_balance('w2'), 0)
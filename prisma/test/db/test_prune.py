@@ -0,0 +1,55 @@
+from prisma.cryptograph.signed_state import SignedStateManager
+from prisma.test.testutils.testcase import PrismaTestCase
+
+
+class PrismaDbPrune(PrismaTestCase):
+    def test_delete_events_many(self):
+        """
+        Tests deleting events in batches together with their can_see, votes and famous documents.
+        """
+        db = self.prisma.db
+        head = db.get_head()
+        h1, h2 = 'aa' * 64, 'bb' * 64
+        db.insert_can_see({head: {'creator1': h1, 'creator2': h2}})
+        db.insert_can_see({h1: {'creator1': h1}})
+        db.insert_famous({h1: True})
+        db.insert_vote({h2: {h1: True}})
+
+        self.assertTrue(db.delete_events_many([h1, h2], batch_size=1))
+
+        # the head can see itself
+        self.assertEqual(db.get_can_see(head), {db.get_event(head).c: head, 'creator1': h1, 'creator2': h2})
+        self.assertEqual(db.get_can_see(h1), {})
+        self.assertFalse(db.check_famous(h1))
+        self.assertTrue(db.get_event(head))
+
+    def test_last_pruned(self):
+        """
+        Tests that pruning goes on from the last pruned round after restart.
+        """
+        db = self.prisma.db
+        h1, h2 = 'aa' * 64, 'bb' * 64
+        db.insert_round({h1: 1, h2: 2})
+        db.set_round_handled({h1: 1, h2: 2})
+        self.assertEqual(db.get_consensus_last_pruned(), -1)
+        self.assertIsNone(SignedStateManager(self.prisma.graph).pruned_round)
+
+        self.assertEqual(SignedStateManager.prune_signed_rounds(None, 1), [h1])
+        self.assertEqual(db.get_consensus_last_pruned(), 1)
+        state_manager = SignedStateManager(self.prisma.graph)
+        self.assertEqual(state_manager.pruned_round, 1)
+        self.assertEqual(state_manager.prune_signed_rounds(state_manager.pruned_round, 2), [h2])
+
+    def test_get_rounds_hash_list_range(self):
+        """
+        Tests getting hashes of events handled in a range of rounds.
+        """
+        db = self.prisma.db
+        h1, h2 = 'aa' * 64, 'bb' * 64
+        db.insert_round({h1: 1})
+        db.insert_round({h2: 2})
+        db.set_round_handled({h1: 1})
+        db.set_round_handled({h2: 2})
+
+        self.assertEqual(set(db.get_rounds_hash_list(2)), {h1, h2})
+        self.assertEqual(db.get_rounds_hash_list(2, start=1), [h2])
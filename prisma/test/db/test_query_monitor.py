@@ -0,0 +1,52 @@
+from collections import namedtuple
+from twisted.trial.unittest import TestCase
+
+from prisma.db.query_monitor import QueryMonitor
+
+Started = namedtuple('Started', 'command_name command database_name connection_id request_id')
+Finished = namedtuple('Finished', 'duration_micros connection_id request_id')
+
+
+class PrismaDbQueryMonitor(TestCase):
+    """
+    Test cases for latency monitoring of MongoDB commands.
+    """
+    def run_command(self, monitor, request_id, command, duration_ms):
+        name = next(iter(command))
+        monitor.started(Started(name, command, 'prisma_testing', 'localhost', request_id))
+        monitor.succeeded(Finished(duration_ms * 1000, 'localhost', request_id))
+
+    def test_stats(self):
+        """
+        Tests that commands are recorded per collection and operation and the slowest ones are kept.
+        """
+        monitor = QueryMonitor(2)
+        self.run_command(monitor, 1, {'find': 'rounds', 'filter': {'round': {'$lt': 5}}}, 0.2)
+        self.run_command(monitor, 2, {'find': 'rounds', 'filter': {'round': {'$gt': 5}}}, 30)
+        self.run_command(monitor, 3, {'update': 'consensus', 'updates': [{'q': {'signed': False}}]}, 3)
+        self.run_command(monitor, 4, {'insert': 'consensus', 'documents': [{'consensus': 1}]}, 1)
+
+        stats = monitor.stats()
+        self.assertEqual(stats['latency']['rounds.find']['count'], 2)
+        self.assertEqual(stats['latency']['rounds.find']['max_ms'], 30)
+        self.assertEqual(stats['latency']['rounds.find']['buckets']['0.5'], 1)
+        self.assertEqual(stats['latency']['rounds.find']['buckets']['50'], 1)
+        self.assertEqual(stats['latency']['consensus.update']['buckets']['5'], 1)
+        self.assertEqual([(query['command'], query['filter']) for query in stats['slowest']],
+                         [('rounds.find', "{'round': {'$gt': 5}}"), ('consensus.update', "[{'signed': False}]")])
+
+        monitor.reset()
+        self.assertEqual(monitor.stats(), {'latency': {}, 'slowest': []})
+
+    def test_slow_query_log(self):
+        """
+        Tests that commands slower than the threshold are logged.
+        """
+        monitor = QueryMonitor(0, slow_query_ms=10)
+        logged = []
+        monitor.logger.warning = lambda *args: logged.append(args)
+        self.run_command(monitor, 1, {'count': 'events', 'query': {}}, 5)
+        self.run_command(monitor, 2, {'count': 'events', 'query': {}}, 15)
+        self.assertEqual(len(logged), 1)
+        self.assertEqual(logged[0][1], 'events.count')
+        self.assertEqual(monitor.stats()['slowest'], [])
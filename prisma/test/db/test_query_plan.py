@@ -0,0 +1,52 @@
+from collections import OrderedDict
+
+from prisma.config import CONFIG
+from prisma.test.testutils.testcase import PrismaTestCase
+
+
+class PrismaDbQueryPlan(PrismaTestCase):
+    """
+    Runs queries of the MongoDB storage engine through explain.
+    """
+    DATABASE_BACKEND = 'mongodb'
+
+    def setUp(self):
+        CONFIG.set('developer', 'explain_queries', 'true')
+        CONFIG.set('developer', 'explain_min_documents', '2')
+        self._set_up()
+
+    def tearDown(self):
+        self._tear_down()
+        CONFIG.set('developer', 'explain_queries', 'false')
+
+    def test_no_collection_scans(self):
+        """
+        Tests that queries with a filter or sort are served by an index.
+        """
+        db = self.prisma.db
+        hashes = ['%02x' % i * 64 for i in range(10)]
+        db.insert_round({h: i for i, h in enumerate(hashes)})
+        db.set_round_handled({h: i for i, h in enumerate(hashes)})
+        db.insert_consensus(list(range(10)))
+        db.insert_transactions([{'type': '0', 'senderId': 'w%s' % i, 'recipientId': 'w%s' % (i + 1),
+                                 'amount': 1, 'round': i} for i in range(10)])
+        for i in range(4):
+            db.insert_state(OrderedDict([('_id', i), ('prev_hash', str(i)), ('balance', {'w1': i})]), str(i), True)
+
+        db.get_rounds_hash_list(5)
+        db.get_rounds_less_than(5)
+        db.get_rounds_max()
+        db.delete_round_less_than(1)
+        db.get_unsent_transactions_many('w1')
+        db.get_transfers_balance([2, 4])
+        db.delete_money_transfer_transaction_less_than(1)
+        db.sign_consensus(3)
+        db.set_consensus_last_sent(4)
+        db.get_consensus_last_sent()
+        db.get_consensus_many(sign=True, sort=-1)
+        db.get_consensus_greater_than(5)
+        db.get_state_balance('w1')
+        db.get_wallets_state()
+        db.delete_state_less_than(2)
+
+        self.assertEqual(db.check_query_plans(), [])
@@ -0,0 +1,34 @@
+from collections import OrderedDict
+
+from prisma.test.testutils.testcase import PrismaTestCase
+
+
+class PrismaDbStateChunks(PrismaTestCase):
+    DATABASE_BACKEND = 'mongodb'
+
+    def test_state_chunks(self):
+        """
+        Tests that a state is stored in chunks of wallets and read back as it was inserted.
+        """
+        db = self.prisma.db
+        db.state_chunk_size = 2
+        balance = OrderedDict([('w1', 10), ('w2', 20), ('w3', 30), ('w4', 40), ('w5', 50)])
+        state = OrderedDict([('_id', 4), ('prev_hash', 'hash2'), ('balance', balance)])
+        self.assertTrue(db.insert_state(state.copy(), 'hash4', True))
+        self.assertFalse(db.insert_state(state.copy(), 'hash4', True))
+        self.assertEqual(db.db.state_balance.count({'state': 4}), 3)
+        self.assertNotIn('balance', db.db.state.find_one({'_id': 4}))
+
+        self.assertEqual(db.get_state_many(2), [state])
+        self.assertEqual(list(db.get_state(4)['balance'].items()), list(balance.items()))
+        self.assertEqual(list(db.get_last_state(balance=False).keys()), ['_id', 'prev_hash', 'hash', 'signed'])
+
+        db.insert_state(OrderedDict([('_id', 6), ('prev_hash', 'hash4'), ('balance', {'w1': 5})]), 'hash6', True)
+        self.assertEqual(db.get_state_balance('w1'), 5)
+        self.assertEqual(db.get_state_balance('w5'), 50)
+        self.assertEqual(db.get_state_balance('w6'), 0)
+        self.assertEqual(db.get_wallets_state(), {'w1'})
+
+        db.delete_state_less_than(6)
+        self.assertEqual(db.db.state_balance.count(), 1)
+        self.assertEqual(db.get_state_balance('w5'), 0)
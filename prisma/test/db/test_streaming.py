@@ -0,0 +1,41 @@
+from pymongo import MongoClient
+from twisted.trial.unittest import TestCase
+
+from prisma.db.database import PrismaDB
+from prisma.db.consolidated import ConsolidatedDB
+
+
+class PrismaDbStreaming(TestCase):
+    """
+    Test cases for reads streamed in batches.
+    """
+    DATABASE_NAME = 'prisma_testing'
+
+    def setUp(self):
+        client = MongoClient(serverSelectionTimeoutMS=2000, connect=False)
+        client.drop_database(self.DATABASE_NAME)
+        client.drop_database(self.DATABASE_NAME + '_consolidated')
+        self.dbs = [PrismaDB(self.DATABASE_NAME), ConsolidatedDB(self.DATABASE_NAME + '_consolidated')]
+
+    def tearDown(self):
+        for db in self.dbs:
+            db.destroy_db()
+
+    def test_batches(self):
+        """
+        Tests that rounds and heights are read in batches of the given size.
+        """
+        hashes = ['%02x' % i * 64 for i in range(5)]
+        for db in self.dbs:
+            db.insert_round({h: i for i, h in enumerate(hashes)})
+            db.insert_height({h: i for i, h in enumerate(hashes)})
+            db.set_round_handled({hashes[0]: 0})
+
+            batches = list(db.iter_rounds(batch_size=2))
+            self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+            self.assertEqual({h: r for batch in batches for h, r in batch.items()},
+                             {h: i for i, h in enumerate(hashes)})
+            self.assertEqual([len(batch) for batch in db.iter_rounds(2, batch_size=2)], [2, 1])
+            self.assertEqual([batch for batch in db.iter_rounds(3, start=1)], [{hashes[2]: 2, hashes[3]: 3}])
+            self.assertEqual(db.get_heights_many(), {h: i for i, h in enumerate(hashes)})
+            self.assertEqual(list(db.iter_peers()), [])
@@ -0,0 +1,88 @@
+from prisma.test.testutils.testcase import PrismaTestCase
+
+
+class PrismaDbUnitOfWork(PrismaTestCase):
+    DATABASE_BACKEND = 'mongodb'
+
+    def test_read_from_buffer(self):
+        """
+        Tests that buffered writes are read back before they are written to db.
+        """
+        db = self.prisma.db
+        h1, h2 = 'aa' * 64, 'bb' * 64
+        db.begin_unit_of_work()
+        db.insert_round({h1: 1})
+        db.insert_height({h1: 2})
+        db.insert_can_see({h1: {'creator1': h2}})
+        db.insert_witness({7: {'creator1': h1}})
+        db.insert_vote({h1: {h2: True}})
+        db.insert_famous({h1: False})
+
+        self.assertEqual(db.get_round(h1), 1)
+        self.assertEqual(db.get_height(h1), 2)
+        self.assertEqual(db.get_can_see(h1), {'creator1': h2})
+        self.assertEqual(db.get_witness(7), {'creator1': h1})
+        self.assertEqual(db.get_witness_max_round(), 7)
+        self.assertEqual(db.get_vote(h1), {h2: True})
+        self.assertEqual(db.get_famous(h1), [False])
+        self.assertEqual(db.db.rounds.find({'_id': db.common.hash_to_bin(h1)}).count(), 0)
+
+        self.assertTrue(db.commit_unit_of_work())
+        self.assertIsNone(db.get_unit_of_work())
+        self.assertEqual(db.get_round(h1), 1)
+        self.assertEqual(db.get_witness(7), {'creator1': h1})
+        self.assertEqual(db.get_famous(h1), [False])
+
+    def test_flush_before_query(self):
+        """
+        Tests that queries which are not served from the buffer see buffered writes.
+        """
+        db = self.prisma.db
+        h1 = 'aa' * 64
+        db.begin_unit_of_work()
+        db.insert_height({h1: 5})
+        self.assertEqual(db.get_heights_many()[h1], 5)
+        db.commit_unit_of_work()
+
+    def test_duplicate_event(self):
+        """
+        Tests that an event already in db is not buffered and that a failed write stops the flush.
+        """
+        db = self.prisma.db
+        head = db.get_head()
+        event = db.get_event(head)
+        h1 = 'aa' * 64
+        db.begin_unit_of_work()
+        self.assertFalse(db.insert_event({head: event}))
+
+        db.get_unit_of_work().events[head] = event
+        db.insert_height({h1: 5})
+        self.assertFalse(db.commit_unit_of_work())
+        self.assertFalse(db.get_height(h1))
+
+    def test_discard(self):
+        """
+        Tests that data of a discarded unit of work is not written.
+        """
+        db = self.prisma.db
+        h1 = 'aa' * 64
+        db.begin_unit_of_work()
+        db.insert_height({h1: 5})
+        db.discard_unit_of_work()
+        self.assertIsNone(db.get_unit_of_work())
+        self.assertFalse(db.get_height(h1))
+
+    def test_journal(self):
+        """
+        Tests that the journal is buffered unless it is written through.
+        """
+        db = self.prisma.db
+        db.begin_unit_of_work()
+        db.insert_journal({'step': 'events'}, False)
+        self.assertEqual(db.db.metadata.find_one({'_id': 'journal'})['step'], 'events')
+        db.insert_journal({'step': 'rounds'})
+        self.assertEqual(db.get_journal(), {'step': 'rounds'})
+        self.assertEqual(db.db.metadata.find_one({'_id': 'journal'})['step'], 'events')
+
+        self.assertTrue(db.commit_unit_of_work())
+        self.assertEqual(db.get_journal(), {'step': 'rounds'})
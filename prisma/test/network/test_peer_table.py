@@ -0,0 +1,62 @@
+from prisma.network.peer_table import PeerTable
+from prisma.test.testutils.testcase import PrismaTestCase
+from prisma.utils.common import Common
+
+
+class PrismaNetworkPeerTable(PrismaTestCase):
+    """
+    Test cases for the in-memory peer table.
+    """
+    def peer(self, _id, seen):
+        return {'_id': _id, 'host': '127.0.0.1', 'port': 8001, 'seen': seen, 'latest_event': 1.5}
+
+    def test_add(self):
+        now = Common.get_timestamp()
+        peers = PeerTable(60)
+        peers.add_many([self.peer('a', now), self.peer('b', now - 61000)])
+        # not moved back to an older last seen time
+        peers.add(self.peer('a', now - 1000))
+        self.assertEqual(peers.count(), 1)
+        self.assertEqual(peers.get_random(), [self.peer('a', now)])
+
+        peers.remove('a')
+        self.assertEqual(peers.get_many(), [])
+        self.assertEqual(peers.get_random(), [])
+
+    def test_add_invalid(self):
+        now = Common.get_timestamp()
+        peers = PeerTable(60)
+        missing = self.peer('b', now)
+        del missing['latest_event']
+        peers.add_many([None, missing, self.peer('c', 'now'), self.peer(['d'], now), self.peer('a', now)])
+        self.assertEqual(peers.get_many(), [self.peer('a', now)])
+
+    def test_flush(self):
+        now = Common.get_timestamp()
+        db = self.prisma.db
+        peers = PeerTable(0)
+        peers.add_many([self.peer('a', now), self.peer('b', now)])
+        self.assertEqual(db.count_peers(), 0)
+        self.assertTrue(peers.flush())
+        self.assertEqual(sorted(peer['_id'] for peer in db.get_peers_many()), ['a', 'b'])
+
+        peers.remove('a')
+        peers.add(self.peer('b', now + 1000))
+        self.assertTrue(peers.flush())
+        self.assertEqual(db.get_peers_many(), [self.peer('b', now + 1000)])
+
+        peers.clear()
+        self.assertTrue(peers.flush())
+        self.assertEqual(db.count_peers(), 0)
+
+    def test_load(self):
+        now = Common.get_timestamp()
+        db = self.prisma.db
+        db.insert_peers_many([self.peer('a', now), self.peer('b', now - 61000)])
+        peers = PeerTable(60)
+        self.assertTrue(peers.load())
+        self.assertEqual(peers.get_many(), [self.peer('a', now)])
+        # nothing changed but the expired peer
+        self.assertEqual(peers.changed, set())
+        self.assertTrue(peers.flush())
+        self.assertEqual(db.get_peers_many(), [self.peer('a', now)])
@@ -14,6 +14,30 @@ class PrismaNetworkProtocolTestCase(NetworkTestCase):
         self.protocol.send_data(obj)
         self.assertEqual(self.transport.value(), self._prepare_sending('{"test": "ok"}'))
 
+    def test_send_encoded(self):
+        rounds = ({h: r} for h, r in (('aa', 1), ('bb', 2)))
+        self.protocol.send_encoded(self.protocol.encode_data({'test': 'ok', 'rounds': rounds, 1: (x for x in [])}))
+        self.assertEqual(json.loads(self._prepare_received(self.transport.value())),
+                         {'test': 'ok', 'rounds': {'aa': 1, 'bb': 2}, '1': {}})
+
+    def test_send_encoded_paused(self):
+        written = []
+
+        def write(data):
+            written.append(data)
+            # the buffer of the transport is full after every write
+            if self.transport.producer is not None:
+                self.transport.producer.pauseProducing()
+        self.patch(self.transport, 'write', write)
+        states = ([{'_id': i}] for i in range(3))
+        d = self.protocol.send_encoded(self.protocol.encode_data({'states': states}))
+        self.assertFalse(d.called)
+        while self.transport.producer is not None:
+            self.transport.producer.resumeProducing()
+        self.assertTrue(d.called)
+        self.assertEqual(json.loads(self._prepare_received(b''.join(written))),
+                         {'states': [{'_id': 0}, {'_id': 1}, {'_id': 2}]})
+
     def test_testnetstring(self):
         received = self._receive_netstring(b'1:a,')
         self.assertEqual(received, b'a')
@@ -0,0 +1,106 @@
+from collections import OrderedDict
+from json import dumps
+
+from prisma.db.backend import create_db
+from prisma.network.snapshot import Snapshot
+from prisma.network.syncstate import SyncState
+from prisma.test.testutils.testcase import PrismaTestCase
+
+
+class PrismaNetworkSnapshotTestCase(PrismaTestCase):
+    """
+    Test snapshot export and import.
+    """
+    def test_export_import(self):
+        db = self.prisma.db
+        db.insert_state(OrderedDict([('_id', 5), ('prev_hash', 'hash-1'), ('balance', {'w1': 3})]), 'hash5', True)
+        db.insert_signature({'last_round': 5, 'hash': 'hash5', 'sign': {'verify_key': 'key1', 'signed': 'signed1'}})
+        hashes = ['%02x' % i * 64 for i in range(3)]
+        db.insert_round({h: i + 4 for i, h in enumerate(hashes)})
+        db.insert_height({h: i for i, h in enumerate(hashes)})
+        db.insert_witness({5: {'creator1': hashes[1]}})
+        db.insert_consensus([5], True)
+        self.patch(Snapshot, 'is_node_running', lambda: False)
+
+        path = self.mktemp()
+        self.assertEqual(Snapshot.export_snapshot(path), 5)
+
+        started = []
+        self.patch(SyncState, 'start_from_states', lambda states, start_data: started.append(
+            (states, {name: [dict(batch) for batch in start_data[name]] for name in ('rounds', 'heights')},
+             start_data['witnesses'])) or True)
+        self.assertTrue(Snapshot.import_snapshot(path))
+
+        states, batches, witnesses = started[0]
+        self.assertEqual([unit['state']['_id'] for unit in states], [5])
+        self.assertEqual(list(states[0]['state']), ['_id', 'prev_hash', 'balance'])
+        self.assertEqual(states[0]['signatures'], {'key1': 'signed1'})
+        # only the frontier of the last signed round
+        self.assertEqual(batches['rounds'], [{hashes[0]: 4, hashes[1]: 5}])
+        self.assertEqual(batches['heights'], [{hashes[0]: 0, hashes[1]: 1}])
+        self.assertEqual(witnesses['5'], {'creator1': hashes[1]})
+
+    def test_round_trip(self):
+        graph = self.prisma.graph
+        address = self.prisma.wallet.addr_from_public_key(graph.keystore['publicKey'])
+        genesis = OrderedDict([('_id', -1), ('prev_hash', '0' * 64), ('balance', {address: 10})])
+        state = OrderedDict([('_id', 5), ('prev_hash', 'hash-1'), ('balance', {address: 10})])
+        state_hash = self.prisma.crypto.blake_hash(dumps(state).encode('utf-8'))
+        sign = self.prisma.crypto.sign_data(dumps({'last_round': 5, 'hash': state_hash}),
+                                            graph.keystore['privateKeySeed'])
+        hashes = ['%02x' % i * 64 for i in range(3)]
+
+        db = self.prisma.db
+        db.insert_state(genesis, 'hash-1', True)
+        db.insert_state(state, state_hash, True)
+        db.insert_signature({'last_round': 5, 'hash': state_hash, 'sign': sign})
+        # precomputed and not signed yet
+        db.insert_state(OrderedDict([('_id', 8), ('prev_hash', state_hash), ('balance', {})]), 'hash8', False)
+        db.insert_round({h: i + 4 for i, h in enumerate(hashes)})
+        db.insert_height({h: i for i, h in enumerate(hashes)})
+        db.insert_witness({5: {'creator1': hashes[1]}})
+        db.insert_consensus([5], True)
+        self.patch(Snapshot, 'is_node_running', lambda: False)
+
+        path = self.mktemp()
+        self.assertEqual(Snapshot.export_snapshot(path), 5)
+
+        # a new node starts from a fresh database with the genesis state
+        db = create_db(self.DATABASE_NAME + '_import')
+        self.addCleanup(db.destroy_db)
+        self.patch(self.prisma, 'db', db)
+        db.insert_state(genesis, 'hash-1', True)
+        # the test has one key with stake
+        self.patch(self.prisma.graph, 'min_s', 1)
+        self.assertTrue(Snapshot.import_snapshot(path))
+
+        self.assertEqual(db.get_last_state(balance=False)['_id'], 5)
+        self.assertEqual(db.get_state(5)['balance'], {address: 10})
+        self.assertTrue(db.check_consensus(5))
+        self.assertEqual(self.prisma.graph.last_signed_state, 5)
+        self.assertEqual({h: db.get_round(h) for h in hashes}, {hashes[0]: 4, hashes[1]: 5, hashes[2]: False})
+        self.assertEqual({h: db.get_height(h) for h in hashes}, {hashes[0]: 0, hashes[1]: 1, hashes[2]: False})
+        self.assertEqual(db.get_witness(5), {'creator1': hashes[1]})
+        # not newer than the imported state
+        self.assertTrue(Snapshot.import_snapshot(path))
+
+    def test_export_refused(self):
+        db = self.prisma.db
+        db.insert_state(OrderedDict([('_id', 5), ('prev_hash', 'hash-1'), ('balance', {})]), 'hash5', True)
+        db.insert_signature({'last_round': 5, 'hash': 'hash5', 'sign': {'verify_key': 'key1', 'signed': 'signed1'}})
+        db.insert_witness({5: {'creator1': 'a' * 64}})
+        db.insert_consensus([5], True)
+
+        self.patch(Snapshot, 'is_node_running', lambda: True)
+        self.assertFalse(Snapshot.export_snapshot(self.mktemp()))
+
+        # a new state signed while reading
+        self.patch(Snapshot, 'is_node_running', lambda: False)
+        def iter_rounds(less_than, start):
+            db.insert_consensus([6], True)
+            return iter([])
+        self.patch(db, 'iter_rounds', iter_rounds)
+        self.assertFalse(Snapshot.export_snapshot(self.mktemp()))
+
+    def test_import_missing_file(self):
+        self.assertFalse(Snapshot.import_snapshot(self.mktemp()))
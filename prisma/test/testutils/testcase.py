@@ -1,3 +1,5 @@
+import sys
+
 from twisted.trial.unittest import TestCase
 from twisted.internet import task
 from pymongo import MongoClient
@@ -6,11 +8,26 @@ from prisma.manager import Prisma
 from prisma.config import CONFIG
 
 
-class PrismaTestCase(TestCase):
+class BackendParametrized(type):
+    """
+    Test cases that do not choose a backend run on MongoDB, and a copy of each of them
+    named with a Memory suffix runs on the in-memory engine.
+    """
+    def __init__(cls, name, bases, namespace):
+        super(BackendParametrized, cls).__init__(name, bases, namespace)
+        if bases != (TestCase,) and 'DATABASE_BACKEND' not in namespace:
+            memory_name = name + 'Memory'
+            setattr(sys.modules[cls.__module__], memory_name,
+                    type(cls)(memory_name, (cls,), {'DATABASE_BACKEND': 'memory', '__module__': cls.__module__}))
+
+
+class PrismaTestCase(TestCase, metaclass=BackendParametrized):
     """
     This class is made to speedup things when testing. Basically already implements a setUp and tearDown functions.
     """
     DATABASE_NAME = 'prisma_testing'
+    # tests of PrismaDB itself set mongodb to run only on it
+    DATABASE_BACKEND = 'mongodb'
 
     PK_ADDRESS = '7076333928921313840PR'
     SK = b'0ff8f749918a1cfd5278c50e5b36002aea8f466b4ec92b0a6593e6c531d35dd6'
@@ -24,6 +41,9 @@ class PrismaTestCase(TestCase):
     def _set_up(self):
         self._destroy_db()
         CONFIG.set('general', 'database', self.DATABASE_NAME)
+        CONFIG.set('database', 'backend', self.DATABASE_BACKEND)
+        # queries run right away, there is no reactor running
+        CONFIG.set('database', 'threads', '0')
         CONFIG.set('general', 'network', 'testnet')
         CONFIG.set('general', 'wallet_address', '3918807197700602162PR')
         CONFIG.set('bootstrap', 'bootstrap_nodes', '[]')
@@ -34,6 +54,8 @@ class PrismaTestCase(TestCase):
         self.prisma.start(False)
 
     def _destroy_db(self):
+        if self.DATABASE_BACKEND != 'mongodb':
+            return
         connection = MongoClient(serverSelectionTimeoutMS=2000, connect=False)
         connection.drop_database(self.DATABASE_NAME)
 
@@ -0,0 +1,37 @@
+import sys
+
+from prisma.test.testutils.testcase import PrismaTestCase
+
+
+class PrismaMemoryManager(PrismaTestCase):
+    """
+    Test cases for the memory manager.
+    """
+    def test_stats(self):
+        stats = self.prisma.memory.stats()
+        # engines may register structures of their own
+        self.assertTrue({'events', 'can_see', 'votes', 'reachability', 'decided', 'tbd'}.issubset(stats['structures']))
+        self.assertEqual(stats['used'], sum(stats['structures'].values()))
+        self.assertEqual(stats['evictions'], 0)
+
+    def test_enforce(self):
+        memory = self.prisma.memory
+        self.assertEqual(memory.enforce(self.prisma.graph.last_signed_state), memory.stats()['used'])
+
+        memory.budget = 0
+        memory.enforce(self.prisma.graph.last_signed_state)
+        self.assertEqual(memory.stats()['evictions'], 1)
+        # the last event of every creator is never evicted
+        self.assertEqual(len(self.prisma.graph._reachability.events), 1)
+        self.assertEqual(memory.evicted_signed, self.prisma.graph.last_signed_state)
+
+    def test_decided_usage(self):
+        decided = self.prisma.graph._decided
+        size = decided.size
+        decided.set_famous('aa' * 64, True)
+        decided.set_famous('aa' * 64, False)
+        decided.add_rounds([100, 100])
+        self.assertEqual(decided.size, size + sys.getsizeof(bytes(64)) + sys.getsizeof(100))
+        decided.delete_famous(['aa' * 64])
+        decided.delete_rounds(100)
+        self.assertEqual(decided.size, size)
@@ -8,6 +8,7 @@ Licensed under the GNU Lesser General Public License, version 3 or later. See LI
 from collections import namedtuple
 import logging
 import os.path
+from binascii import hexlify, unhexlify
 from json import loads, load, dumps
 import nacl.hash
 
@@ -90,6 +91,38 @@ class Common(object):
             self.logger.critical('Could not read genesis event. Reason: {0}'.format(e))
         return False
 
+    @staticmethod
+    def hash_to_bin(h):
+        """
+        Converts a hex event hash into its raw binary digest.
+        Hashes are stored and indexed in binary form, hex is only used at the
+        JSON, API and logging boundaries.
+
+        :param h: event hash as hex string
+        :type h: str
+        :return: raw digest, or the value itself if it is not a hex string
+        :rtype: bytes
+        """
+        if isinstance(h, str):
+            return unhexlify(h)
+        return h
+
+    @staticmethod
+    def bin_to_hash(b):
+        """
+        Converts a raw binary digest back into a hex event hash.
+        Like hash_to_bin it is idempotent, a hex hash is returned unchanged.
+        Databases that still store hex hashes are refused at startup.
+
+        :param b: raw digest or hex hash
+        :type b: bytes or str
+        :return: event hash as hex string
+        :rtype: str
+        """
+        if isinstance(b, bytes):
+            return hexlify(b).decode('utf-8')
+        return b
+
     @staticmethod
     def get_mini_hash(text):
         """
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2017 Prisma crypto currency and its Authors.
+This file is part of prisma crypto currency.
+Licensed under the GNU Lesser General Public License, version 3 or later. See LICENSING for details.
+"""
+
+import logging
+from collections import OrderedDict
+
+from prisma.config import CONFIG
+from prisma.manager import Prisma
+
+
+class MemoryManager(object):
+    """
+    Keeps account of the memory used by in-memory consensus structures
+    and enforces the configured budget.
+
+    A structure is registered with a function returning its size in bytes and
+    optionally two eviction functions:
+
+    * evict_signed(hash_list) - drops entries of events at or below the last signed state
+    * evict_cold(nbytes) - drops least recently used entries, returns freed bytes
+
+    Evicted entries are read back from the database when they are needed again.
+    Events of a signed state are looked up and evicted once, later enforcements
+    only look up events of rounds signed since then.
+    """
+    def __init__(self):
+        """
+        Create class instance
+
+        :returns instance of MemoryManager class
+        :rtype: object
+        """
+        self.logger = logging.getLogger('MemoryManager')
+        self.budget = CONFIG.getint('memory', 'budget_mb', fallback=512) * 1024 * 1024
+        self.structures = OrderedDict()
+        self.evictions = 0
+        # last signed state whose events were evicted
+        self.evicted_signed = None
+
+    def register(self, name, usage, evict_signed=None, evict_cold=None):
+        """
+        Registers a structure
+
+        :param name: name of the structure used in stats
+        :type name: str
+        :param usage: function returning the size of the structure in bytes
+        :type usage: function
+        :param evict_signed: function dropping entries of given (signed) event hashes
+        :type evict_signed: function or None
+        :param evict_cold: function dropping cold entries, takes bytes to free and returns freed bytes
+        :type evict_cold: function or None
+        :return: None
+        """
+        self.structures[name] = (usage, evict_signed, evict_cold)
+
+    def usage(self):
+        """
+        Gets bytes used by every registered structure
+
+        :return: usage in format {name: bytes}
+        :rtype: dict
+        """
+        return OrderedDict((name, s[0]()) for name, s in self.structures.items())
+
+    def enforce(self, last_signed):
+        """
+        If the budget is exceeded, evicts everything at or below
+        the last signed state first, then cold entries.
+
+        :param last_signed: last round for which signed state was reached
+        :type last_signed: int
+        :return: bytes used after enforcing
+        :rtype: int
+        """
+        total = sum(self.usage().values())
+        if total <= self.budget:
+            return total
+
+        self.logger.info("Memory budget exceeded (%s > %s bytes), evicting.", str(total), str(self.budget))
+        self.evictions += 1
+
+        if self.evicted_signed is None or last_signed > self.evicted_signed:
+            hash_list = Prisma().db.get_rounds_hash_list(last_signed, start=self.evicted_signed)
+            if hash_list is not False:
+                self.evicted_signed = last_signed
+            if hash_list:
+                for usage, evict_signed, evict_cold in self.structures.values():
+                    if evict_signed:
+                        evict_signed(hash_list)
+                total = sum(self.usage().values())
+
+        for usage, evict_signed, evict_cold in self.structures.values():
+            if total <= self.budget:
+                break
+            if evict_cold:
+                total -= evict_cold(total - self.budget)
+
+        if total > self.budget:
+            self.logger.warning("Could not fit in the memory budget, using %s bytes.", str(total))
+        return total
+
+    def stats(self):
+        """
+        Gets memory stats
+
+        :return: budget, total usage, usage of every structure and count of evictions
+        :rtype: dict
+        """
+        usage = self.usage()
+        return {
+            'budget': self.budget,
+            'used': sum(usage.values()),
+            'structures': usage,
+            'evictions': self.evictions
+        }
@@ -16,6 +16,9 @@ setup(
         'twisted==17.1.0',
         'packaging==16.8'
     ],
+    extras_require={
+        'lmdb': ['lmdb==0.93']
+    },
     classifiers=[
         "Programming Language :: Python :: 3.5"
     ],